@@ -1,64 +1,82 @@
+import asyncio
+import json
 import uuid
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-from app.api.deps import get_current_user
+from app.api.deps import (
+    get_bank_connection,
+    get_bank_connections,
+    get_current_superuser,
+    get_current_user,
+)
+from app.core.config import settings
 from app.db.database import get_db
 from app.models.bank_connection import BankConnection
 from app.models.user import User
 from app.schemas.banking import (
+    AccountOverviewResponse,
     BankAccountResponse,
     SubscriptionResponse,
     TransactionResponse,
 )
-from app.services.truelayer import TrueLayerService
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from fastapi.responses import RedirectResponse
+from app.services.bank_aggregator import bank_aggregator
+from app.services.bank_provider import BankDataProvider, BankProviderUnavailableError
+from app.services.bank_webhooks import (
+    WebhookSignatureError,
+    bank_webhook_service,
+    verify_webhook_signature,
+)
+from app.services.recurring_series import recurring_series_service, serialize_series
+from app.services.sync_scheduler import bank_sync_scheduler
+from app.services.transaction_sync import (
+    decode_cursor,
+    serialize_transaction,
+    transaction_sync_service,
+)
+from app.services.tink import tink_service
+from app.services.truelayer import truelayer_service
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 router = APIRouter()
-truelayer_service = TrueLayerService()
 
+# Page size of transaction listings continued with a cursor but no limit
+DEFAULT_PAGE_SIZE = 100
 
-@router.get("/connect", response_class=RedirectResponse)
-async def connect_bank(
-    request: Request, current_user: User = Depends(get_current_user)
-):
-    """
-    Start TrueLayer bank connection flow.
 
-    This endpoint redirects the user to TrueLayer's authorization page
-    where they can select their bank and authorize access.
-    """
+def _start_connection(
+    request: Request, current_user: User, provider: BankDataProvider
+) -> str:
+    """Remember the user and a CSRF state for the provider's callback"""
     # Generate a unique state parameter to prevent CSRF attacks
     state = str(uuid.uuid4())
 
     # Store the state in the session or database for verification later
-    request.session["truelayer_state"] = state
+    request.session[f"{provider.name}_state"] = state
     request.session["user_id"] = current_user.id
+    return state
 
-    # Generate the authorization URL
-    auth_url = await truelayer_service.get_auth_url(state=state)
-
-    # Redirect the user to TrueLayer's authorization page
-    return RedirectResponse(auth_url)
-
-
-@router.get("/callback")
-async def truelayer_callback(
-    code: str = Query(...),
-    state: str = Query(...),
-    request: Request = None,
-    db: Session = Depends(get_db),
-):
-    """
-    Handle callback from TrueLayer after user authorizes access.
 
-    This endpoint exchanges the authorization code for an access token
-    and stores the token in the database.
-    """
+async def _finish_connection(
+    request: Request,
+    db: Session,
+    provider: BankDataProvider,
+    code: str,
+    state: str,
+) -> RedirectResponse:
+    """Verify the callback, exchange the code and store the connection"""
     # Verify the state parameter to prevent CSRF attacks
-    if request.session.get("truelayer_state") != state:
+    if request.session.get(f"{provider.name}_state") != state:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid state parameter"
         )
@@ -72,12 +90,12 @@ async def truelayer_callback(
 
     try:
         # Exchange the authorization code for an access token
-        token_data = await truelayer_service.exchange_code_for_token(code)
+        token_data = await provider.exchange_code_for_token(code)
 
         # Store the token in the database
         bank_connection = BankConnection(
             user_id=user_id,
-            provider="truelayer",
+            provider=provider.name,
             access_token=token_data["access_token"],
             refresh_token=token_data["refresh_token"],
             expires_at=token_data["expires_at"],
@@ -89,7 +107,7 @@ async def truelayer_callback(
         db.refresh(bank_connection)
 
         # Clear the session
-        request.session.pop("truelayer_state", None)
+        request.session.pop(f"{provider.name}_state", None)
         request.session.pop("user_id", None)
 
         # Redirect to a success page
@@ -102,57 +120,133 @@ async def truelayer_callback(
         )
 
 
-@router.get("/accounts", response_model=List[BankAccountResponse])
-async def get_accounts(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+@router.get("/connect", response_class=RedirectResponse)
+async def connect_bank(
+    request: Request, current_user: User = Depends(get_current_user)
 ):
     """
-    Get user's connected bank accounts.
+    Start TrueLayer bank connection flow.
+
+    This endpoint redirects the user to TrueLayer's authorization page
+    where they can select their bank and authorize access.
     """
-    # Get the user's active bank connection
-    bank_connection = (
-        db.query(BankConnection)
-        .filter(
-            BankConnection.user_id == current_user.id, BankConnection.is_active == True
-        )
-        .first()
-    )
+    state = _start_connection(request, current_user, truelayer_service)
+
+    # Redirect the user to TrueLayer's authorization page
+    return RedirectResponse(await truelayer_service.get_auth_url(state=state))
 
-    if not bank_connection:
+
+@router.get("/callback")
+async def truelayer_callback(
+    code: str = Query(...),
+    state: str = Query(...),
+    request: Request = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Handle callback from TrueLayer after user authorizes access.
+
+    This endpoint exchanges the authorization code for an access token
+    and stores the token in the database.
+    """
+    return await _finish_connection(request, db, truelayer_service, code, state)
+
+
+@router.get("/tink/connect", response_class=RedirectResponse)
+async def connect_bank_tink(
+    request: Request, current_user: User = Depends(get_current_user)
+):
+    """
+    Start Tink bank connection flow.
+
+    This endpoint redirects the user to Tink Link, where they can select
+    their bank and authorize access. A user can be connected through both
+    TrueLayer and Tink at the same time.
+    """
+    state = _start_connection(request, current_user, tink_service)
+    return RedirectResponse(await tink_service.get_auth_url(state=state))
+
+
+@router.get("/tink-callback")
+async def tink_callback(
+    code: str = Query(...),
+    state: str = Query(...),
+    request: Request = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Handle callback from Tink Link after user authorizes access.
+    """
+    return await _finish_connection(request, db, tink_service, code, state)
+
+
+@router.post("/webhooks/{provider}", status_code=status.HTTP_202_ACCEPTED)
+async def receive_bank_webhook(
+    provider: str, request: Request, db: Session = Depends(get_db)
+):
+    """
+    Receive a signed notification from a bank data provider.
+
+    New-transaction notifications queue an incremental sync of just the
+    affected account, which runs in the background; consent revocations
+    deactivate the connection. Redelivered and bursty notifications are
+    deduplicated.
+    """
+    secret = bank_webhook_service.secret_for(provider)
+    if not settings.BANK_WEBHOOKS_ENABLED or not secret:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active bank connection found",
+            detail="Webhooks are not enabled for this provider",
         )
 
-    # Check if the token is expired and refresh if needed
-    if bank_connection.expires_at <= datetime.now():
-        try:
-            token_data = await truelayer_service.refresh_access_token(
-                bank_connection.refresh_token
-            )
+    body = await request.body()
+    try:
+        verify_webhook_signature(
+            secret,
+            body,
+            request.headers.get(bank_webhook_service.signature_header(provider)),
+        )
+    except WebhookSignatureError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
 
-            bank_connection.access_token = token_data["access_token"]
-            bank_connection.refresh_token = token_data["refresh_token"]
-            bank_connection.expires_at = token_data["expires_at"]
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON payload"
+        )
 
-            db.commit()
-            db.refresh(bank_connection)
+    try:
+        result = bank_webhook_service.handle(db, provider, payload, body)
+    except asyncio.QueueFull:
+        # The provider redelivers, so ask it to come back later
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook ingestion queue is full",
+            headers={"Retry-After": "30"},
+        )
 
-        except Exception as e:
-            # If token refresh fails, mark the connection as inactive
-            bank_connection.is_active = False
-            db.commit()
+    return {"status": result}
 
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Bank connection expired. Please reconnect your bank account.",
-            )
 
-    # Get the accounts from TrueLayer
+@router.get("/accounts", response_model=List[BankAccountResponse])
+async def get_accounts(
+    bank_connections: List[BankConnection] = Depends(get_bank_connections),
+):
+    """
+    Get user's connected bank accounts across all providers.
+
+    Each provider is queried concurrently and accounts are tagged with the
+    aggregator they were fetched through.
+    """
     try:
-        accounts = await truelayer_service.get_accounts(bank_connection.access_token)
-        return accounts
+        return await bank_aggregator.get_accounts(bank_connections)
 
+    except BankProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -162,61 +256,119 @@ async def get_accounts(
 
 @router.get("/transactions", response_model=List[TransactionResponse])
 async def get_transactions(
+    request: Request,
+    response: Response,
     account_id: str = Query(...),
     from_date: Optional[str] = Query(None),
     to_date: Optional[str] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    merchant: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    direction: Optional[str] = Query(None, pattern="^(debit|credit)$"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
+    bank_connection: BankConnection = Depends(get_bank_connection),
     db: Session = Depends(get_db),
 ):
     """
     Get user's transactions for a specific account.
+
+    Transactions are served newest first from the local store, which is
+    incrementally synced from the provider when it is stale. Amount ranges
+    apply to the size of the amount; direction picks money out (debit) or
+    in (credit). Every matching transaction is returned unless a limit or a
+    cursor is given; then they come one page at a time, and when there are
+    more results the X-Next-Cursor header (and a Link rel="next" header)
+    carries the cursor for the next page.
     """
-    # Get the user's active bank connection
-    bank_connection = (
-        db.query(BankConnection)
-        .filter(
-            BankConnection.user_id == current_user.id, BankConnection.is_active == True
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d") if from_date else None
+        # to_date is inclusive, so query up to the start of the next day
+        end = (
+            datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
+            if to_date
+            else None
         )
-        .first()
-    )
-
-    if not bank_connection:
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active bank connection found",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dates must be in YYYY-MM-DD format",
         )
-
-    # Check if the token is expired and refresh if needed
-    if bank_connection.expires_at <= datetime.now():
+    if cursor is not None:
         try:
-            token_data = await truelayer_service.refresh_access_token(
-                bank_connection.refresh_token
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
             )
+        if limit is None:
+            limit = DEFAULT_PAGE_SIZE
 
-            bank_connection.access_token = token_data["access_token"]
-            bank_connection.refresh_token = token_data["refresh_token"]
-            bank_connection.expires_at = token_data["expires_at"]
+    # Sync new transactions if needed and serve them from the local store
+    try:
+        # Later pages continue the listing the first page started
+        if cursor is None:
+            await transaction_sync_service.ensure_synced(
+                db, bank_connection, account_id, start
+            )
+        transactions, next_cursor = transaction_sync_service.page_transactions(
+            db,
+            current_user.id,
+            account_id,
+            start,
+            end,
+            categories=category,
+            merchant=merchant,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            direction=direction,
+            limit=limit,
+            cursor=cursor,
+        )
+    except BankProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get transactions: {str(e)}",
+        )
 
-            db.commit()
-            db.refresh(bank_connection)
+    if next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return [serialize_transaction(t) for t in transactions]
 
-        except Exception as e:
-            # If token refresh fails, mark the connection as inactive
-            bank_connection.is_active = False
-            db.commit()
 
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Bank connection expired. Please reconnect your bank account.",
-            )
+@router.get("/transactions/merged", response_model=List[TransactionResponse])
+async def get_merged_transactions(
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    bank_connections: List[BankConnection] = Depends(get_bank_connections),
+):
+    """
+    Get transactions of all the user's accounts across all providers.
 
-    # Get the transactions from TrueLayer
+    Providers are queried concurrently. A bank account connected through
+    more than one provider is reported once: transactions are matched across
+    providers by a content hash of their account number, date, amount,
+    currency and merchant.
+    """
     try:
-        transactions = await truelayer_service.get_transactions(
-            bank_connection.access_token, account_id, from_date, to_date
+        return await bank_aggregator.get_transactions(
+            bank_connections, from_date, to_date
         )
-        return transactions
 
+    except BankProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -224,70 +376,221 @@ async def get_transactions(
         )
 
 
-@router.get("/subscriptions", response_model=List[SubscriptionResponse])
-async def get_subscriptions(
+@router.get("/transactions/stream")
+async def stream_transactions(
     account_id: str = Query(...),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    output_format: str = Query("ndjson", alias="format", pattern="^(ndjson|json)$"),
     current_user: User = Depends(get_current_user),
+    bank_connection: BankConnection = Depends(get_bank_connection),
     db: Session = Depends(get_db),
 ):
     """
-    Get user's subscriptions based on transaction history.
+    Stream user's transactions for a specific account.
+
+    Rows are read from the local store in batches and written as they are
+    read, either as newline-delimited JSON (format=ndjson) or as a chunked
+    JSON array (format=json), so memory use does not grow with history size
+    and clients can start rendering immediately.
     """
-    # Get the user's active bank connection
-    bank_connection = (
-        db.query(BankConnection)
-        .filter(
-            BankConnection.user_id == current_user.id, BankConnection.is_active == True
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d") if from_date else None
+        end = (
+            datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
+            if to_date
+            else None
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dates must be in YYYY-MM-DD format",
         )
-        .first()
-    )
 
-    if not bank_connection:
+    try:
+        await transaction_sync_service.ensure_synced(
+            db, bank_connection, account_id, start
+        )
+    except BankProviderUnavailableError:
+        # The provider is down, stream whatever is stored locally
+        pass
+    except Exception as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active bank connection found",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get transactions: {str(e)}",
         )
 
-    # Check if the token is expired and refresh if needed
-    if bank_connection.expires_at <= datetime.now():
+    # The request's session is closed before the body is streamed, so the
+    # rows are read through a session of the generator's own
+    bind = db.get_bind()
+    user_id = current_user.id
+
+    async def batches():
+        stream_db = Session(bind=bind, autoflush=False)
         try:
-            token_data = await truelayer_service.refresh_access_token(
-                bank_connection.refresh_token
+            for batch in transaction_sync_service.iter_transaction_batches(
+                stream_db, user_id, account_id, start, end
+            ):
+                yield batch
+                # Let other requests run between batches
+                await asyncio.sleep(0)
+        finally:
+            stream_db.close()
+
+    async def ndjson_chunks():
+        async for batch in batches():
+            yield "".join(
+                json.dumps(serialize_transaction(t)) + "\n" for t in batch
             )
 
-            bank_connection.access_token = token_data["access_token"]
-            bank_connection.refresh_token = token_data["refresh_token"]
-            bank_connection.expires_at = token_data["expires_at"]
+    async def json_array_chunks():
+        yield "["
+        first = True
+        async for batch in batches():
+            rows = ",".join(json.dumps(serialize_transaction(t)) for t in batch)
+            yield rows if first else "," + rows
+            first = False
+        yield "]"
 
-            db.commit()
-            db.refresh(bank_connection)
+    if output_format == "json":
+        return StreamingResponse(json_array_chunks(), media_type="application/json")
+    return StreamingResponse(ndjson_chunks(), media_type="application/x-ndjson")
 
-        except Exception as e:
-            # If token refresh fails, mark the connection as inactive
-            bank_connection.is_active = False
-            db.commit()
 
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Bank connection expired. Please reconnect your bank account.",
-            )
+@router.post("/transactions/reconcile", response_model=Dict[str, int])
+async def reconcile_transactions(
+    account_id: str = Query(...),
+    bank_connection: BankConnection = Depends(get_bank_connection),
+    db: Session = Depends(get_db),
+):
+    """
+    Re-reconcile an account's stored transaction history in a single pass.
+
+    Pending transactions are matched to their settled versions and repeats
+    are marked as duplicates again, then the account's subscriptions are
+    rebuilt from what remains.
+    """
+    return await transaction_sync_service.reconcile_account(
+        db, bank_connection, account_id
+    )
 
-    # Get transactions for the last 6 months
-    from_date = (datetime.now() - timedelta(days=180)).strftime("%Y-%m-%d")
 
+@router.get("/subscriptions", response_model=List[SubscriptionResponse])
+async def get_subscriptions(
+    account_id: str = Query(...),
+    current_user: User = Depends(get_current_user),
+    bank_connection: BankConnection = Depends(get_bank_connection),
+    db: Session = Depends(get_db),
+):
+    """
+    Get user's subscriptions based on transaction history.
+
+    Recurring payments are detected when transactions are synced, so this
+    only reads the stored series.
+    """
     try:
-        # Get transactions from TrueLayer
-        transactions = await truelayer_service.get_transactions(
-            bank_connection.access_token, account_id, from_date
+        # Syncing new transactions also updates the affected series
+        await transaction_sync_service.ensure_synced(db, bank_connection, account_id)
+
+        return [
+            serialize_series(series)
+            for series in recurring_series_service.get_series(
+                db, current_user.id, account_id
+            )
+        ]
+
+    except BankProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get subscriptions: {str(e)}",
+        )
+
+
+@router.get("/subscriptions/upcoming", response_model=List[SubscriptionResponse])
+async def get_upcoming_subscriptions(
+    days: int = Query(30, ge=1, le=366),
+    account_id: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get subscriptions expected to charge within the next days, soonest first.
+    """
+    return [
+        serialize_series(series)
+        for series in recurring_series_service.get_upcoming(
+            db, current_user.id, days, account_id
         )
+    ]
 
-        # Identify subscriptions from transactions
-        subscriptions = await truelayer_service.identify_subscriptions(transactions)
 
-        return subscriptions
+@router.get("/overview", response_model=List[AccountOverviewResponse])
+async def get_overview(
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    bank_connections: List[BankConnection] = Depends(get_bank_connections),
+):
+    """
+    Get transactions, standing orders and direct debits for all of the
+    user's accounts, across all providers, in a single call.
 
+    Per-account calls are made concurrently and failures are reported per
+    account instead of failing the whole response. Transactions already
+    returned through another provider are left out.
+    """
+    try:
+        return await bank_aggregator.get_overview(
+            bank_connections, from_date, to_date
+        )
+
+    except BankProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get subscriptions: {str(e)}",
+            detail=f"Failed to get accounts overview: {str(e)}",
         )
+
+
+@router.get("/pool-stats", response_model=Dict[str, Any])
+async def get_pool_stats(current_user: User = Depends(get_current_superuser)):
+    """
+    Get HTTP connection pool and rate limiter statistics per provider.
+
+    Useful for checking that connections are being kept alive and reused.
+    The figures cover every user's requests, so only administrators may
+    see them.
+    """
+    return bank_aggregator.get_pool_stats()
+
+
+@router.get("/provider-health", response_model=Dict[str, Any])
+async def get_provider_health(current_user: User = Depends(get_current_superuser)):
+    """
+    Get circuit breaker state, retry counts and how often cached responses
+    were served, per provider and endpoint. Administrators only.
+    """
+    return bank_aggregator.get_resilience_stats()
+
+
+@router.get("/sync/status", response_model=Dict[str, Any])
+async def get_sync_status(current_user: User = Depends(get_current_superuser)):
+    """
+    Get background bank sync scheduler and webhook ingestion status.
+
+    Includes queue depth, in-progress syncs, failure backoff, how long ago
+    connections were last synced and webhook ingestion counters, across all
+    users. Administrators only.
+    """
+    return {
+        **bank_sync_scheduler.get_status(),
+        "webhooks": bank_webhook_service.get_status(),
+    }
@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
+from typing import List, Dict, Any, Callable, Optional
 import json
 import logging
 import os
 from datetime import datetime, timedelta
 import re
-from openai import OpenAI
+import asyncio
 import tiktoken
 import random
 
+from app.api.deps import cancel_on_disconnect, stream_events
 from app.core.config import settings
+from app.services.llm_gateway import llm_gateway
+from app.services.progress import (
+    COMPLETE,
+    IN_PROGRESS,
+    ProgressCallback,
+    report_step,
+    token_reporter,
+)
+from app.services.reconciliation import BOOKED, transaction_reconciler
+from app.services.recurring import normalize_merchant
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +28,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 # Default model to use
 DEFAULT_MODEL = "gpt-4o"  # This is the current name for GPT-4.5
 
@@ -34,11 +42,50 @@ def num_tokens_from_string(string: str, model: str = DEFAULT_MODEL) -> int:
 
 @router.post("/message")
 async def process_message(
-    message: str = Body(..., embed=True)
+    request: Request,
+    message: str = Body(..., embed=True),
+    use_cache: bool = Query(True, description="Reuse the reply to an identical earlier message")
 ):
     """
     Process a message from the user and return an AI response
     """
+    return await cancel_on_disconnect(request, answer_message(message, use_cache))
+
+@router.post("/message/stream")
+async def process_message_stream(
+    request: Request,
+    message: str = Body(..., embed=True),
+    use_cache: bool = Query(True, description="Reuse the reply to an identical earlier message")
+):
+    """
+    Process a message from the user, streaming the answer as server-sent events
+
+    The events are:
+    - step: a processing step starting or completing, shaped like the
+      entries of processingSteps
+    - token: the next piece of the coach's reply, as it is written
+    - result: the full response, as /message returns it
+    - error: statusCode and detail if the message couldn't be processed
+
+    The reply in the result is authoritative: if the LLM fails midway the
+    coach falls back to a canned reply. Closing the connection cancels the
+    reply.
+    """
+    return stream_events(
+        request, lambda progress: answer_message(message, use_cache, progress)
+    )
+
+async def answer_message(
+    message: str,
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Build the coach's answer to a user message
+
+    Processing steps and the reply's tokens are reported to progress as
+    they happen, if it is given.
+    """
     try:
         # Use a mock user for hackathon purposes
         mock_user = {"id": 1, "username": "DemoUser"}
@@ -86,14 +133,20 @@ async def process_message(
         
         elif is_transaction_query:
             # Process as a transaction search
+            report_step(progress, "search_transactions", IN_PROGRESS, "Searching your transactions...")
             search_results = search_transactions(message, mock_user["id"])
+            report_step(progress, "search_transactions", COMPLETE, "Found your transactions")
             
             # Generate AI response with transaction data context
-            ai_response = generate_ai_response(
+            report_step(progress, "generate_response", IN_PROGRESS, "Writing your answer...")
+            ai_response = await generate_ai_response(
                 message, 
                 mock_user, 
-                transaction_data=search_results
+                transaction_data=search_results,
+                use_cache=use_cache,
+                on_delta=token_reporter(progress) if progress else None
             )
+            report_step(progress, "generate_response", COMPLETE, "Answer ready")
             
             return {
                 "response": ai_response,
@@ -102,7 +155,14 @@ async def process_message(
             }
         else:
             # Process as a regular question
-            ai_response = generate_ai_response(message, mock_user)
+            report_step(progress, "generate_response", IN_PROGRESS, "Writing your answer...")
+            ai_response = await generate_ai_response(
+                message,
+                mock_user,
+                use_cache=use_cache,
+                on_delta=token_reporter(progress) if progress else None
+            )
+            report_step(progress, "generate_response", COMPLETE, "Answer ready")
             
             return {
                 "response": ai_response,
@@ -113,14 +173,20 @@ async def process_message(
         logger.error(f"Error processing message: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
-def generate_ai_response(
+async def generate_ai_response(
     message: str, 
     user: Dict[str, Any], 
     transaction_data: Optional[Dict[str, Any]] = None,
-    model: str = DEFAULT_MODEL
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+    on_delta: Optional[Callable[[str], Any]] = None
 ) -> str:
     """
     Generate an AI response using OpenAI
+
+    Replies to an identical prompt are reused for LLM_CACHE_CHAT_TTL_SECONDS
+    unless use_cache is False. If on_delta is given, the reply is streamed
+    and passed to it piece by piece as it is written.
     """
     try:
         # Get user financial data (mock data for now)
@@ -190,29 +256,30 @@ def generate_ai_response(
             ratio = max_tokens / token_count
             user_prompt = user_prompt[:int(len(user_prompt) * ratio)]
         
-        # For debugging, check if API key is set
-        if not settings.OPENAI_API_KEY:
-            logger.error("OpenAI API key is not configured")
+        # Check that the model's provider has an API key
+        if not llm_gateway.is_available(model):
+            logger.error(f"No LLM provider is configured for {model}")
             return "Error: OpenAI API key is not configured. Please check your environment variables."
         
         # Call OpenAI API with proper error handling
         try:
             logger.info(f"Calling OpenAI API with model: {model}")
-            logger.info(f"API Key present: {bool(settings.OPENAI_API_KEY)}")
-            logger.info(f"API Key starts with: {settings.OPENAI_API_KEY[:5] if settings.OPENAI_API_KEY else 'None'}...")
             
-            response = client.chat.completions.create(
+            ai_response = await llm_gateway.complete(
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
+                use_cache=use_cache,
+                ttl_seconds=settings.LLM_CACHE_CHAT_TTL_SECONDS,
+                on_delta=on_delta,
                 temperature=0.7,
                 max_tokens=500
             )
             
             logger.info("OpenAI API call successful")
-            return response.choices[0].message.content
+            return ai_response
             
         except Exception as api_error:
             logger.error(f"OpenAI API error: {str(api_error)}")
@@ -256,6 +323,11 @@ def search_transactions(query: str, user_id: int) -> Dict[str, Any]:
     
     # Get mock transaction data, tailored to the query
     all_transactions = get_mock_transactions(user_id, query)
+
+    # Drop settled pending transactions and repeats so totals count them once
+    all_transactions = transaction_reconciler.reconcile_transactions(
+        all_transactions, fields=reconciliation_fields
+    )
     
     # Analyze query intent using keywords
     query_lower = query.lower()
@@ -340,6 +412,19 @@ def search_transactions(query: str, user_id: int) -> Dict[str, Any]:
         }
     }
 
+def reconciliation_fields(transaction: Dict[str, Any]) -> tuple:
+    """
+    Get the fields a coach transaction is reconciled on
+    """
+    return (
+        transaction.get("account_id"),
+        normalize_merchant(transaction.get("description", ""), transaction["merchant"]),
+        transaction["amount"],
+        datetime.strptime(transaction["date"], "%Y-%m-%d").toordinal(),
+        transaction.get("status", BOOKED),
+        transaction.get("reference"),
+    )
+
 def extract_time_period(query: str) -> tuple:
     """
     Extract time period from query, defaulting to last 6 months
@@ -574,39 +659,38 @@ async def test_openai():
     """
     try:
         logger.info(f"Testing OpenAI API connection")
-        logger.info(f"API Key present: {bool(settings.OPENAI_API_KEY)}")
         
-        if not settings.OPENAI_API_KEY:
+        if not llm_gateway.is_available("gpt-3.5-turbo"):
             return {"status": "error", "message": "OpenAI API key is not configured"}
         
-        response = client.chat.completions.create(
+        reply = await llm_gateway.complete(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": "Say hello!"}
             ],
+            use_cache=False,
             max_tokens=10
         )
         
         return {
             "status": "success", 
             "message": "OpenAI API connection successful", 
-            "response": response.choices[0].message.content
+            "response": reply
         }
     except Exception as e:
         logger.error(f"Error testing OpenAI API: {str(e)}")
         return {"status": "error", "message": str(e)}
 
 # Add a function to simulate fetching subscription data
-def fetch_subscription_data(user_id: int, services: List[str]) -> Dict[str, Any]:
+async def fetch_subscription_data(user_id: int, services: List[str]) -> Dict[str, Any]:
     """
     Simulate fetching subscription data for specific streaming services
     """
     logger.info(f"Fetching subscription data for user {user_id} and services {services}")
     
     # Add a small delay to simulate API call
-    import time
-    time.sleep(1.5)
+    await asyncio.sleep(1.5)
     
     # Mock subscription data
     subscriptions = {
@@ -661,7 +745,7 @@ async def analyze_subscriptions(
     """
     try:
         # Fetch subscription data
-        subscription_data = fetch_subscription_data(user_id, services)
+        subscription_data = await fetch_subscription_data(user_id, services)
         
         # Calculate totals
         monthly_total = sum(sub["monthly_cost"] for sub in subscription_data.values())
@@ -694,17 +778,16 @@ async def analyze_subscriptions(
         
         try:
             # Call OpenAI for analysis
-            response = client.chat.completions.create(
+            analysis = await llm_gateway.complete(
                 model=DEFAULT_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a financial coach providing subscription spending analysis. Keep responses brief (max 100-150 words) and use bullet points when possible."},
                     {"role": "user", "content": analysis_prompt}
                 ],
+                ttl_seconds=settings.LLM_CACHE_CHAT_TTL_SECONDS,
                 temperature=0.7,
                 max_tokens=500
             )
-            
-            analysis = response.choices[0].message.content
         except Exception as api_error:
             logger.error(f"OpenAI API error: {str(api_error)}")
             # Fallback analysis
@@ -756,11 +839,10 @@ async def cancel_subscription(
         logger.info(f"Cancelling subscription {subscription} for user {user_id}")
         
         # Add a delay to simulate the cancellation process
-        import time
-        time.sleep(2)
+        await asyncio.sleep(2)
         
         # Return success response with savings information
-        subscription_data = fetch_subscription_data(user_id, [subscription])
+        subscription_data = await fetch_subscription_data(user_id, [subscription])
         
         if not subscription_data:
             raise HTTPException(status_code=404, detail="Subscription not found")
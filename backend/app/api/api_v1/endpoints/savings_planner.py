@@ -1,22 +1,18 @@
 import json
 import logging
-import os
 from typing import Any, Dict, List, Optional
 
 from app.api import deps
+from app.api.deps import cancel_on_disconnect
+from app.services.llm_gateway import llm_gateway
 from app.services.pdf_analysis import DEFAULT_MODEL
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from openai import OpenAI
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=openai_api_key)
-
 
 class SavingsRequest(BaseModel):
     """Request model for savings suggestions."""
@@ -31,10 +27,15 @@ class SavingsRequest(BaseModel):
 @router.post("/suggestions", response_model=Dict[str, Any])
 async def generate_savings_suggestions(
     request: SavingsRequest,
+    http_request: Request,
     model: Optional[str] = Query(
         DEFAULT_MODEL,
         description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
     ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the suggestions of an identical earlier request",
+    ),
     current_user: Optional[Any] = None,  # Made optional for testing
 ):
     """
@@ -107,18 +108,21 @@ async def generate_savings_suggestions(
 
         try:
             # Use OpenAI API
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.2,
-                response_format={"type": "json_object"},
+            llm_result = await cancel_on_disconnect(
+                http_request,
+                llm_gateway.complete(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    parse=json.loads,
+                    use_cache=use_cache,
+                    temperature=0.2,
+                    response_format={"type": "json_object"},
+                ),
             )
 
-            llm_result = json.loads(response.choices[0].message.content)
-
             # Combine the calculated metrics with the LLM suggestions
             result = {
                 "targetSavingsRate": request.targetSavingsRate,
@@ -133,11 +137,15 @@ async def generate_savings_suggestions(
 
             return result
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error generating suggestions with LLM: {e}")
             # Fall back to rule-based suggestions if LLM fails
             return generate_fallback_suggestions(expense_data)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in savings suggestions: {e}")
         raise HTTPException(
@@ -1,12 +1,32 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
 
 from app.api import deps
+from app.api.deps import cancel_on_disconnect, stream_events
+from app.core.config import settings
+from app.models.analysis_job import AnalysisJob
+from app.models.user import User
+from app.services.analysis_jobs import (
+    ANALYZE,
+    COMPLETED,
+    FAILED,
+    PREDICT_MONTHLY,
+    analysis_job_queue,
+    describe_job,
+)
+from app.services.llm_gateway import llm_gateway
 from app.services.pdf_analysis import (
     DEFAULT_MODEL,
+    PDFTooLargeError,
     analyze_monthly_prediction,
     process_pdf_statements,
+    read_pdf_upload,
 )
+from app.services.pdf_cache import statement_text_cache
+from app.services.pdf_extraction import pdf_extraction_engine
+from app.services.progress import ProgressCallback
+from app.services.statement_parser import statement_parser
 from fastapi import (
     APIRouter,
     Depends,
@@ -14,22 +34,117 @@ from fastapi import (
     Form,
     HTTPException,
     Query,
+    Request,
+    Response,
     UploadFile,
     status,
 )
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
 
-router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Models the analysis endpoints accept
+ALLOWED_MODELS = ["gpt-4o", "gpt-4-turbo", "gpt-4", "gpt-3.5-turbo"]
+
+
+class UploadLimitedRequest(Request):
+    """
+    Request whose body is capped while it is being received
+
+    Uploads are refused as soon as they pass the cap, before the multipart
+    parser has spooled the rest of them.
+    """
+
+    max_body_size = (
+        settings.STATEMENT_UPLOAD_MAX_BYTES * settings.STATEMENT_UPLOAD_MAX_FILES
+    )
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload is larger than the {self.max_body_size} byte limit",
+        )
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        content_length = self.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            if int(content_length) > self.max_body_size:
+                raise self._too_large()
+
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > self.max_body_size:
+                raise self._too_large()
+            yield chunk
+
+
+class UploadLimitedRoute(APIRoute):
+    """Route that reads its body through an UploadLimitedRequest"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            return await handler(UploadLimitedRequest(request.scope, request.receive))
+
+        return limited_handler
+
+
+router = APIRouter(route_class=UploadLimitedRoute)
+
+
+def _check_pdf_uploads(files: List[UploadFile]) -> None:
+    """Refuse uploads that aren't PDFs, or are too many or too large"""
+    for file in files:
+        if file.content_type != "application/pdf":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File {file.filename} is not a PDF. Only PDF files are accepted.",
+            )
+    _check_upload_sizes(files)
+
+
+def _allowed_model(model: Optional[str]) -> str:
+    """The requested model, or the default one if it isn't allowed"""
+    if model not in ALLOWED_MODELS:
+        logger.warning(
+            f"Invalid model requested: {model}. Using default model {DEFAULT_MODEL} instead."
+        )
+        return DEFAULT_MODEL
+    return model
+
+
+def _check_upload_sizes(files: List[UploadFile]) -> None:
+    """Refuse requests with too many files or a file over the size limit"""
+    if len(files) > settings.STATEMENT_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.STATEMENT_UPLOAD_MAX_FILES} files can be "
+            "analyzed at once",
+        )
+    for file in files:
+        if file.size is not None and file.size > settings.STATEMENT_UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File {file.filename} is larger than the "
+                f"{settings.STATEMENT_UPLOAD_MAX_BYTES} byte limit",
+            )
+
 
 @router.post("/analyze", response_model=Dict[str, Any])
 async def analyze_statements(
+    request: Request,
     files: List[UploadFile] = File(...),
     model: Optional[str] = Query(
         DEFAULT_MODEL,
         description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
     ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the analysis of an identical earlier request",
+    ),
     db: Session = Depends(deps.get_db),
     current_user: Optional[Any] = None,  # Made optional for testing
 ):
@@ -45,28 +160,18 @@ async def analyze_statements(
     Parameters:
     - files: List of PDF files to analyze
     - model: The LLM model to use (default: gpt-4o)
+    - use_cache: Set to false to always request a fresh analysis
     """
     try:
-        # Validate file types
-        for file in files:
-            content_type = file.content_type
-            if content_type != "application/pdf":
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"File {file.filename} is not a PDF. Only PDF files are accepted.",
-                )
-
-        # Validate model
-        allowed_models = ["gpt-4o", "gpt-4-turbo", "gpt-4", "gpt-3.5-turbo"]
-        if model not in allowed_models:
-            logger.warning(
-                f"Invalid model requested: {model}. Using default model {DEFAULT_MODEL} instead."
-            )
-            model = DEFAULT_MODEL
+        _check_pdf_uploads(files)
+        model = _allowed_model(model)
 
         # Process the PDF files with the specified model
         logger.info(f"Processing PDF statements with model: {model}")
-        result = process_pdf_statements(files, model=model)
+        result = await cancel_on_disconnect(
+            request,
+            process_pdf_statements(files, model=model, use_cache=use_cache),
+        )
 
         # In a production app, you would save the analysis results and update user traits/XP in the database
         # For example:
@@ -75,6 +180,12 @@ async def analyze_statements(
 
         return result
 
+    except HTTPException:
+        raise
+    except PDFTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
     except ValueError as e:
         logger.error(f"Value error in statement analysis: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -88,11 +199,16 @@ async def analyze_statements(
 
 @router.post("/predict-monthly", response_model=Dict[str, Any])
 async def predict_monthly_spending(
+    request: Request,
     file: UploadFile = File(...),
     model: Optional[str] = Query(
         DEFAULT_MODEL,
         description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
     ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the analysis of an identical earlier request",
+    ),
     db: Session = Depends(deps.get_db),
     current_user: Optional[Any] = None,  # Made optional for testing
 ):
@@ -108,30 +224,27 @@ async def predict_monthly_spending(
     Parameters:
     - file: PDF file of the current month's statement
     - model: The LLM model to use (default: gpt-4o)
+    - use_cache: Set to false to always request a fresh analysis
     """
     try:
-        # Validate file type
-        content_type = file.content_type
-        if content_type != "application/pdf":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File {file.filename} is not a PDF. Only PDF files are accepted.",
-            )
-
-        # Validate model
-        allowed_models = ["gpt-4o", "gpt-4-turbo", "gpt-4", "gpt-3.5-turbo"]
-        if model not in allowed_models:
-            logger.warning(
-                f"Invalid model requested: {model}. Using default model {DEFAULT_MODEL} instead."
-            )
-            model = DEFAULT_MODEL
+        _check_pdf_uploads([file])
+        model = _allowed_model(model)
 
         # Process the PDF file with the specified model
         logger.info(f"Processing monthly prediction with model: {model}")
         try:
-            result = analyze_monthly_prediction(file, model=model)
+            result = await cancel_on_disconnect(
+                request,
+                analyze_monthly_prediction(file, model=model, use_cache=use_cache),
+            )
             logger.info("Successfully processed monthly prediction")
             return result
+        except HTTPException:
+            raise
+        except PDFTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+            )
         except ValueError as e:
             logger.error(f"Value error in monthly prediction: {str(e)}")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -142,6 +255,8 @@ async def predict_monthly_spending(
                 detail=f"An error occurred while analyzing the statement: {str(e)}",
             )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Value error in monthly prediction: {str(e)}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -151,3 +266,273 @@ async def predict_monthly_spending(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while analyzing the statement: {str(e)}",
         )
+
+
+@router.post("/analyze/stream")
+async def analyze_statements_stream(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Query(
+        DEFAULT_MODEL,
+        description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
+    ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the analysis of an identical earlier request",
+    ),
+):
+    """
+    Analyze PDF bank statements, streaming the progress as server-sent events.
+
+    Same analysis as /analyze. The events are:
+    - step: a processing step (extracting, parsing, analyzing) starting or
+      completing, shaped like the coach's processingSteps
+    - field: a field of a single statement's analysis, once it is known
+    - statement: the totals of one of multiple statements, once analyzed
+    - result: the full analysis, as /analyze returns it
+    - error: statusCode and detail of a failed analysis
+
+    Closing the connection cancels the analysis.
+    """
+    _check_pdf_uploads(files)
+    model = _allowed_model(model)
+
+    async def work(progress: ProgressCallback) -> Dict[str, Any]:
+        try:
+            return await process_pdf_statements(
+                files, model=model, use_cache=use_cache, progress=progress
+            )
+        except PDFTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+            )
+        except ValueError as e:
+            logger.error(f"Value error in statement analysis: {e}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    logger.info(f"Streaming analysis of PDF statements with model: {model}")
+    return stream_events(request, work)
+
+
+@router.post("/predict-monthly/stream")
+async def predict_monthly_spending_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    model: Optional[str] = Query(
+        DEFAULT_MODEL,
+        description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
+    ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the analysis of an identical earlier request",
+    ),
+):
+    """
+    Predict the current month's spending, streaming the progress as
+    server-sent events.
+
+    Same prediction as /predict-monthly. The events are:
+    - step: a processing step (extracting, parsing, analyzing) starting or
+      completing, shaped like the coach's processingSteps
+    - field: a field of the prediction, once it is known
+    - result: the full prediction, as /predict-monthly returns it
+    - error: statusCode and detail of a failed prediction
+
+    Closing the connection cancels the prediction.
+    """
+    _check_pdf_uploads([file])
+    model = _allowed_model(model)
+
+    async def work(progress: ProgressCallback) -> Dict[str, Any]:
+        try:
+            return await analyze_monthly_prediction(
+                file, model=model, use_cache=use_cache, progress=progress
+            )
+        except PDFTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+            )
+        except ValueError as e:
+            logger.error(f"Value error in monthly prediction: {str(e)}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    logger.info(f"Streaming monthly prediction with model: {model}")
+    return stream_events(request, work)
+
+
+def _submit_job(
+    db: Session, kind: str, files: List[UploadFile], model: str, use_cache: bool
+) -> Dict[str, Any]:
+    """Queue an analysis job for uploaded files"""
+    try:
+        uploads = [read_pdf_upload(file) for file in files]
+    except PDFTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+
+    try:
+        job, existing = analysis_job_queue.submit(
+            db, kind, uploads, model, use_cache=use_cache
+        )
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis job queue is full",
+            headers={"Retry-After": "30"},
+        )
+
+    logger.info(
+        f"{'Joined' if existing else 'Queued'} {kind} job {job.id} "
+        f"with model: {model}"
+    )
+    return {**describe_job(job), "deduplicated": existing}
+
+
+def _get_job(db: Session, job_id: str) -> AnalysisJob:
+    """Get a job, or answer 404"""
+    job = analysis_job_queue.get(db, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return job
+
+
+@router.post(
+    "/jobs", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED
+)
+async def submit_analysis_job(
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Query(
+        DEFAULT_MODEL,
+        description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
+    ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the result of an identical earlier submission",
+    ),
+    db: Session = Depends(deps.get_db),
+):
+    """
+    Queue PDF bank statements for analysis in the background.
+
+    Returns the job right away; its status is at /jobs/{job_id}, the
+    analysis, once done, at /jobs/{job_id}/result (the same body /analyze
+    returns), and its progress can be followed at /jobs/{job_id}/events.
+    Submitting the same files again returns the job of the first
+    submission, with deduplicated set.
+    """
+    _check_pdf_uploads(files)
+    return _submit_job(db, ANALYZE, files, _allowed_model(model), use_cache)
+
+
+@router.post(
+    "/jobs/predict-monthly",
+    response_model=Dict[str, Any],
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_prediction_job(
+    file: UploadFile = File(...),
+    model: Optional[str] = Query(
+        DEFAULT_MODEL,
+        description="The LLM model to use for analysis (e.g., gpt-4o, gpt-3.5-turbo)",
+    ),
+    use_cache: bool = Query(
+        True,
+        description="Reuse the result of an identical earlier submission",
+    ),
+    db: Session = Depends(deps.get_db),
+):
+    """
+    Queue the current month's statement for a spending prediction in the
+    background.
+
+    Works like /jobs, the result being the body /predict-monthly returns.
+    """
+    _check_pdf_uploads([file])
+    return _submit_job(db, PREDICT_MONTHLY, [file], _allowed_model(model), use_cache)
+
+
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_analysis_job(job_id: str, db: Session = Depends(deps.get_db)):
+    """
+    Get the status of an analysis job: queued, running, completed or failed.
+    """
+    job = _get_job(db, job_id)
+    return describe_job(job)
+
+
+@router.get("/jobs/{job_id}/result", response_model=Dict[str, Any])
+async def get_analysis_job_result(job_id: str, db: Session = Depends(deps.get_db)):
+    """
+    Get the result of a completed analysis job.
+
+    Answers 409 while the job is queued or running, and 500 with the error
+    if it failed.
+    """
+    job = _get_job(db, job_id)
+    if job.status == FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"The analysis failed: {job.error}",
+        )
+    if job.status != COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}"
+        )
+    return job.result
+
+
+@router.get("/jobs/{job_id}/events")
+async def follow_analysis_job(
+    job_id: str, request: Request, db: Session = Depends(deps.get_db)
+):
+    """
+    Follow an analysis job as server-sent events.
+
+    The events are:
+    - status: the job's status, whenever it changes
+    - step, field, statement: the analysis' progress, as sent by
+      /analyze/stream, while the job runs in this server process
+    - result: the finished job's status with its result
+    - error: statusCode and detail if the job couldn't be followed
+
+    Closing the connection only stops following; the job keeps running.
+    """
+    _get_job(db, job_id)
+    return stream_events(
+        request, lambda progress: analysis_job_queue.follow(job_id, progress)
+    )
+
+
+@router.get("/job-stats", response_model=Dict[str, Any])
+async def get_job_stats(current_user: User = Depends(deps.get_current_superuser)):
+    """
+    Get analysis job queue depth, running jobs and job counters.
+    """
+    return analysis_job_queue.get_status()
+
+
+@router.get("/extraction-stats", response_model=Dict[str, Any])
+async def get_extraction_stats(
+    current_user: User = Depends(deps.get_current_superuser),
+):
+    """
+    Get statement text cache hit/miss counters, extraction pool metrics and
+    local statement parser counters.
+    """
+    return {
+        "cache": statement_text_cache.get_stats(),
+        "pool": pdf_extraction_engine.get_stats(),
+        "parser": statement_parser.get_stats(),
+    }
+
+
+@router.get("/llm-stats", response_model=Dict[str, Any])
+async def get_llm_stats(current_user: User = Depends(deps.get_current_superuser)):
+    """
+    Get per-model LLM latency, token usage, retry and error counters,
+    provider circuit breaker states and response cache counters.
+    """
+    return llm_gateway.get_stats()
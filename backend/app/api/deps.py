@@ -1,15 +1,27 @@
-from typing import Generator, Optional
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Generator, List, Optional
 
 from app.core.config import settings
 from app.core.security import ALGORITHM
 from app.db.database import get_db
+from app.models.account_sync_state import AccountSyncState
+from app.models.bank_connection import BankConnection
+from app.models.transaction import Transaction
 from app.models.user import User
-from fastapi import Depends, HTTPException, status
+from app.services.bank_aggregator import get_bank_provider
+from app.services.bank_tokens import BankConnectionExpiredError, bank_token_manager
+from app.services.progress import ProgressCallback
+from fastapi import Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 
@@ -42,3 +54,270 @@ async def get_current_user(
         )
 
     return user
+
+
+async def get_current_superuser(
+    current_user: User = Depends(get_current_user),
+) -> User:
+    """
+    Get the current user, who must be an administrator.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges"
+        )
+    return current_user
+
+
+async def _with_valid_token(
+    db: Session, bank_connection: BankConnection
+) -> BankConnection:
+    """Make sure a connection carries a valid access token"""
+    try:
+        access_token = await bank_token_manager.get_access_token(bank_connection)
+    except BankConnectionExpiredError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Bank connection expired. Please reconnect your bank account.",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Bank provider is unavailable: {str(e)}",
+        )
+
+    # Pick up tokens written by a refresh that ran in another session
+    if access_token != bank_connection.access_token:
+        db.refresh(bank_connection)
+
+    return bank_connection
+
+
+async def get_bank_connection(
+    provider: Optional[str] = Query(
+        None, description="Provider of the connection to use, e.g. truelayer or tink"
+    ),
+    account_id: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> BankConnection:
+    """
+    Get the current user's active bank connection with a valid access token.
+
+    With more than one connection, the one the account belongs to is used:
+    the connection it was synced through, or else the one whose provider
+    lists it.
+    """
+    query = db.query(BankConnection).filter(
+        BankConnection.user_id == current_user.id, BankConnection.is_active == True
+    )
+    if provider:
+        query = query.filter(BankConnection.provider == provider)
+    bank_connections = query.order_by(BankConnection.id).all()
+
+    if not bank_connections:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active bank connection found",
+        )
+    if len(bank_connections) == 1:
+        return await _with_valid_token(db, bank_connections[0])
+
+    if not account_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You have more than one bank connection, pass account_id "
+            "or provider to choose one",
+        )
+    bank_connection = _synced_connection(db, bank_connections, account_id)
+    if bank_connection is not None:
+        return await _with_valid_token(db, bank_connection)
+    return await _listing_connection(db, bank_connections, account_id)
+
+
+def _synced_connection(
+    db: Session, bank_connections: List[BankConnection], account_id: str
+) -> Optional[BankConnection]:
+    """The connection an account's transactions were synced through, if any"""
+    by_id = {connection.id: connection for connection in bank_connections}
+    for model in (AccountSyncState, Transaction):
+        row = (
+            db.query(model.bank_connection_id)
+            .filter(
+                model.account_id == account_id,
+                model.bank_connection_id.in_(list(by_id)),
+            )
+            .first()
+        )
+        if row is not None:
+            return by_id[row[0]]
+    return None
+
+
+async def _listing_connection(
+    db: Session, bank_connections: List[BankConnection], account_id: str
+) -> BankConnection:
+    """Ask each connection's provider for its accounts to find the account's"""
+
+    async def lists_account(connection: BankConnection) -> bool:
+        connection = await _with_valid_token(db, connection)
+        provider = get_bank_provider(connection.provider)
+        accounts = await provider.get_accounts(connection.access_token)
+        return any(account.get("account_id") == account_id for account in accounts)
+
+    results = await asyncio.gather(
+        *(lists_account(connection) for connection in bank_connections),
+        return_exceptions=True,
+    )
+    for connection, listed in zip(bank_connections, results):
+        if listed is True:
+            return connection
+    if all(isinstance(result, Exception) for result in results):
+        raise results[0]
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="No active bank connection has this account",
+    )
+
+
+async def get_bank_connections(
+    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+) -> List[BankConnection]:
+    """
+    Get all of the current user's active bank connections, across providers,
+    with valid access tokens.
+
+    Connections whose tokens cannot be refreshed are left out, unless none
+    are left.
+    """
+    bank_connections = (
+        db.query(BankConnection)
+        .filter(
+            BankConnection.user_id == current_user.id, BankConnection.is_active == True
+        )
+        .all()
+    )
+
+    if not bank_connections:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active bank connection found",
+        )
+
+    results = await asyncio.gather(
+        *(_with_valid_token(db, connection) for connection in bank_connections),
+        return_exceptions=True,
+    )
+    valid = [r for r in results if isinstance(r, BankConnection)]
+    if not valid:
+        raise results[0]
+    return valid
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Run a request's work, cancelling it if the client disconnects first
+
+    LLM completions take seconds and are paid for, so there's no point in
+    finishing one nobody is waiting for. The work runs as a task while the
+    connection is polled every LLM_DISCONNECT_POLL_SECONDS.
+
+    Args:
+        request: Request the work is for
+        work: Coroutine producing the response
+
+    Returns:
+        The work's result
+
+    Raises:
+        HTTPException: 499 if the client went away before the work finished
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {task}, timeout=settings.LLM_DISCONNECT_POLL_SECONDS
+            )
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        # Also stop the work if this request is cancelled itself
+        if not task.done():
+            task.cancel()
+
+
+def server_sent_event(event: str, data: Any) -> str:
+    """Format an event for a text/event-stream response"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_events(
+    request: Request, work: Callable[[ProgressCallback], Awaitable[Any]]
+) -> StreamingResponse:
+    """
+    Run a request's work, streaming its progress as server-sent events
+
+    The work is given a callback to report events with, which are sent as
+    they come. The stream ends with a "result" event carrying what the work
+    returned, the same body as the endpoint's non-streaming variant, or an
+    "error" event with the status code and detail of the HTTPException it
+    raised. A comment is sent first, so the response starts before any of
+    the work is done. As with cancel_on_disconnect, the work is cancelled
+    if the client disconnects.
+
+    Args:
+        request: Request the work is for
+        work: Takes the progress callback and produces the result
+
+    Returns:
+        A text/event-stream response
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def generate() -> AsyncIterator[str]:
+        task = asyncio.ensure_future(
+            work(lambda event, data: events.put_nowait((event, data)))
+        )
+        # Wakes the loop below up once the work is done
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            yield ": stream opened\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        events.get(), timeout=settings.LLM_DISCONNECT_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        logger.info("Client closed the event stream")
+                        return
+                    continue
+                if item is None:
+                    break
+                yield server_sent_event(*item)
+
+            error = task.exception()
+            if error is None:
+                yield server_sent_event("result", task.result())
+            elif isinstance(error, HTTPException):
+                yield server_sent_event(
+                    "error", {"statusCode": error.status_code, "detail": error.detail}
+                )
+            else:
+                logger.error(f"Error in streamed request: {error}")
+                yield server_sent_event(
+                    "error", {"statusCode": 500, "detail": "An error occurred"}
+                )
+        finally:
+            # Also stops the work when the response itself is cancelled
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -12,6 +12,11 @@ class Settings(BaseSettings):
 
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./savquest.db")
+    # Request sessions hold a pooled connection while awaiting bank calls, so
+    # the pool must cover the expected number of concurrent banking requests
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+    DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+    DATABASE_POOL_TIMEOUT: float = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
 
     # TrueLayer API settings
     TRUELAYER_CLIENT_ID: str = os.getenv("TRUELAYER_CLIENT_ID", "")
@@ -19,6 +24,139 @@ class Settings(BaseSettings):
     TRUELAYER_REDIRECT_URI: str = os.getenv(
         "TRUELAYER_REDIRECT_URI", "http://localhost:8000/api/v1/banking/callback"
     )
+    # Base URLs, override to point at a local stand-in server
+    TRUELAYER_AUTH_URL: str = os.getenv(
+        "TRUELAYER_AUTH_URL", "https://auth.truelayer.com"
+    )
+    TRUELAYER_API_URL: str = os.getenv("TRUELAYER_API_URL", "https://api.truelayer.com")
+
+    # TrueLayer HTTP connection pool settings
+    TRUELAYER_MAX_CONNECTIONS: int = int(os.getenv("TRUELAYER_MAX_CONNECTIONS", "20"))
+    TRUELAYER_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("TRUELAYER_MAX_KEEPALIVE_CONNECTIONS", "10")
+    )
+    TRUELAYER_KEEPALIVE_EXPIRY: float = float(
+        os.getenv("TRUELAYER_KEEPALIVE_EXPIRY", "30")
+    )
+    TRUELAYER_HTTP2: bool = os.getenv("TRUELAYER_HTTP2", "true").lower() in [
+        "true",
+        "1",
+        "yes",
+    ]
+    TRUELAYER_CONNECT_TIMEOUT: float = float(
+        os.getenv("TRUELAYER_CONNECT_TIMEOUT", "5")
+    )
+    TRUELAYER_READ_TIMEOUT: float = float(os.getenv("TRUELAYER_READ_TIMEOUT", "30"))
+    # TrueLayer retry and circuit breaker settings
+    TRUELAYER_MAX_RETRIES: int = int(os.getenv("TRUELAYER_MAX_RETRIES", "3"))
+    TRUELAYER_BACKOFF_BASE_SECONDS: float = float(
+        os.getenv("TRUELAYER_BACKOFF_BASE_SECONDS", "0.5")
+    )
+    TRUELAYER_BACKOFF_MAX_SECONDS: float = float(
+        os.getenv("TRUELAYER_BACKOFF_MAX_SECONDS", "8")
+    )
+    TRUELAYER_RETRY_AFTER_MAX_SECONDS: float = float(
+        os.getenv("TRUELAYER_RETRY_AFTER_MAX_SECONDS", "30")
+    )
+    TRUELAYER_BREAKER_FAILURE_THRESHOLD: int = int(
+        os.getenv("TRUELAYER_BREAKER_FAILURE_THRESHOLD", "5")
+    )
+    TRUELAYER_BREAKER_RESET_SECONDS: float = float(
+        os.getenv("TRUELAYER_BREAKER_RESET_SECONDS", "30")
+    )
+    # Number of last-good responses kept to serve while the provider is down
+    TRUELAYER_STALE_CACHE_SIZE: int = int(
+        os.getenv("TRUELAYER_STALE_CACHE_SIZE", "1000")
+    )
+    # Maximum number of concurrent per-account calls when fanning out
+    TRUELAYER_FANOUT_CONCURRENCY: int = int(
+        os.getenv("TRUELAYER_FANOUT_CONCURRENCY", "8")
+    )
+    # Client-side rate limit (requests per second and burst), 0 to disable
+    TRUELAYER_RATE_LIMIT_PER_SECOND: float = float(
+        os.getenv("TRUELAYER_RATE_LIMIT_PER_SECOND", "20")
+    )
+    TRUELAYER_RATE_LIMIT_BURST: int = int(os.getenv("TRUELAYER_RATE_LIMIT_BURST", "40"))
+
+    # Seconds before expiry at which bank tokens are refreshed in the background
+    BANK_TOKEN_REFRESH_WINDOW_SECONDS: int = int(
+        os.getenv("BANK_TOKEN_REFRESH_WINDOW_SECONDS", "300")
+    )
+    # Seconds before expiry at which a token is no longer handed out
+    BANK_TOKEN_EXPIRY_MARGIN_SECONDS: int = int(
+        os.getenv("BANK_TOKEN_EXPIRY_MARGIN_SECONDS", "30")
+    )
+
+    # Local transaction store sync settings
+    # Days of history fetched the first time an account is synced
+    TRANSACTION_SYNC_INITIAL_DAYS: int = int(
+        os.getenv("TRANSACTION_SYNC_INITIAL_DAYS", "180")
+    )
+    # Days re-fetched before the high-water mark to catch late-posting items
+    TRANSACTION_SYNC_OVERLAP_DAYS: int = int(
+        os.getenv("TRANSACTION_SYNC_OVERLAP_DAYS", "3")
+    )
+    # Seconds after which a read triggers an incremental sync
+    TRANSACTION_SYNC_STALE_SECONDS: int = int(
+        os.getenv("TRANSACTION_SYNC_STALE_SECONDS", "300")
+    )
+    # Days between a pending transaction and its settled version
+    TRANSACTION_RECONCILE_WINDOW_DAYS: int = int(
+        os.getenv("TRANSACTION_RECONCILE_WINDOW_DAYS", "5")
+    )
+    # Relative difference allowed between a pending and a settled amount
+    TRANSACTION_RECONCILE_AMOUNT_TOLERANCE: float = float(
+        os.getenv("TRANSACTION_RECONCILE_AMOUNT_TOLERANCE", "0.2")
+    )
+
+    # Background bank sync scheduler settings. Each process that enables it
+    # syncs every connection, so turn it on in one process only, not in every
+    # uvicorn worker
+    BANK_SYNC_ENABLED: bool = os.getenv("BANK_SYNC_ENABLED", "false").lower() in [
+        "true",
+        "1",
+        "yes",
+    ]
+    BANK_SYNC_INTERVAL_SECONDS: int = int(
+        os.getenv("BANK_SYNC_INTERVAL_SECONDS", "1800")
+    )
+    BANK_SYNC_TICK_SECONDS: int = int(os.getenv("BANK_SYNC_TICK_SECONDS", "15"))
+    BANK_SYNC_MAX_CONCURRENCY: int = int(os.getenv("BANK_SYNC_MAX_CONCURRENCY", "4"))
+    BANK_SYNC_PER_USER_CONCURRENCY: int = int(
+        os.getenv("BANK_SYNC_PER_USER_CONCURRENCY", "1")
+    )
+    # Fraction of the interval used to randomize each connection's next run
+    BANK_SYNC_JITTER: float = float(os.getenv("BANK_SYNC_JITTER", "0.2"))
+    BANK_SYNC_BACKOFF_BASE_SECONDS: int = int(
+        os.getenv("BANK_SYNC_BACKOFF_BASE_SECONDS", "60")
+    )
+    BANK_SYNC_BACKOFF_MAX_SECONDS: int = int(
+        os.getenv("BANK_SYNC_BACKOFF_MAX_SECONDS", "3600")
+    )
+
+    # Bank webhook ingestion settings
+    BANK_WEBHOOKS_ENABLED: bool = os.getenv(
+        "BANK_WEBHOOKS_ENABLED", "false"
+    ).lower() in ["true", "1", "yes"]
+    # Shared HMAC secrets used to verify each provider's notifications
+    TRUELAYER_WEBHOOK_SECRET: str = os.getenv("TRUELAYER_WEBHOOK_SECRET", "")
+    TINK_WEBHOOK_SECRET: str = os.getenv("TINK_WEBHOOK_SECRET", "")
+    # Maximum age of a signed notification, to reject replays
+    BANK_WEBHOOK_TOLERANCE_SECONDS: int = int(
+        os.getenv("BANK_WEBHOOK_TOLERANCE_SECONDS", "300")
+    )
+    BANK_WEBHOOK_INGEST_CONCURRENCY: int = int(
+        os.getenv("BANK_WEBHOOK_INGEST_CONCURRENCY", "4")
+    )
+    BANK_WEBHOOK_QUEUE_SIZE: int = int(os.getenv("BANK_WEBHOOK_QUEUE_SIZE", "1000"))
+    # Number of recent event ids remembered to drop redelivered notifications
+    BANK_WEBHOOK_EVENT_CACHE_SIZE: int = int(
+        os.getenv("BANK_WEBHOOK_EVENT_CACHE_SIZE", "10000")
+    )
+    # With webhooks enabled, polling is only a safety net for missed events
+    BANK_SYNC_WEBHOOK_INTERVAL_SECONDS: int = int(
+        os.getenv("BANK_SYNC_WEBHOOK_INTERVAL_SECONDS", "21600")
+    )
 
     # Tink API settings
     TINK_CLIENT_ID: str = os.getenv("TINK_CLIENT_ID", "")
@@ -26,10 +164,145 @@ class Settings(BaseSettings):
     TINK_REDIRECT_URI: str = os.getenv(
         "TINK_REDIRECT_URI", "http://localhost:8000/api/v1/banking/tink-callback"
     )
+    # Tink Link (auth) and API base URLs, override to point at a stand-in
+    TINK_LINK_URL: str = os.getenv("TINK_LINK_URL", "https://link.tink.com")
+    TINK_API_URL: str = os.getenv("TINK_API_URL", "https://api.tink.com")
+    TINK_MARKET: str = os.getenv("TINK_MARKET", "GB")
+    TINK_LOCALE: str = os.getenv("TINK_LOCALE", "en_US")
+    # Tink has its own connection pool and rate limit, so a slow or throttled
+    # Tink never holds up TrueLayer requests and vice versa
+    TINK_MAX_CONNECTIONS: int = int(os.getenv("TINK_MAX_CONNECTIONS", "20"))
+    TINK_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("TINK_MAX_KEEPALIVE_CONNECTIONS", "10")
+    )
+    TINK_READ_TIMEOUT: float = float(os.getenv("TINK_READ_TIMEOUT", "30"))
+    TINK_MAX_RETRIES: int = int(os.getenv("TINK_MAX_RETRIES", "3"))
+    TINK_FANOUT_CONCURRENCY: int = int(os.getenv("TINK_FANOUT_CONCURRENCY", "8"))
+    TINK_RATE_LIMIT_PER_SECOND: float = float(
+        os.getenv("TINK_RATE_LIMIT_PER_SECOND", "10")
+    )
+    TINK_RATE_LIMIT_BURST: int = int(os.getenv("TINK_RATE_LIMIT_BURST", "20"))
 
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
+    # DeepSeek settings (OpenAI-compatible API)
+    DEEPSEEK_API_KEY: str = os.getenv("DEEPSEEK_API_KEY", "")
+    DEEPSEEK_BASE_URL: str = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+    # LLM client settings
+    # Longest wait for a whole completion, in seconds
+    LLM_REQUEST_TIMEOUT_SECONDS: float = float(
+        os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60")
+    )
+    LLM_CONNECT_TIMEOUT_SECONDS: float = float(
+        os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")
+    )
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    # Backoff between retries, and the circuit breaker of each LLM provider
+    LLM_BACKOFF_BASE_SECONDS: float = float(
+        os.getenv("LLM_BACKOFF_BASE_SECONDS", "1")
+    )
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+    LLM_RETRY_AFTER_MAX_SECONDS: float = float(
+        os.getenv("LLM_RETRY_AFTER_MAX_SECONDS", "30")
+    )
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(
+        os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")
+    )
+    LLM_BREAKER_RESET_SECONDS: float = float(
+        os.getenv("LLM_BREAKER_RESET_SECONDS", "30")
+    )
+    # Completions in flight per model
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    # Prompt and completion tokens sent per model per minute, 0 for no budget
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    # Per-model overrides as JSON, e.g.
+    # {"gpt-4o": {"max_concurrency": 8, "tokens_per_minute": 30000}}
+    LLM_MODEL_LIMITS: str = os.getenv("LLM_MODEL_LIMITS", "")
+    # How often a pending completion checks whether its caller has gone
+    LLM_DISCONNECT_POLL_SECONDS: float = float(
+        os.getenv("LLM_DISCONNECT_POLL_SECONDS", "0.5")
+    )
+
+    # LLM response cache settings
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in [
+        "true",
+        "1",
+        "yes",
+    ]
+    # How long analysis responses are reused
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    # How long coach chat replies are reused, as they are sampled more freely
+    LLM_CACHE_CHAT_TTL_SECONDS: int = int(
+        os.getenv("LLM_CACHE_CHAT_TTL_SECONDS", "3600")
+    )
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    # Persistent tier surviving restarts, empty to disable it. It is only used
+    # if owned by the app's user and not writable by others, and holds replies
+    # about users' statements, so ./cache/ is listed in .gitignore
+    LLM_CACHE_DIR: str = os.getenv("LLM_CACHE_DIR", "./cache/llm")
+    LLM_CACHE_DISK_BYTES: int = int(
+        os.getenv("LLM_CACHE_DISK_BYTES", str(256 * 1024 * 1024))
+    )
+
+    # Statement upload settings
+    # Largest PDF accepted for analysis, in bytes
+    STATEMENT_UPLOAD_MAX_BYTES: int = int(
+        os.getenv("STATEMENT_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024))
+    )
+    # Most PDFs accepted in one analysis request
+    STATEMENT_UPLOAD_MAX_FILES: int = int(
+        os.getenv("STATEMENT_UPLOAD_MAX_FILES", "12")
+    )
+    # Worker processes extracting PDF text, 0 for one per CPU
+    PDF_EXTRACTION_WORKERS: int = int(os.getenv("PDF_EXTRACTION_WORKERS", "0"))
+    # Pages extracted per worker task
+    PDF_EXTRACTION_PAGES_PER_TASK: int = int(
+        os.getenv("PDF_EXTRACTION_PAGES_PER_TASK", "4")
+    )
+    # Most pages read from a single PDF
+    PDF_MAX_PAGES: int = int(os.getenv("PDF_MAX_PAGES", "200"))
+    # Cache of extracted statement text keyed by the SHA-256 of the PDF
+    PDF_TEXT_CACHE_MEMORY_BYTES: int = int(
+        os.getenv("PDF_TEXT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024))
+    )
+    # Disk tier shared by the app's worker processes, empty to disable it. It
+    # is only used if owned by the app's user and not writable by others, and
+    # holds users' statements, so ./cache/ is listed in .gitignore
+    PDF_TEXT_CACHE_DIR: str = os.getenv("PDF_TEXT_CACHE_DIR", "./cache/statements")
+    PDF_TEXT_CACHE_DISK_BYTES: int = int(
+        os.getenv("PDF_TEXT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))
+    )
+    # Statement text sent in one analysis request; longer statements are
+    # split into chunks of at most this many tokens, analyzed concurrently
+    STATEMENT_CHUNK_TOKENS: int = int(os.getenv("STATEMENT_CHUNK_TOKENS", "8000"))
+
+    # Statement analysis jobs: background workers running them, and jobs
+    # that may wait for a worker before submissions are refused
+    ANALYSIS_JOB_CONCURRENCY: int = int(os.getenv("ANALYSIS_JOB_CONCURRENCY", "4"))
+    ANALYSIS_JOB_QUEUE_SIZE: int = int(os.getenv("ANALYSIS_JOB_QUEUE_SIZE", "100"))
+    # Longest a job may run before it is failed
+    ANALYSIS_JOB_TIMEOUT_SECONDS: float = float(
+        os.getenv("ANALYSIS_JOB_TIMEOUT_SECONDS", "300")
+    )
+    # How long a completed job is reused for identical submissions
+    ANALYSIS_JOB_REUSE_SECONDS: int = int(
+        os.getenv("ANALYSIS_JOB_REUSE_SECONDS", "86400")
+    )
+    # How often job event streams check on jobs run by other worker processes
+    ANALYSIS_JOB_POLL_SECONDS: float = float(
+        os.getenv("ANALYSIS_JOB_POLL_SECONDS", "1")
+    )
+    # How often a process marks its queued and running jobs as alive, and how
+    # long without that before they count as left by a process that stopped
+    ANALYSIS_JOB_HEARTBEAT_SECONDS: float = float(
+        os.getenv("ANALYSIS_JOB_HEARTBEAT_SECONDS", "10")
+    )
+    ANALYSIS_JOB_STALE_SECONDS: float = float(
+        os.getenv("ANALYSIS_JOB_STALE_SECONDS", "60")
+    )
+
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
@@ -0,0 +1,51 @@
+from app.db.database import Base, engine
+from sqlalchemy import inspect, text
+
+# Import all models so they are registered on Base.metadata
+from app.models import (  # noqa: F401
+    account_sync_state,
+    analysis_job,
+    bank_connection,
+    recurring_series,
+    transaction,
+    user,
+)
+
+# Indexes that wider composite indexes have replaced, dropped where present
+SUPERSEDED_INDEXES = {
+    "transactions": {
+        # Both are prefixes of the (..., transaction_date, transaction_id) ones
+        "ix_transactions_account_date",
+        "ix_transactions_account_merchant",
+    },
+}
+
+
+def init_db(bind=engine) -> None:
+    """Create missing tables, nullable columns and indexes; drop superseded ones"""
+    Base.metadata.create_all(bind=bind)
+    # create_all skips tables that already exist, so add nullable columns
+    # defined since; anything else needs a manual migration
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+    # Likewise for indexes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    with bind.begin() as connection:
+        for table_name, names in SUPERSEDED_INDEXES.items():
+            present = {index["name"] for index in inspect(bind).get_indexes(table_name)}
+            for name in sorted(names & present):
+                connection.execute(text(f"DROP INDEX {name}"))
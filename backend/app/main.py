@@ -1,8 +1,51 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api_v1.router import api_router
+from app.core.config import settings
+from app.db.init_db import init_db
+from app.services.analysis_jobs import analysis_job_queue
+from app.services.bank_aggregator import bank_aggregator
+from app.services.bank_webhooks import bank_webhook_service
+from app.services.llm_gateway import llm_gateway
+from app.services.pdf_extraction import pdf_extraction_engine
+from app.services.sync_scheduler import bank_sync_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Make sure the database tables exist
+    init_db()
+    # Open shared outbound connection pools on startup
+    await bank_aggregator.startup()
+    # Start the PDF text extraction worker processes
+    await pdf_extraction_engine.startup()
+    # Open the LLM providers' clients
+    await llm_gateway.startup()
+    # Run queued statement analyses in the background
+    await analysis_job_queue.start()
+    # Pre-sync bank data in the background
+    if settings.BANK_SYNC_ENABLED:
+        await bank_sync_scheduler.start()
+    # Ingest provider notifications in the background
+    if settings.BANK_WEBHOOKS_ENABLED:
+        await bank_webhook_service.start()
+    yield
+    # Stop background work and close pools cleanly on shutdown
+    await analysis_job_queue.stop()
+    await bank_webhook_service.stop()
+    await bank_sync_scheduler.stop()
+    await bank_aggregator.aclose()
+    await pdf_extraction_engine.aclose()
+    await llm_gateway.aclose()
 
-app = FastAPI(title="SavQuest API", description="Backend for SavQuest financial literacy platform")
+
+app = FastAPI(
+    title="SavQuest API",
+    description="Backend for SavQuest financial literacy platform",
+    lifespan=lifespan,
+)
 
 # Configure CORS for frontend
 app.add_middleware(
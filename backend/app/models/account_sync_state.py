@@ -0,0 +1,33 @@
+from app.db.database import Base
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+
+
+class AccountSyncState(Base):
+    """Tracks how far each bank account's transactions have been synced"""
+
+    __tablename__ = "account_sync_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bank_connection_id = Column(Integer, ForeignKey("bank_connections.id"))
+    account_id = Column(String, index=True)
+    # Timestamp of the newest transaction stored (the high-water mark)
+    last_transaction_at = Column(DateTime, nullable=True)
+    # Earliest date covered by the stored history
+    synced_from = Column(DateTime, nullable=True)
+    last_synced_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint(
+            "bank_connection_id", "account_id", name="uq_account_sync_states_account"
+        ),
+    )
@@ -0,0 +1,34 @@
+from app.db.database import Base
+from sqlalchemy import JSON, Column, DateTime, Index, String, Text
+from sqlalchemy.sql import func
+
+
+class AnalysisJob(Base):
+    """A statement analysis run in the background, and its result"""
+
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)
+    # "analyze" or "predict-monthly"
+    kind = Column(String)
+    model = Column(String)
+    # SHA-256 of the kind, model and uploaded files; identical submissions
+    # share a job
+    content_hash = Column(String)
+    filenames = Column(JSON)
+    # queued, running, completed or failed
+    status = Column(String, default="queued")
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Process whose queue holds the job, as "<pid>:<boot id>", and when it
+    # last said it was still alive; jobs of a process that stopped are failed
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_jobs_hash_created", "content_hash", "created_at"),
+        Index("ix_analysis_jobs_status", "status"),
+    )
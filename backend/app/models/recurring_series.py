@@ -0,0 +1,32 @@
+from app.db.database import Base
+from sqlalchemy import JSON, Column, DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+
+class RecurringSeries(Base):
+    """A recurring payment detected in an account's stored transactions"""
+
+    __tablename__ = "recurring_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    account_id = Column(String)
+    # Normalized merchant key shared by all payments in the series
+    merchant = Column(String)
+    description = Column(String)
+    # Amount of the most recent payment
+    amount = Column(Float)
+    frequency = Column(String, default="unknown")
+    interval_days = Column(Float)
+    confidence = Column(Float)
+    occurrences = Column(JSON)
+    price_changes = Column(JSON)
+    last_charge_at = Column(DateTime)
+    next_expected_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_recurring_series_account_merchant", "account_id", "merchant"),
+        Index("ix_recurring_series_user_next", "user_id", "next_expected_at"),
+    )
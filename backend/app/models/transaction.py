@@ -0,0 +1,79 @@
+from app.db.database import Base
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+
+class Transaction(Base):
+    __tablename__ = "transactions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    bank_connection_id = Column(Integer, ForeignKey("bank_connections.id"))
+    provider = Column(String, default="truelayer")
+    account_id = Column(String)
+    # Transaction id assigned by the provider
+    transaction_id = Column(String)
+    amount = Column(Float)
+    currency = Column(String)
+    category = Column(String, nullable=True)
+    transaction_type = Column(String, nullable=True)
+    merchant_name = Column(String, nullable=True)
+    # Normalized merchant used to group recurring payments
+    merchant_key = Column(String, nullable=True)
+    description = Column(String)
+    transaction_date = Column(DateTime)
+    is_expense = Column(Boolean, default=False)
+    is_subscription = Column(Boolean, default=False)
+    # "pending" until the provider reports the transaction as settled
+    status = Column(String, nullable=True, default="booked")
+    # Provider id of the transaction that replaced this one, set on pending
+    # transactions that have settled and on repeats of another transaction
+    duplicate_of = Column(String, nullable=True)
+    running_balance = Column(JSON, nullable=True)
+    meta = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint(
+            "account_id", "transaction_id", name="uq_transactions_account_transaction"
+        ),
+        # Keyset pagination seeks on (transaction_date, transaction_id) within
+        # an account, optionally narrowed to one category or merchant first
+        Index(
+            "ix_transactions_account_date_id",
+            "account_id",
+            "transaction_date",
+            "transaction_id",
+        ),
+        Index(
+            "ix_transactions_account_category_date_id",
+            "account_id",
+            "category",
+            "transaction_date",
+            "transaction_id",
+        ),
+        Index(
+            "ix_transactions_account_merchant_date_id",
+            "account_id",
+            "merchant_key",
+            "transaction_date",
+            "transaction_id",
+        ),
+        Index("ix_transactions_user_date", "user_id", "transaction_date"),
+    )
+
+    # Relationship with User model
+    user = relationship("User", back_populates="transactions")
@@ -12,6 +12,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # May see process-wide operational stats
+    is_superuser = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Financial traits levels
@@ -26,3 +28,4 @@ class User(Base):
 
     # Relationships
     bank_connections = relationship("BankConnection", back_populates="user")
+    transactions = relationship("Transaction", back_populates="user")
@@ -13,6 +13,8 @@ class BankAccountResponse(BaseModel):
     currency: str
     account_number: Optional[Dict[str, Any]] = None
     provider: Optional[Dict[str, Any]] = None
+    # Aggregator the account was fetched through, e.g. truelayer or tink
+    aggregator: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -31,6 +33,11 @@ class TransactionResponse(BaseModel):
     merchant_name: Optional[str] = None
     running_balance: Optional[Dict[str, Any]] = None
     meta: Optional[Dict[str, Any]] = None
+    # "pending" or "booked", where the provider reports it
+    status: Optional[str] = None
+    # Set on transactions merged across accounts and providers
+    account_id: Optional[str] = None
+    aggregator: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -43,6 +50,24 @@ class SubscriptionResponse(BaseModel):
     amount: float
     frequency: str
     occurrences: List[str]
+    merchant: Optional[str] = None
+    interval_days: Optional[float] = None
+    confidence: Optional[float] = None
+    price_changes: List[Dict[str, Any]] = []
+    next_expected_date: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AccountOverviewResponse(BaseModel):
+    """Schema for one account's data in the multi-account overview"""
+
+    account: BankAccountResponse
+    transactions: List[TransactionResponse] = []
+    standing_orders: List[Dict[str, Any]] = []
+    direct_debits: List[Dict[str, Any]] = []
+    errors: Dict[str, str] = {}
 
     class Config:
         from_attributes = True
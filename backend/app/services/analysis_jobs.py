@@ -0,0 +1,443 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.analysis_job import AnalysisJob
+from app.services.pdf_analysis import (
+    analyze_monthly_prediction,
+    process_pdf_statements,
+)
+from app.services.progress import ProgressCallback
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Kinds of job
+ANALYZE = "analyze"
+PREDICT_MONTHLY = "predict-monthly"
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED = (COMPLETED, FAILED)
+
+# An uploaded file, as (filename, contents)
+Upload = Tuple[str, bytes]
+
+Runner = Callable[
+    [str, List[Upload], str, bool, ProgressCallback], Awaitable[Dict[str, Any]]
+]
+
+
+def submission_hash(kind: str, model: str, files: List[Upload]) -> str:
+    """
+    SHA-256 fingerprint of a submission
+
+    Only the files' contents count, so the same statements uploaded under
+    other names match.
+    """
+    digest = hashlib.sha256(f"{kind}\n{model}\n".encode())
+    for _, content in files:
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+async def run_analysis(
+    kind: str,
+    files: List[Upload],
+    model: str,
+    use_cache: bool,
+    progress: ProgressCallback,
+) -> Dict[str, Any]:
+    """Run the analysis a job was submitted for"""
+    # Shaped like the UploadFiles the analysis normally gets
+    uploads = [
+        SimpleNamespace(filename=filename, file=BytesIO(content))
+        for filename, content in files
+    ]
+    if kind == PREDICT_MONTHLY:
+        return await analyze_monthly_prediction(
+            uploads[0], model=model, use_cache=use_cache, progress=progress
+        )
+    return await process_pdf_statements(
+        uploads, model=model, use_cache=use_cache, progress=progress
+    )
+
+
+def describe_job(job: AnalysisJob) -> Dict[str, Any]:
+    """Status of a job, without its result"""
+    return {
+        "jobId": job.id,
+        "kind": job.kind,
+        "model": job.model,
+        "status": job.status,
+        "filenames": job.filenames,
+        "error": job.error,
+        "createdAt": job.created_at,
+        "startedAt": job.started_at,
+        "finishedAt": job.finished_at,
+    }
+
+
+class AnalysisJobQueue:
+    """
+    Runs statement analyses in the background, off the request path.
+
+    A submission is stored as a job in the database and queued; a fixed
+    pool of workers drains the bounded queue, so analyses run at a capped
+    concurrency however many are submitted, and clients poll the job or
+    follow its events instead of holding a request open. Submissions with
+    the same files, kind and model collapse into the job already queued or
+    running, or reuse one completed within ANALYSIS_JOB_REUSE_SECONDS.
+
+    Uploads are only kept in memory until their job runs, so a job can only
+    finish in the process that queued it. Each job records that process as
+    its owner, which keeps the heartbeat of its unfinished jobs up to date
+    while it runs; jobs whose heartbeat stopped, because their process was
+    restarted or went away, are failed by whichever process notices first.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        runner: Runner = run_analysis,
+        concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.runner = runner
+        self.concurrency = concurrency or settings.ANALYSIS_JOB_CONCURRENCY
+        self._queue: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or settings.ANALYSIS_JOB_QUEUE_SIZE
+        )
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        # Tells this queue's jobs from those of other worker processes, and
+        # of an earlier run of a process that reuses the same pid
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        # Progress callbacks of the clients following each job
+        self._listeners: Dict[str, List[ProgressCallback]] = {}
+        # Set, and replaced, whenever a job's status changes
+        self._changes: Dict[str, asyncio.Event] = {}
+        self._stats = {
+            "jobs_submitted": 0,
+            "jobs_deduplicated": 0,
+            "jobs_completed": 0,
+            "jobs_failed": 0,
+            "jobs_timed_out": 0,
+        }
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Fail jobs a stopped process left and start the workers"""
+        if self._tasks:
+            return
+        self._beat()
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        logger.info(f"Analysis job queue started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        """Stop the workers and the heartbeat, and cancel running analyses"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self) -> None:
+        """Wait until every queued job has finished"""
+        await self._queue.join()
+
+    def submit(
+        self,
+        db: Session,
+        kind: str,
+        files: List[Upload],
+        model: str,
+        use_cache: bool = True,
+    ) -> Tuple[AnalysisJob, bool]:
+        """
+        Queue an analysis, or find the job an identical submission made
+
+        Args:
+            db: Database session
+            kind: ANALYZE or PREDICT_MONTHLY
+            files: Uploaded PDFs
+            model: LLM model to analyze with
+            use_cache: False to not reuse a completed job; a queued or
+                running one is still joined
+
+        Returns:
+            The job, and whether it was an existing one
+
+        Raises:
+            asyncio.QueueFull: If the queue is full; no job is stored
+        """
+        content_hash = submission_hash(kind, model, files)
+        reusable = AnalysisJob.status.in_([QUEUED, RUNNING])
+        if use_cache:
+            cutoff = datetime.utcnow() - timedelta(
+                seconds=settings.ANALYSIS_JOB_REUSE_SECONDS
+            )
+            reusable = or_(
+                reusable,
+                and_(
+                    AnalysisJob.status == COMPLETED,
+                    AnalysisJob.finished_at >= cutoff,
+                ),
+            )
+        existing = (
+            db.query(AnalysisJob)
+            .filter(AnalysisJob.content_hash == content_hash, reusable)
+            .order_by(AnalysisJob.created_at.desc())
+            .first()
+        )
+        if existing is not None:
+            self._stats["jobs_deduplicated"] += 1
+            return existing, True
+
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            model=model,
+            content_hash=content_hash,
+            filenames=[filename for filename, _ in files],
+            status=QUEUED,
+            owner=self.owner,
+            heartbeat_at=datetime.utcnow(),
+        )
+        # Nothing is awaited until the job is stored, so no worker can take
+        # it from the queue before it exists
+        self._queue.put_nowait((job.id, kind, files, model, use_cache))
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._stats["jobs_submitted"] += 1
+        return job, False
+
+    def get(self, db: Session, job_id: str) -> Optional[AnalysisJob]:
+        """Get a job by id"""
+        return db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+
+    async def follow(
+        self, job_id: str, progress: ProgressCallback
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Report a job's progress until it finishes
+
+        A "status" event is reported with the job's description whenever its
+        status changes. While it runs in this process, the analysis' own
+        steps and fields are passed on as well; jobs run by another worker
+        process are checked every ANALYSIS_JOB_POLL_SECONDS.
+
+        Args:
+            job_id: Job to follow
+            progress: Called with the events
+
+        Returns:
+            The finished job's description and result, or None if there is
+            no such job
+        """
+        listeners = self._listeners.setdefault(job_id, [])
+        listeners.append(progress)
+        status = None
+        try:
+            while True:
+                # Taken before reading, so a change right after isn't missed
+                changed = self._changes.setdefault(job_id, asyncio.Event())
+                db = self.session_factory()
+                try:
+                    job = self.get(db, job_id)
+                    if job is None:
+                        return None
+                    description = describe_job(job)
+                    result = job.result
+                finally:
+                    db.close()
+
+                if description["status"] != status:
+                    status = description["status"]
+                    progress("status", description)
+                if status in FINISHED:
+                    return {**description, "result": result}
+                try:
+                    await asyncio.wait_for(
+                        changed.wait(), timeout=settings.ANALYSIS_JOB_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listeners.remove(progress)
+            if not listeners:
+                del self._listeners[job_id]
+                self._changes.pop(job_id, None)
+
+    def _beat(self) -> int:
+        """
+        Keep this process' jobs alive and fail those whose owner stopped
+
+        Returns:
+            Number of jobs failed
+        """
+        now = datetime.utcnow()
+        unfinished = AnalysisJob.status.in_([QUEUED, RUNNING])
+        db = self.session_factory()
+        try:
+            db.query(AnalysisJob).filter(
+                unfinished, AnalysisJob.owner == self.owner
+            ).update({"heartbeat_at": now}, synchronize_session=False)
+            stale = now - timedelta(seconds=settings.ANALYSIS_JOB_STALE_SECONDS)
+            abandoned = (
+                db.query(AnalysisJob)
+                .filter(
+                    unfinished,
+                    or_(AnalysisJob.owner.is_(None), AnalysisJob.owner != self.owner),
+                    or_(
+                        AnalysisJob.heartbeat_at.is_(None),
+                        AnalysisJob.heartbeat_at < stale,
+                    ),
+                )
+                .update(
+                    {
+                        "status": FAILED,
+                        "error": "Interrupted by a server restart, please "
+                        "submit the statements again",
+                        "finished_at": now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+        if abandoned:
+            logger.warning(
+                f"Failed {abandoned} analysis jobs left by a stopped process"
+            )
+        return abandoned
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ANALYSIS_JOB_HEARTBEAT_SECONDS)
+            try:
+                self._beat()
+            except Exception as e:
+                logger.error(f"Analysis job heartbeat failed: {e}")
+
+    def _notify(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        for listener in self._listeners.get(job_id, []):
+            listener(event, data)
+
+    def _update(self, job_id: str, **values: Any) -> None:
+        """Store a job's new state and wake up its followers"""
+        db = self.session_factory()
+        try:
+            db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        changed = self._changes.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def _run(
+        self, job_id: str, kind: str, files: List[Upload], model: str, use_cache: bool
+    ) -> None:
+        self._update(job_id, status=RUNNING, started_at=datetime.utcnow())
+        try:
+            result = await asyncio.wait_for(
+                self.runner(
+                    kind,
+                    files,
+                    model,
+                    use_cache,
+                    lambda event, data: self._notify(job_id, event, data),
+                ),
+                timeout=settings.ANALYSIS_JOB_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Analysis job {job_id} timed out")
+            self._stats["jobs_timed_out"] += 1
+            self._stats["jobs_failed"] += 1
+            self._update(
+                job_id,
+                status=FAILED,
+                error="The analysis took longer than "
+                f"{settings.ANALYSIS_JOB_TIMEOUT_SECONDS:g} seconds",
+                finished_at=datetime.utcnow(),
+            )
+            return
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}")
+            self._stats["jobs_failed"] += 1
+            self._update(
+                job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow()
+            )
+            return
+
+        self._stats["jobs_completed"] += 1
+        self._update(
+            job_id, status=COMPLETED, result=result, finished_at=datetime.utcnow()
+        )
+
+    def _fail_unrecorded(self, job_id: str) -> None:
+        """Fail a job whose outcome couldn't be stored, so it isn't left running"""
+        try:
+            self._update(
+                job_id,
+                status=FAILED,
+                error="The analysis result could not be stored",
+                finished_at=datetime.utcnow(),
+            )
+        except Exception as e:
+            logger.error(f"Could not fail analysis job {job_id}: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, kind, files, model, use_cache = await self._queue.get()
+            self._running += 1
+            try:
+                await self._run(job_id, kind, files, model, use_cache)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Could not record analysis job {job_id}: {e}")
+                self._fail_unrecorded(job_id)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get job queue status and metrics
+
+        Returns:
+            Dictionary with queue depth, running jobs and counters
+        """
+        return {
+            "running": self.is_running,
+            "workers": self.concurrency,
+            "queue_depth": self._queue.qsize(),
+            "in_progress": self._running,
+            **self._stats,
+        }
+
+
+analysis_job_queue = AnalysisJobQueue()
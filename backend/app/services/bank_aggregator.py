@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.models.bank_connection import BankConnection
+from app.services.bank_provider import BankDataProvider, BankProviderError
+from app.services.reconciliation import transaction_reconciler
+from app.services.recurring import normalize_merchant
+from app.services.tink import tink_service
+from app.services.truelayer import truelayer_service
+
+logger = logging.getLogger(__name__)
+
+# Providers by BankConnection.provider
+PROVIDERS: Dict[str, BankDataProvider] = {
+    truelayer_service.name: truelayer_service,
+    tink_service.name: tink_service,
+}
+
+
+def get_bank_provider(name: Optional[str]) -> BankDataProvider:
+    """
+    Get the provider service for a BankConnection.provider value
+
+    Raises:
+        BankProviderError: If the provider is not supported
+    """
+    provider = PROVIDERS.get(name or truelayer_service.name)
+    if provider is None:
+        raise BankProviderError(f"Unsupported bank provider: {name}")
+    return provider
+
+
+def account_identifier(account: Dict[str, Any], provider: str) -> str:
+    """
+    Normalized identifier of the bank account behind a provider's account
+
+    Provider account ids differ, so the account is identified by its IBAN,
+    or by its sort code and account number; a UK IBAN is reduced to the
+    sort code and account number it contains so either form matches.
+    Accounts with neither, such as cards, can't be recognized across
+    providers, so they get the provider's own account id, scoped to the
+    provider.
+    """
+    own = f"{provider}:{account.get('account_id')}"
+    number = account.get("account_number")
+    if not isinstance(number, dict):
+        return own
+    # TrueLayer gives {"iban", "sort_code", "number"}; Tink {"iban": {"iban"}}
+    # or {"code", "accountNumber"}
+    iban = number.get("iban")
+    if isinstance(iban, dict):
+        iban = iban.get("iban")
+    if iban:
+        iban = re.sub(r"[\s-]", "", iban).upper()
+        return iban[-14:] if iban.startswith("GB") and len(iban) == 22 else iban
+    sort_code = number.get("sort_code") or number.get("code")
+    account_number = number.get("number") or number.get("accountNumber")
+    if sort_code and account_number:
+        return re.sub(r"[\s-]", "", f"{sort_code}{account_number}")
+    return own
+
+
+def transaction_fingerprint(transaction: Dict[str, Any], account: str = "") -> str:
+    """
+    Content hash identifying the same bank transaction across providers
+
+    Providers assign their own transaction ids and format descriptions
+    differently, so the hash covers the account identifier (see
+    account_identifier), booking day, amount, currency and normalized
+    merchant instead.
+    """
+    content = "|".join(
+        [
+            account,
+            str(transaction.get("timestamp") or "")[:10],
+            f"{float(transaction.get('amount') or 0.0):.2f}",
+            (transaction.get("currency") or "").upper(),
+            normalize_merchant(transaction.get("description") or ""),
+        ]
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def dedupe_across_providers(
+    transactions: Sequence[Tuple[str, str, Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """
+    Drop transactions that another provider already returned
+
+    The same bank account can be connected through more than one aggregator.
+    Identical transactions within one provider (two coffees on the same day)
+    are genuine, so for each fingerprint the merged result keeps as many
+    copies as the provider that returned the most of them, preferring the
+    provider that comes first.
+
+    Args:
+        transactions: (provider name, account identifier, transaction)
+            triples in provider order
+
+    Returns:
+        Transactions with cross-provider duplicates removed, in input order
+    """
+    kept: Counter = Counter()
+    seen: Dict[str, Counter] = {}
+    merged = []
+    for provider, account, transaction in transactions:
+        fingerprint = transaction_fingerprint(transaction, account)
+        provider_seen = seen.setdefault(provider, Counter())
+        provider_seen[fingerprint] += 1
+        if provider_seen[fingerprint] > kept[fingerprint]:
+            kept[fingerprint] += 1
+            merged.append(transaction)
+    return merged
+
+
+class BankAggregator:
+    """
+    Fetches and merges bank data across all of a user's connections.
+
+    Connections are queried concurrently. Each provider has its own pool and
+    rate limiter, so the slowest aggregator bounds the total time instead of
+    the sum of them, and a failing connection only removes its own data.
+    """
+
+    def __init__(self, providers: Optional[Dict[str, BankDataProvider]] = None):
+        self.providers = PROVIDERS if providers is None else providers
+
+    def provider_for(self, bank_connection: BankConnection) -> BankDataProvider:
+        """Get the provider service a connection was made through"""
+        name = bank_connection.provider or truelayer_service.name
+        if name not in self.providers:
+            raise BankProviderError(f"Unsupported bank provider: {name}")
+        return self.providers[name]
+
+    async def startup(self) -> None:
+        """Open every provider's connection pool"""
+        for provider in self.providers.values():
+            await provider.startup()
+
+    async def aclose(self) -> None:
+        """Close every provider's connection pool"""
+        for provider in self.providers.values():
+            await provider.aclose()
+
+    async def _gather(self, connections: Sequence[BankConnection], call) -> List[Any]:
+        """
+        Run call(provider, connection) for every connection concurrently
+
+        Failed connections are logged and skipped. If every connection fails,
+        the first error is raised.
+        """
+        results = await asyncio.gather(
+            *(
+                call(self.provider_for(connection), connection)
+                for connection in connections
+            ),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    f"Failed to fetch data for bank connection {connection.id} "
+                    f"({connection.provider}): {result}"
+                )
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        return [r for r in results if not isinstance(r, Exception)]
+
+    async def get_accounts(
+        self, connections: Sequence[BankConnection]
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the accounts of every connection, tagged with their aggregator
+
+        Args:
+            connections: Active connections with valid access tokens
+
+        Returns:
+            Accounts of all connections, in connection order
+        """
+
+        async def fetch(provider: BankDataProvider, connection: BankConnection):
+            accounts = await provider.get_accounts(connection.access_token)
+            return [{**account, "aggregator": provider.name} for account in accounts]
+
+        results = await self._gather(connections, fetch)
+        return [account for accounts in results for account in accounts]
+
+    async def get_transactions(
+        self,
+        connections: Sequence[BankConnection],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the transactions of every account of every connection, merged
+
+        Args:
+            connections: Active connections with valid access tokens
+            from_date: Optional start date in YYYY-MM-DD format
+            to_date: Optional end date in YYYY-MM-DD format
+
+        Returns:
+            Transactions newest first, tagged with account_id and aggregator,
+            with cross-provider duplicates and settled pending transactions
+            removed
+        """
+
+        async def fetch(provider: BankDataProvider, connection: BankConnection):
+            accounts = await provider.get_accounts(connection.access_token)
+            semaphore = asyncio.Semaphore(provider.limits.fanout_concurrency)
+
+            async def account_transactions(account: Dict[str, Any]):
+                account_id = account["account_id"]
+                async with semaphore:
+                    transactions = await provider.get_transactions(
+                        connection.access_token, account_id, from_date, to_date
+                    )
+                return [
+                    (
+                        provider.name,
+                        account_identifier(account, provider.name),
+                        {
+                            **t,
+                            "account_id": account_id,
+                            "aggregator": provider.name,
+                        },
+                    )
+                    for t in transactions
+                ]
+
+            results = await asyncio.gather(
+                *(account_transactions(account) for account in accounts)
+            )
+            return [row for rows in results for row in rows]
+
+        results = await self._gather(connections, fetch)
+        merged = dedupe_across_providers([row for rows in results for row in rows])
+        merged = transaction_reconciler.reconcile_transactions(merged)
+        return sorted(merged, key=lambda t: t.get("timestamp") or "", reverse=True)
+
+    async def get_overview(
+        self,
+        connections: Sequence[BankConnection],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the accounts overview of every connection, merged
+
+        Accounts are tagged with their aggregator. Transactions that an
+        earlier connection's provider already returned, and pending
+        transactions that have settled, are removed.
+
+        Args:
+            connections: Active connections with valid access tokens
+            from_date: Optional start date in YYYY-MM-DD format
+            to_date: Optional end date in YYYY-MM-DD format
+
+        Returns:
+            Per-account overview entries of all connections
+        """
+
+        async def fetch(provider: BankDataProvider, connection: BankConnection):
+            overview = await provider.get_accounts_overview(
+                connection.access_token, from_date, to_date
+            )
+            for entry in overview:
+                entry["account"] = {**entry["account"], "aggregator": provider.name}
+            return overview
+
+        results = await self._gather(connections, fetch)
+        entries = [entry for overview in results for entry in overview]
+        if len(results) > 1:
+            kept = {
+                id(t)
+                for t in dedupe_across_providers(
+                    [
+                        (
+                            entry["account"]["aggregator"],
+                            account_identifier(
+                                entry["account"], entry["account"]["aggregator"]
+                            ),
+                            t,
+                        )
+                        for entry in entries
+                        for t in entry["transactions"]
+                    ]
+                )
+            }
+            for entry in entries:
+                entry["transactions"] = [
+                    t for t in entry["transactions"] if id(t) in kept
+                ]
+
+        for entry in entries:
+            entry["transactions"] = transaction_reconciler.reconcile_transactions(
+                entry["transactions"]
+            )
+        return entries
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool and rate limiter statistics per provider"""
+        return {
+            name: provider.get_pool_stats() for name, provider in self.providers.items()
+        }
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """Get circuit breaker and retry statistics per provider"""
+        return {
+            name: provider.get_resilience_stats()
+            for name, provider in self.providers.items()
+        }
+
+
+bank_aggregator = BankAggregator()
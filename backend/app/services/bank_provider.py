@@ -0,0 +1,497 @@
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Type
+from urllib.parse import urlencode
+
+import httpx
+from app.services.recurring import recurring_payment_engine
+from app.services.resilience import (
+    CircuitBreaker,
+    RateLimiter,
+    backoff_delay,
+    parse_retry_after,
+)
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Responses that are worth retrying for idempotent requests
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class BankProviderError(Exception):
+    """Raised when a bank data provider returns an error response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BankProviderUnavailableError(BankProviderError):
+    """Raised when a provider is unreachable or its circuit breaker is open"""
+
+
+class ProviderLimits(BaseModel):
+    """Connection pool, timeout, retry and rate limit settings of one provider"""
+
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    max_retries: int = 3
+    backoff_base_seconds: float = 0.5
+    backoff_max_seconds: float = 8.0
+    retry_after_max_seconds: float = 30.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+    # Number of last-good responses kept to serve while the provider is down
+    stale_cache_size: int = 1000
+    # Maximum number of concurrent per-account calls when fanning out
+    fanout_concurrency: int = 8
+    # Sustained requests per second and burst size, 0 disables the limit
+    rate_limit_per_second: float = 0.0
+    rate_limit_burst: int = 0
+
+
+class BankDataProvider(ABC):
+    """
+    Common async interface of the bank data aggregators.
+
+    Every provider owns its own pooled HTTP client, rate limiter, per-endpoint
+    circuit breakers and stale-response cache, so a slow or failing
+    aggregator never holds up requests to another one. Subclasses implement
+    the auth and data calls and return accounts and transactions in the
+    common (TrueLayer-shaped) format used across the app.
+    """
+
+    # Registry key, also stored in BankConnection.provider
+    name = ""
+    display_name = ""
+    # Exception types raised for this provider's errors
+    api_error: Type[BankProviderError] = BankProviderError
+    unavailable_error: Type[BankProviderUnavailableError] = (
+        BankProviderUnavailableError
+    )
+    # Per-endpoint read timeouts in seconds
+    endpoint_timeouts: Dict[str, float] = {}
+
+    def __init__(
+        self,
+        limits: ProviderLimits,
+        auth_url: str,
+        api_url: str,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+    ):
+        self.limits = limits
+        self.auth_url = auth_url.rstrip("/")
+        self.api_url = api_url.rstrip("/")
+
+        # Shared connection pool, opened lazily or by the app lifespan
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        # Whether the client speaks HTTP/2, None until it is created
+        self._http2: Optional[bool] = None
+        self._requests_sent = 0
+        self._connections_opened = 0
+        self._rate_limiter = RateLimiter(
+            limits.rate_limit_per_second, limits.rate_limit_burst
+        )
+
+        # Resilience: retries, per-endpoint circuit breakers and stale cache
+        self.max_retries = limits.max_retries if max_retries is None else max_retries
+        self.backoff_base = (
+            limits.backoff_base_seconds if backoff_base is None else backoff_base
+        )
+        self._breakers: Dict[str, CircuitBreaker] = defaultdict(
+            lambda: CircuitBreaker(
+                failure_threshold=limits.breaker_failure_threshold,
+                reset_timeout=limits.breaker_reset_seconds,
+            )
+        )
+        self._retries: Dict[str, int] = defaultdict(int)
+        self._stale_served: Dict[str, int] = defaultdict(int)
+        self._last_good: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared pooled HTTP client, creating it if needed.
+
+        Every call goes through this client so TCP/TLS connections are kept
+        alive and reused instead of being re-established per request.
+        """
+        if self._client is None or self._client.is_closed:
+            http2 = self.limits.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("h2 package not installed, falling back to HTTP/1.1")
+                    http2 = False
+
+            self._http2 = http2
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.limits.max_connections,
+                    max_keepalive_connections=self.limits.max_keepalive_connections,
+                    keepalive_expiry=self.limits.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    self.limits.read_timeout, connect=self.limits.connect_timeout
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def startup(self) -> None:
+        """Open the shared connection pool"""
+        self._get_client()
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool and all kept-alive connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def use_transport(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport],
+        auth_url: Optional[str] = None,
+        api_url: Optional[str] = None,
+    ) -> None:
+        """
+        Route requests through another transport, e.g. an in-process stand-in
+
+        Args:
+            transport: Transport for the new client, None for the network
+            auth_url: Optional auth base URL to use with it
+            api_url: Optional data API base URL to use with it
+        """
+        await self.aclose()
+        self._transport = transport
+        if auth_url:
+            self.auth_url = auth_url.rstrip("/")
+        if api_url:
+            self.api_url = api_url.rstrip("/")
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook used to count newly opened connections"""
+        if event_name == "connection.connect_tcp.complete":
+            self._connections_opened += 1
+
+    async def _request(
+        self, method: str, url: str, endpoint: str, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request through the shared pooled client
+
+        Every attempt first waits for the provider's rate limiter. GET
+        requests are retried on 429, 5xx and transport errors with
+        exponential backoff and jitter, honouring Retry-After. Each endpoint
+        has its own timeout and circuit breaker, which counts a request that
+        failed after all its retries as one failure. While a breaker is open, or
+        once retries are exhausted, the last successful response for the same
+        request is served if there is one.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            endpoint: Endpoint name used for timeouts, breakers and metrics
+
+        Returns:
+            The HTTP response (possibly a cached one marked with X-Stale)
+
+        Raises:
+            BankProviderUnavailableError: If the circuit is open or the request
+                could not be sent, and there is no cached response
+        """
+        breaker = self._breakers[endpoint]
+        cache_key = self._cache_key(url, kwargs) if method == "GET" else None
+
+        if not breaker.allow_request():
+            stale = self._stale_response(endpoint, cache_key)
+            if stale is not None:
+                return stale
+            raise self.unavailable_error(
+                f"{self.display_name} {endpoint} endpoint is unavailable "
+                f"(circuit open)"
+            )
+
+        client = self._get_client()
+        timeout = httpx.Timeout(
+            self.endpoint_timeouts.get(endpoint, self.limits.read_timeout),
+            connect=self.limits.connect_timeout,
+        )
+        # Only idempotent requests are retried
+        attempts = self.max_retries + 1 if method == "GET" else 1
+        response: Optional[httpx.Response] = None
+        error: Optional[Exception] = None
+
+        # Only a half-open trial needs releasing if it ends without an outcome
+        trial = breaker.state == CircuitBreaker.HALF_OPEN
+
+        try:
+            for attempt in range(attempts):
+                await self._rate_limiter.acquire()
+                self._requests_sent += 1
+                try:
+                    response = await client.request(
+                        method,
+                        url,
+                        timeout=timeout,
+                        extensions={"trace": self._trace},
+                        **kwargs,
+                    )
+                    error = None
+                except httpx.TransportError as e:
+                    response, error = None, e
+
+                if (
+                    response is not None
+                    and response.status_code not in RETRYABLE_STATUS_CODES
+                ):
+                    breaker.record_success()
+                    if cache_key is not None and response.status_code == 200:
+                        self._remember(cache_key, response)
+                    return response
+
+                if attempt + 1 >= attempts or breaker.state == CircuitBreaker.OPEN:
+                    break
+
+                retry_after = parse_retry_after(
+                    response.headers.get("Retry-After")
+                    if response is not None
+                    else None
+                )
+                delay = (
+                    min(retry_after, self.limits.retry_after_max_seconds)
+                    if retry_after is not None
+                    else backoff_delay(
+                        attempt, self.backoff_base, self.limits.backoff_max_seconds
+                    )
+                )
+                self._retries[endpoint] += 1
+                logger.info(
+                    f"Retrying {self.display_name} {endpoint} request in "
+                    f"{delay:.2f}s (attempt {attempt + 2}/{attempts})"
+                )
+                await asyncio.sleep(delay)
+
+            # One failure per request however many attempts it took; rate
+            # limiting is not a sign of an unhealthy provider
+            if response is None or response.status_code != 429:
+                breaker.record_failure()
+        finally:
+            # Cancelled, rate limited or failed with an unexpected error
+            if trial:
+                breaker.release()
+
+        stale = self._stale_response(endpoint, cache_key)
+        if stale is not None:
+            return stale
+        if response is not None:
+            return response
+        raise self.unavailable_error(
+            f"{self.display_name} {endpoint} request failed: {str(error)}"
+        )
+
+    def _cache_key(self, url: str, kwargs: Dict[str, Any]) -> str:
+        """Key a GET request by URL, params and a hash of the access token"""
+        authorization = kwargs.get("headers", {}).get("Authorization", "")
+        params = urlencode(sorted((kwargs.get("params") or {}).items()))
+        token_hash = hashlib.sha256(authorization.encode()).hexdigest()[:16]
+        return f"{token_hash}:{url}?{params}"
+
+    def _remember(self, cache_key: str, response: httpx.Response) -> None:
+        self._last_good[cache_key] = (
+            response.content,
+            response.headers.get("content-type", "application/json"),
+        )
+        self._last_good.move_to_end(cache_key)
+        while len(self._last_good) > self.limits.stale_cache_size:
+            self._last_good.popitem(last=False)
+
+    def _stale_response(
+        self, endpoint: str, cache_key: Optional[str]
+    ) -> Optional[httpx.Response]:
+        if cache_key is None or cache_key not in self._last_good:
+            return None
+        content, content_type = self._last_good[cache_key]
+        self._stale_served[endpoint] += 1
+        logger.warning(f"Serving cached {self.display_name} {endpoint} response")
+        return httpx.Response(
+            200,
+            content=content,
+            headers={"content-type": content_type, "X-Stale": "true"},
+        )
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """
+        Get retry, circuit breaker and stale-cache metrics per endpoint
+
+        Returns:
+            Dictionary keyed by endpoint name
+        """
+        endpoints = (
+            set(self._breakers) | set(self._retries) | set(self._stale_served)
+        )
+        return {
+            endpoint: {
+                **self._breakers[endpoint].get_stats(),
+                "retries": self._retries[endpoint],
+                "stale_responses_served": self._stale_served[endpoint],
+            }
+            for endpoint in sorted(endpoints)
+        }
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool and rate limiter statistics
+
+        Returns:
+            Dictionary with the pool configuration and connection reuse
+            counters. http2 is whether the client actually uses HTTP/2, which
+            it can't without the h2 package, and None before it is created
+        """
+        reused = max(self._requests_sent - self._connections_opened, 0)
+        return {
+            "client_open": self._client is not None and not self._client.is_closed,
+            "http2": self._http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "requests_sent": self._requests_sent,
+            "connections_opened": self._connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": (
+                round(reused / self._requests_sent, 3) if self._requests_sent else 0.0
+            ),
+            **self._rate_limiter.get_stats(),
+        }
+
+    @abstractmethod
+    async def get_auth_url(self, state: str = None) -> str:
+        """Generate the URL that starts the provider's bank connection flow"""
+
+    @abstractmethod
+    async def exchange_code_for_token(self, code: str) -> Dict[str, Any]:
+        """Exchange an authorization code for access and refresh tokens"""
+
+    @abstractmethod
+    async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Refresh an access token, returning the same shape as the exchange"""
+
+    @abstractmethod
+    async def get_accounts(self, access_token: str) -> List[Dict[str, Any]]:
+        """Get the accounts the token gives access to"""
+
+    @abstractmethod
+    async def get_transactions(
+        self,
+        access_token: str,
+        account_id: str,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get an account's transactions, dates in YYYY-MM-DD format"""
+
+    @abstractmethod
+    async def get_standing_orders(
+        self, access_token: str, account_id: str
+    ) -> List[Dict[str, Any]]:
+        """Get an account's standing orders"""
+
+    @abstractmethod
+    async def get_direct_debits(
+        self, access_token: str, account_id: str
+    ) -> List[Dict[str, Any]]:
+        """Get an account's direct debits"""
+
+    async def get_accounts_overview(
+        self,
+        access_token: str,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get transactions, standing orders and direct debits for every account
+
+        The per-account calls run concurrently (bounded by max_concurrency), so
+        the total time is close to the slowest single call. A failing call is
+        recorded in that account's "errors" instead of failing the whole result.
+
+        Args:
+            access_token: Provider access token
+            from_date: Optional start date in YYYY-MM-DD format
+            to_date: Optional end date in YYYY-MM-DD format
+            max_concurrency: Optional limit on concurrent calls
+
+        Returns:
+            List of per-account dictionaries with account, transactions,
+            standing_orders, direct_debits and errors
+        """
+        accounts = await self.get_accounts(access_token)
+        semaphore = asyncio.Semaphore(
+            max_concurrency or self.limits.fanout_concurrency
+        )
+
+        async def limited(call):
+            async with semaphore:
+                return await call
+
+        resources = ["transactions", "standing_orders", "direct_debits"]
+        calls = []
+        for account in accounts:
+            account_id = account["account_id"]
+            calls.extend(
+                [
+                    limited(
+                        self.get_transactions(
+                            access_token, account_id, from_date, to_date
+                        )
+                    ),
+                    limited(self.get_standing_orders(access_token, account_id)),
+                    limited(self.get_direct_debits(access_token, account_id)),
+                ]
+            )
+
+        results = await asyncio.gather(*calls, return_exceptions=True)
+
+        overview = []
+        for index, account in enumerate(accounts):
+            entry = {"account": account, "errors": {}}
+            account_results = results[index * len(resources) : (index + 1) * len(resources)]
+            for resource, result in zip(resources, account_results):
+                if isinstance(result, Exception):
+                    logger.warning(
+                        f"Failed to get {resource} for account {account['account_id']}: {result}"
+                    )
+                    entry[resource] = []
+                    entry["errors"][resource] = str(result)
+                else:
+                    entry[resource] = result
+            overview.append(entry)
+
+        return overview
+
+    async def identify_subscriptions(
+        self, transactions: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Identify potential subscriptions from transaction data
+
+        Args:
+            transactions: List of transactions
+
+        Returns:
+            List of identified subscriptions
+        """
+        return recurring_payment_engine.detect(transactions)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.bank_connection import BankConnection
+from app.services.bank_aggregator import get_bank_provider
+from app.services.bank_provider import (
+    BankDataProvider,
+    BankProviderError,
+    BankProviderUnavailableError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BankConnectionExpiredError(Exception):
+    """Raised when a bank connection's tokens can no longer be refreshed"""
+
+
+def _as_local_naive(value: datetime) -> datetime:
+    """Normalize a stored expiry to a naive local datetime"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class BankTokenManager:
+    """
+    Caches bank access tokens in memory and refreshes them single-flight.
+
+    Concurrent requests for the same connection share one in-flight refresh
+    instead of racing on the refresh token. Tokens that are close to expiry
+    are refreshed in the background so requests rarely wait on the token
+    endpoint.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[BankDataProvider] = None,
+        session_factory=SessionLocal,
+    ):
+        # Without a fixed provider, each connection's own provider is used
+        self.provider = provider
+        self.session_factory = session_factory
+        # connection id -> (access token, expires at)
+        self._tokens: Dict[int, Tuple[str, datetime]] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    async def get_access_token(self, bank_connection: BankConnection) -> str:
+        """
+        Get a valid access token for a bank connection
+
+        Args:
+            bank_connection: The active bank connection
+
+        Returns:
+            An access token that is valid for at least the expiry margin
+
+        Raises:
+            BankConnectionExpiredError: If the token had to be refreshed and
+                the provider rejected the refresh token
+            BankProviderError: If the refresh failed because of a provider error
+        """
+        cached = self._tokens.get(bank_connection.id)
+        if cached is None:
+            cached = (
+                bank_connection.access_token,
+                _as_local_naive(bank_connection.expires_at),
+            )
+            self._tokens[bank_connection.id] = cached
+
+        access_token, expires_at = cached
+        now = datetime.now()
+
+        # Expired or about to: the caller has to wait for a new token
+        margin = timedelta(seconds=settings.BANK_TOKEN_EXPIRY_MARGIN_SECONDS)
+        if expires_at - margin <= now:
+            return await self.refresh(bank_connection.id)
+
+        # Close to expiry: refresh in the background and keep serving this one
+        window = timedelta(seconds=settings.BANK_TOKEN_REFRESH_WINDOW_SECONDS)
+        if expires_at - window <= now:
+            self.start_refresh(bank_connection.id)
+
+        return access_token
+
+    def needs_refresh(self, bank_connection: BankConnection) -> bool:
+        """Check whether a connection's token is inside the refresh window"""
+        cached = self._tokens.get(bank_connection.id)
+        expires_at = (
+            cached[1] if cached else _as_local_naive(bank_connection.expires_at)
+        )
+        window = timedelta(seconds=settings.BANK_TOKEN_REFRESH_WINDOW_SECONDS)
+        return expires_at - window <= datetime.now()
+
+    async def refresh(self, connection_id: int) -> str:
+        """Refresh a connection's token, joining any refresh already in flight"""
+        return await asyncio.shield(self.start_refresh(connection_id))
+
+    def invalidate(self, connection_id: int) -> None:
+        """Drop a connection's cached token"""
+        self._tokens.pop(connection_id, None)
+
+    def is_refreshing(self, connection_id: int) -> bool:
+        """Check whether a refresh is in flight for a connection"""
+        task = self._inflight.get(connection_id)
+        return task is not None and not task.done()
+
+    def start_refresh(self, connection_id: int) -> asyncio.Task:
+        """Start a background refresh, or return the one already in flight"""
+        task = self._inflight.get(connection_id)
+        if task is not None and not task.done():
+            return task
+
+        task = asyncio.create_task(self._refresh(connection_id))
+        self._inflight[connection_id] = task
+
+        def done(finished: asyncio.Task) -> None:
+            if self._inflight.get(connection_id) is finished:
+                del self._inflight[connection_id]
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(
+                    f"Token refresh failed for bank connection {connection_id}: "
+                    f"{finished.exception()}"
+                )
+
+        task.add_done_callback(done)
+        return task
+
+    async def _refresh(self, connection_id: int) -> str:
+        db = self.session_factory()
+        try:
+            bank_connection = (
+                db.query(BankConnection)
+                .filter(BankConnection.id == connection_id)
+                .first()
+            )
+            if bank_connection is None or not bank_connection.is_active:
+                self.invalidate(connection_id)
+                raise BankConnectionExpiredError("Bank connection is not active")
+
+            try:
+                provider = self.provider or get_bank_provider(bank_connection.provider)
+                token_data = await provider.refresh_access_token(
+                    bank_connection.refresh_token
+                )
+            except BankProviderUnavailableError:
+                # Provider outage: keep the connection so it can be retried
+                raise
+            except BankProviderError as e:
+                if e.status_code is not None and e.status_code >= 500:
+                    raise
+                # The refresh token was rejected, mark the connection as inactive
+                bank_connection.is_active = False
+                db.commit()
+                self.invalidate(connection_id)
+                raise BankConnectionExpiredError(str(e)) from e
+
+            bank_connection.access_token = token_data["access_token"]
+            bank_connection.refresh_token = token_data["refresh_token"]
+            bank_connection.expires_at = token_data["expires_at"]
+            db.commit()
+
+            self._tokens[connection_id] = (
+                token_data["access_token"],
+                _as_local_naive(token_data["expires_at"]),
+            )
+            return token_data["access_token"]
+        finally:
+            db.close()
+
+
+bank_token_manager = BankTokenManager()
@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.account_sync_state import AccountSyncState
+from app.models.bank_connection import BankConnection
+from app.services.bank_tokens import BankTokenManager, bank_token_manager
+from app.services.transaction_sync import (
+    TransactionSyncService,
+    transaction_sync_service,
+)
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Signature header per provider, X-Webhook-Signature for the others
+SIGNATURE_HEADERS = {"tink": "X-Tink-Signature"}
+
+# What each provider event type means for the local store
+EVENT_ACTIONS = {
+    "transactions_available": "sync",
+    "account-transactions:modified": "sync",
+    "account-booked-transactions:modified": "sync",
+    "consent_revoked": "revoke",
+}
+
+
+class WebhookSignatureError(Exception):
+    """Raised when a webhook notification's signature cannot be verified"""
+
+
+def sign_webhook(secret: str, body: bytes, timestamp: int) -> str:
+    """
+    Sign a notification body
+
+    Args:
+        secret: Shared webhook secret
+        body: Raw request body
+        timestamp: Unix time the notification was sent
+
+    Returns:
+        Signature header value in the "t=<timestamp>,v1=<hex digest>" format
+    """
+    digest = hmac.new(
+        secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_webhook_signature(
+    secret: str,
+    body: bytes,
+    header: Optional[str],
+    tolerance: Optional[int] = None,
+    now: Optional[float] = None,
+) -> None:
+    """
+    Verify the HMAC-SHA256 signature of a notification
+
+    The signature covers the timestamp and the raw body, and notifications
+    older than the tolerance are rejected so captured requests can't be
+    replayed. Several v1 values may be sent while secrets are rotated.
+
+    Raises:
+        WebhookSignatureError: If the header is missing, malformed, stale or
+            doesn't match the body
+    """
+    if not header:
+        raise WebhookSignatureError("Missing signature header")
+
+    timestamp = None
+    signatures: List[str] = []
+    for part in header.split(","):
+        key, _, value = part.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if timestamp is None or not timestamp.isdigit() or not signatures:
+        raise WebhookSignatureError("Malformed signature header")
+
+    tolerance = (
+        settings.BANK_WEBHOOK_TOLERANCE_SECONDS if tolerance is None else tolerance
+    )
+    if abs((now or time.time()) - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Signature timestamp is outside the tolerance")
+
+    expected = sign_webhook(secret, body, int(timestamp)).split("v1=")[1]
+    if not any(hmac.compare_digest(expected, s) for s in signatures):
+        raise WebhookSignatureError("Signature does not match")
+
+
+def parse_event(payload: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """
+    Extract the event id, action and account from a provider notification
+
+    Understands flat payloads ({"event_id", "type", "account_id"}) as well as
+    Tink's ({"event", "content": {"account": {"id"}}}). Notifications without
+    an id are identified by a hash of their body, so redeliveries still match.
+    """
+    content = payload.get("content") or {}
+    event_type = payload.get("type") or payload.get("event")
+    return {
+        "event_id": payload.get("event_id")
+        or payload.get("id")
+        or hashlib.sha256(body).hexdigest(),
+        "type": event_type,
+        "action": EVENT_ACTIONS.get(event_type),
+        "account_id": payload.get("account_id")
+        or (content.get("account") or {}).get("id")
+        or content.get("accountId"),
+    }
+
+
+class BankWebhookService:
+    """
+    Turns signed provider notifications into targeted account syncs.
+
+    A notification only queues an incremental sync of the account it is
+    about, off the request path. Redelivered events are dropped by id, and a
+    burst of notifications for one account collapses into the sync already
+    queued (or one follow-up sync if it is already running). A fixed pool of
+    workers drains the bounded queue, so ingestion concurrency stays capped
+    however many notifications arrive.
+    """
+
+    def __init__(
+        self,
+        sync_service: TransactionSyncService = transaction_sync_service,
+        token_manager: BankTokenManager = bank_token_manager,
+        session_factory=SessionLocal,
+        concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
+        self.sync_service = sync_service
+        self.token_manager = token_manager
+        self.session_factory = session_factory
+        self.concurrency = concurrency or settings.BANK_WEBHOOK_INGEST_CONCURRENCY
+        self._queue: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or settings.BANK_WEBHOOK_QUEUE_SIZE
+        )
+        # (connection id, account id) keys by stage
+        self._pending: Set[Tuple[int, str]] = set()
+        self._running: Set[Tuple[int, str]] = set()
+        # Running syncs that were notified again and need one more pass
+        self._dirty: Set[Tuple[int, str]] = set()
+        self._seen_events: "OrderedDict[str, None]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self._stats = {
+            "notifications_received": 0,
+            "duplicate_events": 0,
+            "notifications_coalesced": 0,
+            "notifications_ignored": 0,
+            "connections_revoked": 0,
+            "syncs_queued": 0,
+            "syncs_completed": 0,
+            "syncs_failed": 0,
+            "transactions_ingested": 0,
+        }
+
+    @staticmethod
+    def secret_for(provider: str) -> str:
+        """Get the shared webhook secret of a provider, empty if not set up"""
+        return {
+            "truelayer": settings.TRUELAYER_WEBHOOK_SECRET,
+            "tink": settings.TINK_WEBHOOK_SECRET,
+        }.get(provider, "")
+
+    @staticmethod
+    def signature_header(provider: str) -> str:
+        """Get the name of the header carrying a provider's signature"""
+        return SIGNATURE_HEADERS.get(provider, "X-Webhook-Signature")
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start the ingestion workers"""
+        if self._tasks:
+            return
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Bank webhook ingestion started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        """Stop the ingestion workers and cancel in-progress syncs"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self) -> None:
+        """Wait until every queued sync has finished"""
+        await self._queue.join()
+
+    def handle(
+        self, db: Session, provider: str, payload: Dict[str, Any], body: bytes
+    ) -> str:
+        """
+        Act on a verified notification
+
+        Args:
+            db: Database session
+            provider: Provider that sent the notification
+            payload: Parsed notification body
+            body: Raw notification body
+
+        Returns:
+            What happened: "queued", "coalesced", "duplicate", "ignored" or
+            "revoked"
+
+        Raises:
+            asyncio.QueueFull: If the ingestion queue is full; the event is
+                not recorded, so the provider's redelivery is processed
+        """
+        self._stats["notifications_received"] += 1
+        event = parse_event(payload, body)
+        if event["event_id"] in self._seen_events:
+            self._stats["duplicate_events"] += 1
+            return "duplicate"
+
+        result = self._apply(db, provider, event)
+        self._remember_event(event["event_id"])
+        return result
+
+    def _apply(self, db: Session, provider: str, event: Dict[str, Any]) -> str:
+        if event["action"] is None or not event["account_id"]:
+            self._stats["notifications_ignored"] += 1
+            return "ignored"
+
+        # Accounts are mapped to connections through their sync state
+        connection = (
+            db.query(BankConnection)
+            .join(
+                AccountSyncState,
+                AccountSyncState.bank_connection_id == BankConnection.id,
+            )
+            .filter(
+                AccountSyncState.account_id == event["account_id"],
+                BankConnection.provider == provider,
+                BankConnection.is_active == True,
+            )
+            .first()
+        )
+        if connection is None:
+            logger.info(
+                f"Ignoring {provider} {event['type']} notification for unknown "
+                f"account {event['account_id']}"
+            )
+            self._stats["notifications_ignored"] += 1
+            return "ignored"
+
+        if event["action"] == "revoke":
+            connection.is_active = False
+            db.commit()
+            self.token_manager.invalidate(connection.id)
+            self._stats["connections_revoked"] += 1
+            logger.info(f"Bank connection {connection.id} revoked by {provider}")
+            return "revoked"
+
+        return self.enqueue(connection.id, event["account_id"])
+
+    def enqueue(self, connection_id: int, account_id: str) -> str:
+        """
+        Queue an incremental sync of one account, coalescing with any sync
+        already queued or running for it
+
+        Returns:
+            "queued" or "coalesced"
+
+        Raises:
+            asyncio.QueueFull: If the ingestion queue is full
+        """
+        key = (connection_id, account_id)
+        if key in self._pending:
+            self._stats["notifications_coalesced"] += 1
+            return "coalesced"
+        if key in self._running:
+            self._dirty.add(key)
+            self._stats["notifications_coalesced"] += 1
+            return "coalesced"
+
+        self._queue.put_nowait(key)
+        self._pending.add(key)
+        self._stats["syncs_queued"] += 1
+        return "queued"
+
+    def _remember_event(self, event_id: str) -> None:
+        self._seen_events[event_id] = None
+        while len(self._seen_events) > settings.BANK_WEBHOOK_EVENT_CACHE_SIZE:
+            self._seen_events.popitem(last=False)
+
+    async def ingest(self, connection_id: int, account_id: str) -> int:
+        """
+        Incrementally sync one account of a connection
+
+        Returns:
+            Number of newly stored transactions
+        """
+        db = self.session_factory()
+        try:
+            connection = (
+                db.query(BankConnection)
+                .filter(BankConnection.id == connection_id)
+                .first()
+            )
+            if connection is None or not connection.is_active:
+                return 0
+
+            access_token = await self.token_manager.get_access_token(connection)
+            if access_token != connection.access_token:
+                db.refresh(connection)
+
+            return await self.sync_service.sync_account(db, connection, account_id)
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._queue.get()
+            self._pending.discard(key)
+            self._running.add(key)
+            try:
+                inserted = await self.ingest(*key)
+                self._stats["syncs_completed"] += 1
+                self._stats["transactions_ingested"] += inserted
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Webhook sync failed for account {key[1]}: {e}")
+                self._stats["syncs_failed"] += 1
+            finally:
+                self._running.discard(key)
+                # Notifications that arrived mid-sync get one more pass
+                if key in self._dirty:
+                    self._dirty.discard(key)
+                    try:
+                        self.enqueue(*key)
+                    except asyncio.QueueFull:
+                        logger.warning(f"Dropped follow-up sync of account {key[1]}")
+                self._queue.task_done()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get ingestion status and metrics
+
+        Returns:
+            Dictionary with queue depth, in-progress syncs and counters
+        """
+        return {
+            "running": self.is_running,
+            "workers": self.concurrency,
+            "queue_depth": self._queue.qsize(),
+            "in_progress": len(self._running),
+            **self._stats,
+        }
+
+
+bank_webhook_service = BankWebhookService()
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Disk writes between checks of the tier's size
+PRUNE_INTERVAL = 50
+
+
+def private_directory(path: str) -> bool:
+    """
+    Create a cache directory, or check an existing one, for private entries
+
+    Args:
+        path: Directory to use
+
+    Returns:
+        True if the directory is owned by the app's user and not writable by
+        anyone else, so no other user can plant or swap its entries
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        stat = os.stat(path)
+    except OSError as e:
+        logger.warning(f"Not using cache directory {path}: {e}")
+        return False
+    if stat.st_uid != os.geteuid() or stat.st_mode & 0o022:
+        logger.warning(
+            f"Not using cache directory {path}: it must be owned by the app's "
+            f"user and not writable by group or others"
+        )
+        return False
+    return True
+
+
+class DiskCacheTier:
+    """
+    On-disk tier of a cache, shared by the app's worker processes.
+
+    Entries are JSON objects stored one file per key. Files are written
+    atomically, so workers never read a partial entry, and only the app's
+    user can read them. Reading an entry marks it as recently used, and the
+    least recently used entries are pruned once the tier is over its size
+    limit. Entries live under a version subdirectory of the configured
+    directory, so changing their format starts a fresh tier, and files
+    missing one of the given fields are ignored.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        version: str,
+        max_bytes: int,
+        fields: Sequence[str],
+        description: str,
+    ):
+        # An empty directory disables the tier
+        self.directory = (
+            os.path.join(directory, version)
+            if directory and private_directory(directory)
+            else None
+        )
+        self.max_bytes = max_bytes
+        self.fields = tuple(fields)
+        # What the entries are, for log messages
+        self.description = description
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def read(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an entry, marking it as recently used
+
+        Args:
+            key: Hex key of the entry
+
+        Returns:
+            The entry, or None if it is missing or unreadable
+        """
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            missing = [field for field in self.fields if field not in entry]
+            if missing:
+                raise KeyError(", ".join(missing))
+            # Recently used files are the last to be pruned
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable {self.description} entry {key}: {e}")
+            return None
+
+    def write(self, key: str, entry: Dict[str, Any]) -> None:
+        """
+        Write an entry, pruning the tier every PRUNE_INTERVAL writes
+
+        Args:
+            key: Hex key of the entry
+            entry: JSON-serializable entry
+        """
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            # Write to a private temporary file, then rename it into place
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Failed to write {self.description} entry {key}: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_INTERVAL == 1
+        if prune:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        """Delete an entry if it exists"""
+        if self.directory is None:
+            return
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune(self) -> int:
+        """
+        Delete the least recently used entries until the tier fits
+
+        Returns:
+            Number of entries deleted
+        """
+        if self.directory is None or not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+
+        with self._lock:
+            self.evictions += deleted
+        return deleted
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.disk_cache import DiskCacheTier
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored entry format changes
+CACHE_VERSION = "v1"
+
+
+def completion_key(model: str, messages: List[Dict[str, Any]], **params: Any) -> str:
+    """
+    SHA-256 fingerprint of a chat completion request
+
+    Args:
+        model: Model the request is sent to
+        messages: Chat messages
+        **params: Sampling and output parameters (temperature, max_tokens...)
+
+    Returns:
+        Hex digest, the same for equal requests whatever the parameter order
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache of LLM completions keyed by model, messages and parameters.
+
+    The analysis prompts are sent at a low temperature, so sending the same
+    request again would mostly pay for the same answer. Completions are kept
+    in an in-memory LRU tier capped by entry count, and written through to a
+    disk tier that survives restarts and is shared by the app's worker
+    processes. Entries expire after a TTL in both tiers (expired files are
+    deleted when next read), and the disk tier is pruned by last use once it
+    is over its size limit. Prompts contain users' statements, so cache files
+    are only readable by the app's user.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        directory: Optional[str] = None,
+        disk_bytes: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.max_entries = (
+            settings.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        )
+        self.ttl_seconds = (
+            settings.LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        )
+        self.disk = DiskCacheTier(
+            settings.LLM_CACHE_DIR if directory is None else directory,
+            CACHE_VERSION,
+            settings.LLM_CACHE_DISK_BYTES if disk_bytes is None else disk_bytes,
+            fields=("text", "expires_at"),
+            description="LLM cache",
+        )
+        self.enabled = settings.LLM_CACHE_ENABLED if enabled is None else enabled
+        # key -> (completion text, expiry timestamp)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+        }
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached completion
+
+        Args:
+            key: Fingerprint from completion_key
+
+        Returns:
+            The completion text, or None if it isn't cached or has expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        entry = self.disk.read(key)
+        if entry is not None and entry["expires_at"] <= now:
+            # Expired files are deleted when next read
+            self.disk.delete(key)
+            with self._lock:
+                self._stats["expired"] += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, entry["text"], entry["expires_at"])
+            return entry["text"]
+
+    def put(self, key: str, text: str, ttl_seconds: Optional[int] = None) -> None:
+        """
+        Store a completion in both tiers
+
+        Args:
+            key: Fingerprint from completion_key
+            text: Completion text
+            ttl_seconds: How long to keep it, defaults to the cache's TTL
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._stats["stores"] += 1
+            self._remember(key, text, expires_at)
+        self.disk.write(key, {"text": text, "expires_at": expires_at})
+
+    async def complete(
+        self,
+        create: Callable[..., Awaitable[Any]],
+        model: str,
+        messages: List[Dict[str, Any]],
+        parse: Optional[Callable[[str], Any]] = None,
+        use_cache: bool = True,
+        ttl_seconds: Optional[int] = None,
+        **params: Any,
+    ) -> Any:
+        """
+        Get a chat completion, reusing a cached one for the same request
+
+        Args:
+            create: Async client call sending the request, such as
+                client.chat.completions.create
+            model: Model to use
+            messages: Chat messages
+            parse: Turns the completion text into the result. A completion it
+                rejects by raising is not cached
+            use_cache: False to always send the request; the fresh completion
+                still replaces the cached one
+            ttl_seconds: How long to keep the completion, defaults to the
+                cache's TTL
+            **params: Other request parameters, part of the cache key
+
+        Returns:
+            The parsed completion, or its text if there is no parse function
+        """
+        parse = parse or (lambda text: text)
+        key = completion_key(model, messages, **params)
+        if self.enabled and use_cache:
+            # The disk tier is file I/O, so keep it off the event loop
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                logger.info(f"Using cached {model} completion {key[:12]}")
+                return parse(cached)
+        elif self.enabled:
+            with self._lock:
+                self._stats["bypassed"] += 1
+
+        response = await create(model=model, messages=messages, **params)
+        text = response.choices[0].message.content
+        result = parse(text)
+        if self.enabled and text:
+            await asyncio.to_thread(self.put, key, text, ttl_seconds)
+        return result
+
+    def _remember(self, key: str, text: str, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (text, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def prune_disk(self) -> int:
+        """
+        Delete the least recently used disk entries until the tier fits
+
+        Returns:
+            Number of entries deleted
+        """
+        return self.disk.prune()
+
+    def clear(self) -> None:
+        """Drop every entry of the memory tier"""
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit, miss and eviction counters of both tiers"""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_limit_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_enabled": self.disk.enabled,
+                "disk_limit_bytes": self.disk.max_bytes,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "disk_evictions": self.disk.evictions,
+                **self._stats,
+            }
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,515 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache, llm_response_cache
+from app.services.resilience import (
+    CircuitBreaker,
+    TokenBudget,
+    backoff_delay,
+    parse_retry_after,
+)
+from openai import APIConnectionError, AsyncOpenAI, Timeout
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Responses that are worth retrying
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Completion tokens assumed for budgeting when a request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+class LLMGatewayError(Exception):
+    """Raised when a completion request fails"""
+
+
+class LLMUnavailableError(LLMGatewayError):
+    """Raised when a provider is unconfigured, unreachable or its circuit is open"""
+
+
+class LLMProvider(BaseModel):
+    """Credentials and endpoint of an OpenAI-compatible completions API"""
+
+    name: str
+    api_key: str = ""
+    base_url: Optional[str] = None
+
+
+class ModelLimits(BaseModel):
+    """Concurrency and token budget of one model"""
+
+    max_concurrency: int = 16
+    # Prompt and completion tokens per minute, 0 disables the budget
+    tokens_per_minute: int = 0
+
+
+def default_providers() -> Dict[str, LLMProvider]:
+    """Providers configured through the settings"""
+    return {
+        "openai": LLMProvider(name="openai", api_key=settings.OPENAI_API_KEY),
+        "deepseek": LLMProvider(
+            name="deepseek",
+            api_key=settings.DEEPSEEK_API_KEY,
+            base_url=settings.DEEPSEEK_BASE_URL,
+        ),
+    }
+
+
+def configured_model_limits() -> Dict[str, ModelLimits]:
+    """Per-model limits from LLM_MODEL_LIMITS, on top of the global defaults"""
+    defaults = {
+        "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "tokens_per_minute": settings.LLM_TOKENS_PER_MINUTE,
+    }
+    if not settings.LLM_MODEL_LIMITS:
+        return {}
+    try:
+        overrides = json.loads(settings.LLM_MODEL_LIMITS)
+        return {
+            model: ModelLimits(**{**defaults, **limits})
+            for model, limits in overrides.items()
+        }
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid LLM_MODEL_LIMITS: {e}")
+        return {}
+
+
+def estimate_tokens(
+    messages: List[Dict[str, Any]], max_tokens: Optional[int] = None
+) -> int:
+    """
+    Estimate the tokens a completion request will use, for budgeting
+
+    Counts about four characters per prompt token plus the completion limit.
+    The budget is settled with the real usage afterwards, so this only needs
+    to be in the right range.
+    """
+    prompt = sum(len(str(message.get("content") or "")) for message in messages)
+    return prompt // 4 + 4 * len(messages) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Check whether a failed request is worth sending again"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(
+        error, (APIConnectionError, asyncio.TimeoutError, ConnectionError)
+    )
+
+
+class _ModelState:
+    """Limits and counters of one model"""
+
+    def __init__(self, limits: ModelLimits):
+        self.limits = limits
+        self.semaphore = asyncio.Semaphore(max(limits.max_concurrency, 1))
+        self.budget = TokenBudget(limits.tokens_per_minute)
+        self.in_flight = 0
+        self.error_types: Dict[str, int] = defaultdict(int)
+        self.stats = {
+            "requests": 0,
+            "completed": 0,
+            "errors": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_seconds": 0.0,
+            "slowest_seconds": 0.0,
+            "queued_seconds": 0.0,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        completed = self.stats["completed"]
+        return {
+            **self.stats,
+            "average_latency_seconds": (
+                round(self.stats["latency_seconds"] / completed, 3)
+                if completed
+                else 0.0
+            ),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.limits.max_concurrency,
+            "error_types": dict(self.error_types),
+            **self.budget.get_stats(),
+        }
+
+
+class LLMGateway:
+    """
+    Single entry point for LLM completions.
+
+    The gateway owns one long-lived async client, and so one connection pool,
+    per provider, and routes each model to its provider (DeepSeek models to
+    DeepSeek's OpenAI-compatible API, everything else to OpenAI). Every model
+    has a cap on completions in flight and an optional tokens-per-minute
+    budget; requests over either wait their turn. Failed requests are retried
+    on timeouts, connection errors, 429 and 5xx with exponential backoff,
+    honouring Retry-After, and each provider has a circuit breaker so an
+    outage fails fast. Latency, token usage, retries and errors are recorded
+    per model. Responses go through the LLM response cache. Completions can
+    be streamed, their text passed on as it arrives.
+    """
+
+    def __init__(
+        self,
+        providers: Optional[Dict[str, LLMProvider]] = None,
+        model_limits: Optional[Dict[str, ModelLimits]] = None,
+        default_limits: Optional[ModelLimits] = None,
+        clients: Optional[Dict[str, Any]] = None,
+        cache: Optional[LLMResponseCache] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+    ):
+        self.providers = default_providers() if providers is None else providers
+        self.model_limits = (
+            configured_model_limits() if model_limits is None else model_limits
+        )
+        self.default_limits = default_limits or ModelLimits(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+        )
+        self.cache = llm_response_cache if cache is None else cache
+        self.max_retries = (
+            settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff_base = (
+            settings.LLM_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+        )
+        self._clients: Dict[str, Any] = dict(clients or {})
+        self._injected = set(self._clients)
+        self._models: Dict[str, _ModelState] = {}
+        self._breakers: Dict[str, CircuitBreaker] = defaultdict(
+            lambda: CircuitBreaker(
+                failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.LLM_BREAKER_RESET_SECONDS,
+            )
+        )
+
+    def provider_for(self, model: str) -> str:
+        """Name of the provider serving a model"""
+        return "deepseek" if model.lower().startswith("deepseek") else "openai"
+
+    def is_available(self, model: str) -> bool:
+        """Check whether the provider of a model is configured"""
+        provider = self.provider_for(model)
+        config = self.providers.get(provider)
+        return provider in self._clients or bool(config and config.api_key)
+
+    def _get_client(self, provider: str) -> Any:
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        config = self.providers.get(provider)
+        if config is None or not config.api_key:
+            raise LLMUnavailableError(f"No API key is configured for {provider}")
+        # Retries are the gateway's job, so the client doesn't add its own
+        client = AsyncOpenAI(
+            api_key=config.api_key,
+            base_url=config.base_url,
+            timeout=Timeout(
+                settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                connect=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+            ),
+            max_retries=0,
+        )
+        self._clients[provider] = client
+        return client
+
+    def use_client(self, provider: str, client: Any) -> None:
+        """
+        Send a provider's requests through another client, e.g. a stand-in
+
+        Args:
+            provider: Provider name
+            client: Object with an async chat.completions.create
+        """
+        self._clients[provider] = client
+        self._injected.add(provider)
+
+    async def startup(self) -> None:
+        """Create the clients of every configured provider"""
+        for name, config in self.providers.items():
+            if config.api_key or name in self._clients:
+                self._get_client(name)
+                logger.info(f"LLM provider {name} is configured")
+            else:
+                logger.warning(f"No API key configured for LLM provider {name}")
+
+    async def aclose(self) -> None:
+        """Close the clients' connection pools"""
+        for name in list(self._clients):
+            if name in self._injected:
+                continue
+            client = self._clients.pop(name)
+            await client.close()
+
+    def _model_state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            limits = self.model_limits.get(model, self.default_limits)
+            state = self._models[model] = _ModelState(limits)
+        return state
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        parse: Optional[Callable[[str], Any]] = None,
+        use_cache: bool = True,
+        ttl_seconds: Optional[int] = None,
+        on_delta: Optional[Callable[[str], Any]] = None,
+        **params: Any,
+    ) -> Any:
+        """
+        Get a chat completion
+
+        Args:
+            model: Model to use
+            messages: Chat messages
+            parse: Turns the completion text into the result; a completion it
+                rejects by raising is not cached
+            use_cache: False to skip the response cache lookup
+            ttl_seconds: How long to cache the completion, defaults to the
+                cache's TTL
+            on_delta: Called with each piece of the completion's text as it
+                is streamed in; a cached completion is passed on whole
+            **params: Other request parameters (temperature, max_tokens...)
+
+        Returns:
+            The parsed completion, or its text if there is no parse function
+
+        Raises:
+            LLMUnavailableError: If the provider isn't configured, its circuit
+                is open or retries ran out
+            LLMGatewayError: If the provider rejected the request
+        """
+        create = self._create
+        if on_delta is not None:
+            streamed: List[str] = []
+            parse_text = parse or (lambda text: text)
+
+            def forward(delta: str) -> None:
+                streamed.append(delta)
+                on_delta(delta)
+
+            def parse_streamed(text: str) -> Any:
+                if not streamed and text:
+                    on_delta(text)
+                return parse_text(text)
+
+            parse = parse_streamed
+
+            # Streaming doesn't change the completion, so it shares the
+            # cache entry of the same request sent without it
+            create = functools.partial(self._create, on_delta=forward)
+
+        return await self.cache.complete(
+            create,
+            model,
+            messages,
+            parse=parse,
+            use_cache=use_cache,
+            ttl_seconds=ttl_seconds,
+            **params,
+        )
+
+    async def _create(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        on_delta: Optional[Callable[[str], Any]] = None,
+        **params: Any,
+    ) -> Any:
+        """Send a request within the model's limits and record its metrics"""
+        provider = self.provider_for(model)
+        client = self._get_client(provider)
+        state = self._model_state(model)
+        state.stats["requests"] += 1
+        estimate = estimate_tokens(messages, params.get("max_tokens"))
+
+        queued = time.perf_counter()
+        async with state.semaphore:
+            reserved = await state.budget.acquire(estimate)
+            began = time.perf_counter()
+            state.stats["queued_seconds"] += began - queued
+            state.in_flight += 1
+            try:
+                response = await self._send(
+                    provider, client, state, model, messages, params, on_delta
+                )
+            except BaseException:
+                # Failed requests aren't billed, give the reservation back
+                state.budget.settle(reserved, 0)
+                raise
+            finally:
+                state.in_flight -= 1
+
+        latency = time.perf_counter() - began
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        used = prompt_tokens + completion_tokens if usage is not None else reserved
+        state.budget.settle(reserved, used)
+        state.stats["completed"] += 1
+        state.stats["prompt_tokens"] += prompt_tokens
+        state.stats["completion_tokens"] += completion_tokens
+        state.stats["latency_seconds"] += latency
+        state.stats["slowest_seconds"] = max(state.stats["slowest_seconds"], latency)
+        logger.info(
+            f"{model} completion took {latency:.2f}s "
+            f"({prompt_tokens} prompt + {completion_tokens} completion tokens)"
+        )
+        return response
+
+    async def _send(
+        self,
+        provider: str,
+        client: Any,
+        state: _ModelState,
+        model: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        on_delta: Optional[Callable[[str], Any]] = None,
+    ) -> Any:
+        """Send a request, retrying transient failures with backoff"""
+        breaker = self._breakers[provider]
+        attempts = self.max_retries + 1
+        for attempt in range(attempts):
+            if not breaker.allow_request():
+                state.error_types["CircuitOpen"] += 1
+                raise LLMUnavailableError(f"{provider} is unavailable (circuit open)")
+            # Only a half-open trial needs releasing if it ends without an outcome
+            trial = breaker.state == CircuitBreaker.HALF_OPEN
+            streamed: List[str] = []
+            try:
+                if on_delta is None:
+                    response = await client.chat.completions.create(
+                        model=model, messages=messages, **params
+                    )
+                else:
+                    response = await self._stream(
+                        client, model, messages, params, on_delta, streamed
+                    )
+            except Exception as e:
+                state.stats["errors"] += 1
+                state.error_types[type(e).__name__] += 1
+                if not _is_retryable(e):
+                    # The request itself is wrong, retrying won't help
+                    breaker.record_success()
+                    raise LLMGatewayError(f"{model} request failed: {e}") from e
+                status_code = getattr(e, "status_code", None)
+                # Rate limiting is not a sign of an unhealthy provider
+                if status_code != 429:
+                    breaker.record_failure()
+                # Text already passed on can't be taken back, so a stream
+                # that broke off isn't sent again
+                if (
+                    attempt + 1 >= attempts
+                    or breaker.state == CircuitBreaker.OPEN
+                    or streamed
+                ):
+                    raise LLMUnavailableError(f"{model} request failed: {e}") from e
+
+                headers = getattr(getattr(e, "response", None), "headers", None) or {}
+                retry_after = parse_retry_after(headers.get("retry-after"))
+                delay = (
+                    min(retry_after, settings.LLM_RETRY_AFTER_MAX_SECONDS)
+                    if retry_after is not None
+                    else backoff_delay(
+                        attempt, self.backoff_base, settings.LLM_BACKOFF_MAX_SECONDS
+                    )
+                )
+                error = e
+            else:
+                breaker.record_success()
+                return response
+            finally:
+                # Cancelled (e.g. the client went away) or rate limited
+                if trial:
+                    breaker.release()
+
+            state.stats["retries"] += 1
+            logger.info(
+                f"Retrying {model} request in {delay:.2f}s "
+                f"(attempt {attempt + 2}/{attempts}): {error}"
+            )
+            await asyncio.sleep(delay)
+
+    async def _stream(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        on_delta: Callable[[str], Any],
+        streamed: List[str],
+    ) -> Any:
+        """
+        Send a streamed request, passing on its text as it arrives
+
+        Returns:
+            A response shaped like a non-streamed one, with the whole text
+            and the token usage reported at the end of the stream
+        """
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params,
+        )
+        usage = None
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                for choice in chunk.choices or []:
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        streamed.append(delta)
+                        on_delta(delta)
+        finally:
+            # Release the connection when the caller stops listening early
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+        message = SimpleNamespace(content="".join(streamed))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)], usage=usage
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-model call metrics and per-provider state
+
+        Returns:
+            Dictionary with the models' latency, token, retry and error
+            counters and limits, the providers' circuit breakers and the
+            response cache counters
+        """
+        return {
+            "models": {
+                model: state.get_stats()
+                for model, state in sorted(self._models.items())
+            },
+            "providers": {
+                name: {
+                    "configured": bool(config.api_key) or name in self._clients,
+                    "client_open": name in self._clients,
+                    **self._breakers[name].get_stats(),
+                }
+                for name, config in self.providers.items()
+            },
+            "cache": self.cache.get_stats(),
+        }
+
+
+llm_gateway = LLMGateway()
@@ -1,12 +1,39 @@
+import asyncio
 import json
 import logging
 import os
+import re
+from datetime import date
 from typing import Any, Dict, List, Optional, Tuple
 
 # Remove the fitz import
 # import fitz  # PyMuPDF
 import tiktoken
 from app.core.config import settings
+from app.services.llm_gateway import llm_gateway
+from app.services.pdf_cache import statement_text_cache, stream_digest
+from app.services.pdf_extraction import PDFTooManyPagesError, pdf_extraction_engine
+from app.services.progress import (
+    COMPLETE,
+    IN_PROGRESS,
+    ProgressCallback,
+    field_reporter,
+    report_step,
+)
+from app.services.statement_chunks import (
+    merge_statement_analyses,
+    split_statement_text,
+)
+from app.services.statement_parser import (
+    project_month,
+    statement_parser,
+    summarize_transactions,
+)
+from app.services.statement_periods import (
+    Period,
+    months_covered,
+    statement_period,
+)
 from pypdf import PdfReader
 
 # Configure logging
@@ -26,43 +53,6 @@ if USE_MOCK_RESPONSES:
 else:
     logger.info("Mock responses are DISABLED. Will use real LLM APIs.")
 
-# Initialize OpenAI client
-openai_client = None
-try:
-    from openai import OpenAI
-
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if openai_api_key:
-        openai_client = OpenAI(api_key=openai_api_key)
-        logger.info("OpenAI client initialized successfully")
-    else:
-        logger.warning("OpenAI API key not found in environment variables")
-        if not USE_MOCK_RESPONSES:
-            logger.warning(
-                "Consider setting USE_MOCK_RESPONSES=true if you don't have an OpenAI API key"
-            )
-except ImportError:
-    logger.warning("OpenAI package not installed")
-    if not USE_MOCK_RESPONSES:
-        logger.warning(
-            "Consider setting USE_MOCK_RESPONSES=true if you don't have the OpenAI package installed"
-        )
-except Exception as e:
-    logger.error(f"Error initializing OpenAI client: {str(e)}")
-    if not USE_MOCK_RESPONSES:
-        logger.warning("Consider setting USE_MOCK_RESPONSES=true to bypass API issues")
-
-# Initialize DeepSeek client if available
-deepseek_available = False
-deepseek_client = None
-try:
-    from deepseek import DeepSeekChat
-
-    deepseek_available = True
-    logger.info("DeepSeek package available")
-except ImportError:
-    logger.warning("DeepSeek package not available. Will use OpenAI only.")
-
 # Default model to use
 DEFAULT_MODEL = "gpt-4o"
 logger.info(f"Using default model: {DEFAULT_MODEL}")
@@ -78,104 +68,305 @@ def num_tokens_from_string(string: str, model: str = DEFAULT_MODEL) -> int:
     return len(encoding.encode(string))
 
 
+class PDFTooLargeError(ValueError):
+    """Raised when an uploaded PDF is over STATEMENT_UPLOAD_MAX_BYTES"""
+
+
+def _checked_upload(pdf_file) -> Tuple[str, Any]:
+    """
+    Get the name and binary stream of an upload, checking its size
+
+    Raises:
+        PDFTooLargeError: If the file is over the upload size limit
+    """
+    filename = getattr(pdf_file, "filename", None) or "upload"
+    stream = getattr(pdf_file, "file", pdf_file)
+
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    if size > settings.STATEMENT_UPLOAD_MAX_BYTES:
+        raise PDFTooLargeError(
+            f"{filename} is {size} bytes, larger than the "
+            f"{settings.STATEMENT_UPLOAD_MAX_BYTES} byte limit"
+        )
+    return filename, stream
+
+
+def read_pdf_upload(pdf_file) -> Tuple[str, bytes]:
+    """
+    Read the name and contents of an uploaded PDF
+
+    Raises:
+        PDFTooLargeError: If the file is over the upload size limit
+    """
+    filename, stream = _checked_upload(pdf_file)
+    try:
+        return filename, stream.read()
+    finally:
+        stream.seek(0)
+
+
 def extract_text_from_pdf(pdf_file) -> str:
     """
     Extract text from a PDF file using PyPDF.
 
+    The reader works directly on the upload's spooled stream, so the bytes
+    are neither written out to another file nor copied in memory. Text of a
+    PDF that was extracted before is served from the statement text cache.
+
     Args:
-        pdf_file: PDF file object
+        pdf_file: PDF file object (an UploadFile or a binary file object)
 
     Returns:
         Extracted text as a string
+
+    Raises:
+        PDFTooLargeError: If the file is over the upload size limit
+        ValueError: If the PDF can't be read
     """
-    try:
-        # Save the uploaded file to a temporary location
-        temp_file_path = f"/tmp/{pdf_file.filename}"
-        with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(pdf_file.file.read())
+    filename, stream = _checked_upload(pdf_file)
 
-        # Reset file pointer
-        pdf_file.file.seek(0)
+    digest = stream_digest(stream)
+    cached = statement_text_cache.get(digest)
+    if cached is not None:
+        text = cached["text"]
+    else:
+        try:
+            stream.seek(0)
+            reader = PdfReader(stream)
 
-        # Extract text using PyPDF
-        reader = PdfReader(temp_file_path)
-        text = ""
+            # Extract text from each page
+            pages = [page.extract_text() for page in reader.pages]
+            text = "".join(page + "\n\n" for page in pages if page)
+        except Exception as e:
+            logger.error(f"Error extracting text from PDF: {str(e)}")
+            raise ValueError(f"Failed to extract text from PDF: {str(e)}")
+        finally:
+            # Leave the upload readable from the start for other consumers
+            stream.seek(0)
+        statement_text_cache.put(digest, text, len(pages))
 
-        # Extract text from each page
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n\n"
+    if not text.strip():
+        logger.warning(f"No text extracted from PDF: {filename}")
+        return "No text could be extracted from this PDF."
 
-        # Clean up the temporary file
-        os.remove(temp_file_path)
+    return text
 
-        if not text.strip():
-            logger.warning(f"No text extracted from PDF: {pdf_file.filename}")
-            return "No text could be extracted from this PDF."
 
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF: {str(e)}")
-        raise ValueError(f"Failed to extract text from PDF: {str(e)}")
+async def extract_text_from_pdf_async(pdf_file) -> str:
+    """
+    Extract text from a PDF file on the extraction worker pool
 
+    Same result as extract_text_from_pdf, without blocking the event loop.
 
-def analyze_statement_with_llm(text: str, model: str = DEFAULT_MODEL) -> Dict[str, Any]:
+    Raises:
+        PDFTooLargeError: If the file is over the upload size limit
+        PDFTooManyPagesError: If the file is over the page limit
+        ValueError: If the PDF can't be read
     """
-    Analyze bank statement text using an LLM (OpenAI or DeepSeek).
+    filename, content = read_pdf_upload(pdf_file)
+    result = await pdf_extraction_engine.extract(content, filename)
+    if not result["text"].strip():
+        logger.warning(f"No text extracted from PDF: {filename}")
+        return "No text could be extracted from this PDF."
+    return result["text"]
 
-    Returns a dictionary with analysis results including:
-    - totalIncome: float
-    - totalExpenses: float
-    - savingsRate: float
-    - topCategories: List[Dict[str, Any]]
-    - recommendations: List[str]
-    - traits: Dict[str, int]
-    - xpEarned: int
+
+def parse_llm_json(result_text: str) -> Dict[str, Any]:
     """
-    # Check if we should use a mock response for testing
-    if USE_MOCK_RESPONSES:
+    Parse the JSON object in an LLM response
+
+    Args:
+        result_text: Completion text, possibly with prose around the JSON
+
+    Returns:
+        The parsed object
+
+    Raises:
+        ValueError: If the response doesn't contain valid JSON
+    """
+    logger.info("Parsing JSON response")
+    # Extract JSON from the response (in case the LLM adds extra text)
+    json_match = re.search(r"({[\s\S]*})", result_text or "")
+    if not json_match:
+        logger.error(f"Could not extract JSON from response: {result_text}")
+        raise ValueError("Could not extract JSON from LLM response")
+    json_str = json_match.group(1)
+    try:
+        result = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing JSON: {str(e)}")
+        logger.error(f"JSON string: {json_str}")
+        raise ValueError("Invalid JSON response from LLM")
+    logger.info("Successfully parsed JSON response")
+    return result
+
+
+def _fallback_statement_analysis(error: Exception) -> Dict[str, Any]:
+    """Analysis returned when a statement couldn't be analyzed"""
+    return {
+        "totalIncome": 0.0,
+        "totalExpenses": 0.0,
+        "savingsRate": 0.0,
+        "topCategories": [],
+        "recommendations": [
+            f"Unable to analyze statement due to an error: {str(error)}"
+        ],
+        "traits": {"saver": 50, "investor": 50, "planner": 50, "knowledgeable": 50},
+        "xpEarned": 100,
+    }
+
+
+async def _analyze_parsed_statement(
+    transactions: List[Dict[str, Any]],
+    model: str,
+    use_cache: bool,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Analyze a statement from its parsed transactions
+
+    The figures are computed here; the LLM only gets a summary of them to
+    write recommendations and score traits from. If that fails the figures
+    are still returned, with neutral scores. The period the transactions
+    cover is returned as well.
+    """
+    summary = summarize_transactions(transactions)
+    figures = {
+        "totalIncome": summary["totalIncome"],
+        "totalExpenses": summary["totalExpenses"],
+        "savingsRate": summary["savingsRate"],
+        "topCategories": summary["topCategories"],
+    }
+    if progress is not None:
+        # The figures are known before the LLM has written anything
+        for name, value in figures.items():
+            progress("field", {"name": name, "value": value})
+
+    system_prompt = """
+    You are a financial analysis expert. You are given a summary of a bank statement computed from all of its transactions: total income and expenses, the savings rate, spending by category, the biggest merchants and the largest expenses. The figures are exact. Based on them, provide:
+
+    1. Financial recommendations based on spending patterns
+    2. Trait scores (0-100) for the following financial traits:
+       - Saver: How well the person saves money
+       - Investor: How well the person invests money
+       - Planner: How well the person plans their finances
+       - Knowledgeable: How financially knowledgeable the person appears to be
+    3. XP earned (between 100-1000) based on overall financial health
+
+    Return the results in a JSON format with the following structure:
+    {
+      "recommendations": [string],
+      "traits": {
+        "saver": int,
+        "investor": int,
+        "planner": int,
+        "knowledgeable": int
+      },
+      "xpEarned": int
+    }
+    """
+
+    user_prompt = (
+        "Here is the bank statement summary:\n\n"
+        f"{json.dumps(summary, separators=(',', ':'))}"
+    )
+
+    try:
         logger.info(
-            "Using mock response for statement analysis (USE_MOCK_RESPONSES is enabled)"
+            f"Sending summary of {len(transactions)} parsed transactions to {model}"
         )
-        # Return a realistic mock response for testing
-        return {
-            "totalIncome": 3500.00,
-            "totalExpenses": 2800.00,
-            "savingsRate": 20.0,
-            "topCategories": [
-                {"category": "Housing", "amount": 1200.00},
-                {"category": "Food", "amount": 600.00},
-                {"category": "Transportation", "amount": 400.00},
-                {"category": "Entertainment", "amount": 300.00},
-                {"category": "Utilities", "amount": 200.00},
+        advice = await llm_gateway.complete(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
             ],
+            parse=parse_llm_json,
+            use_cache=use_cache,
+            on_delta=field_reporter(progress) if progress else None,
+            temperature=0.2,
+            max_tokens=800,
+        )
+    except Exception as e:
+        logger.error(f"Error in LLM analysis of statement summary: {str(e)}")
+        advice = {
             "recommendations": [
-                "Consider reducing your dining out expenses by cooking more meals at home.",
-                "Your subscription services total $85/month. Review these for services you may not be using.",
-                "You could save approximately $120/month by refinancing your current loans.",
-                "Setting up automatic transfers to your savings account can help increase your savings rate.",
-            ],
-            "traits": {"saver": 65, "investor": 45, "planner": 70, "knowledgeable": 60},
-            "xpEarned": 350,
+                f"Unable to write recommendations due to an error: {str(e)}"
+            ]
         }
 
-    # Check if text is too long and truncate if necessary
-    token_count = num_tokens_from_string(text, model)
+    return {
+        **figures,
+        "recommendations": advice.get("recommendations") or [],
+        "traits": advice.get("traits")
+        or {"saver": 50, "investor": 50, "planner": 50, "knowledgeable": 50},
+        "xpEarned": advice.get("xpEarned", 100),
+        "periodStart": summary["periodStart"],
+        "periodEnd": summary["periodEnd"],
+    }
+
+
+def _statement_period(text: str, analysis: Dict[str, Any]) -> Optional[Period]:
+    """Period of a parsed statement's transactions, else its stated period"""
+    if analysis.get("periodStart") and analysis.get("periodEnd"):
+        return (
+            date.fromisoformat(analysis["periodStart"]),
+            date.fromisoformat(analysis["periodEnd"]),
+        )
+    return statement_period(text)
 
-    # Set max tokens based on model
-    if model == "gpt-4o" or model == "gpt-4-turbo":
-        max_tokens = 100000  # Higher limit for GPT-4o
-    else:
-        max_tokens = 15000  # Lower limit for other models like GPT-3.5
 
-    if token_count > max_tokens:
-        logger.warning(
-            f"Text too long ({token_count} tokens), truncating to {max_tokens} tokens"
+async def _request_statement_analysis(
+    text: str,
+    model: str,
+    use_cache: bool,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Analyze statement text with the LLM
+
+    Statements the local parser reads are summed up in code, and the LLM
+    only gets a summary. Others are sent in full, in concurrent parts if
+    they are long.
+
+    Raises:
+        LLMGatewayError: If a request failed
+        ValueError: If a response couldn't be parsed
+    """
+    report_step(progress, "parsing", IN_PROGRESS, "Reading your transactions...")
+    parsed = await asyncio.to_thread(statement_parser.parse, text)
+    report_step(
+        progress,
+        "parsing",
+        COMPLETE,
+        f"Read {len(parsed['transactions'])} transactions"
+        if parsed is not None
+        else "Statement layout not recognized, analyzing its text",
+    )
+    report_step(progress, "analyzing", IN_PROGRESS, "Analyzing your spending...")
+    if parsed is not None:
+        return await _analyze_parsed_statement(
+            parsed["transactions"], model, use_cache, progress
+        )
+
+    # Statements over the chunk budget are analyzed in parts, concurrently,
+    # rather than cut short (counting tokens of a long statement takes a
+    # while, so keep it off the event loop)
+    chunk_tokens = settings.STATEMENT_CHUNK_TOKENS
+    token_count = await asyncio.to_thread(num_tokens_from_string, text, model)
+    chunks = [text]
+    if token_count > chunk_tokens:
+        chunks = await asyncio.to_thread(
+            split_statement_text,
+            text,
+            chunk_tokens,
+            lambda chunk: num_tokens_from_string(chunk, model),
+        )
+        logger.info(
+            f"Statement is {token_count} tokens, analyzing it in "
+            f"{len(chunks)} parts of at most {chunk_tokens} tokens"
         )
-        # Simple truncation strategy - in production you'd want a more sophisticated approach
-        ratio = max_tokens / token_count
-        text = text[: int(len(text) * ratio)]
 
     # Prepare the prompt for the LLM
     system_prompt = """
@@ -217,101 +408,140 @@ def analyze_statement_with_llm(text: str, model: str = DEFAULT_MODEL) -> Dict[st
     Analyze the statement carefully and provide accurate numbers and helpful recommendations.
     """
 
-    user_prompt = f"Here is the bank statement text to analyze:\n\n{text}"
+    part_prompt = """
+    The text is one part of a longer statement that is analyzed in parts.
+    Only count the transactions in this part and leave out opening and
+    closing balances, as the totals and category amounts of all parts are
+    added up.
+    """
 
-    try:
-        # Use OpenAI API
-        if "gpt" in model.lower():
-            # Check if OpenAI client is available
-            if openai_client is None:
-                logger.error("OpenAI client is not available")
-                raise ValueError(
-                    "OpenAI client is not available. Please check your API key or enable mock responses."
-                )
+    async def analyze(user_prompt: str, part_of: int) -> Dict[str, Any]:
+        prompt = system_prompt + part_prompt if part_of > 1 else system_prompt
+        # Parts are merged once they are all in, so only a whole statement
+        # has fields to report as they are written
+        return await llm_gateway.complete(
+            model=model,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            parse=parse_llm_json,
+            use_cache=use_cache,
+            on_delta=field_reporter(progress) if progress and part_of == 1 else None,
+            temperature=0.2,
+            max_tokens=2000,
+        )
 
-            logger.info(f"Sending request to OpenAI with model: {model}")
-            response = openai_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.2,
-                max_tokens=2000,
-            )
-            result_text = response.choices[0].message.content
-            logger.info("Successfully received response from OpenAI")
-        else:
-            # DeepSeek model
-            if not deepseek_available:
-                logger.error("DeepSeek is not available")
-                raise ValueError(
-                    "DeepSeek is not available. Please use an OpenAI model or enable mock responses."
+    logger.info(f"Sending statement analysis request with model: {model}")
+    if len(chunks) == 1:
+        result = await analyze(
+            f"Here is the bank statement text to analyze:\n\n{text}", 1
+        )
+    else:
+        # A failed part fails the analysis, since its totals would be
+        # missing; the parts that did finish are cached for a retry
+        partials = await asyncio.gather(
+            *(
+                analyze(
+                    f"Here is part {number} of {len(chunks)} of the bank "
+                    f"statement text to analyze:\n\n{chunk}",
+                    len(chunks),
                 )
-
-            # Create a new DeepSeek client instance
-            deepseek_client = DeepSeekChat()
-
-            logger.info(f"Sending request to DeepSeek with model: {model}")
-            response = deepseek_client.chat(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.2,
-                max_tokens=2000,
+                for number, chunk in enumerate(chunks, start=1)
             )
-            result_text = response.choices[0].message.content
-            logger.info("Successfully received response from DeepSeek")
-
-        # Parse the JSON response
-        import json
-        import re
-
-        logger.info("Parsing JSON response")
-        # Extract JSON from the response (in case the LLM adds extra text)
-        json_match = re.search(r"({[\s\S]*})", result_text)
-        if json_match:
-            json_str = json_match.group(1)
-            try:
-                result = json.loads(json_str)
-                logger.info("Successfully parsed JSON response")
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON: {str(e)}")
-                logger.error(f"JSON string: {json_str}")
-                raise ValueError("Invalid JSON response from LLM")
-        else:
-            logger.error(f"Could not extract JSON from response: {result_text}")
-            raise ValueError("Could not extract JSON from LLM response")
+        )
+        result = merge_statement_analyses(
+            partials, weights=[len(chunk) for chunk in chunks]
+        )
+    logger.info(f"Successfully received statement analysis from {model}")
+    return result
 
-        return result
 
-    except Exception as e:
-        logger.error(f"Error in LLM analysis: {str(e)}")
-        # Return a fallback response
+async def analyze_statement_with_llm(
+    text: str,
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+    fallback: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Analyze bank statement text using an LLM (OpenAI or DeepSeek).
+
+    Statements over STATEMENT_CHUNK_TOKENS are split on page and transaction
+    boundaries, the parts are analyzed concurrently and their results added
+    up. Identical requests within the LLM cache TTL reuse the earlier
+    response unless use_cache is False. If the analysis fails, a placeholder
+    analysis with the error is returned, or the error is raised when
+    fallback is False. Processing steps and the fields of the analysis, as
+    they are written, are reported to progress if it is given.
+
+    Returns a dictionary with analysis results including:
+    - totalIncome: float
+    - totalExpenses: float
+    - savingsRate: float
+    - topCategories: List[Dict[str, Any]]
+    - recommendations: List[str]
+    - traits: Dict[str, int]
+    - xpEarned: int
+    """
+    # Check if we should use a mock response for testing
+    if USE_MOCK_RESPONSES:
+        logger.info(
+            "Using mock response for statement analysis (USE_MOCK_RESPONSES is enabled)"
+        )
+        # Return a realistic mock response for testing
         return {
-            "totalIncome": 0.0,
-            "totalExpenses": 0.0,
-            "savingsRate": 0.0,
-            "topCategories": [],
+            "totalIncome": 3500.00,
+            "totalExpenses": 2800.00,
+            "savingsRate": 20.0,
+            "topCategories": [
+                {"category": "Housing", "amount": 1200.00},
+                {"category": "Food", "amount": 600.00},
+                {"category": "Transportation", "amount": 400.00},
+                {"category": "Entertainment", "amount": 300.00},
+                {"category": "Utilities", "amount": 200.00},
+            ],
             "recommendations": [
-                f"Unable to analyze statement due to an error: {str(e)}"
+                "Consider reducing your dining out expenses by cooking more meals at home.",
+                "Your subscription services total $85/month. Review these for services you may not be using.",
+                "You could save approximately $120/month by refinancing your current loans.",
+                "Setting up automatic transfers to your savings account can help increase your savings rate.",
             ],
-            "traits": {"saver": 50, "investor": 50, "planner": 50, "knowledgeable": 50},
-            "xpEarned": 100,
+            "traits": {"saver": 65, "investor": 45, "planner": 70, "knowledgeable": 60},
+            "xpEarned": 350,
         }
 
-
-def process_pdf_statements(
-    pdf_files: List[Any], model: str = DEFAULT_MODEL
+    try:
+        result = await _request_statement_analysis(text, model, use_cache, progress)
+    except Exception as e:
+        logger.error(f"Error in LLM analysis: {str(e)}")
+        if not fallback:
+            raise
+        result = _fallback_statement_analysis(e)
+    report_step(progress, "analyzing", COMPLETE, "Analysis complete")
+    return result
+
+
+async def process_pdf_statements(
+    pdf_files: List[Any],
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None,
 ) -> Dict[str, Any]:
     """
     Process multiple PDF statements and return combined analysis.
 
+    Every statement is analyzed separately and concurrently, so each one's
+    result is cached on its own. The combined figures are added up in code
+    and, for multiple statements, averaged over the months the statements
+    cover, which are read from the dates in them.
+
     Args:
         pdf_files: List of PDF file objects
         model: The LLM model to use for analysis
+        use_cache: Whether a cached LLM response may be reused
+        progress: Called with processing steps, the fields of a single
+            statement's analysis and each of multiple statements' totals
 
     Returns:
         Dict with analysis results
@@ -342,60 +572,144 @@ def process_pdf_statements(
             "traits": {"saver": 65, "investor": 45, "planner": 70, "knowledgeable": 60},
             "xpEarned": 350,
             "numStatements": len(pdf_files),
+            "skippedFiles": [],
         }
 
-    all_text = ""
-    num_statements = len(pdf_files)
+    # Uploads that couldn't be extracted or analyzed, left out of the totals
+    skipped = []
 
-    # Extract text from all PDFs
-    for pdf_file in pdf_files:
-        try:
-            text = extract_text_from_pdf(pdf_file)
-            all_text += text + "\n\n--- NEW STATEMENT ---\n\n"
-        except Exception as e:
-            logger.error(f"Error processing PDF: {str(e)}")
+    # Extract text from all PDFs at once, spread across the worker pool
+    report_step(
+        progress, "extracting", IN_PROGRESS, "Extracting text from your statements..."
+    )
+    documents = [read_pdf_upload(pdf_file) for pdf_file in pdf_files]
+    results = await pdf_extraction_engine.extract_many(documents)
+    statements = []
+    for (filename, _), result in zip(documents, results):
+        if isinstance(result, PDFTooManyPagesError):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(f"Error processing PDF {filename}: {str(result)}")
+            skipped.append(filename)
             continue
+        text = result["text"]
+        if not text.strip():
+            text = "No text could be extracted from this PDF."
+        statements.append((filename, text))
 
-    if not all_text:
+    if not statements:
         raise ValueError("No text could be extracted from the provided PDFs")
+    report_step(
+        progress, "extracting", COMPLETE, f"Extracted {len(statements)} statements"
+    )
 
-    # Analyze the combined text
-    analysis_result = analyze_statement_with_llm(all_text, model)
+    # A single statement reports its own steps and fields as it goes;
+    # multiple statements report each one's totals once it is analyzed
+    single = len(statements) == 1
+    if not single:
+        report_step(
+            progress,
+            "analyzing",
+            IN_PROGRESS,
+            f"Analyzing {len(statements)} statements...",
+        )
 
-    # Add the number of statements to the result
-    analysis_result["numStatements"] = num_statements
+    async def analyze(filename: str, text: str) -> Dict[str, Any]:
+        analysis = await analyze_statement_with_llm(
+            text,
+            model,
+            use_cache,
+            fallback=False,
+            progress=progress if single else None,
+        )
+        if progress is not None and not single:
+            progress(
+                "statement",
+                {
+                    "filename": filename,
+                    "totalIncome": analysis.get("totalIncome", 0.0),
+                    "totalExpenses": analysis.get("totalExpenses", 0.0),
+                },
+            )
+        return analysis
 
-    # If we have multiple statements, adjust the income and expenses to be monthly averages
-    if num_statements > 1:
-        analysis_result["totalIncomeAllStatements"] = analysis_result["totalIncome"]
-        analysis_result["totalExpensesAllStatements"] = analysis_result["totalExpenses"]
+    # Each statement is analyzed on its own and concurrently, so a statement
+    # that was analyzed before is answered from the LLM cache
+    analyses = await asyncio.gather(
+        *(analyze(filename, text) for filename, text in statements),
+        return_exceptions=True,
+    )
+    if not single:
+        report_step(progress, "analyzing", COMPLETE, "Analysis complete")
+    periods = await asyncio.to_thread(
+        lambda: [
+            _statement_period(text, analysis)
+            if isinstance(analysis, dict)
+            else None
+            for (_, text), analysis in zip(statements, analyses)
+        ]
+    )
 
-        # Calculate monthly averages
-        analysis_result["totalIncome"] = analysis_result["totalIncome"] / num_statements
-        analysis_result["totalExpenses"] = (
-            analysis_result["totalExpenses"] / num_statements
+    analyzed = []
+    for (filename, text), period, analysis in zip(statements, periods, analyses):
+        if isinstance(analysis, Exception):
+            logger.error(f"Error analyzing statement {filename}: {str(analysis)}")
+            skipped.append(filename)
+            continue
+        if isinstance(analysis, BaseException):
+            raise analysis
+        analyzed.append((filename, text, period, analysis))
+
+    if not analyzed:
+        analysis_result = _fallback_statement_analysis(analyses[0])
+    elif len(analyzed) == 1:
+        analysis_result = analyzed[0][3]
+    else:
+        analysis_result = merge_statement_analyses(
+            [analysis for _, _, _, analysis in analyzed],
+            weights=[len(text) for _, text, _, _ in analyzed],
         )
 
-        # Recalculate savings rate based on monthly averages
-        if analysis_result["totalIncome"] > 0:
-            analysis_result["savingsRate"] = (
-                (analysis_result["totalIncome"] - analysis_result["totalExpenses"])
-                / analysis_result["totalIncome"]
-                * 100
-            )
-        else:
-            analysis_result["savingsRate"] = 0
-
-        # Adjust category spending to be monthly averages
+    # The statements the totals cover, and the uploads they leave out
+    analysis_result["numStatements"] = len(analyzed)
+    analysis_result["skippedFiles"] = skipped
+    analysis_result["statements"] = [
+        {
+            "filename": filename,
+            "periodStart": period[0].isoformat() if period else None,
+            "periodEnd": period[1].isoformat() if period else None,
+            "totalIncome": analysis.get("totalIncome", 0.0),
+            "totalExpenses": analysis.get("totalExpenses", 0.0),
+        }
+        for filename, _, period, analysis in analyzed
+    ]
+
+    # With multiple statements, turn the totals into monthly averages over
+    # the months the statements cover
+    if len(analyzed) > 1:
+        months = max(months_covered([period for _, _, period, _ in analyzed]), 1.0)
+        income = analysis_result["totalIncome"]
+        expenses = analysis_result["totalExpenses"]
+        analysis_result["totalIncomeAllStatements"] = income
+        analysis_result["totalExpensesAllStatements"] = expenses
+        analysis_result["monthsCovered"] = round(months, 2)
+
+        analysis_result["totalIncome"] = round(income / months, 2)
+        analysis_result["totalExpenses"] = round(expenses / months, 2)
+        analysis_result["savingsRate"] = (
+            (income - expenses) / income * 100 if income > 0 else 0.0
+        )
         for category in analysis_result.get("topCategories", []):
-            if "amount" in category:
-                category["amount"] = category["amount"] / num_statements
+            category["amount"] = round(category["amount"] / months, 2)
 
     return analysis_result
 
 
-def analyze_monthly_prediction(
-    current_month_pdf: Any, model: str = DEFAULT_MODEL
+async def analyze_monthly_prediction(
+    current_month_pdf: Any,
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None,
 ) -> Dict[str, Any]:
     """
     Analyze the current month's bank statement and provide spending predictions and savings advice.
@@ -403,6 +717,9 @@ def analyze_monthly_prediction(
     Args:
         current_month_pdf: PDF file object for the current month's statement
         model: The LLM model to use for analysis
+        use_cache: Whether a cached LLM response may be reused
+        progress: Called with processing steps and the prediction's fields
+            as they are worked out
 
     Returns:
         Dict with prediction results and savings advice
@@ -462,7 +779,13 @@ def analyze_monthly_prediction(
     # Extract text from the current month's PDF
     try:
         logger.info(f"Extracting text from PDF: {current_month_pdf.filename}")
-        current_month_text = extract_text_from_pdf(current_month_pdf)
+        report_step(
+            progress,
+            "extracting",
+            IN_PROGRESS,
+            "Extracting text from your statement...",
+        )
+        current_month_text = await extract_text_from_pdf_async(current_month_pdf)
 
         if current_month_text == "No text could be extracted from this PDF.":
             logger.error("No text could be extracted from the PDF")
@@ -473,6 +796,9 @@ def analyze_monthly_prediction(
         logger.info(
             f"Successfully extracted {len(current_month_text)} characters from PDF"
         )
+        report_step(progress, "extracting", COMPLETE, "Extracted your statement")
+    except (PDFTooLargeError, PDFTooManyPagesError):
+        raise
     except Exception as e:
         logger.error(f"Error processing current month PDF: {str(e)}")
         raise ValueError(
@@ -535,88 +861,100 @@ def analyze_monthly_prediction(
 
     user_prompt = f"Here is the bank statement for the current month. Please analyze it and provide spending predictions and savings advice:\n\n{current_month_text}"
 
+    # A statement the local parser reads is summed up and projected in code,
+    # and the LLM only gets a summary to write the advice from
+    report_step(progress, "parsing", IN_PROGRESS, "Reading your transactions...")
+    parsed = await asyncio.to_thread(statement_parser.parse, current_month_text)
+    report_step(
+        progress,
+        "parsing",
+        COMPLETE,
+        f"Read {len(parsed['transactions'])} transactions"
+        if parsed is not None
+        else "Statement layout not recognized, analyzing its text",
+    )
+    projection: Dict[str, Any] = {}
+    if parsed is not None:
+        summary = summarize_transactions(parsed["transactions"])
+        projection = project_month(summary)
+        if progress is not None:
+            for name, value in projection.items():
+                if value is not None:
+                    progress("field", {"name": name, "value": value})
+        system_prompt = """
+        You are a financial prediction expert. You are given a summary of the bank statement for the current month (which may be incomplete as the month is still ongoing), computed from all of its transactions, with the month's projected spending, savings rate and end balance. The figures are exact. Based on them, provide the following:
+
+        1. Comparison to previous months' average spending (if the summary allows it)
+        2. Identification of any unusual or one-time expenses this month
+        3. Categories where spending is higher than usual
+        4. Categories where the user could potentially save money
+        5. Specific, actionable advice for reducing expenses in the identified categories
+        6. Whether the user is on track to meet their financial goals
+        7. A savings opportunity score (0-100) indicating how much potential there is to save more
+
+        Return the results in a JSON format with the following structure:
+        {
+          "comparisonToPrevious": {
+            "difference": float,
+            "percentageChange": float,
+            "isHigher": boolean
+          },
+          "unusualExpenses": [
+            {
+              "category": string,
+              "amount": float,
+              "description": string
+            }
+          ],
+          "highSpendingCategories": [
+            {
+              "category": string,
+              "amount": float,
+              "percentageAboveNormal": float
+            }
+          ],
+          "savingsOpportunities": [
+            {
+              "category": string,
+              "potentialSavings": float,
+              "advice": string
+            }
+          ],
+          "onTrackForGoals": boolean,
+          "savingsOpportunityScore": int,
+          "overallAdvice": string
+        }
+        """
+        user_prompt = (
+            "Here is a summary of the bank statement for the current month:\n\n"
+            f"{json.dumps({**summary, **projection}, separators=(',', ':'))}"
+        )
+        logger.info(
+            f"Sending summary of {len(parsed['transactions'])} parsed transactions"
+        )
+
     # Call the LLM
+    report_step(progress, "analyzing", IN_PROGRESS, "Predicting your spending...")
     try:
-        if "gpt" in model.lower():
-            # OpenAI model
-            try:
-                # Check if OpenAI client is available
-                if openai_client is None:
-                    logger.error("OpenAI client is not available")
-                    raise ValueError(
-                        "OpenAI client is not available. Please check your API key or enable mock responses."
-                    )
-
-                logger.info(f"Sending request to OpenAI with model: {model}")
-                response = openai_client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    temperature=0.2,
-                    max_tokens=2000,
-                )
-
-                result_text = response.choices[0].message.content
-                logger.info("Successfully received response from OpenAI")
-            except ImportError:
-                logger.error("OpenAI package is not installed")
-                raise ValueError("OpenAI package is not installed")
-            except Exception as e:
-                logger.error(f"Error with OpenAI API: {str(e)}")
-                raise ValueError(f"Error with OpenAI API: {str(e)}")
-        else:
-            # DeepSeek model (or other models could be added here)
-            try:
-                if not deepseek_available:
-                    logger.error("DeepSeek is not available")
-                    raise ValueError(
-                        "DeepSeek is not available. Please use an OpenAI model or enable mock responses."
-                    )
-
-                # Create a new DeepSeek client instance
-                deepseek_client = DeepSeekChat()
-
-                logger.info(f"Sending request to DeepSeek with model: {model}")
-                response = deepseek_client.chat(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    temperature=0.2,
-                    max_tokens=2000,
-                )
-
-                result_text = response.choices[0].message.content
-                logger.info("Successfully received response from DeepSeek")
-            except ImportError:
-                logger.error("DeepSeek package is not installed")
-                raise ValueError("DeepSeek package is not installed")
-            except Exception as e:
-                logger.error(f"Error with DeepSeek API: {str(e)}")
-                raise ValueError(f"Error with DeepSeek API: {str(e)}")
-
-        # Parse the JSON response
-        import json
-        import re
-
-        logger.info("Parsing JSON response")
-        # Extract JSON from the response (in case the LLM adds extra text)
-        json_match = re.search(r"({[\s\S]*})", result_text)
-        if json_match:
-            json_str = json_match.group(1)
-            try:
-                result = json.loads(json_str)
-                logger.info("Successfully parsed JSON response")
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON: {str(e)}")
-                logger.error(f"JSON string: {json_str}")
-                raise ValueError("Invalid JSON response from LLM")
-        else:
-            logger.error(f"Could not extract JSON from response: {result_text}")
-            raise ValueError("Could not extract JSON from LLM response")
+        logger.info(f"Sending monthly prediction request with model: {model}")
+        result = await llm_gateway.complete(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            parse=parse_llm_json,
+            use_cache=use_cache,
+            on_delta=field_reporter(progress) if progress else None,
+            temperature=0.2,
+            max_tokens=2000,
+        )
+        logger.info(f"Successfully received monthly prediction from {model}")
+        report_step(progress, "analyzing", COMPLETE, "Prediction complete")
+        result.update(
+            {key: value for key, value in projection.items() if value is not None}
+        )
+        result.setdefault("projectedEndBalance", 0.0)
 
         # Add XP earned based on the savings opportunity score
         result["xpEarned"] = min(
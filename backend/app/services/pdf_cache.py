@@ -0,0 +1,156 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+import pypdf
+from app.core.config import settings
+from app.services.disk_cache import DiskCacheTier
+
+# Entries are only valid for the extractor that produced them
+CACHE_VERSION = f"v1-pypdf-{pypdf.__version__}"
+
+
+def content_digest(content: bytes) -> str:
+    """SHA-256 hex digest of a PDF's bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def stream_digest(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a binary stream, read in chunks from the start"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class StatementTextCache:
+    """
+    Content-addressed cache of extracted statement text.
+
+    Entries are keyed by the SHA-256 of the PDF bytes, so re-uploading the
+    same statement under any name skips parsing it again. Recently used
+    entries are kept in an in-memory LRU tier capped by size. Behind it, an
+    on-disk tier is shared by every worker process on the host: files are
+    written atomically, so workers never read a partial entry, and the oldest
+    are pruned once the tier is over its size limit. Statements are
+    sensitive, so cache files are only readable by the app's user.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: Optional[int] = None,
+        directory: Optional[str] = None,
+        disk_bytes: Optional[int] = None,
+    ):
+        self.memory_bytes = (
+            settings.PDF_TEXT_CACHE_MEMORY_BYTES
+            if memory_bytes is None
+            else memory_bytes
+        )
+        self.disk = DiskCacheTier(
+            settings.PDF_TEXT_CACHE_DIR if directory is None else directory,
+            CACHE_VERSION,
+            settings.PDF_TEXT_CACHE_DISK_BYTES if disk_bytes is None else disk_bytes,
+            fields=("text", "pages"),
+            description="statement cache",
+        )
+        # digest -> (text, pages, size in bytes)
+        self._memory: "OrderedDict[str, Tuple[str, int, int]]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+        }
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the extracted text of a PDF
+
+        Args:
+            digest: SHA-256 hex digest of the PDF bytes
+
+        Returns:
+            Dictionary with the text and page count, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                self._memory.move_to_end(digest)
+                self._stats["memory_hits"] += 1
+                return {"text": entry[0], "pages": entry[1]}
+
+        entry = self.disk.read(digest)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(digest, entry["text"], entry["pages"])
+            return {"text": entry["text"], "pages": entry["pages"]}
+
+    def put(self, digest: str, text: str, pages: int) -> None:
+        """
+        Store the extracted text of a PDF in both tiers
+
+        Args:
+            digest: SHA-256 hex digest of the PDF bytes
+            text: Extracted text
+            pages: Page count
+        """
+        with self._lock:
+            self._stats["stores"] += 1
+            self._remember(digest, text, pages)
+        self.disk.write(digest, {"text": text, "pages": pages})
+
+    def _remember(self, digest: str, text: str, pages: int) -> None:
+        size = len(text.encode())
+        if size > self.memory_bytes:
+            return
+        previous = self._memory.pop(digest, None)
+        if previous is not None:
+            self._memory_size -= previous[2]
+        self._memory[digest] = (text, pages, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (_, _, evicted) = self._memory.popitem(last=False)
+            self._memory_size -= evicted
+            self._stats["memory_evictions"] += 1
+
+    def prune_disk(self) -> int:
+        """
+        Delete the least recently used disk entries until the tier fits
+
+        Returns:
+            Number of entries deleted
+        """
+        return self.disk.prune()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit, miss and size counters of both tiers"""
+        with self._lock:
+            lookups = (
+                self._stats["memory_hits"]
+                + self._stats["disk_hits"]
+                + self._stats["misses"]
+            )
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "memory_limit_bytes": self.memory_bytes,
+                "disk_enabled": self.disk.enabled,
+                "disk_limit_bytes": self.disk.max_bytes,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "disk_evictions": self.disk.evictions,
+                **self._stats,
+            }
+
+
+statement_text_cache = StatementTextCache()
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.pdf_cache import (
+    StatementTextCache,
+    content_digest,
+    statement_text_cache,
+)
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+class PDFTooManyPagesError(ValueError):
+    """Raised when a PDF has more pages than PDF_MAX_PAGES"""
+
+
+def count_pages(content: bytes) -> int:
+    """Count the pages of a PDF (runs in a worker process)"""
+    return len(PdfReader(BytesIO(content)).pages)
+
+
+def extract_page_range(
+    content: bytes, start: int, stop: int
+) -> List[Tuple[str, float]]:
+    """
+    Extract the text of a range of pages (runs in a worker process)
+
+    Args:
+        content: PDF file contents
+        start: First page index
+        stop: Page index to stop before
+
+    Returns:
+        (text, seconds taken) of every page in the range
+    """
+    reader = PdfReader(BytesIO(content))
+    results = []
+    for index in range(start, stop):
+        began = time.perf_counter()
+        text = reader.pages[index].extract_text() or ""
+        results.append((text, time.perf_counter() - began))
+    return results
+
+
+class PDFExtractionEngine:
+    """
+    Extracts PDF text on a pool of worker processes.
+
+    pypdf's text extraction is pure Python and CPU bound, so on the event loop
+    it blocks every other request, and threads can't run it in parallel.
+    Each document is split into page ranges that are extracted across the
+    pool, together with the ranges of any other documents in the request,
+    and the pages are joined back in order. The pool is started and shut down
+    with the app, and started on first use elsewhere (scripts and tests).
+    Documents already in the statement text cache skip the pool entirely.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        pages_per_task: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        cache: Optional[StatementTextCache] = statement_text_cache,
+    ):
+        self.max_workers = (
+            max_workers or settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        )
+        self.pages_per_task = pages_per_task or settings.PDF_EXTRACTION_PAGES_PER_TASK
+        self.max_pages = max_pages or settings.PDF_MAX_PAGES
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats = {
+            "documents_extracted": 0,
+            "pages_extracted": 0,
+            "page_seconds": 0.0,
+            "slowest_page_seconds": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def startup(self) -> None:
+        """Start the worker pool"""
+        self._get_executor()
+        logger.info(f"PDF extraction pool started with {self.max_workers} workers")
+
+    async def aclose(self) -> None:
+        """Shut down the worker pool, cancelling queued work"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool as e:
+            # A crashed worker breaks the whole pool, so start a fresh one
+            self._executor = None
+            raise ValueError("PDF extraction worker stopped unexpectedly") from e
+
+    async def extract(self, content: bytes, name: str = "document") -> Dict[str, Any]:
+        """
+        Extract the text of a PDF
+
+        Args:
+            content: PDF file contents
+            name: Name used in errors and logs
+
+        Returns:
+            Dictionary with the text (pages in order, separated by blank
+            lines), the page count, the seconds each page took (none when the
+            text was cached), the wall time of the whole extraction and
+            whether it came from the cache
+
+        Raises:
+            PDFTooManyPagesError: If the PDF has more than max_pages pages
+            ValueError: If the PDF can't be read
+        """
+        began = time.perf_counter()
+        digest = None
+        if self.cache is not None:
+            # Hashing and the disk tier release the GIL, so keep them off the loop
+            digest = await asyncio.to_thread(content_digest, content)
+            cached = await asyncio.to_thread(self.cache.get, digest)
+            if cached is not None:
+                self._check_pages(name, cached["pages"])
+                return {
+                    **cached,
+                    "page_seconds": [],
+                    "seconds": time.perf_counter() - began,
+                    "cached": True,
+                }
+
+        try:
+            pages = await self._run(count_pages, content)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Failed to read {name}: {str(e)}") from e
+        self._check_pages(name, pages)
+
+        ranges = [
+            (start, min(start + self.pages_per_task, pages))
+            for start in range(0, pages, self.pages_per_task)
+        ]
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._run(extract_page_range, content, start, stop)
+                    for start, stop in ranges
+                )
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Failed to extract text from {name}: {str(e)}") from e
+
+        extracted = [page for result in results for page in result]
+        page_seconds = [seconds for _, seconds in extracted]
+        text = "".join(page + "\n\n" for page, _ in extracted if page)
+
+        if digest is not None:
+            await asyncio.to_thread(self.cache.put, digest, text, pages)
+
+        self._stats["documents_extracted"] += 1
+        self._stats["pages_extracted"] += pages
+        self._stats["page_seconds"] += sum(page_seconds)
+        self._stats["slowest_page_seconds"] = max(
+            [self._stats["slowest_page_seconds"], *page_seconds]
+        )
+        seconds = time.perf_counter() - began
+        logger.info(
+            f"Extracted {pages} pages of {name} in {seconds:.2f}s "
+            f"({sum(page_seconds):.2f}s of page work)"
+        )
+        return {
+            "text": text,
+            "pages": pages,
+            "page_seconds": page_seconds,
+            "seconds": seconds,
+            "cached": False,
+        }
+
+    def _check_pages(self, name: str, pages: int) -> None:
+        if pages > self.max_pages:
+            raise PDFTooManyPagesError(
+                f"{name} has {pages} pages, more than the {self.max_pages} page limit"
+            )
+
+    async def extract_many(
+        self, documents: Sequence[Tuple[str, bytes]]
+    ) -> List[Any]:
+        """
+        Extract several PDFs at once, sharing the pool between them
+
+        Args:
+            documents: (name, contents) of each PDF
+
+        Returns:
+            Extraction result or exception of each document, in input order
+        """
+        return await asyncio.gather(
+            *(self.extract(content, name) for name, content in documents),
+            return_exceptions=True,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool size and extraction counters"""
+        return {
+            "workers": self.max_workers,
+            "running": self._executor is not None,
+            **self._stats,
+        }
+
+
+pdf_extraction_engine = PDFExtractionEngine()
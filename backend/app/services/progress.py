@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Called with an event name and its data, e.g. to stream them to the client
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+# Processing step states, as in the processingSteps of coach responses
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+COMPLETE = "complete"
+
+# Start of the next "name": in a JSON object, after the previous value
+_FIELD_NAME = re.compile(r'\s*,?\s*("(?:[^"\\]|\\.)*")\s*:\s*')
+
+
+class JSONFieldReader:
+    """
+    Reads the top-level fields of a JSON object while its text streams in
+
+    Each field is returned once its value is complete, so clients can show
+    parts of an LLM's JSON answer before the rest of it has been written.
+    Text before the object, such as a code fence, is skipped.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._position: Optional[int] = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        """
+        Add the next piece of text
+
+        Args:
+            delta: Text following what was fed before
+
+        Returns:
+            (name, value) of the fields completed by this piece
+        """
+        self._text += delta
+        if self._position is None:
+            start = self._text.find("{")
+            if start < 0:
+                return []
+            self._position = start + 1
+
+        fields = []
+        while True:
+            match = _FIELD_NAME.match(self._text, self._position)
+            if not match:
+                break
+            try:
+                value, end = self._decoder.raw_decode(self._text, match.end())
+            except ValueError:
+                break
+            # A number at the very end may go on in the next piece
+            if end >= len(self._text):
+                break
+            fields.append((json.loads(match.group(1)), value))
+            self._position = end
+        return fields
+
+
+def report_step(
+    progress: Optional[ProgressCallback], step_id: str, status: str, message: str
+) -> None:
+    """Report a processing step, shaped like an entry of processingSteps"""
+    if progress is not None:
+        progress("step", {"id": step_id, "status": status, "message": message})
+
+
+def token_reporter(progress: ProgressCallback) -> Callable[[str], None]:
+    """Completion text callback reporting each piece as a token event"""
+    return lambda delta: progress("token", {"text": delta})
+
+
+def field_reporter(progress: ProgressCallback) -> Callable[[str], None]:
+    """Completion text callback reporting the JSON fields it completes"""
+    reader = JSONFieldReader()
+
+    def report(delta: str) -> None:
+        for name, value in reader.feed(delta):
+            progress("field", {"name": name, "value": value})
+
+    return report
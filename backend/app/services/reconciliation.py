@@ -0,0 +1,410 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from app.core.config import settings
+from app.models.transaction import Transaction
+from app.services.recurring import normalize_merchant
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+BOOKED = "booked"
+
+# (account, merchant key, amount, day ordinal, status, provider reference)
+TransactionFields = Tuple[
+    Optional[str], str, float, Optional[int], str, Optional[str]
+]
+
+
+def transaction_status(transaction: Dict[str, Any]) -> str:
+    """Get whether a provider transaction is "pending" or "booked" """
+    meta = transaction.get("meta") or {}
+    status = transaction.get("status") or meta.get("status") or ""
+    return PENDING if str(status).lower() == PENDING else BOOKED
+
+
+def provider_fields(transaction: Dict[str, Any]) -> TransactionFields:
+    """Extract the reconciliation fields of a transaction in the provider shape"""
+    timestamp = str(transaction.get("timestamp") or "")[:10]
+    return (
+        transaction.get("account_id"),
+        normalize_merchant(
+            transaction.get("description") or "", transaction.get("merchant_name")
+        ),
+        float(transaction.get("amount") or 0.0),
+        date.fromisoformat(timestamp).toordinal() if timestamp else None,
+        transaction_status(transaction),
+        (transaction.get("meta") or {}).get("provider_transaction_id"),
+    )
+
+
+def row_fields(row: Transaction) -> TransactionFields:
+    """Extract the reconciliation fields of a stored transaction"""
+    return (
+        row.account_id,
+        row.merchant_key or "",
+        row.amount or 0.0,
+        row.transaction_date.toordinal() if row.transaction_date else None,
+        row.status or BOOKED,
+        (row.meta or {}).get("provider_transaction_id"),
+    )
+
+
+class _Entry:
+    """A transaction with the fields it is reconciled on"""
+
+    __slots__ = ("item", "account", "merchant", "amount", "day", "status", "reference")
+
+    def __init__(self, item: Any, fields: TransactionFields):
+        self.item = item
+        (
+            self.account,
+            self.merchant,
+            self.amount,
+            self.day,
+            self.status,
+            self.reference,
+        ) = fields
+
+
+class FingerprintIndex:
+    """
+    Hash index of transactions for constant-time match lookups
+
+    Transactions are bucketed by (account, merchant, direction, amount band,
+    day). Amount bands are logarithmic and as wide as the amount tolerance, so
+    any amount within tolerance lands in the same or a neighbouring band, and
+    a lookup probes a fixed 3 x (2 x window + 1) buckets however many
+    transactions are indexed.
+    """
+
+    def __init__(self, window_days: int, tolerance: float):
+        self.window_days = window_days
+        self.tolerance = tolerance
+        self._buckets: Dict[Hashable, List[_Entry]] = defaultdict(list)
+        self._keys_by_day: Dict[int, Set[Hashable]] = defaultdict(set)
+
+    def _band(self, amount: float) -> int:
+        size = abs(amount)
+        if self.tolerance <= 0 or size < 0.01:
+            return round(size * 100)
+        return math.floor(math.log(size) / math.log1p(self.tolerance))
+
+    def _key(self, entry: _Entry, band: int, day: int) -> Hashable:
+        direction = (entry.amount > 0) - (entry.amount < 0)
+        return (entry.account, entry.merchant, direction, band, day)
+
+    def _within_tolerance(self, a: float, b: float) -> bool:
+        small, large = sorted((abs(a), abs(b)))
+        return large - small <= small * self.tolerance + 0.005
+
+    def add(self, entry: _Entry) -> None:
+        key = self._key(entry, self._band(entry.amount), entry.day)
+        self._buckets[key].append(entry)
+        self._keys_by_day[entry.day].add(key)
+
+    def remove(self, entry: _Entry) -> None:
+        key = self._key(entry, self._band(entry.amount), entry.day)
+        bucket = self._buckets.get(key)
+        # Entries may already have been evicted or matched
+        if bucket and entry in bucket:
+            bucket.remove(entry)
+
+    def find(self, entry: _Entry) -> Optional[_Entry]:
+        """
+        Find the closest indexed transaction matching an entry
+
+        Matches have the same account, merchant and direction, an amount
+        within tolerance and a date within the window. The nearest date wins,
+        then the nearest amount.
+        """
+        band = self._band(entry.amount)
+        best, best_rank = None, None
+        window = range(entry.day - self.window_days, entry.day + self.window_days + 1)
+        for day in window:
+            for candidate_band in (band - 1, band, band + 1):
+                bucket = self._buckets.get(self._key(entry, candidate_band, day))
+                for candidate in bucket or ():
+                    if not self._within_tolerance(candidate.amount, entry.amount):
+                        continue
+                    rank = (
+                        abs(candidate.day - entry.day),
+                        abs(candidate.amount - entry.amount),
+                    )
+                    if best_rank is None or rank < best_rank:
+                        best, best_rank = candidate, rank
+        return best
+
+    def evict_before(self, day: int) -> None:
+        """Drop every transaction dated before a day"""
+        for old_day in [d for d in self._keys_by_day if d < day]:
+            for key in self._keys_by_day.pop(old_day):
+                self._buckets.pop(key, None)
+
+
+class ReconciliationPass:
+    """
+    Matching state of one reconciliation run
+
+    A settled transaction supersedes at most one pending transaction, and a
+    transaction repeating an earlier one's provider reference (the bank's own
+    id, which survives provider id changes) is a repeat of it. Unmatched
+    pending and settled transactions are kept in separate indexes, so each
+    transaction costs a constant number of lookups. References are kept for
+    the same window as the indexes, so all of them can be evicted together.
+    """
+
+    def __init__(
+        self, window_days: Optional[int] = None, tolerance: Optional[float] = None
+    ):
+        window_days = (
+            settings.TRANSACTION_RECONCILE_WINDOW_DAYS
+            if window_days is None
+            else window_days
+        )
+        tolerance = (
+            settings.TRANSACTION_RECONCILE_AMOUNT_TOLERANCE
+            if tolerance is None
+            else tolerance
+        )
+        self.window_days = window_days
+        self._pending = FingerprintIndex(window_days, tolerance)
+        self._booked = FingerprintIndex(window_days, tolerance)
+        self._references: Dict[Tuple[Optional[str], str], _Entry] = {}
+        self._references_by_day: Dict[int, Set[Tuple[Optional[str], str]]] = (
+            defaultdict(set)
+        )
+
+    def _remember_reference(self, key: Tuple[Optional[str], str], entry: _Entry):
+        self._references[key] = entry
+        self._references_by_day[entry.day].add(key)
+
+    def add(self, entry: _Entry, matched: bool = False) -> None:
+        """
+        Index an already reconciled transaction without matching it
+
+        Args:
+            entry: Transaction to index
+            matched: Whether it already superseded a pending transaction
+        """
+        key = (entry.account, entry.reference)
+        if entry.reference and key not in self._references:
+            self._remember_reference(key, entry)
+        if entry.status == PENDING:
+            self._pending.add(entry)
+        elif not matched:
+            self._booked.add(entry)
+
+    def match(self, entry: _Entry) -> Optional[Tuple[_Entry, _Entry]]:
+        """
+        Reconcile a transaction against everything seen so far
+
+        Returns:
+            (duplicate, kept) if the transaction or an earlier one is now
+            redundant, otherwise None
+        """
+        if entry.reference:
+            key = (entry.account, entry.reference)
+            original = self._references.get(key)
+            if original is None:
+                self._remember_reference(key, entry)
+            elif original.status == PENDING and entry.status == BOOKED:
+                # The settled version of a pending transaction with the same id
+                self._remember_reference(key, entry)
+                self._pending.remove(original)
+                return original, entry
+            else:
+                return entry, original
+
+        if entry.status == PENDING:
+            settled = self._booked.find(entry)
+            if settled is not None:
+                self._booked.remove(settled)
+                return entry, settled
+            self._pending.add(entry)
+            return None
+
+        pending = self._pending.find(entry)
+        if pending is not None:
+            self._pending.remove(pending)
+            return pending, entry
+        self._booked.add(entry)
+        return None
+
+    def evict_before(self, day: int) -> None:
+        """Forget transactions too old to match anything dated from a day on"""
+        self._pending.evict_before(day)
+        self._booked.evict_before(day)
+        for old_day in [d for d in self._references_by_day if d < day]:
+            for key in self._references_by_day.pop(old_day):
+                # A settled version may have replaced it under a later day
+                entry = self._references.get(key)
+                if entry is not None and entry.day < day:
+                    del self._references[key]
+
+
+class TransactionReconciler:
+    """
+    Removes double counting from transaction feeds.
+
+    Providers first report a card payment as pending and later as settled,
+    with a new id and sometimes a different amount, and overlapping syncs
+    can return a transaction again under a new id. Stored duplicates are
+    kept but point at the transaction that replaced them through
+    duplicate_of, and are left out of queries, series and totals.
+    """
+
+    def reconcile_transactions(
+        self,
+        transactions: List[Dict[str, Any]],
+        fields: Callable[[Dict[str, Any]], TransactionFields] = provider_fields,
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop superseded pending transactions and repeats from a list
+
+        Args:
+            transactions: Transactions to reconcile
+            fields: Function extracting the reconciliation fields of one
+
+        Returns:
+            The remaining transactions, in input order
+        """
+        run = ReconciliationPass()
+        duplicates = set()
+        for transaction in transactions:
+            entry = _Entry(transaction, fields(transaction))
+            if entry.day is None:
+                continue
+            result = run.match(entry)
+            if result is not None:
+                duplicates.add(id(result[0].item))
+        if not duplicates:
+            return transactions
+        return [t for t in transactions if id(t) not in duplicates]
+
+    def reconcile_rows(
+        self, db: Session, account_id: str, rows: Iterable[Transaction]
+    ) -> int:
+        """
+        Reconcile newly stored transactions against the account's history
+
+        Only stored transactions close enough in time to match the new ones
+        are loaded, so the cost depends on the size of the batch rather than
+        of the history.
+
+        Args:
+            db: Database session
+            account_id: Account the transactions belong to
+            rows: New or updated transactions of the account
+
+        Returns:
+            Number of transactions marked as duplicates
+        """
+        batch = [
+            row
+            for row in rows
+            if row.transaction_date is not None and row.duplicate_of is None
+        ]
+        if not batch:
+            return 0
+
+        run = ReconciliationPass()
+        # A pending transaction can be matched up to a window on either side,
+        # and what it was matched with up to another window further out
+        margin = timedelta(days=2 * run.window_days)
+        dates = [row.transaction_date for row in batch]
+        stored = (
+            db.query(Transaction)
+            .filter(
+                Transaction.account_id == account_id,
+                Transaction.transaction_date >= min(dates) - margin,
+                Transaction.transaction_date <= max(dates) + margin,
+            )
+            .all()
+        )
+        consumed = {row.duplicate_of for row in stored if row.duplicate_of}
+        batch_rows = {id(row) for row in batch}
+        for row in sorted(stored, key=lambda r: r.transaction_date):
+            if row.duplicate_of is None and id(row) not in batch_rows:
+                run.add(
+                    _Entry(row, row_fields(row)),
+                    matched=row.transaction_id in consumed,
+                )
+
+        duplicates = 0
+        for row in sorted(batch, key=lambda r: r.transaction_date):
+            entry = _Entry(row, row_fields(row))
+            if row.transaction_id in consumed:
+                run.add(entry, matched=True)
+                continue
+            result = run.match(entry)
+            if result is not None:
+                duplicate, kept = result
+                duplicate.item.duplicate_of = kept.item.transaction_id
+                duplicates += 1
+        return duplicates
+
+    def reconcile_account(self, db: Session, account_id: str) -> Dict[str, int]:
+        """
+        Re-reconcile an account's whole stored history in a single pass
+
+        Earlier matches are cleared and the history is streamed oldest first.
+        Transactions that are too old to match the current one are evicted
+        from the index as the pass goes, so it only ever holds a window's
+        worth of them.
+
+        Args:
+            db: Database session
+            account_id: Account to reconcile
+
+        Returns:
+            Number of transactions scanned and marked as duplicates
+        """
+        db.query(Transaction).filter(Transaction.account_id == account_id).update(
+            {Transaction.duplicate_of: None}, synchronize_session=False
+        )
+
+        run = ReconciliationPass()
+        scanned = duplicates = 0
+        rows = (
+            db.query(Transaction)
+            .populate_existing()
+            .filter(
+                Transaction.account_id == account_id,
+                Transaction.transaction_date.isnot(None),
+            )
+            .order_by(Transaction.transaction_date, Transaction.id)
+            .yield_per(1000)
+        )
+        for row in rows:
+            entry = _Entry(row, row_fields(row))
+            run.evict_before(entry.day - run.window_days)
+            scanned += 1
+            result = run.match(entry)
+            if result is not None:
+                duplicate, kept = result
+                duplicate.item.duplicate_of = kept.item.transaction_id
+                duplicates += 1
+
+        logger.info(
+            f"Reconciled account {account_id}: {scanned} transactions, "
+            f"{duplicates} duplicates"
+        )
+        return {"transactions": scanned, "duplicates": duplicates}
+
+
+transaction_reconciler = TransactionReconciler()
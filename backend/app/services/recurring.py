@@ -0,0 +1,258 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+# Tokens banks put in front of, or around, the merchant name
+_DESCRIPTOR_PREFIXES = {
+    "card",
+    "payment",
+    "payments",
+    "to",
+    "dd",
+    "direct",
+    "debit",
+    "pos",
+    "purchase",
+    "contactless",
+    "visa",
+    "mastercard",
+    "paypal",
+    "sumup",
+    "sq",
+}
+_DESCRIPTOR_NOISE = {"www", "ref", "ltd", "limited", "inc", "gb", "uk", "eu", "it"}
+_DOMAIN_SUFFIX = re.compile(r"\.(com|co\.uk|co|net|org|io|tv|it|eu|uk)\b")
+_REFERENCE = re.compile(r"\S*\d\S*")
+_PUNCTUATION = re.compile(r"[^a-z ]+")
+
+# Median interval ranges (in days) for each billing frequency
+FREQUENCY_RANGES = [
+    ("weekly", 6, 8),
+    ("bi-weekly", 13, 16),
+    ("monthly", 26, 35),
+    ("quarterly", 85, 95),
+    ("yearly", 350, 380),
+]
+
+
+@lru_cache(maxsize=65536)
+def normalize_merchant(description: str, merchant_name: Optional[str] = None) -> str:
+    """
+    Reduce a transaction descriptor to a stable merchant key
+
+    Strips domains, reference numbers, punctuation and payment-method
+    prefixes, so "NETFLIX.COM 1234", "Netflix" and "PAYPAL *NETFLIX" all map
+    to "netflix".
+
+    Args:
+        description: Raw transaction description
+        merchant_name: Optional merchant name supplied by the provider
+
+    Returns:
+        Normalized merchant key
+    """
+    text = (merchant_name or description or "").lower()
+    text = _DOMAIN_SUFFIX.sub(" ", text)
+    text = _REFERENCE.sub(" ", text)
+    text = _PUNCTUATION.sub(" ", text)
+
+    tokens = [
+        token
+        for token in text.split()
+        if len(token) > 1 and token not in _DESCRIPTOR_NOISE
+    ]
+    # Drop leading payment-method words but never the last remaining token
+    while len(tokens) > 1 and tokens[0] in _DESCRIPTOR_PREFIXES:
+        tokens.pop(0)
+
+    key = " ".join(tokens[:2])
+    return key or (description or "").lower().strip()
+
+
+def classify_frequency(interval_days: float) -> str:
+    """Map a median payment interval to a billing frequency"""
+    for frequency, low, high in FREQUENCY_RANGES:
+        if low <= interval_days <= high:
+            return frequency
+    return "unknown"
+
+
+class RecurringPaymentEngine:
+    """
+    Detects recurring payments with vectorized NumPy grouping.
+
+    Outgoing payments are grouped by normalized merchant, then split into
+    amount bands: sorted amounts stay in one band while each is within
+    amount_tolerance of the previous one, so gradual price changes stay in
+    the same series. Each band's cadence is the median interval between
+    payments, which a single missed or late payment does not skew.
+    Confidence is the share of intervals that are close to a whole multiple
+    of the median. Bands repeating more often than min_interval_days are
+    everyday spending rather than subscriptions and are dropped. All
+    grouping and statistics are done with sorts and bincounts, so detection
+    runs in O(n log n).
+    """
+
+    def __init__(
+        self,
+        amount_tolerance: float = 0.25,
+        cadence_tolerance: float = 0.2,
+        min_occurrences: int = 2,
+        min_interval_days: float = 5.0,
+    ):
+        self.amount_tolerance = amount_tolerance
+        self.cadence_tolerance = cadence_tolerance
+        self.min_occurrences = min_occurrences
+        self.min_interval_days = min_interval_days
+
+    def detect(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Detect recurring payments in one user's transactions
+
+        Args:
+            transactions: Transactions in the provider's response shape
+
+        Returns:
+            List of recurring payment series
+        """
+        return self.detect_batch({None: transactions})[None]
+
+    def detect_batch(
+        self, transactions_by_owner: Dict[Hashable, List[Dict[str, Any]]]
+    ) -> Dict[Hashable, List[Dict[str, Any]]]:
+        """
+        Detect recurring payments for many users in one vectorized pass
+
+        Args:
+            transactions_by_owner: Transactions keyed by user (or account)
+
+        Returns:
+            Recurring payment series keyed by the same owners
+        """
+        results: Dict[Hashable, List[Dict[str, Any]]] = {
+            owner: [] for owner in transactions_by_owner
+        }
+
+        owners = list(transactions_by_owner)
+        rows: List[Dict[str, Any]] = []
+        owner_ids: List[int] = []
+        for owner_id, owner in enumerate(owners):
+            # Only outgoing payments can be subscriptions
+            selected = [
+                t
+                for t in transactions_by_owner[owner]
+                if t.get("description")
+                and (t.get("amount") or 0) < 0
+                and t.get("timestamp")
+            ]
+            rows.extend(selected)
+            owner_ids.extend([owner_id] * len(selected))
+
+        if not rows:
+            return results
+
+        # Factorize (owner, merchant) pairs into dense group codes
+        group_codes: Dict[Any, int] = {}
+        group_ids = []
+        for owner_id, t in zip(owner_ids, rows):
+            merchant = normalize_merchant(t["description"], t.get("merchant_name"))
+            group_ids.append(
+                group_codes.setdefault((owner_id, merchant), len(group_codes))
+            )
+        group_keys = list(group_codes)
+
+        n = len(rows)
+        group = np.asarray(group_ids, dtype=np.int64)
+        amount = np.abs(np.fromiter((t["amount"] for t in rows), np.float64, n))
+        day = (
+            np.asarray([str(t["timestamp"])[:19] for t in rows], dtype="datetime64[s]")
+            .astype(np.int64)
+            / 86400.0
+        )
+
+        # Split each merchant's payments into amount bands
+        order = np.lexsort((amount, group))
+        sorted_group, sorted_amount = group[order], amount[order]
+        new_band = np.ones(n, dtype=bool)
+        new_band[1:] = (sorted_group[1:] != sorted_group[:-1]) | (
+            sorted_amount[1:] > sorted_amount[:-1] * (1 + self.amount_tolerance) + 0.01
+        )
+        band = np.empty(n, dtype=np.int64)
+        band[order] = np.cumsum(new_band) - 1
+        band_group = sorted_group[new_band]
+        num_bands = len(band_group)
+
+        # Order every band chronologically
+        order = np.lexsort((day, band))
+        sorted_band, sorted_day = band[order], day[order]
+        counts = np.bincount(sorted_band, minlength=num_bands)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        # Intervals between consecutive payments in the same band
+        same_band = sorted_band[1:] == sorted_band[:-1]
+        gaps = np.diff(sorted_day)[same_band]
+        gap_band = sorted_band[1:][same_band]
+        gap_counts = np.bincount(gap_band, minlength=num_bands)
+
+        # Median interval per band
+        gap_order = np.lexsort((gaps, gap_band))
+        sorted_gaps = gaps[gap_order]
+        gap_starts = np.concatenate(([0], np.cumsum(gap_counts)[:-1]))
+        has_gaps = gap_counts > 0
+        median = np.zeros(num_bands)
+        low = (gap_starts + (gap_counts - 1) // 2)[has_gaps]
+        high = (gap_starts + gap_counts // 2)[has_gaps]
+        median[has_gaps] = (sorted_gaps[low] + sorted_gaps[high]) / 2
+
+        # Share of intervals close to a whole multiple of the median
+        ratio = gaps / np.maximum(median[gap_band], 1e-9)
+        multiple = np.rint(ratio)
+        regular = (multiple >= 1) & (
+            np.abs(ratio - multiple) <= self.cadence_tolerance
+        )
+        confidence = np.bincount(
+            gap_band, weights=regular.astype(np.float64), minlength=num_bands
+        ) / np.maximum(gap_counts, 1)
+        # Few observations give weak evidence
+        confidence *= np.minimum(gap_counts / 3.0, 1.0)
+
+        recurring = (counts >= self.min_occurrences) & (
+            median >= self.min_interval_days
+        )
+        for band_id in np.nonzero(recurring)[0]:
+            indices = order[starts[band_id] : starts[band_id] + counts[band_id]]
+            band_amounts = amount[indices]
+            latest = rows[indices[-1]]
+
+            price_changes = [
+                {
+                    "date": rows[indices[i + 1]].get("timestamp"),
+                    "old_amount": float(band_amounts[i]),
+                    "new_amount": float(band_amounts[i + 1]),
+                }
+                for i in np.nonzero(np.abs(np.diff(band_amounts)) >= 0.01)[0]
+            ]
+
+            owner_id, merchant = group_keys[band_group[band_id]]
+            results[owners[owner_id]].append(
+                {
+                    "description": latest.get("description"),
+                    "merchant": merchant,
+                    "amount": float(band_amounts[-1]),
+                    "frequency": classify_frequency(median[band_id]),
+                    "occurrences": [rows[i].get("timestamp") for i in indices],
+                    "transaction_ids": [rows[i].get("transaction_id") for i in indices],
+                    "interval_days": round(float(median[band_id]), 1),
+                    "confidence": round(float(confidence[band_id]), 2),
+                    "price_changes": price_changes,
+                }
+            )
+
+        for series in results.values():
+            series.sort(key=lambda s: (s["merchant"], s["amount"]))
+        return results
+
+
+recurring_payment_engine = RecurringPaymentEngine()
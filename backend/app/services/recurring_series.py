@@ -0,0 +1,192 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.models.recurring_series import RecurringSeries
+from app.models.transaction import Transaction
+from app.services.recurring import RecurringPaymentEngine, recurring_payment_engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def predict_next_charge(
+    last_charge_at: datetime, interval_days: Optional[float]
+) -> Optional[datetime]:
+    """Predict the next charge of a series from its last charge and cadence"""
+    if not interval_days:
+        return None
+    return last_charge_at + timedelta(days=interval_days)
+
+
+def serialize_series(series: RecurringSeries) -> Dict[str, Any]:
+    """Convert a stored series into the subscription response shape"""
+    return {
+        "description": series.description,
+        "merchant": series.merchant,
+        "amount": series.amount,
+        "frequency": series.frequency,
+        "occurrences": series.occurrences or [],
+        "interval_days": series.interval_days,
+        "confidence": series.confidence,
+        "price_changes": series.price_changes or [],
+        "next_expected_date": series.next_expected_at,
+    }
+
+
+class RecurringSeriesService:
+    """
+    Keeps detected recurring payments up to date in the database.
+
+    Series are recomputed per (account, merchant) whenever new transactions
+    for that merchant are stored, so a sync only re-runs detection for the
+    handful of merchants it touched. Reading subscriptions is then a plain
+    lookup of the stored series.
+    """
+
+    def __init__(self, engine: RecurringPaymentEngine = recurring_payment_engine):
+        self.engine = engine
+
+    def update_merchants(
+        self, db: Session, user_id: int, account_id: str, merchants: Iterable[str]
+    ) -> int:
+        """
+        Re-run detection over the stored payments of the given merchants
+
+        Args:
+            db: Database session
+            user_id: Owner of the account
+            account_id: Account to update
+            merchants: Normalized merchant keys to recompute
+
+        Returns:
+            Number of series stored for these merchants
+        """
+        merchants = list(merchants)
+        if not merchants:
+            return 0
+
+        # Sessions don't autoflush, so make freshly stored rows visible
+        db.flush()
+        rows = (
+            db.query(Transaction)
+            .filter(
+                Transaction.account_id == account_id,
+                Transaction.merchant_key.in_(merchants),
+                Transaction.amount < 0,
+                # Settled pending payments and repeats would count twice
+                Transaction.duplicate_of.is_(None),
+            )
+            .all()
+        )
+        detected = self.engine.detect(
+            [
+                {
+                    "transaction_id": row.transaction_id,
+                    "description": row.description,
+                    "merchant_name": row.merchant_name,
+                    "amount": row.amount,
+                    "timestamp": row.transaction_date.replace(
+                        tzinfo=timezone.utc
+                    ).isoformat(),
+                }
+                for row in rows
+                if row.transaction_date is not None
+            ]
+        )
+
+        db.query(RecurringSeries).filter(
+            RecurringSeries.account_id == account_id,
+            RecurringSeries.merchant.in_(merchants),
+        ).delete(synchronize_session=False)
+
+        recurring_ids = set()
+        for series in detected:
+            recurring_ids.update(series["transaction_ids"])
+            last_charge_at = datetime.fromisoformat(
+                series["occurrences"][-1]
+            ).replace(tzinfo=None)
+            db.add(
+                RecurringSeries(
+                    user_id=user_id,
+                    account_id=account_id,
+                    merchant=series["merchant"],
+                    description=series["description"],
+                    amount=series["amount"],
+                    frequency=series["frequency"],
+                    interval_days=series["interval_days"],
+                    confidence=series["confidence"],
+                    occurrences=series["occurrences"],
+                    price_changes=series["price_changes"],
+                    last_charge_at=last_charge_at,
+                    next_expected_at=predict_next_charge(
+                        last_charge_at, series["interval_days"]
+                    ),
+                )
+            )
+
+        for row in rows:
+            row.is_subscription = row.transaction_id in recurring_ids
+
+        logger.info(
+            f"Updated recurring series for account {account_id}: "
+            f"{len(merchants)} merchants, {len(detected)} series"
+        )
+        return len(detected)
+
+    def rebuild_account(self, db: Session, user_id: int, account_id: str) -> int:
+        """Recompute every series of an account from its stored transactions"""
+        merchants = [
+            merchant
+            for (merchant,) in db.query(Transaction.merchant_key)
+            .filter(Transaction.account_id == account_id)
+            .distinct()
+            if merchant
+        ]
+        db.query(RecurringSeries).filter(
+            RecurringSeries.account_id == account_id
+        ).delete(synchronize_session=False)
+        return self.update_merchants(db, user_id, account_id, merchants)
+
+    def get_series(
+        self, db: Session, user_id: int, account_id: Optional[str] = None
+    ) -> List[RecurringSeries]:
+        """Get the stored recurring series of a user, optionally for one account"""
+        query = db.query(RecurringSeries).filter(RecurringSeries.user_id == user_id)
+        if account_id is not None:
+            query = query.filter(RecurringSeries.account_id == account_id)
+        return query.order_by(RecurringSeries.merchant, RecurringSeries.amount).all()
+
+    def get_upcoming(
+        self,
+        db: Session,
+        user_id: int,
+        days: int,
+        account_id: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> List[RecurringSeries]:
+        """
+        Get the series expected to charge within the next days
+
+        Args:
+            db: Database session
+            user_id: Owner of the series
+            days: Size of the look-ahead window
+            account_id: Optional account to restrict to
+            now: Start of the window, defaults to the current UTC time
+
+        Returns:
+            Series ordered by their next expected charge
+        """
+        now = now or datetime.utcnow()
+        query = db.query(RecurringSeries).filter(
+            RecurringSeries.user_id == user_id,
+            RecurringSeries.next_expected_at >= now,
+            RecurringSeries.next_expected_at < now + timedelta(days=days),
+        )
+        if account_id is not None:
+            query = query.filter(RecurringSeries.account_id == account_id)
+        return query.order_by(RecurringSeries.next_expected_at).all()
+
+
+recurring_series_service = RecurringSeriesService()
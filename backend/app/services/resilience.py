@@ -0,0 +1,225 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast. Once reset_timeout seconds have passed a single trial call is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Check whether a call may be attempted right now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        # Half-open: let exactly one trial call through
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if (
+            self.state == self.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """
+        End a half-open trial without an outcome
+
+        For a trial that was cancelled, rate limited or failed in a way that
+        says nothing about the service's health, so the next call can try.
+        """
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(maximum, base * 2**attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the request rate to one provider.
+
+    Up to burst requests go out immediately, after which callers wait their
+    turn so the sustained rate stays at rate requests per second. A rate of
+    0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int = 0):
+        self.rate = rate
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so they are served in arrival order
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self.waits += 1
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._tokens = 1.0
+                self._updated = time.monotonic()
+            self._tokens -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rate_limit_per_second": self.rate,
+            "rate_limit_burst": int(self.capacity),
+            "rate_limited_waits": self.waits,
+            "rate_limited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+class TokenBudget:
+    """
+    Token bucket limiting the tokens sent to a model per minute.
+
+    Callers reserve an estimate of a request's tokens before sending it and
+    settle the reservation with the actual usage afterwards, so the budget
+    tracks what was really spent. Requests wait in arrival order once the
+    bucket is empty. A budget of 0 disables limiting.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(max(tokens_per_minute, 0))
+        self.rate = self.capacity / 60
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: int) -> int:
+        """
+        Wait until a request of about this many tokens may be sent
+
+        Args:
+            tokens: Estimated tokens of the request
+
+        Returns:
+            Tokens reserved, to pass to settle
+        """
+        if self.capacity <= 0:
+            return 0
+        # A request bigger than the whole budget waits for a full bucket
+        tokens = min(tokens, int(self.capacity))
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                self.waits += 1
+            # Usage settled while waiting can push the budget back into debt
+            while self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+        return tokens
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Return an overestimate to the budget, or charge an underestimate"""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + reserved - used)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tokens_per_minute": int(self.capacity),
+            "tokens_available": int(max(self._tokens, 0)) if self.capacity else None,
+            "budget_waits": self.waits,
+            "budget_waited_seconds": round(self.waited_seconds, 3),
+        }
@@ -0,0 +1,175 @@
+import math
+import re
+from itertools import zip_longest
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Recommendations kept when partial analyses are merged
+MAX_RECOMMENDATIONS = 8
+
+# Page breaks in extracted text; the lookbehind keeps them with their page
+_PAGE_BREAK = re.compile(r"(?<=\n\n)")
+
+
+def _units(
+    text: str, max_tokens: int, count_tokens: Callable[[str], int]
+) -> Iterator[Tuple[str, int]]:
+    """
+    Pages of a statement with their token counts, finer where they must be
+
+    A page over the budget is broken into lines, which hold one transaction
+    each, and a line over the budget into pieces, so nothing is dropped.
+    """
+    for page in _PAGE_BREAK.split(text):
+        if not page:
+            continue
+        tokens = count_tokens(page)
+        if tokens <= max_tokens:
+            yield page, tokens
+            continue
+        for line in page.splitlines(keepends=True):
+            tokens = count_tokens(line)
+            if tokens <= max_tokens:
+                yield line, tokens
+                continue
+            width = max(1, len(line) * max_tokens // tokens)
+            for start in range(0, len(line), width):
+                piece = line[start : start + width]
+                yield piece, count_tokens(piece)
+
+
+def split_statement_text(
+    text: str, max_tokens: int, count_tokens: Callable[[str], int]
+) -> List[str]:
+    """
+    Split statement text into chunks of at most max_tokens tokens
+
+    Chunks are cut on page boundaries, or on line boundaries within a page
+    that is over the budget by itself, and are balanced in size, since the
+    slowest one decides how long a concurrent analysis takes. Joining the
+    chunks gives back the text, less leading and trailing blank lines.
+
+    Args:
+        text: Text of one statement
+        max_tokens: Token budget of a chunk
+        count_tokens: Counts the tokens of a string
+
+    Returns:
+        The chunks, in order
+    """
+    text = text.strip("\n")
+    if not text.strip():
+        return []
+    units = list(_units(text, max_tokens, count_tokens))
+    total = sum(tokens for _, tokens in units)
+    target = math.ceil(total / max(math.ceil(total / max_tokens), 1))
+
+    chunks = []
+    parts: List[str] = []
+    size = 0
+    for unit, tokens in units:
+        # Close a chunk when it is nearer the target without this unit than
+        # with it, or before it would go over the budget
+        if parts and (size + tokens / 2 > target or size + tokens > max_tokens):
+            chunks.append("".join(parts))
+            parts, size = [], 0
+        parts.append(unit)
+        size += tokens
+    if parts:
+        chunks.append("".join(parts))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _amount(value: Any) -> float:
+    """Read an amount the LLM may have written as a string like "$1,200.50" """
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").replace("$", "").strip())
+    except ValueError:
+        return 0.0
+
+
+def _weighted_mean(values: Sequence[Tuple[float, float]]) -> Optional[float]:
+    total = sum(weight for _, weight in values)
+    if not total:
+        return None
+    return sum(value * weight for value, weight in values) / total
+
+
+def merge_statement_analyses(
+    partials: Sequence[Dict[str, Any]], weights: Optional[Sequence[float]] = None
+) -> Dict[str, Any]:
+    """
+    Combine analyses of parts of a statement into one analysis
+
+    Income, expenses and category amounts are added up and the savings rate
+    is recomputed from the totals. Trait scores and XP, which rate the whole
+    statement, are averaged weighted by the size of each part.
+    Recommendations are taken in turn from each part, without duplicates.
+
+    Args:
+        partials: Analyses in the analyze_statement_with_llm response shape
+        weights: Relative size of each part, equal if not given
+
+    Returns:
+        Analysis in the same shape
+    """
+    weights = list(weights) if weights is not None else [1.0] * len(partials)
+
+    income = sum(_amount(partial.get("totalIncome", 0)) for partial in partials)
+    expenses = sum(_amount(partial.get("totalExpenses", 0)) for partial in partials)
+
+    categories: Dict[str, Dict[str, Any]] = {}
+    for partial in partials:
+        for category in partial.get("topCategories") or []:
+            name = str(category.get("category") or "Other").strip()
+            merged = categories.setdefault(
+                name.lower(), {"category": name, "amount": 0.0}
+            )
+            merged["amount"] += _amount(category.get("amount", 0))
+    top_categories = sorted(
+        categories.values(), key=lambda category: category["amount"], reverse=True
+    )
+
+    recommendations: List[str] = []
+    for batch in zip_longest(
+        *(partial.get("recommendations") or [] for partial in partials)
+    ):
+        for recommendation in batch:
+            if recommendation and recommendation not in recommendations:
+                recommendations.append(recommendation)
+
+    traits: Dict[str, int] = {}
+    names = dict.fromkeys(
+        name for partial in partials for name in partial.get("traits") or {}
+    )
+    for name in names:
+        score = _weighted_mean(
+            [
+                (_amount(partial["traits"][name]), weight)
+                for partial, weight in zip(partials, weights)
+                if name in (partial.get("traits") or {})
+            ]
+        )
+        traits[name] = round(score) if score is not None else 50
+
+    xp = _weighted_mean(
+        [
+            (_amount(partial["xpEarned"]), weight)
+            for partial, weight in zip(partials, weights)
+            if "xpEarned" in partial
+        ]
+    )
+
+    return {
+        "totalIncome": round(income, 2),
+        "totalExpenses": round(expenses, 2),
+        "savingsRate": (income - expenses) / income * 100 if income > 0 else 0.0,
+        "topCategories": [
+            {"category": category["category"], "amount": round(category["amount"], 2)}
+            for category in top_categories
+        ],
+        "recommendations": recommendations[:MAX_RECOMMENDATIONS],
+        "traits": traits,
+        "xpEarned": round(xp) if xp is not None else 100,
+    }
@@ -0,0 +1,458 @@
+import calendar
+import logging
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from app.services.recurring import normalize_merchant
+from app.services.statement_periods import parse_statement_dates
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Building blocks for statement line patterns
+DATE = (
+    r"\d{1,2}[/.-]\d{1,2}[/.-](?:\d{4}|\d{2})"
+    r"|\d{4}-\d{1,2}-\d{1,2}"
+    r"|\d{1,2} [A-Za-z]{3,9},? \d{4}"
+    r"|[A-Za-z]{3,9} \d{1,2},? \d{4}"
+)
+AMOUNT = r"\(?[-+]?\s?[$£€]?\d{1,3}(?:,?\d{3})*\.\d{2}\)?"
+AMOUNT_DECIMAL_COMMA = r"\(?[-+]?\s?[$£€]?\d{1,3}(?:[.\s]?\d{3})*,\d{2}\)?"
+
+# Share of the lines that look like transactions the parser has to read
+# for its result to be used instead of the full statement text
+MIN_COVERAGE = 0.9
+
+# Fewest transactions for a statement to count as parsed
+MIN_TRANSACTIONS = 3
+
+# Entries of the summary lists sent to the LLM
+SUMMARY_MERCHANTS = 10
+SUMMARY_LARGEST = 5
+
+# Rows carrying a balance rather than a transaction
+_BALANCE_ROW = re.compile(
+    r"\b(opening|closing|previous|new|available)\s+balance\b"
+    r"|\bbalance\s+(brought|carried)\s+forward\b|^balance$",
+    re.IGNORECASE,
+)
+
+# Money coming in, for lines that don't say which way the money went
+_CREDIT_WORDS = re.compile(
+    r"\b(salary|payroll|wages|deposit|refund|interest paid|interest earned"
+    r"|dividend|cashback|reimbursement|transfer from|received|credit)\b",
+    re.IGNORECASE,
+)
+
+CATEGORY_KEYWORDS = {
+    "Housing": ["rent", "mortgage", "letting", "landlord", "council tax", "hoa"],
+    "Utilities": [
+        "electric",
+        "energy",
+        "gas",
+        "water",
+        "broadband",
+        "internet",
+        "mobile",
+        "phone",
+        "vodafone",
+        "verizon",
+        "comcast",
+        "british gas",
+    ],
+    "Food": [
+        "grocery",
+        "groceries",
+        "supermarket",
+        "tesco",
+        "sainsbury",
+        "asda",
+        "aldi",
+        "lidl",
+        "walmart",
+        "whole foods",
+        "trader joe",
+        "kroger",
+        "restaurant",
+        "cafe",
+        "coffee",
+        "starbucks",
+        "mcdonald",
+        "pizza",
+        "deliveroo",
+        "uber eats",
+        "doordash",
+        "just eat",
+    ],
+    "Transportation": [
+        "uber",
+        "lyft",
+        "taxi",
+        "fuel",
+        "petrol",
+        "gas station",
+        "shell",
+        "chevron",
+        "parking",
+        "train",
+        "rail",
+        "tfl",
+        "transit",
+        "airline",
+    ],
+    "Entertainment": [
+        "netflix",
+        "spotify",
+        "disney",
+        "hulu",
+        "prime video",
+        "cinema",
+        "theatre",
+        "steam",
+        "playstation",
+        "xbox",
+        "concert",
+    ],
+    "Shopping": ["amazon", "ebay", "target", "ikea", "shop", "store", "retail"],
+    "Health": ["pharmacy", "gym", "dental", "doctor", "clinic", "hospital"],
+    "Insurance": ["insurance", "assurance"],
+    "Transfers": ["transfer", "savings", "atm", "cash withdrawal"],
+}
+
+
+class StatementPattern(BaseModel):
+    """
+    Line format of one bank's statements
+
+    The line regex needs named groups date, description and amount, and may
+    have balance (the running balance) and marker (CR or DR) groups.
+    """
+
+    name: str
+    line: str
+    # Regex the statement text must contain for this pattern to be tried
+    detect: Optional[str] = None
+    # Amounts written like 1.234,56
+    decimal_comma: bool = False
+
+
+def _line_pattern(amount: str) -> str:
+    return (
+        rf"^\s*(?P<date>{DATE})\s+(?P<description>.*?\S)\s+"
+        rf"(?P<amount>{amount})(?:\s*(?P<marker>CR|DR)\b)?"
+        rf"(?:\s+(?P<balance>{amount})(?:\s*(?:CR|DR)\b)?)?\s*$"
+    )
+
+
+DEFAULT_PATTERNS = [
+    StatementPattern(name="date-description-amount", line=_line_pattern(AMOUNT)),
+    StatementPattern(
+        name="date-description-amount-decimal-comma",
+        line=_line_pattern(AMOUNT_DECIMAL_COMMA),
+        decimal_comma=True,
+    ),
+]
+
+# Any line starting with a date and holding an amount looks like a transaction
+_CANDIDATE = re.compile(
+    rf"^\s*(?:{DATE})\s.*(?:{AMOUNT}|{AMOUNT_DECIMAL_COMMA})", re.MULTILINE
+)
+
+
+@lru_cache(maxsize=256)
+def _compile(regex: str, flags: int = 0) -> Pattern:
+    return re.compile(regex, flags)
+
+
+def parse_amount(value: str, decimal_comma: bool = False) -> float:
+    """
+    Read an amount as printed on a statement
+
+    Args:
+        value: Amount like "-1,234.56", "(12.00)" or "$5.00"
+        decimal_comma: Whether the amount is written like 1.234,56
+
+    Returns:
+        The amount, negative if it had a minus sign or parentheses
+    """
+    text = value.strip()
+    negative = text.startswith("(") or "-" in text
+    digits = re.sub(r"[^\d.,]", "", text)
+    if decimal_comma:
+        digits = digits.replace(".", "").replace(",", ".")
+    else:
+        digits = digits.replace(",", "")
+    amount = float(digits)
+    return -amount if negative else amount
+
+
+_CATEGORY_PATTERNS = {
+    category: re.compile(
+        r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b"
+    )
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+
+def categorize(description: str) -> str:
+    """Spending category of a transaction from keywords in its description"""
+    text = description.lower()
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        if pattern.search(text):
+            return category
+    return "Other"
+
+
+class StatementParser:
+    """
+    Deterministic parser turning statement text into transactions.
+
+    Every transaction line of a statement is matched against line patterns:
+    date, description and amount, optionally followed by a CR/DR marker and
+    the running balance. Which way money went is read from a sign, brackets
+    or a CR/DR marker, otherwise from the change in the running balance, and
+    failing that from the description. Banks with other layouts are
+    supported by registering a pattern for them. A statement counts as
+    parsed only when the best pattern reads nearly every line that looks
+    like a transaction; otherwise callers should fall back to sending the
+    full text to the LLM.
+    """
+
+    def __init__(self, patterns: Optional[List[StatementPattern]] = None):
+        self.patterns = list(DEFAULT_PATTERNS if patterns is None else patterns)
+        self._lock = threading.Lock()
+        self._stats = {"parsed": 0, "unparsed": 0, "transactions": 0}
+
+    def register(self, pattern: StatementPattern) -> None:
+        """
+        Add a bank's line pattern, preferred to the others when they read as
+        many lines
+
+        Args:
+            pattern: The bank's statement line pattern
+        """
+        _compile(pattern.line, re.IGNORECASE)
+        self.patterns.insert(0, pattern)
+
+    def _read(
+        self, text: str, pattern: StatementPattern
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Transactions read with a pattern, and the number of lines it matched"""
+        line = _compile(pattern.line, re.IGNORECASE)
+        rows = []
+        for raw in text.splitlines():
+            match = line.match(raw)
+            if match is not None:
+                rows.append(match.groupdict())
+        if not rows:
+            return [], 0
+
+        dates = parse_statement_dates([row["date"] for row in rows])
+        transactions = []
+        previous_balance: Optional[float] = None
+        for row, when in zip(rows, dates):
+            amount = parse_amount(row["amount"], pattern.decimal_comma)
+            balance = (
+                parse_amount(row["balance"], pattern.decimal_comma)
+                if row.get("balance")
+                else None
+            )
+            description = " ".join(row["description"].split())
+            if _BALANCE_ROW.search(description):
+                previous_balance = balance if balance is not None else amount
+                continue
+
+            amount = self._signed(row, amount, balance, previous_balance, description)
+            if balance is not None:
+                previous_balance = balance
+            transactions.append(
+                {
+                    "date": when.isoformat() if when else None,
+                    "description": description,
+                    "amount": amount,
+                    "balance": balance,
+                    "category": "Income" if amount > 0 else categorize(description),
+                }
+            )
+        return transactions, len(rows)
+
+    @staticmethod
+    def _signed(
+        row: Dict[str, Any],
+        amount: float,
+        balance: Optional[float],
+        previous_balance: Optional[float],
+        description: str,
+    ) -> float:
+        """Give an amount its direction, positive for money in"""
+        printed = row["amount"].strip()
+        marker = (row.get("marker") or "").upper()
+        if amount < 0 or printed.startswith("+") or marker == "CR":
+            return amount if amount < 0 else abs(amount)
+        if marker == "DR":
+            return -abs(amount)
+        if balance is not None and previous_balance is not None:
+            change = round(balance - previous_balance, 2)
+            if abs(abs(change) - amount) < 0.01:
+                return amount if change > 0 else -amount
+        return amount if _CREDIT_WORDS.search(description) else -amount
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse the transactions of a statement
+
+        Args:
+            text: Statement text
+
+        Returns:
+            Dictionary with the pattern used, the transactions (ISO date,
+            description, signed amount, running balance and category) and
+            the share of transaction-like lines read, or None if no pattern
+            reads the statement well enough
+        """
+        candidates = len(_CANDIDATE.findall(text))
+        best: Optional[Dict[str, Any]] = None
+        matched = 0
+        for pattern in self.patterns:
+            detect = pattern.detect and _compile(pattern.detect, re.IGNORECASE)
+            if detect and not detect.search(text):
+                continue
+            transactions, lines = self._read(text, pattern)
+            if best is None or lines > matched:
+                best = {"pattern": pattern.name, "transactions": transactions}
+                matched = lines
+
+        parsed = len(best["transactions"]) if best else 0
+        # A bank's own pattern may read lines that don't look like the usual
+        # date-first transaction rows
+        candidates = max(candidates, matched)
+        coverage = matched / candidates if candidates else 0.0
+        if parsed < MIN_TRANSACTIONS or coverage < MIN_COVERAGE:
+            with self._lock:
+                self._stats["unparsed"] += 1
+            logger.info(
+                f"Statement not parsed locally: read {parsed} of {candidates} "
+                f"transaction lines"
+            )
+            return None
+
+        with self._lock:
+            self._stats["parsed"] += 1
+            self._stats["transactions"] += parsed
+        best["coverage"] = round(coverage, 3)
+        return best
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters of parsed and unparsed statements"""
+        with self._lock:
+            return {"patterns": len(self.patterns), **self._stats}
+
+
+def summarize_transactions(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compute a statement's figures from its transactions
+
+    Args:
+        transactions: Parsed transactions, amounts positive for money in
+
+    Returns:
+        Dictionary with the totals, savings rate and spending per category
+        in the analyze_statement_with_llm shape, plus the period, balances,
+        biggest merchants and largest expenses for the LLM summary
+    """
+    income = sum(t["amount"] for t in transactions if t["amount"] > 0)
+    expenses = -sum(t["amount"] for t in transactions if t["amount"] < 0)
+
+    categories: Dict[str, float] = defaultdict(float)
+    merchants: Dict[str, List[float]] = defaultdict(list)
+    for transaction in transactions:
+        if transaction["amount"] < 0:
+            categories[transaction["category"]] -= transaction["amount"]
+            merchant = normalize_merchant(transaction["description"])
+            merchants[merchant].append(-transaction["amount"])
+
+    dates = sorted(
+        date.fromisoformat(t["date"]) for t in transactions if t.get("date")
+    )
+    balances = [t["balance"] for t in transactions if t.get("balance") is not None]
+    largest = sorted(
+        (t for t in transactions if t["amount"] < 0), key=lambda t: t["amount"]
+    )[:SUMMARY_LARGEST]
+
+    return {
+        "totalIncome": round(income, 2),
+        "totalExpenses": round(expenses, 2),
+        "savingsRate": (income - expenses) / income * 100 if income > 0 else 0.0,
+        "topCategories": [
+            {"category": category, "amount": round(amount, 2)}
+            for category, amount in sorted(
+                categories.items(), key=lambda item: item[1], reverse=True
+            )
+        ],
+        "transactionCount": len(transactions),
+        "periodStart": dates[0].isoformat() if dates else None,
+        "periodEnd": dates[-1].isoformat() if dates else None,
+        "closingBalance": balances[-1] if balances else None,
+        "topMerchants": [
+            {
+                "merchant": merchant,
+                "amount": round(sum(amounts), 2),
+                "count": len(amounts),
+            }
+            for merchant, amounts in sorted(
+                merchants.items(), key=lambda item: sum(item[1]), reverse=True
+            )[:SUMMARY_MERCHANTS]
+        ],
+        "largestExpenses": [
+            {
+                "date": t["date"],
+                "description": t["description"],
+                "amount": round(-t["amount"], 2),
+            }
+            for t in largest
+        ],
+    }
+
+
+
+def project_month(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Project a month's spending from a statement of the month so far
+
+    Spending is extrapolated at its pace over the days the statement covers
+    to the length of its last month, and income is taken as received.
+
+    Args:
+        summary: Result of summarize_transactions
+
+    Returns:
+        Dictionary with projectedSpending, projectedSavingsRate and
+        projectedEndBalance, the last None without a running balance
+    """
+    spent = summary["totalExpenses"]
+    income = summary["totalIncome"]
+    projected = spent
+    if summary["periodStart"] and summary["periodEnd"]:
+        start = date.fromisoformat(summary["periodStart"])
+        end = date.fromisoformat(summary["periodEnd"])
+        days_in_month = calendar.monthrange(end.year, end.month)[1]
+        elapsed = (end - start).days + 1
+        projected = spent * max(days_in_month / elapsed, 1.0)
+
+    balance = summary["closingBalance"]
+    return {
+        "projectedSpending": round(projected, 2),
+        "projectedSavingsRate": (
+            (income - projected) / income * 100 if income > 0 else 0.0
+        ),
+        "projectedEndBalance": (
+            round(balance - (projected - spent), 2) if balance is not None else None
+        ),
+    }
+
+
+statement_parser = StatementParser()
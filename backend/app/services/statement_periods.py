@@ -0,0 +1,208 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+# Average length of a month, in days
+DAYS_PER_MONTH = 365.25 / 12
+
+# Years accepted as statement dates, to skip numbers that only look like dates
+YEARS = range(1990, 2100)
+
+# Days after today a statement date may be, so numbers that only look like
+# dates, such as the sort code 20-12-45, aren't read as one in the future
+MAX_DAYS_AHEAD = 7
+
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        [
+            "jan",
+            "feb",
+            "mar",
+            "apr",
+            "may",
+            "jun",
+            "jul",
+            "aug",
+            "sep",
+            "oct",
+            "nov",
+            "dec",
+        ],
+        start=1,
+    )
+}
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})\b")
+_DAY_MONTH_DATE = re.compile(
+    rf"\b(\d{{1,2}})(?:st|nd|rd|th)?[ -]{_MONTH},?[ -](\d{{4}})\b", re.IGNORECASE
+)
+_MONTH_DAY_DATE = re.compile(
+    rf"\b{_MONTH} (\d{{1,2}})(?:st|nd|rd|th)?,? (\d{{4}})\b", re.IGNORECASE
+)
+
+# Lines stating the period a statement covers
+_PERIOD_LINE = re.compile(r"\b(statement|period|from)\b", re.IGNORECASE)
+
+Period = Tuple[date, date]
+
+
+def _date(year: int, month: int, day: int) -> Optional[date]:
+    if year < 100:
+        year += 2000
+    if year not in YEARS:
+        return None
+    try:
+        found = date(year, month, day)
+    except ValueError:
+        return None
+    if found > date.today() + timedelta(days=MAX_DAYS_AHEAD):
+        return None
+    return found
+
+
+def _dates(text: str) -> Iterator[date]:
+    """Dates written with month names or in ISO form"""
+    candidates = [
+        (int(year), int(month), int(day))
+        for year, month, day in _ISO_DATE.findall(text)
+    ]
+    candidates += [
+        (int(year), MONTHS[month.lower()[:3]], int(day))
+        for day, month, year in _DAY_MONTH_DATE.findall(text)
+    ]
+    candidates += [
+        (int(year), MONTHS[month.lower()[:3]], int(day))
+        for month, day, year in _MONTH_DAY_DATE.findall(text)
+    ]
+    for candidate in candidates:
+        found = _date(*candidate)
+        if found is not None:
+            yield found
+
+
+def _numeric_reading(
+    fields: Sequence[Tuple[int, int, int]]
+) -> List[Optional[date]]:
+    """
+    Dates written as numbers, like 05/04/2024, from their three fields
+
+    Whether these are day or month first is decided for the whole
+    statement: by a field over 12 when there is one, otherwise by the
+    reading giving the shorter period, as statements cover weeks or months.
+    """
+    # Fields over 12 on both sides aren't dates either way round
+    plausible = [field for field in fields if min(field[0], field[1]) <= 12]
+    readings = []
+    for day_first in (True, False):
+        if any(
+            (second if day_first else first) > 12 for first, second, _ in plausible
+        ):
+            continue
+        dates = [
+            _date(year, second, first) if day_first else _date(year, first, second)
+            for first, second, year in fields
+        ]
+        if any(found is not None for found in dates):
+            readings.append(dates)
+    if not readings:
+        return [None] * len(fields)
+
+    def span(dates: List[Optional[date]]) -> Tuple[Any, int]:
+        found = [value for value in dates if value is not None]
+        return max(found) - min(found), -len(found)
+
+    return min(readings, key=span)
+
+
+def _numeric_dates(text: str) -> List[date]:
+    fields = [
+        (int(first), int(second), int(year))
+        for first, second, year in _NUMERIC_DATE.findall(text)
+    ]
+    return [found for found in _numeric_reading(fields) if found is not None]
+
+
+def parse_statement_dates(values: Sequence[str]) -> List[Optional[date]]:
+    """
+    Parse the dates of one statement's transactions
+
+    Numeric dates are all read day first or all month first, whichever
+    reading gives the shorter period.
+
+    Args:
+        values: Date strings, numeric, ISO or with month names
+
+    Returns:
+        The date of each value, None where it isn't a valid date
+    """
+    matches = [_NUMERIC_DATE.fullmatch(value.strip()) for value in values]
+    numeric = iter(
+        _numeric_reading(
+            [
+                (int(match[1]), int(match[2]), int(match[3]))
+                for match in matches
+                if match
+            ]
+        )
+    )
+    dates = []
+    for value, match in zip(values, matches):
+        if match:
+            dates.append(next(numeric))
+        else:
+            dates.append(next(_dates(value), None))
+    return dates
+
+
+def statement_period(text: str) -> Optional[Period]:
+    """
+    Find the period a statement covers from the line that states it
+
+    Only lines labelled as the statement period, with a first and a last
+    date, count: other dates in a statement, like the date the account was
+    opened, say nothing about the period. Statements the local parser reads
+    take their period from their transactions' dates instead.
+
+    Args:
+        text: Statement text
+
+    Returns:
+        First and last date of the period line, or None if there is none
+    """
+    for line in text.splitlines():
+        if not _PERIOD_LINE.search(line):
+            continue
+        dates = list(_dates(line)) + _numeric_dates(line)
+        if len(dates) >= 2:
+            return min(dates), max(dates)
+    return None
+
+
+def months_covered(periods: Sequence[Optional[Period]]) -> float:
+    """
+    Number of months a set of statements covers
+
+    Overlapping periods, such as statements of two accounts for the same
+    month, are counted once. Statements without a period count as a month.
+
+    Args:
+        periods: Period of each statement, None where it couldn't be found
+
+    Returns:
+        Months covered, fractional for partial months
+    """
+    days = 0
+    end: Optional[date] = None
+    for start, last in sorted(period for period in periods if period):
+        if end is not None and start <= end:
+            if last > end:
+                days += (last - end).days
+                end = last
+            continue
+        days += (last - start).days + 1
+        end = last
+    undated = sum(1 for period in periods if not period)
+    return days / DAYS_PER_MONTH + undated
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.bank_connection import BankConnection
+from app.services.bank_aggregator import get_bank_provider
+from app.services.bank_provider import BankDataProvider
+from app.services.bank_tokens import BankTokenManager, bank_token_manager
+from app.services.transaction_sync import (
+    TransactionSyncService,
+    transaction_sync_service,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BankSyncScheduler:
+    """
+    In-process scheduler that pre-syncs bank data for active connections.
+
+    A scheduling loop walks the active BankConnection rows, refreshes tokens
+    that are close to expiry and queues connections whose next sync is due.
+    A fixed pool of workers drains the queue, so at most max_concurrency
+    syncs run at once, and at most per_user_concurrency for any one user:
+    a connection whose user is at the limit is set aside until one of the
+    user's syncs finishes, so it never ties up a worker. Next-run times are
+    jittered to spread load, and failing connections back off exponentially.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[BankDataProvider] = None,
+        sync_service: TransactionSyncService = transaction_sync_service,
+        token_manager: BankTokenManager = bank_token_manager,
+        session_factory=SessionLocal,
+        interval: Optional[float] = None,
+        tick: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        per_user_concurrency: Optional[int] = None,
+        jitter: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.sync_service = sync_service
+        self.token_manager = token_manager
+        self.session_factory = session_factory
+        self.interval = interval or (
+            settings.BANK_SYNC_WEBHOOK_INTERVAL_SECONDS
+            if settings.BANK_WEBHOOKS_ENABLED
+            else settings.BANK_SYNC_INTERVAL_SECONDS
+        )
+        self.tick_interval = tick or settings.BANK_SYNC_TICK_SECONDS
+        self.max_concurrency = max_concurrency or settings.BANK_SYNC_MAX_CONCURRENCY
+        self.per_user_concurrency = (
+            per_user_concurrency or settings.BANK_SYNC_PER_USER_CONCURRENCY
+        )
+        self.jitter = settings.BANK_SYNC_JITTER if jitter is None else jitter
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: Set[int] = set()
+        self._running: Set[int] = set()
+        # Syncs running per user, and connections waiting for one to finish
+        self._user_running: Counter = Counter()
+        self._deferred: Dict[int, Deque[int]] = defaultdict(deque)
+        self._tasks: List[asyncio.Task] = []
+
+        # Per-connection scheduling state (monotonic clock)
+        self._next_run: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+        self._last_synced: Dict[int, datetime] = {}
+        self._user_ids: Dict[int, int] = {}
+
+        self._stats = {
+            "syncs_completed": 0,
+            "syncs_failed": 0,
+            "token_refreshes_started": 0,
+        }
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start the scheduling loop and the worker pool"""
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._schedule_loop()))
+        for _ in range(self.max_concurrency):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(
+            f"Bank sync scheduler started with {self.max_concurrency} workers"
+        )
+
+    async def stop(self) -> None:
+        """Stop the scheduling loop and cancel in-progress syncs"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self) -> None:
+        """Wait until every queued sync has finished"""
+        await self._queue.join()
+
+    def enqueue(self, connection_id: int, user_id: int) -> bool:
+        """
+        Queue a connection for syncing unless it is already queued or running
+
+        Returns:
+            True if the connection was queued
+        """
+        if connection_id in self._queued or connection_id in self._running:
+            return False
+        self._user_ids[connection_id] = user_id
+        self._queued.add(connection_id)
+        self._queue.put_nowait(connection_id)
+        return True
+
+    async def tick(self) -> None:
+        """Run one scheduling pass over the active bank connections"""
+        db = self.session_factory()
+        try:
+            connections = (
+                db.query(BankConnection).filter(BankConnection.is_active == True).all()
+            )
+            now = time.monotonic()
+            active_ids = set()
+
+            for connection in connections:
+                active_ids.add(connection.id)
+
+                # Spread first runs across the interval instead of all at once
+                if connection.id not in self._next_run:
+                    self._next_run[connection.id] = now + random.uniform(
+                        0, self.interval * self.jitter
+                    )
+
+                # Refresh tokens ahead of expiry, off the request path
+                if self.token_manager.needs_refresh(
+                    connection
+                ) and not self.token_manager.is_refreshing(connection.id):
+                    self.token_manager.start_refresh(connection.id)
+                    self._stats["token_refreshes_started"] += 1
+
+                if self._next_run[connection.id] <= now:
+                    self.enqueue(connection.id, connection.user_id)
+
+            # Forget connections that are no longer active
+            for connection_id in list(self._next_run):
+                if connection_id not in active_ids:
+                    self._next_run.pop(connection_id, None)
+                    self._failures.pop(connection_id, None)
+                    self._last_synced.pop(connection_id, None)
+        finally:
+            db.close()
+
+    async def sync_connection(self, connection_id: int) -> None:
+        """Refresh the token if needed and sync every account of a connection"""
+        db = self.session_factory()
+        try:
+            connection = (
+                db.query(BankConnection)
+                .filter(BankConnection.id == connection_id)
+                .first()
+            )
+            if connection is None or not connection.is_active:
+                return
+
+            access_token = await self.token_manager.get_access_token(connection)
+            if access_token != connection.access_token:
+                db.refresh(connection)
+
+            provider = self.provider or get_bank_provider(connection.provider)
+            accounts = await provider.get_accounts(connection.access_token)
+            for account in accounts:
+                await self.sync_service.sync_account(
+                    db, connection, account["account_id"]
+                )
+        finally:
+            db.close()
+
+    async def _schedule_loop(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Bank sync scheduling pass failed: {str(e)}")
+            await asyncio.sleep(self.tick_interval)
+
+    async def _worker(self) -> None:
+        while True:
+            connection_id = await self._queue.get()
+            user_id = self._user_ids.get(connection_id)
+            if self._user_running[user_id] >= self.per_user_concurrency:
+                # Requeued when one of the user's syncs finishes, which keeps
+                # the queue unfinished until then
+                self._deferred[user_id].append(connection_id)
+                self._queue.task_done()
+                continue
+
+            self._queued.discard(connection_id)
+            self._running.add(connection_id)
+            self._user_running[user_id] += 1
+            try:
+                await self.sync_connection(connection_id)
+                self._record_success(connection_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Sync failed for bank connection {connection_id}: {e}")
+                self._record_failure(connection_id)
+            finally:
+                self._running.discard(connection_id)
+                self._user_running[user_id] -= 1
+                if not self._user_running[user_id]:
+                    del self._user_running[user_id]
+                deferred = self._deferred.get(user_id)
+                if deferred:
+                    self._queue.put_nowait(deferred.popleft())
+                    if not deferred:
+                        del self._deferred[user_id]
+                self._queue.task_done()
+
+    def _record_success(self, connection_id: int) -> None:
+        self._stats["syncs_completed"] += 1
+        self._failures.pop(connection_id, None)
+        self._last_synced[connection_id] = datetime.utcnow()
+        spread = self.interval * self.jitter
+        self._next_run[connection_id] = (
+            time.monotonic() + self.interval + random.uniform(-spread, spread)
+        )
+
+    def _record_failure(self, connection_id: int) -> None:
+        self._stats["syncs_failed"] += 1
+        failures = self._failures.get(connection_id, 0) + 1
+        self._failures[connection_id] = failures
+        backoff = min(
+            settings.BANK_SYNC_BACKOFF_BASE_SECONDS * 2 ** (failures - 1),
+            settings.BANK_SYNC_BACKOFF_MAX_SECONDS,
+        )
+        # Full jitter so failing connections don't retry in lockstep
+        self._next_run[connection_id] = time.monotonic() + random.uniform(
+            backoff / 2, backoff
+        )
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get scheduler status and metrics
+
+        Returns:
+            Dictionary with queue depth, in-progress syncs, backoff state,
+            counters and the sync lag of tracked connections
+        """
+        now = datetime.utcnow()
+        lags = [
+            (now - self._last_synced[connection_id]).total_seconds()
+            if connection_id in self._last_synced
+            else None
+            for connection_id in self._next_run
+        ]
+        known_lags = [lag for lag in lags if lag is not None]
+        return {
+            "running": self.is_running,
+            "workers": self.max_concurrency,
+            "per_user_concurrency": self.per_user_concurrency,
+            "interval_seconds": self.interval,
+            "queue_depth": self._queue.qsize(),
+            "deferred": sum(len(waiting) for waiting in self._deferred.values()),
+            "in_progress": len(self._running),
+            "connections_tracked": len(self._next_run),
+            "connections_never_synced": len(lags) - len(known_lags),
+            "connections_backing_off": len(self._failures),
+            "max_sync_lag_seconds": round(max(known_lags), 1) if known_lags else None,
+            "avg_sync_lag_seconds": (
+                round(sum(known_lags) / len(known_lags), 1) if known_lags else None
+            ),
+            **self._stats,
+        }
+
+
+bank_sync_scheduler = BankSyncScheduler()
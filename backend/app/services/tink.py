@@ -0,0 +1,311 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+from app.core.config import settings
+from app.services.bank_provider import (
+    BankDataProvider,
+    BankProviderError,
+    BankProviderUnavailableError,
+    ProviderLimits,
+)
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint read timeouts in seconds
+ENDPOINT_TIMEOUTS = {
+    "token": 10.0,
+    "accounts": 10.0,
+    "transactions": 30.0,
+}
+
+# Largest page the Tink data API serves
+PAGE_SIZE = 100
+
+
+class TinkAPIError(BankProviderError):
+    """Raised when Tink returns an error response"""
+
+
+class TinkUnavailableError(TinkAPIError, BankProviderUnavailableError):
+    """Raised when Tink is unreachable or its circuit breaker is open"""
+
+
+def _amount(value: Optional[Dict[str, Any]]) -> float:
+    """Convert a Tink {unscaledValue, scale} amount into a float"""
+    if not value:
+        return 0.0
+    return int(value["unscaledValue"]) / 10 ** int(value.get("scale", 0))
+
+
+def normalize_account(account: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Tink data v2 account into the common account shape"""
+    identifiers = account.get("identifiers") or {}
+    booked = (account.get("balances") or {}).get("booked") or {}
+    return {
+        "account_id": account["id"],
+        "account_type": account.get("type", "UNDEFINED"),
+        "display_name": account.get("name"),
+        "currency": (booked.get("amount") or {}).get("currencyCode", ""),
+        "account_number": identifiers.get("iban") or identifiers.get("sortCode"),
+        "provider": {"display_name": account.get("financialInstitutionId")},
+    }
+
+
+def normalize_transaction(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Tink data v2 transaction into the common transaction shape"""
+    amount = transaction.get("amount") or {}
+    value = _amount(amount.get("value"))
+    dates = transaction.get("dates") or {}
+    descriptions = transaction.get("descriptions") or {}
+    category = ((transaction.get("categories") or {}).get("pfm") or {}).get("name")
+    merchant = transaction.get("merchantInformation") or {}
+    booked = dates.get("booked") or dates.get("value")
+    return {
+        "transaction_id": transaction["id"],
+        # Tink only has booking dates, which are treated as UTC midnight
+        "timestamp": f"{booked}T00:00:00+00:00" if booked else None,
+        "description": descriptions.get("display") or descriptions.get("original", ""),
+        "amount": value,
+        "currency": amount.get("currencyCode", ""),
+        "transaction_type": "DEBIT" if value < 0 else "CREDIT",
+        "transaction_category": category,
+        "merchant_name": merchant.get("merchantName"),
+        "meta": {
+            "status": transaction.get("status"),
+            "provider_transaction_type": (transaction.get("types") or {}).get("type"),
+            "provider_transaction_id": (transaction.get("identifiers") or {}).get(
+                "providerTransactionId"
+            ),
+        },
+    }
+
+
+class TinkService(BankDataProvider):
+    """Service for interacting with the Tink API"""
+
+    name = "tink"
+    display_name = "Tink"
+    api_error = TinkAPIError
+    unavailable_error = TinkUnavailableError
+    endpoint_timeouts = ENDPOINT_TIMEOUTS
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        auth_url: Optional[str] = None,
+        api_url: Optional[str] = None,
+    ):
+        super().__init__(
+            ProviderLimits(
+                max_connections=settings.TINK_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TINK_MAX_KEEPALIVE_CONNECTIONS,
+                read_timeout=settings.TINK_READ_TIMEOUT,
+                max_retries=settings.TINK_MAX_RETRIES,
+                fanout_concurrency=settings.TINK_FANOUT_CONCURRENCY,
+                rate_limit_per_second=settings.TINK_RATE_LIMIT_PER_SECOND,
+                rate_limit_burst=settings.TINK_RATE_LIMIT_BURST,
+            ),
+            auth_url=auth_url or settings.TINK_LINK_URL,
+            api_url=api_url or settings.TINK_API_URL,
+            transport=transport,
+            max_retries=max_retries,
+            backoff_base=backoff_base,
+        )
+        self.client_id = settings.TINK_CLIENT_ID
+        self.client_secret = settings.TINK_CLIENT_SECRET
+        self.redirect_uri = settings.TINK_REDIRECT_URI
+
+    async def get_auth_url(self, state: str = None) -> str:
+        """
+        Generate the Tink Link URL for connecting bank accounts
+
+        Args:
+            state: Optional state parameter for security
+
+        Returns:
+            Tink Link URL for the user to connect their bank account
+        """
+        params = {
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "market": settings.TINK_MARKET,
+            "locale": settings.TINK_LOCALE,
+            "scope": "accounts:read,balances:read,transactions:read,credentials:read",
+        }
+
+        if state:
+            params["state"] = state
+
+        return f"{self.auth_url}/1.0/transactions/connect-accounts?{urlencode(params)}"
+
+    async def _token(self, grant: Dict[str, str], action: str) -> Dict[str, Any]:
+        response = await self._request(
+            "POST",
+            f"{self.api_url}/api/v1/oauth/token",
+            "token",
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                **grant,
+            },
+        )
+
+        if response.status_code != 200:
+            raise TinkAPIError(
+                f"Failed to {action}: {response.text}",
+                status_code=response.status_code,
+            )
+
+        data = response.json()
+        expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
+
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": data["refresh_token"],
+            "expires_at": expires_at,
+        }
+
+    async def exchange_code_for_token(self, code: str) -> Dict[str, Any]:
+        """
+        Exchange authorization code for access token
+
+        Args:
+            code: Authorization code received from Tink Link
+
+        Returns:
+            Dictionary containing access_token, refresh_token, and expires_at
+        """
+        return await self._token(
+            {"grant_type": "authorization_code", "code": code},
+            "exchange code for token",
+        )
+
+    async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        """
+        Refresh an expired access token
+
+        Args:
+            refresh_token: The refresh token to use
+
+        Returns:
+            Dictionary containing new access_token, refresh_token, and expires_at
+        """
+        return await self._token(
+            {"grant_type": "refresh_token", "refresh_token": refresh_token},
+            "refresh token",
+        )
+
+    async def _get_pages(
+        self,
+        path: str,
+        endpoint: str,
+        key: str,
+        access_token: str,
+        params: Optional[Dict[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        GET a data API collection, following nextPageToken
+
+        Args:
+            path: Collection path under the API URL
+            endpoint: Endpoint name used for timeouts, breakers and metrics
+            key: Response field holding the collection
+            access_token: Tink access token
+            params: Optional query parameters
+
+        Returns:
+            Items of every page
+        """
+        params = {**(params or {}), "pageSize": str(PAGE_SIZE)}
+        results: List[Dict[str, Any]] = []
+        while True:
+            response = await self._request(
+                "GET",
+                f"{self.api_url}{path}",
+                endpoint,
+                params=params,
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+
+            if response.status_code != 200:
+                raise TinkAPIError(
+                    f"Failed to get {key}: {response.text}",
+                    status_code=response.status_code,
+                )
+
+            data = response.json()
+            results.extend(data.get(key, []))
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return results
+            params = {**params, "pageToken": page_token}
+
+    async def get_accounts(self, access_token: str) -> List[Dict[str, Any]]:
+        """
+        Get user's bank accounts
+
+        Args:
+            access_token: Tink access token
+
+        Returns:
+            List of bank accounts in the common account shape
+        """
+        accounts = await self._get_pages(
+            "/data/v2/accounts", "accounts", "accounts", access_token
+        )
+        return [normalize_account(account) for account in accounts]
+
+    async def get_transactions(
+        self,
+        access_token: str,
+        account_id: str,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get transactions for a specific account
+
+        Args:
+            access_token: Tink access token
+            account_id: Account ID to get transactions for
+            from_date: Optional start date in YYYY-MM-DD format
+            to_date: Optional end date in YYYY-MM-DD format
+
+        Returns:
+            List of transactions in the common transaction shape
+        """
+        params = {"accountIdIn": account_id}
+        if from_date:
+            params["bookedDateGte"] = from_date
+        if to_date:
+            params["bookedDateLte"] = to_date
+
+        transactions = await self._get_pages(
+            "/data/v2/transactions",
+            "transactions",
+            "transactions",
+            access_token,
+            params,
+        )
+        return [normalize_transaction(t) for t in transactions]
+
+    async def get_standing_orders(
+        self, access_token: str, account_id: str
+    ) -> List[Dict[str, Any]]:
+        """Tink's data API has no standing orders resource"""
+        return []
+
+    async def get_direct_debits(
+        self, access_token: str, account_id: str
+    ) -> List[Dict[str, Any]]:
+        """Tink's data API has no direct debits resource"""
+        return []
+
+
+# Shared service instance whose connection pool lives for the app's lifetime
+tink_service = TinkService()
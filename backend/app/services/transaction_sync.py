@@ -0,0 +1,516 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from weakref import WeakValueDictionary
+
+from app.core.config import settings
+from app.models.account_sync_state import AccountSyncState
+from app.models.bank_connection import BankConnection
+from app.models.transaction import Transaction
+from app.services.bank_aggregator import get_bank_provider
+from app.services.bank_provider import BankDataProvider
+from app.services.reconciliation import (
+    TransactionReconciler,
+    transaction_reconciler,
+    transaction_status,
+)
+from app.services.recurring import normalize_merchant
+from app.services.recurring_series import (
+    RecurringSeriesService,
+    recurring_series_service,
+)
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse a provider timestamp into a naive UTC datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def serialize_transaction(transaction: Transaction) -> Dict[str, Any]:
+    """Convert a stored transaction back into the provider's response shape"""
+    return {
+        "transaction_id": transaction.transaction_id,
+        "timestamp": transaction.transaction_date.replace(
+            tzinfo=timezone.utc
+        ).isoformat(),
+        "description": transaction.description,
+        "amount": transaction.amount,
+        "currency": transaction.currency,
+        "transaction_type": transaction.transaction_type,
+        "transaction_category": transaction.category,
+        "merchant_name": transaction.merchant_name,
+        "running_balance": transaction.running_balance,
+        "meta": transaction.meta,
+        "status": transaction.status,
+    }
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    """Opaque pagination cursor pointing just past a transaction"""
+    position = [transaction.transaction_date.isoformat(), transaction.transaction_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode a pagination cursor into its (transaction_date, transaction_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        timestamp, transaction_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(timestamp), str(transaction_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class TransactionSyncService:
+    """Keeps the local transaction store in sync with the provider"""
+
+    def __init__(
+        self,
+        provider: Optional[BankDataProvider] = None,
+        recurring_service: RecurringSeriesService = recurring_series_service,
+        reconciler: TransactionReconciler = transaction_reconciler,
+    ):
+        # Without a fixed provider, each connection's own provider is used
+        self.provider = provider
+        self.recurring_service = recurring_service
+        self.reconciler = reconciler
+        # One sync at a time per (connection, account). A lock is dropped once
+        # no sync holds or waits for it, so the map only keeps busy accounts
+        self._locks: "WeakValueDictionary[Tuple[int, str], asyncio.Lock]" = (
+            WeakValueDictionary()
+        )
+
+    def _lock(self, bank_connection: BankConnection, account_id: str) -> asyncio.Lock:
+        """Get the lock serializing syncs of an account"""
+        key = (bank_connection.id, account_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def get_sync_state(
+        self, db: Session, bank_connection: BankConnection, account_id: str
+    ) -> Optional[AccountSyncState]:
+        """Get the sync state of an account, if it has been synced before"""
+        return (
+            db.query(AccountSyncState)
+            # Another session may have just synced the account
+            .populate_existing()
+            .filter(
+                AccountSyncState.bank_connection_id == bank_connection.id,
+                AccountSyncState.account_id == account_id,
+            )
+            .first()
+        )
+
+    def is_stale(self, state: Optional[AccountSyncState]) -> bool:
+        """Check whether an account's local data is too old to serve as-is"""
+        if state is None or state.last_synced_at is None:
+            return True
+        age = datetime.utcnow() - state.last_synced_at
+        return age.total_seconds() > settings.TRANSACTION_SYNC_STALE_SECONDS
+
+    def store_transactions(
+        self,
+        db: Session,
+        bank_connection: BankConnection,
+        account_id: str,
+        transactions: List[Dict[str, Any]],
+    ) -> int:
+        """
+        Insert or update provider transactions, keyed by provider transaction id
+
+        Stored transactions are then reconciled, so pending transactions that
+        have settled and repeats under a new id are marked as duplicates.
+
+        Args:
+            db: Database session
+            bank_connection: Connection the transactions were fetched through
+            account_id: Account the transactions belong to
+            transactions: Transactions in the provider's response shape
+
+        Returns:
+            Number of newly inserted transactions
+        """
+        transaction_ids = [
+            t["transaction_id"] for t in transactions if t.get("transaction_id")
+        ]
+        existing = {}
+        if transaction_ids:
+            existing = {
+                row.transaction_id: row
+                for row in db.query(Transaction).filter(
+                    Transaction.account_id == account_id,
+                    Transaction.transaction_id.in_(transaction_ids),
+                )
+            }
+
+        inserted = 0
+        stored = []
+        for data in transactions:
+            transaction_id = data.get("transaction_id")
+            if not transaction_id:
+                continue
+
+            row = existing.get(transaction_id)
+            if row is None:
+                row = Transaction(
+                    user_id=bank_connection.user_id,
+                    bank_connection_id=bank_connection.id,
+                    provider=bank_connection.provider,
+                    account_id=account_id,
+                    transaction_id=transaction_id,
+                )
+                db.add(row)
+                existing[transaction_id] = row
+                inserted += 1
+
+            amount = data.get("amount") or 0.0
+            row.amount = amount
+            row.currency = data.get("currency")
+            row.category = data.get("transaction_category")
+            row.transaction_type = data.get("transaction_type")
+            row.merchant_name = data.get("merchant_name")
+            row.description = data.get("description", "")
+            row.merchant_key = normalize_merchant(row.description, row.merchant_name)
+            row.transaction_date = parse_timestamp(data.get("timestamp"))
+            row.is_expense = amount < 0
+            row.running_balance = data.get("running_balance")
+            row.meta = data.get("meta")
+            row.status = transaction_status(data)
+            stored.append(row)
+
+        self.reconciler.reconcile_rows(db, account_id, stored)
+        return inserted
+
+    async def sync_account(
+        self,
+        db: Session,
+        bank_connection: BankConnection,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+    ) -> int:
+        """
+        Fetch new transactions for an account and store them locally
+
+        The first sync fetches TRANSACTION_SYNC_INITIAL_DAYS of history. Later
+        syncs only fetch from the high-water mark minus an overlap window, so
+        late-posting transactions are still picked up. Passing a from_date
+        earlier than the stored history backfills the missing range. Recurring
+        series of merchants with new payments are updated in the same commit.
+
+        Args:
+            db: Database session
+            bank_connection: Connection with a valid access token
+            account_id: Account to sync
+            from_date: Optional earliest date the caller needs
+
+        Returns:
+            Number of newly inserted transactions
+        """
+        async with self._lock(bank_connection, account_id):
+            return await self._sync_account(db, bank_connection, account_id, from_date)
+
+    async def _sync_account(
+        self,
+        db: Session,
+        bank_connection: BankConnection,
+        account_id: str,
+        from_date: Optional[datetime],
+    ) -> int:
+        state = self.get_sync_state(db, bank_connection, account_id)
+        now = datetime.utcnow()
+
+        if state is None:
+            state = AccountSyncState(
+                bank_connection_id=bank_connection.id, account_id=account_id
+            )
+            db.add(state)
+
+        if state.last_transaction_at is not None:
+            fetch_from = state.last_transaction_at - timedelta(
+                days=settings.TRANSACTION_SYNC_OVERLAP_DAYS
+            )
+        else:
+            fetch_from = now - timedelta(days=settings.TRANSACTION_SYNC_INITIAL_DAYS)
+
+        # Backfill if the caller needs history older than what we have
+        if from_date is not None and (
+            state.synced_from is None or from_date < state.synced_from
+        ):
+            fetch_from = min(fetch_from, from_date)
+
+        provider = self.provider or get_bank_provider(bank_connection.provider)
+        transactions = await provider.get_transactions(
+            bank_connection.access_token,
+            account_id,
+            fetch_from.strftime("%Y-%m-%d"),
+        )
+
+        inserted = self.store_transactions(db, bank_connection, account_id, transactions)
+
+        # Only merchants with new or newly superseded payments need their
+        # series recomputed
+        new_merchants = {
+            row.merchant_key
+            for row in db.new
+            if isinstance(row, Transaction) and row.is_expense
+        } | {
+            row.merchant_key
+            for row in db.dirty
+            if isinstance(row, Transaction)
+            and row.is_expense
+            and row.duplicate_of is not None
+        }
+        self.recurring_service.update_merchants(
+            db, bank_connection.user_id, account_id, new_merchants
+        )
+
+        timestamps = [
+            parse_timestamp(t.get("timestamp"))
+            for t in transactions
+            if t.get("timestamp")
+        ]
+        if timestamps:
+            newest = max(timestamps)
+            if state.last_transaction_at is None or newest > state.last_transaction_at:
+                state.last_transaction_at = newest
+        if state.synced_from is None or fetch_from < state.synced_from:
+            state.synced_from = fetch_from
+        state.last_synced_at = now
+
+        db.commit()
+        logger.info(
+            f"Synced account {account_id}: {len(transactions)} fetched, {inserted} new"
+        )
+        return inserted
+
+    async def ensure_synced(
+        self,
+        db: Session,
+        bank_connection: BankConnection,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+    ) -> None:
+        """
+        Sync an account only if its local data is stale or incomplete
+
+        Concurrent callers for the same account wait for the sync in progress
+        and then find the data fresh, instead of syncing it again.
+        """
+        async with self._lock(bank_connection, account_id):
+            state = self.get_sync_state(db, bank_connection, account_id)
+            needs_backfill = (
+                state is not None
+                and state.synced_from is not None
+                and from_date is not None
+                and from_date < state.synced_from
+            )
+            if self.is_stale(state) or needs_backfill:
+                await self._sync_account(db, bank_connection, account_id, from_date)
+
+    async def reconcile_account(
+        self, db: Session, bank_connection: BankConnection, account_id: str
+    ) -> Dict[str, int]:
+        """
+        Re-reconcile an account's whole stored history and rebuild its series
+
+        Used after the reconciliation settings change or to clean up history
+        stored before reconciliation existed.
+
+        Returns:
+            Number of transactions scanned, duplicates found and series stored
+        """
+        async with self._lock(bank_connection, account_id):
+            result = self.reconciler.reconcile_account(db, account_id)
+            result["series"] = self.recurring_service.rebuild_account(
+                db, bank_connection.user_id, account_id
+            )
+            db.commit()
+            return result
+
+    def query_transactions(
+        self,
+        db: Session,
+        user_id: int,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+    ) -> List[Transaction]:
+        """Get stored transactions for an account, newest first"""
+        return self._filtered_query(
+            db, user_id, account_id, from_date, to_date
+        ).all()
+
+    def _filtered_query(
+        self,
+        db: Session,
+        user_id: int,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        categories: Optional[List[str]] = None,
+        merchant: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        direction: Optional[str] = None,
+    ):
+        """Build the newest-first query of an account's matching transactions"""
+        query = db.query(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.account_id == account_id,
+            Transaction.duplicate_of.is_(None),
+        )
+        if from_date is not None:
+            query = query.filter(Transaction.transaction_date >= from_date)
+        if to_date is not None:
+            query = query.filter(Transaction.transaction_date < to_date)
+        if categories:
+            query = query.filter(Transaction.category.in_(categories))
+        if merchant:
+            query = query.filter(
+                Transaction.merchant_key == normalize_merchant(merchant)
+            )
+        if direction == "debit":
+            query = query.filter(Transaction.amount < 0)
+        elif direction == "credit":
+            query = query.filter(Transaction.amount > 0)
+        if min_amount is not None or max_amount is not None:
+            # The range applies to the size of the amount, in either direction
+            low = min_amount or 0.0
+            credit = [Transaction.amount >= low]
+            debit = [Transaction.amount <= -low]
+            if max_amount is not None:
+                credit.append(Transaction.amount <= max_amount)
+                debit.append(Transaction.amount >= -max_amount)
+            query = query.filter(or_(and_(*credit), and_(*debit)))
+        return query.order_by(
+            Transaction.transaction_date.desc(), Transaction.transaction_id.desc()
+        )
+
+    def page_transactions(
+        self,
+        db: Session,
+        user_id: int,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        categories: Optional[List[str]] = None,
+        merchant: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        direction: Optional[str] = None,
+        limit: Optional[int] = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Transaction], Optional[str]]:
+        """
+        Get one page of stored transactions, newest first
+
+        Pages are ordered by (transaction_date, transaction_id) and each page
+        seeks past the previous one's last row on the composite indexes
+        instead of using OFFSET, so fetching a page costs the same however
+        deep into the history it is.
+
+        Args:
+            db: Database session
+            user_id: Owner of the account
+            account_id: Account to read
+            from_date: Optional inclusive start
+            to_date: Optional exclusive end
+            categories: Optional provider categories to include
+            merchant: Optional merchant, matched on its normalized key
+            min_amount: Optional minimum size of the amount
+            max_amount: Optional maximum size of the amount
+            direction: Optional "debit" (money out) or "credit" (money in)
+            limit: Page size, None for every matching transaction at once
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            The page and the cursor of the next page, None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = self._filtered_query(
+            db,
+            user_id,
+            account_id,
+            from_date,
+            to_date,
+            categories,
+            merchant,
+            min_amount,
+            max_amount,
+            direction,
+        )
+        if cursor:
+            query = query.filter(
+                tuple_(Transaction.transaction_date, Transaction.transaction_id)
+                < tuple_(*decode_cursor(cursor))
+            )
+
+        if limit is None:
+            return query.all(), None
+        # One extra row tells whether there is a next page
+        rows = query.limit(limit + 1).all()
+        if len(rows) <= limit:
+            return rows, None
+        return rows[:limit], encode_cursor(rows[limit - 1])
+
+    def iter_transaction_batches(
+        self,
+        db: Session,
+        user_id: int,
+        account_id: str,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        batch_size: int = 500,
+    ) -> Iterator[List[Transaction]]:
+        """
+        Yield stored transactions newest first, one batch at a time
+
+        Batches are keyset pages (see page_transactions), and each batch is
+        dropped from the session once it has been yielded, so memory stays
+        bounded however long the history is.
+        """
+        cursor = None
+        while True:
+            batch, cursor = self.page_transactions(
+                db,
+                user_id,
+                account_id,
+                from_date,
+                to_date,
+                limit=batch_size,
+                cursor=cursor,
+            )
+            if batch:
+                yield batch
+
+            for transaction in batch:
+                db.expunge(transaction)
+            if cursor is None:
+                return
+
+
+transaction_sync_service = TransactionSyncService()
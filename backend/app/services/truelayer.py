@@ -1,22 +1,83 @@
-import json
+import logging
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlsplit
 
 import httpx
 from app.core.config import settings
+from app.services.bank_provider import (
+    BankDataProvider,
+    BankProviderError,
+    BankProviderUnavailableError,
+    ProviderLimits,
+)
 
+logger = logging.getLogger(__name__)
 
-class TrueLayerService:
+# Per-endpoint read timeouts in seconds
+ENDPOINT_TIMEOUTS = {
+    "token": 10.0,
+    "accounts": 10.0,
+    "transactions": 30.0,
+    "standing_orders": 10.0,
+    "direct_debits": 10.0,
+}
+
+
+class TrueLayerAPIError(BankProviderError):
+    """Raised when TrueLayer returns an error response"""
+
+
+class TrueLayerUnavailableError(TrueLayerAPIError, BankProviderUnavailableError):
+    """Raised when TrueLayer is unreachable or its circuit breaker is open"""
+
+
+class TrueLayerService(BankDataProvider):
     """Service for interacting with TrueLayer API"""
 
-    def __init__(self):
+    name = "truelayer"
+    display_name = "TrueLayer"
+    api_error = TrueLayerAPIError
+    unavailable_error = TrueLayerUnavailableError
+    endpoint_timeouts = ENDPOINT_TIMEOUTS
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        auth_url: Optional[str] = None,
+        api_url: Optional[str] = None,
+    ):
+        super().__init__(
+            ProviderLimits(
+                max_connections=settings.TRUELAYER_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TRUELAYER_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.TRUELAYER_KEEPALIVE_EXPIRY,
+                http2=settings.TRUELAYER_HTTP2,
+                connect_timeout=settings.TRUELAYER_CONNECT_TIMEOUT,
+                read_timeout=settings.TRUELAYER_READ_TIMEOUT,
+                max_retries=settings.TRUELAYER_MAX_RETRIES,
+                backoff_base_seconds=settings.TRUELAYER_BACKOFF_BASE_SECONDS,
+                backoff_max_seconds=settings.TRUELAYER_BACKOFF_MAX_SECONDS,
+                retry_after_max_seconds=settings.TRUELAYER_RETRY_AFTER_MAX_SECONDS,
+                breaker_failure_threshold=settings.TRUELAYER_BREAKER_FAILURE_THRESHOLD,
+                breaker_reset_seconds=settings.TRUELAYER_BREAKER_RESET_SECONDS,
+                stale_cache_size=settings.TRUELAYER_STALE_CACHE_SIZE,
+                fanout_concurrency=settings.TRUELAYER_FANOUT_CONCURRENCY,
+                rate_limit_per_second=settings.TRUELAYER_RATE_LIMIT_PER_SECOND,
+                rate_limit_burst=settings.TRUELAYER_RATE_LIMIT_BURST,
+            ),
+            # Live URLs by default, configurable to point at a stand-in server
+            auth_url=auth_url or settings.TRUELAYER_AUTH_URL,
+            api_url=api_url or settings.TRUELAYER_API_URL,
+            transport=transport,
+            max_retries=max_retries,
+            backoff_base=backoff_base,
+        )
         self.client_id = settings.TRUELAYER_CLIENT_ID
         self.client_secret = settings.TRUELAYER_CLIENT_SECRET
         self.redirect_uri = settings.TRUELAYER_REDIRECT_URI
-        # Use live URLs instead of sandbox
-        self.auth_url = "https://auth.truelayer.com"
-        self.api_url = "https://api.truelayer.com"
 
     async def get_auth_url(self, state: str = None) -> str:
         """
@@ -52,29 +113,33 @@ class TrueLayerService:
         Returns:
             Dictionary containing access_token, refresh_token, and expires_at
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.auth_url}/connect/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "redirect_uri": self.redirect_uri,
-                    "code": code,
-                },
+        response = await self._request(
+            "POST",
+            f"{self.auth_url}/connect/token",
+            "token",
+            data={
+                "grant_type": "authorization_code",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uri": self.redirect_uri,
+                "code": code,
+            },
+        )
+
+        if response.status_code != 200:
+            raise TrueLayerAPIError(
+                f"Failed to exchange code for token: {response.text}",
+                status_code=response.status_code,
             )
 
-            if response.status_code != 200:
-                raise Exception(f"Failed to exchange code for token: {response.text}")
-
-            data = response.json()
-            expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
+        data = response.json()
+        expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
 
-            return {
-                "access_token": data["access_token"],
-                "refresh_token": data["refresh_token"],
-                "expires_at": expires_at,
-            }
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": data["refresh_token"],
+            "expires_at": expires_at,
+        }
 
     async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """
@@ -86,50 +151,101 @@ class TrueLayerService:
         Returns:
             Dictionary containing new access_token, refresh_token, and expires_at
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.auth_url}/connect/token",
-                data={
-                    "grant_type": "refresh_token",
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "refresh_token": refresh_token,
-                },
+        response = await self._request(
+            "POST",
+            f"{self.auth_url}/connect/token",
+            "token",
+            data={
+                "grant_type": "refresh_token",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "refresh_token": refresh_token,
+            },
+        )
+
+        if response.status_code != 200:
+            raise TrueLayerAPIError(
+                f"Failed to refresh token: {response.text}",
+                status_code=response.status_code,
             )
 
-            if response.status_code != 200:
-                raise Exception(f"Failed to refresh token: {response.text}")
-
-            data = response.json()
-            expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
+        data = response.json()
+        expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
 
-            return {
-                "access_token": data["access_token"],
-                "refresh_token": data["refresh_token"],
-                "expires_at": expires_at,
-            }
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": data["refresh_token"],
+            "expires_at": expires_at,
+        }
 
-    async def get_accounts(self, access_token: str) -> List[Dict[str, Any]]:
+    async def _get_results(
+        self,
+        url: str,
+        endpoint: str,
+        resource: str,
+        access_token: str,
+        params: Optional[Dict[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
         """
-        Get user's bank accounts
+        GET a data API collection, following pagination links
 
         Args:
+            url: Collection URL
+            endpoint: Endpoint name used for timeouts, breakers and metrics
+            resource: Human-readable resource name for error messages
             access_token: TrueLayer access token
+            params: Optional query parameters for the first page
 
         Returns:
-            List of bank accounts
+            Results of every page
+
+        Raises:
+            TrueLayerAPIError: If a page links outside the data API
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.api_url}/data/v1/accounts",
+        api = urlsplit(self.api_url)
+        results: List[Dict[str, Any]] = []
+        next_url: Optional[str] = url
+        while next_url:
+            response = await self._request(
+                "GET",
+                next_url,
+                endpoint,
+                params=params,
                 headers={"Authorization": f"Bearer {access_token}"},
             )
 
             if response.status_code != 200:
-                raise Exception(f"Failed to get accounts: {response.text}")
+                raise TrueLayerAPIError(
+                    f"Failed to get {resource}: {response.text}",
+                    status_code=response.status_code,
+                )
 
             data = response.json()
-            return data.get("results", [])
+            results.extend(data.get("results", []))
+            # Next-page links already carry the original query
+            next_url, params = data.get("next"), None
+            # The access token is only ever sent to the data API itself
+            if next_url:
+                link = urlsplit(next_url)
+                if (link.scheme, link.netloc) != (api.scheme, api.netloc):
+                    raise TrueLayerAPIError(
+                        f"Failed to get {resource}: next page is not on the data API"
+                    )
+        return results
+
+    async def get_accounts(self, access_token: str) -> List[Dict[str, Any]]:
+        """
+        Get user's bank accounts
+
+        Args:
+            access_token: TrueLayer access token
+
+        Returns:
+            List of bank accounts
+        """
+        return await self._get_results(
+            f"{self.api_url}/data/v1/accounts", "accounts", "accounts", access_token
+        )
 
     async def get_transactions(
         self,
@@ -156,19 +272,13 @@ class TrueLayerService:
         if to_date:
             params["to"] = to_date
 
-        query_string = f"?{urlencode(params)}" if params else ""
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.api_url}/data/v1/accounts/{account_id}/transactions{query_string}",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-
-            if response.status_code != 200:
-                raise Exception(f"Failed to get transactions: {response.text}")
-
-            data = response.json()
-            return data.get("results", [])
+        return await self._get_results(
+            f"{self.api_url}/data/v1/accounts/{account_id}/transactions",
+            "transactions",
+            "transactions",
+            access_token,
+            params,
+        )
 
     async def get_standing_orders(
         self, access_token: str, account_id: str
@@ -183,17 +293,12 @@ class TrueLayerService:
         Returns:
             List of standing orders
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.api_url}/data/v1/accounts/{account_id}/standing_orders",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-
-            if response.status_code != 200:
-                raise Exception(f"Failed to get standing orders: {response.text}")
-
-            data = response.json()
-            return data.get("results", [])
+        return await self._get_results(
+            f"{self.api_url}/data/v1/accounts/{account_id}/standing_orders",
+            "standing_orders",
+            "standing orders",
+            access_token,
+        )
 
     async def get_direct_debits(
         self, access_token: str, account_id: str
@@ -208,95 +313,13 @@ class TrueLayerService:
         Returns:
             List of direct debits
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.api_url}/data/v1/accounts/{account_id}/direct_debits",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-
-            if response.status_code != 200:
-                raise Exception(f"Failed to get direct debits: {response.text}")
-
-            data = response.json()
-            return data.get("results", [])
-
-    async def identify_subscriptions(
-        self, transactions: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
-        """
-        Identify potential subscriptions from transaction data
+        return await self._get_results(
+            f"{self.api_url}/data/v1/accounts/{account_id}/direct_debits",
+            "direct_debits",
+            "direct debits",
+            access_token,
+        )
 
-        Args:
-            transactions: List of transactions
 
-        Returns:
-            List of identified subscriptions
-        """
-        # This is a simplified implementation
-        # In a real-world scenario, you would use more sophisticated algorithms
-        # to identify recurring payments with similar amounts and descriptions
-
-        # Group transactions by description and similar amounts
-        subscriptions = {}
-
-        for transaction in transactions:
-            description = transaction.get("description", "").lower()
-            amount = transaction.get("amount")
-
-            if not description or not amount:
-                continue
-
-            # Skip deposits
-            if amount > 0:
-                continue
-
-            key = f"{description}_{round(abs(amount), 2)}"
-
-            if key not in subscriptions:
-                subscriptions[key] = {
-                    "description": description,
-                    "amount": abs(amount),
-                    "occurrences": [],
-                    "frequency": "unknown",
-                }
-
-            subscriptions[key]["occurrences"].append(transaction.get("timestamp"))
-
-        # Filter out transactions with less than 2 occurrences
-        result = []
-        for key, sub in subscriptions.items():
-            if len(sub["occurrences"]) >= 2:
-                # Sort occurrences by date
-                sub["occurrences"].sort()
-
-                # Try to determine frequency
-                if len(sub["occurrences"]) >= 3:
-                    # Calculate average days between payments
-                    days_between = []
-                    for i in range(1, len(sub["occurrences"])):
-                        date1 = datetime.fromisoformat(
-                            sub["occurrences"][i - 1].replace("Z", "+00:00")
-                        )
-                        date2 = datetime.fromisoformat(
-                            sub["occurrences"][i].replace("Z", "+00:00")
-                        )
-                        days = (date2 - date1).days
-                        days_between.append(days)
-
-                    avg_days = sum(days_between) / len(days_between)
-
-                    # Determine frequency
-                    if 25 <= avg_days <= 35:
-                        sub["frequency"] = "monthly"
-                    elif 6 <= avg_days <= 8:
-                        sub["frequency"] = "weekly"
-                    elif 13 <= avg_days <= 15:
-                        sub["frequency"] = "bi-weekly"
-                    elif 85 <= avg_days <= 95:
-                        sub["frequency"] = "quarterly"
-                    elif 350 <= avg_days <= 380:
-                        sub["frequency"] = "yearly"
-
-                result.append(sub)
-
-        return result
+# Shared service instance whose connection pool lives for the app's lifetime
+truelayer_service = TrueLayerService()
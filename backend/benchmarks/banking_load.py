@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Banking API Load Test
+
+Drives the /api/v1/banking endpoints in process against the local TrueLayer
+stand-in and reports p50/p95/p99 latency and throughput per endpoint, plus
+the provider call counts and connection pool and retry metrics. No network
+access or real credentials are needed.
+
+Usage:
+    python benchmarks/banking_load.py [--users 20] [--requests 500]
+        [--concurrency 20] [--latency-ms 50] [--error-rate 0.05]
+        [--rate-limit 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+STUB_URL = "http://truelayer-stub"
+
+# Endpoint mix: (name, weight)
+SCENARIOS = [
+    ("accounts", 2),
+    ("transactions", 4),
+    ("subscriptions", 2),
+    ("upcoming", 1),
+    ("overview", 1),
+]
+
+
+def seed_users(count: int) -> Dict[int, "User"]:
+    """Create users with active bank connections to the stand-in"""
+    from app.db.database import SessionLocal
+    from app.db.init_db import init_db
+    from app.models.bank_connection import BankConnection
+    from app.models.user import User
+
+    init_db()
+    db = SessionLocal()
+    users = {}
+    try:
+        for user_id in range(1, count + 1):
+            user = User(
+                id=user_id,
+                email=f"load{user_id}@example.com",
+                username=f"load{user_id}",
+                hashed_password="not-used",
+                is_active=True,
+            )
+            db.merge(user)
+            db.merge(
+                BankConnection(
+                    id=user_id,
+                    user_id=user_id,
+                    provider="truelayer",
+                    access_token=f"user{user_id}.access0",
+                    refresh_token=f"user{user_id}.refresh0",
+                    expires_at=datetime.now() + timedelta(hours=1),
+                    is_active=True,
+                )
+            )
+            users[user_id] = user
+        db.commit()
+    finally:
+        db.close()
+    return users
+
+
+def build_path(scenario: str, user_id: int, rng: random.Random) -> str:
+    account_id = f"user{user_id}-acc0"
+    if scenario == "accounts":
+        return "/api/v1/banking/accounts"
+    if scenario == "transactions":
+        days = rng.choice([7, 30, 90])
+        from_date = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+        return (
+            f"/api/v1/banking/transactions?account_id={account_id}"
+            f"&from_date={from_date}"
+        )
+    if scenario == "subscriptions":
+        return f"/api/v1/banking/subscriptions?account_id={account_id}"
+    if scenario == "upcoming":
+        return "/api/v1/banking/subscriptions/upcoming?days=30"
+    return "/api/v1/banking/overview"
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.api.deps import get_current_user
+    from app.main import app
+    from app.models.user import User
+    from app.services.truelayer import truelayer_service
+    from fastapi import Request
+    from tests.stubs.truelayer import TrueLayerStubConfig, create_truelayer_stub
+
+    # Per-request logging would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    stub = create_truelayer_stub(
+        TrueLayerStubConfig(
+            latency_ms=args.latency_ms,
+            latency_jitter_ms=args.latency_ms / 2,
+            error_rate=args.error_rate,
+            page_size=args.page_size,
+            transactions_per_account=args.transactions,
+            seed=args.seed,
+        )
+    )
+    await truelayer_service.use_transport(
+        httpx.ASGITransport(app=stub), auth_url=STUB_URL, api_url=STUB_URL
+    )
+
+    users = seed_users(args.users)
+
+    async def current_user(request: Request) -> User:
+        return users[int(request.headers["X-Load-User"])]
+
+    app.dependency_overrides[get_current_user] = current_user
+
+    rng = random.Random(args.seed)
+    names = [name for name, _ in SCENARIOS]
+    weights = [weight for _, weight in SCENARIOS]
+    plan = [
+        (rng.choices(names, weights)[0], rng.randint(1, args.users))
+        for _ in range(args.requests)
+    ]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://savquest"
+    ) as client:
+
+        async def send(scenario: str, user_id: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(
+                    build_path(scenario, user_id, rng),
+                    headers={"X-Load-User": str(user_id)},
+                )
+                latencies[scenario].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures[scenario] += 1
+                    if args.verbose:
+                        print(f"{scenario} {response.status_code}: {response.text}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(scenario, user) for scenario, user in plan))
+        elapsed = time.perf_counter() - started
+
+    await truelayer_service.aclose()
+    app.dependency_overrides.pop(get_current_user, None)
+
+    print(
+        f"{args.requests} requests, {args.users} users, concurrency "
+        f"{args.concurrency}, stand-in latency {args.latency_ms}ms, "
+        f"error rate {args.error_rate}"
+    )
+    print(
+        f"{'endpoint':<16}{'count':>7}{'errors':>8}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for scenario in names + ["all"]:
+        samples = (
+            [s for values in latencies.values() for s in values]
+            if scenario == "all"
+            else latencies[scenario]
+        )
+        if not samples:
+            continue
+        p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+        errors = (
+            sum(failures.values()) if scenario == "all" else failures[scenario]
+        )
+        print(
+            f"{scenario:<16}{len(samples):>7}{errors:>8}"
+            f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+        )
+    print(f"throughput: {args.requests / elapsed:.1f} req/s over {elapsed:.2f}s")
+
+    provider_calls = sum(stub.state.stats.values())
+    print(f"provider calls: {provider_calls} {dict(sorted(stub.state.stats.items()))}")
+    print(f"pool: {truelayer_service.get_pool_stats()}")
+    print(f"resilience: {truelayer_service.get_resilience_stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument("--transactions", type=int, default=300)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="client-side provider rate limit in requests/s, 0 for none",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="print failures")
+    args = parser.parse_args()
+
+    # Configure the app before it is imported: a throwaway database with a
+    # pool large enough for the request concurrency, and no background sync
+    db_dir = tempfile.mkdtemp(prefix="banking-load-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_dir}/load.db"
+    os.environ["DATABASE_POOL_SIZE"] = str(args.concurrency)
+    os.environ["BANK_SYNC_ENABLED"] = "false"
+    os.environ["TRUELAYER_RATE_LIMIT_PER_SECOND"] = str(args.rate_limit)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
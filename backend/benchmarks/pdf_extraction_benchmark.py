@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+PDF Text Extraction Benchmark
+
+Compares extracting a multi-statement upload one page after another on a
+single thread with the process pool extraction engine, on synthetic
+statement PDFs.
+
+Usage:
+    python benchmarks/pdf_extraction_benchmark.py [--statements 5] [--pages 12]
+        [--workers 0]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.services.pdf_analysis import extract_text_from_pdf  # noqa: E402
+from app.services.pdf_extraction import PDFExtractionEngine  # noqa: E402
+from tests.stubs.statements import build_statement  # noqa: E402
+
+
+async def run(args: argparse.Namespace) -> None:
+    documents = [
+        (f"statement-{i}.pdf", build_statement(args.pages, args.rows))
+        for i in range(args.statements)
+    ]
+
+    began = time.perf_counter()
+    serial = [extract_text_from_pdf(BytesIO(content)) for _, content in documents]
+    serial_seconds = time.perf_counter() - began
+
+    engine = PDFExtractionEngine(max_workers=args.workers or None)
+    await engine.startup()
+    try:
+        # Warm the workers up so process start-up isn't timed
+        await engine.extract(documents[0][1])
+        began = time.perf_counter()
+        results = await engine.extract_many(documents)
+        pool_seconds = time.perf_counter() - began
+    finally:
+        await engine.aclose()
+
+    assert [r["text"] for r in results] == serial
+    pages = args.statements * args.pages
+    page_seconds = sorted(s for r in results for s in r["page_seconds"])
+    print(f"{args.statements} statements, {pages} pages, {engine.max_workers} workers")
+    print(f"serial:  {serial_seconds:.2f}s")
+    print(f"pool:    {pool_seconds:.2f}s ({serial_seconds / pool_seconds:.1f}x)")
+    print(
+        f"page:    p50 {page_seconds[len(page_seconds) // 2] * 1000:.1f}ms, "
+        f"max {page_seconds[-1] * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--statements", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=0, help="0 for one per CPU")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Recurring Payment Detection Benchmark
+
+Compares the vectorized recurring payment engine against the original
+exact-match implementation of identify_subscriptions on synthetic
+transaction histories, both per user and as a single batch call.
+
+Usage:
+    python benchmarks/recurring_benchmark.py [--users 200] [--days 365]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.recurring import RecurringPaymentEngine  # noqa: E402
+
+SUBSCRIPTIONS = [
+    ("NETFLIX.COM {ref}", 10.99, 30),
+    ("SPOTIFY P{ref}", 9.99, 30),
+    ("DD AMAZON PRIME {ref}", 8.99, 30),
+    ("GYM GROUP {ref}", 24.99, 30),
+    ("CARD PAYMENT TO PURE GYM", 5.00, 7),
+    ("ICLOUD STORAGE", 0.99, 30),
+    ("AA INSURANCE {ref}", 120.00, 91),
+    ("ADOBE CREATIVE CLOUD", 239.88, 365),
+]
+MERCHANTS = ["TESCO", "SAINSBURYS", "PRET A MANGER", "UBER", "AMAZON", "COSTA"]
+
+
+def legacy_identify_subscriptions(
+    transactions: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Original exact-match implementation of identify_subscriptions"""
+    # This is a simplified implementation
+    # In a real-world scenario, you would use more sophisticated algorithms
+    # to identify recurring payments with similar amounts and descriptions
+
+    # Group transactions by description and similar amounts
+    subscriptions = {}
+
+    for transaction in transactions:
+        description = transaction.get("description", "").lower()
+        amount = transaction.get("amount")
+
+        if not description or not amount:
+            continue
+
+        # Skip deposits
+        if amount > 0:
+            continue
+
+        key = f"{description}_{round(abs(amount), 2)}"
+
+        if key not in subscriptions:
+            subscriptions[key] = {
+                "description": description,
+                "amount": abs(amount),
+                "occurrences": [],
+                "frequency": "unknown",
+            }
+
+        subscriptions[key]["occurrences"].append(transaction.get("timestamp"))
+
+    # Filter out transactions with less than 2 occurrences
+    result = []
+    for key, sub in subscriptions.items():
+        if len(sub["occurrences"]) >= 2:
+            # Sort occurrences by date
+            sub["occurrences"].sort()
+
+            # Try to determine frequency
+            if len(sub["occurrences"]) >= 3:
+                # Calculate average days between payments
+                days_between = []
+                for i in range(1, len(sub["occurrences"])):
+                    date1 = datetime.fromisoformat(
+                        sub["occurrences"][i - 1].replace("Z", "+00:00")
+                    )
+                    date2 = datetime.fromisoformat(
+                        sub["occurrences"][i].replace("Z", "+00:00")
+                    )
+                    days = (date2 - date1).days
+                    days_between.append(days)
+
+                avg_days = sum(days_between) / len(days_between)
+
+                # Determine frequency
+                if 25 <= avg_days <= 35:
+                    sub["frequency"] = "monthly"
+                elif 6 <= avg_days <= 8:
+                    sub["frequency"] = "weekly"
+                elif 13 <= avg_days <= 15:
+                    sub["frequency"] = "bi-weekly"
+                elif 85 <= avg_days <= 95:
+                    sub["frequency"] = "quarterly"
+                elif 350 <= avg_days <= 380:
+                    sub["frequency"] = "yearly"
+
+            result.append(sub)
+
+    return result
+
+
+def generate_history(days: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Generate one user's history of subscriptions and everyday spending"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    transactions = []
+    for template, amount, interval in SUBSCRIPTIONS:
+        if rng.random() < 0.3:
+            continue
+        day = rng.randint(0, interval - 1)
+        while day < days:
+            # Payments drift by a day or two and references change each time
+            drift = rng.choice([0, 0, 1, -1, 2])
+            transactions.append(
+                {
+                    "description": template.format(ref=rng.randint(1000, 9999)),
+                    "amount": -amount,
+                    "timestamp": (start + timedelta(days=day + drift)).isoformat(),
+                }
+            )
+            day += interval
+    for day in range(days):
+        for _ in range(rng.randint(0, 3)):
+            transactions.append(
+                {
+                    "description": rng.choice(MERCHANTS),
+                    "amount": -round(rng.uniform(2, 80), 2),
+                    "timestamp": (start + timedelta(days=day)).isoformat(),
+                }
+            )
+    rng.shuffle(transactions)
+    return transactions
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def count_known(series: List[Dict[str, Any]]) -> int:
+    return sum(1 for s in series if s["frequency"] != "unknown")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    histories = {user: generate_history(args.days, rng) for user in range(args.users)}
+    total = sum(len(history) for history in histories.values())
+    engine = RecurringPaymentEngine()
+
+    legacy_time = timed(
+        lambda: [legacy_identify_subscriptions(h) for h in histories.values()]
+    )
+    per_user_time = timed(lambda: [engine.detect(h) for h in histories.values()])
+    batch_time = timed(engine.detect_batch, histories)
+
+    # Series with a recognised billing frequency
+    legacy_found = sum(
+        count_known(legacy_identify_subscriptions(h)) for h in histories.values()
+    )
+    engine_found = sum(
+        count_known(series) for series in engine.detect_batch(histories).values()
+    )
+
+    print(f"{args.users} users, {total} transactions")
+    print(f"{'implementation':<24}{'seconds':>10}{'tx/s':>14}{'series found':>14}")
+    for name, seconds, found in [
+        ("legacy", legacy_time, legacy_found),
+        ("engine (per user)", per_user_time, engine_found),
+        ("engine (batch)", batch_time, engine_found),
+    ]:
+        print(f"{name:<24}{seconds:>10.3f}{total / seconds:>14,.0f}{found:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from app.api.api_v1.endpoints import statement_analysis
+from app.db.database import get_db
+from app.main import app
+from app.services.analysis_jobs import AnalysisJobQueue
+from tests.api.test_streaming import STATEMENT, parse_events
+from tests.conftest import TestingSessionLocal
+from tests.stubs.statements import build_pdf
+
+REPLY = {
+    "recommendations": ["Cook at home"],
+    "traits": {"saver": 70, "investor": 40, "planner": 60, "knowledgeable": 50},
+    "xpEarned": 400,
+}
+
+
+@pytest.fixture
+def jobs(monkeypatch, db_session):
+    def get_test_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    queue = AnalysisJobQueue(session_factory=TestingSessionLocal, concurrency=2)
+    monkeypatch.setattr(statement_analysis, "analysis_job_queue", queue)
+    yield queue
+    app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.mark.asyncio
+async def test_submitted_statements_are_analyzed_in_the_background(fake_llm, jobs):
+    """Test submit, dedupe, events, then status and result"""
+    completions = fake_llm(json.dumps(REPLY), delay=0.01)
+    pdf = build_pdf([STATEMENT])
+    files = [("files", ("may.pdf", pdf, "application/pdf"))]
+
+    await jobs.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test/api/v1/statement-analysis"
+    ) as client:
+        submitted = await asyncio.gather(
+            client.post("/jobs", files=files), client.post("/jobs", files=files)
+        )
+        assert [response.status_code for response in submitted] == [202, 202]
+        first, second = sorted(
+            (response.json() for response in submitted),
+            key=lambda job: job["deduplicated"],
+        )
+        assert (first["status"], first["deduplicated"]) == ("queued", False)
+        assert (second["jobId"], second["deduplicated"]) == (first["jobId"], True)
+        job_id = first["jobId"]
+
+        events = parse_events((await client.get(f"/jobs/{job_id}/events")).text)
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        result = await client.get(f"/jobs/{job_id}/result")
+        missing = await client.get("/jobs/unknown/result")
+    await jobs.stop()
+
+    assert [data["status"] for event, data in events if event == "status"][-1] == (
+        "completed"
+    )
+    assert events[-1][0] == "result"
+    assert events[-1][1]["result"] == result.json()
+    assert job["status"] == "completed"
+    assert result.json()["totalExpenses"] == 1254.2
+    assert result.json()["recommendations"] == ["Cook at home"]
+    assert missing.status_code == 404
+    assert len(completions.streams) == 1
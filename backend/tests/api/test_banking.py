@@ -1,12 +1,16 @@
+import json
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import pytest
 from app.api.deps import get_current_user
+from app.core.config import settings
+from app.db.database import get_db
 from app.main import app
 from app.models.bank_connection import BankConnection
 from app.models.user import User
 from fastapi.testclient import TestClient
+from tests.stubs.webhooks import build_webhook
 
 client = TestClient(app)
 
@@ -54,16 +58,17 @@ mock_transactions = [
     }
 ]
 
-mock_subscriptions = [
+mock_subscription_transactions = [
     {
-        "description": "netflix",
-        "amount": 9.99,
-        "frequency": "monthly",
-        "occurrences": [
-            (datetime.now() - timedelta(days=30)).isoformat(),
-            datetime.now().isoformat(),
-        ],
+        "transaction_id": f"tx_netflix_{days_ago}",
+        "timestamp": (datetime.utcnow() - timedelta(days=days_ago)).isoformat(),
+        "description": "NETFLIX.COM",
+        "amount": -9.99,
+        "currency": "GBP",
+        "transaction_type": "DEBIT",
+        "transaction_category": "PURCHASE",
     }
+    for days_ago in (65, 35, 5)
 ]
 
 
@@ -72,17 +77,22 @@ async def override_get_current_user():
     return mock_user
 
 
-def override_get_db():
-    # This would normally return a database session
-    # For testing, we'll use mocks instead
-    db = MagicMock()
-    db.query.return_value.filter.return_value.first.return_value = mock_bank_connection
-    return db
+@pytest.fixture(autouse=True)
+def override_get_db(db_session):
+    # Seed the test database with the user's bank connection
+    db_session.merge(mock_bank_connection)
+    db_session.commit()
+
+    def get_test_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    app.dependency_overrides.pop(get_db, None)
 
 
 # Override dependencies
 app.dependency_overrides[get_current_user] = override_get_current_user
-app.dependency_overrides["app.db.database.get_db"] = override_get_db
 
 
 @pytest.mark.asyncio
@@ -138,12 +148,43 @@ async def test_get_transactions(mock_get_transactions):
 
 @pytest.mark.asyncio
 @patch("app.services.truelayer.TrueLayerService.get_transactions")
-@patch("app.services.truelayer.TrueLayerService.identify_subscriptions")
-async def test_get_subscriptions(mock_identify_subscriptions, mock_get_transactions):
+async def test_get_transactions_pages_with_cursor(mock_get_transactions):
+    """Test that the transactions endpoint hands out a cursor for the next page"""
+    mock_get_transactions.return_value = mock_subscription_transactions
+
+    # Without a limit or cursor, the listing is not paginated
+    response = client.get("/api/v1/banking/transactions?account_id=acc_123")
+    assert len(response.json()) == len(mock_subscription_transactions)
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/api/v1/banking/transactions?account_id=acc_123&limit=2")
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    assert 'rel="next"' in response.headers["Link"]
+
+    response = client.get(
+        f"/api/v1/banking/transactions?account_id=acc_123&limit=2&cursor={cursor}"
+    )
+    assert response.status_code == 200
+    second_page = response.json()
+    assert "X-Next-Cursor" not in response.headers
+    ids = [t["transaction_id"] for t in first_page + second_page]
+    assert len(set(ids)) == len(mock_subscription_transactions)
+
+    response = client.get(
+        "/api/v1/banking/transactions?account_id=acc_123&cursor=not-a-cursor"
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@patch("app.services.truelayer.TrueLayerService.get_transactions")
+async def test_get_subscriptions(mock_get_transactions):
     """Test the get subscriptions endpoint"""
-    # Mock the transactions and subscriptions responses
-    mock_get_transactions.return_value = mock_transactions
-    mock_identify_subscriptions.return_value = mock_subscriptions
+    # Mock the transactions response with three monthly payments
+    mock_get_transactions.return_value = mock_subscription_transactions
 
     # Make the request
     response = client.get("/api/v1/banking/subscriptions?account_id=acc_123")
@@ -152,6 +193,167 @@ async def test_get_subscriptions(mock_identify_subscriptions, mock_get_transacti
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 1
-    assert data[0]["description"] == "netflix"
+    assert data[0]["description"] == "NETFLIX.COM"
     assert data[0]["amount"] == 9.99
     assert data[0]["frequency"] == "monthly"
+    assert len(data[0]["occurrences"]) == 3
+    assert data[0]["next_expected_date"] is not None
+
+
+@pytest.mark.asyncio
+@patch("app.services.truelayer.TrueLayerService.get_transactions")
+async def test_get_upcoming_subscriptions(mock_get_transactions):
+    """Test that upcoming charges are read from the stored series"""
+    mock_get_transactions.return_value = mock_subscription_transactions
+    client.get("/api/v1/banking/subscriptions?account_id=acc_123")
+
+    # The next charge is about 25 days away
+    response = client.get("/api/v1/banking/subscriptions/upcoming?days=30")
+    assert response.status_code == 200
+    assert [s["merchant"] for s in response.json()] == ["netflix"]
+
+    response = client.get("/api/v1/banking/subscriptions/upcoming?days=7")
+    assert response.status_code == 200
+    assert response.json() == []
+
+    # Only the first request had to fetch from the provider
+    assert mock_get_transactions.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("app.services.truelayer.TrueLayerService.get_accounts_overview")
+async def test_get_overview(mock_get_accounts_overview):
+    """Test the multi-account overview endpoint"""
+    # Mock the overview response with one failed call
+    mock_get_accounts_overview.return_value = [
+        {
+            "account": mock_accounts[0],
+            "transactions": mock_transactions,
+            "standing_orders": [],
+            "direct_debits": [],
+            "errors": {"standing_orders": "Failed to get standing orders"},
+        }
+    ]
+
+    # Make the request
+    response = client.get("/api/v1/banking/overview")
+
+    # Check the response
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["account"]["account_id"] == "acc_123"
+    assert data[0]["transactions"][0]["description"] == "Coffee Shop"
+    assert "standing_orders" in data[0]["errors"]
+
+
+@pytest.mark.asyncio
+@patch("app.services.truelayer.TrueLayerService.get_transactions")
+async def test_stream_transactions(mock_get_transactions):
+    """Test the streaming transactions endpoint in both formats"""
+    # Mock a longer history than one streaming batch
+    mock_get_transactions.return_value = [
+        {
+            "transaction_id": f"tx_{i}",
+            "timestamp": (datetime.now() - timedelta(hours=i)).isoformat(),
+            "description": "Coffee Shop",
+            "amount": -3.50,
+            "currency": "GBP",
+        }
+        for i in range(1200)
+    ]
+
+    # Make the requests
+    response = client.get("/api/v1/banking/transactions/stream?account_id=acc_123")
+    array_response = client.get(
+        "/api/v1/banking/transactions/stream?account_id=acc_123&format=json"
+    )
+
+    # Check the responses
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1200
+    assert lines[0]["transaction_id"] == "tx_0"
+    assert lines[-1]["transaction_id"] == "tx_1199"
+    assert len(array_response.json()) == 1200
+
+
+@pytest.mark.asyncio
+@patch("app.services.tink.TinkService.get_transactions")
+@patch("app.services.tink.TinkService.get_accounts")
+@patch("app.services.truelayer.TrueLayerService.get_transactions")
+@patch("app.services.truelayer.TrueLayerService.get_accounts")
+async def test_account_endpoints_use_the_account_connection(
+    truelayer_accounts,
+    truelayer_transactions,
+    tink_accounts,
+    tink_transactions,
+    db_session,
+):
+    """Test that a user with two providers gets each account's own data"""
+    db_session.add(
+        BankConnection(
+            id=2,
+            user_id=1,
+            provider="tink",
+            access_token="tink_access_token",
+            refresh_token="tink_refresh_token",
+            expires_at=datetime.now() + timedelta(hours=1),
+            is_active=True,
+        )
+    )
+    db_session.commit()
+    truelayer_accounts.return_value = mock_accounts
+    truelayer_transactions.return_value = mock_subscription_transactions
+    tink_accounts.return_value = [{"account_id": "tink_acc"}]
+    tink_transactions.return_value = mock_transactions
+
+    for _ in range(2):
+        response = client.get("/api/v1/banking/transactions?account_id=tink_acc")
+        assert [t["description"] for t in response.json()] == ["Coffee Shop"]
+    # Once synced, the account's connection is known without asking
+    assert tink_accounts.call_count == 1
+
+    response = client.get("/api/v1/banking/transactions?account_id=acc_123")
+    assert len(response.json()) == 3
+    response = client.get("/api/v1/banking/transactions?account_id=unknown")
+    assert response.status_code == 404
+
+
+def test_process_wide_stats_are_for_administrators(monkeypatch):
+    """Test that pool, provider and sync stats need an administrator"""
+    paths = ["/pool-stats", "/provider-health", "/sync/status"]
+    for path in paths:
+        assert client.get(f"/api/v1/banking{path}").status_code == 403
+
+    monkeypatch.setattr(mock_user, "is_superuser", True)
+    for path in paths:
+        assert client.get(f"/api/v1/banking{path}").status_code == 200
+
+
+def test_receive_bank_webhook(monkeypatch):
+    """Test that only correctly signed notifications are accepted"""
+    monkeypatch.setattr(settings, "BANK_WEBHOOKS_ENABLED", True)
+    monkeypatch.setattr(settings, "TRUELAYER_WEBHOOK_SECRET", "test-secret")
+    body, headers = build_webhook(
+        "truelayer", "transactions_available", "acc_123", "test-secret"
+    )
+
+    response = client.post(
+        "/api/v1/banking/webhooks/truelayer", content=body, headers=headers
+    )
+    forged = client.post(
+        "/api/v1/banking/webhooks/truelayer",
+        content=body,
+        headers={**headers, "X-Webhook-Signature": "t=1,v1=forged"},
+    )
+    unconfigured = client.post(
+        "/api/v1/banking/webhooks/tink", content=body, headers=headers
+    )
+
+    # The account has never been synced, so there is nothing to refresh
+    assert response.status_code == 202
+    assert response.json() == {"status": "ignored"}
+    assert forged.status_code == 401
+    assert unconfigured.status_code == 404
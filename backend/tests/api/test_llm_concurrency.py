@@ -0,0 +1,98 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from app.api.deps import cancel_on_disconnect
+from app.core.config import settings
+from app.main import app
+from fastapi import HTTPException
+from tests.stubs.llm import FakeCompletions
+from tests.stubs.statements import build_statement
+
+DELAY = 0.5
+REPLY = '{"categorySuggestions": [], "generalTips": ["Cook at home"]}'
+
+
+@pytest.fixture
+def completions(fake_llm):
+    return fake_llm(REPLY, delay=DELAY)
+
+
+def llm_requests(client: httpx.AsyncClient):
+    """One request to each endpoint backed by a completion, bypassing the cache"""
+    statement = build_statement(pages=1, rows_per_page=3)
+    savings = {
+        "averageMonthlyIncome": 3000.0,
+        "averageMonthlyExpenses": 2500.0,
+        "currentSavingsRate": 16.0,
+        "targetSavingsRate": 20.0,
+        "topCategories": [{"category": "Food", "amount": 400.0}],
+    }
+    return [
+        client.post(
+            "/api/v1/coach/message?use_cache=false",
+            json={"message": "How do I build an emergency fund?"},
+        ),
+        client.post(
+            "/api/v1/savings-planner/suggestions?use_cache=false", json=savings
+        ),
+        client.post(
+            "/api/v1/statement-analysis/analyze?use_cache=false",
+            files=[("files", ("may.pdf", statement, "application/pdf"))],
+        ),
+        client.post(
+            "/api/v1/statement-analysis/predict-monthly?use_cache=false",
+            files={"file": ("june.pdf", statement, "application/pdf")},
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_slow_completions_overlap_on_one_worker(completions):
+    """Test that N concurrent slow completions take about as long as one"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        single = 0.0
+        for request in llm_requests(client):
+            began = time.perf_counter()
+            response = await request
+            single = max(single, time.perf_counter() - began)
+            assert response.status_code == 200
+
+        rounds = 3
+        began = time.perf_counter()
+        responses = await asyncio.gather(
+            *(request for _ in range(rounds) for request in llm_requests(client))
+        )
+        elapsed = time.perf_counter() - began
+
+    assert all(response.status_code == 200 for response in responses)
+    assert completions.peak == len(responses)
+    # Serialized, they would take len(responses) x DELAY
+    assert elapsed < 2 * single < len(responses) * DELAY
+
+
+@pytest.mark.asyncio
+async def test_completion_is_cancelled_when_client_disconnects(monkeypatch):
+    """Test that work for a client that went away is cancelled, not finished"""
+    monkeypatch.setattr(settings, "LLM_DISCONNECT_POLL_SECONDS", 0.01)
+    polls = []
+
+    async def is_disconnected():
+        polls.append(True)
+        return len(polls) > 2
+
+    completions = FakeCompletions(REPLY, delay=DELAY)
+    work = asyncio.ensure_future(completions.create(model="gpt-4o", messages=[]))
+
+    with pytest.raises(HTTPException) as error:
+        await cancel_on_disconnect(
+            SimpleNamespace(is_disconnected=is_disconnected), work
+        )
+
+    assert error.value.status_code == 499
+    await asyncio.sleep(0)
+    assert work.cancelled()
+    assert completions.in_flight == 0
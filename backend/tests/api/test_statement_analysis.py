@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+from app.api.api_v1.endpoints.statement_analysis import UploadLimitedRequest
+from app.api.deps import get_current_user
+from app.main import app
+from app.models.user import User
+from fastapi.testclient import TestClient
+from tests.stubs.statements import build_statement
+
+client = TestClient(app)
+
+mock_analysis = {
+    "totalIncome": 3500.0,
+    "totalExpenses": 2800.0,
+    "savingsRate": 20.0,
+    "topCategories": [],
+    "recommendations": [],
+    "traits": {"saver": 65, "investor": 45, "planner": 70, "knowledgeable": 60},
+    "xpEarned": 350,
+}
+
+
+@patch("app.services.pdf_analysis.analyze_statement_with_llm")
+def test_analyze_statements(mock_analyze):
+    """Test that uploaded statements are analyzed from their extracted text"""
+    mock_analyze.return_value = dict(mock_analysis)
+    content = build_statement(pages=2, rows_per_page=3)
+
+    response = client.post(
+        "/api/v1/statement-analysis/analyze",
+        files=[("files", ("statement.pdf", content, "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    text = mock_analyze.call_args[0][0]
+    assert "Page 2 of 2" in text
+
+
+@patch("app.services.pdf_analysis.analyze_statement_with_llm")
+def test_analyze_statements_rejects_oversized_upload(mock_analyze, monkeypatch):
+    """Test that an upload over the limit is refused while it is received"""
+    content = build_statement(pages=20)
+    monkeypatch.setattr(UploadLimitedRequest, "max_body_size", len(content) // 2)
+
+    response = client.post(
+        "/api/v1/statement-analysis/analyze",
+        files=[("files", ("statement.pdf", content, "application/pdf"))],
+    )
+
+    assert response.status_code == 413
+    mock_analyze.assert_not_called()
+
+
+def test_process_wide_stats_are_for_administrators(monkeypatch):
+    """Test that job, extraction and LLM stats need an administrator"""
+    user = User(id=1, email="test@example.com", username="testuser", is_active=True)
+
+    async def current_user():
+        return user
+
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, current_user)
+    paths = ["/job-stats", "/extraction-stats", "/llm-stats"]
+    for path in paths:
+        assert client.get(f"/api/v1/statement-analysis{path}").status_code == 403
+
+    user.is_superuser = True
+    for path in paths:
+        assert client.get(f"/api/v1/statement-analysis{path}").status_code == 200
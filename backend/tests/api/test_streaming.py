@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from app.api.api_v1.endpoints import coach
+from app.api.deps import stream_events
+from app.core.config import settings
+from app.main import app
+from tests.stubs.statements import build_pdf
+
+STATEMENT = [
+    "Statement 01/05/2024 - 31/05/2024",
+    "02/05/2024 ACME CORP SALARY 3,000.00 4,000.00",
+    "03/05/2024 RENT MAY 1,200.00 2,800.00",
+    "05/05/2024 TESCO STORES 54.20 2,745.80",
+]
+
+
+def parse_events(body):
+    """(event, data) of each server-sent event in a response body"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if line[:1] != ":"
+        )
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def post(path, **request):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(f"/api/v1{path}", **request)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse_events(response.text)
+
+
+@pytest.mark.asyncio
+async def test_coach_reply_is_streamed_token_by_token(fake_llm):
+    """Test steps, then the reply's tokens, then the same body as /message"""
+    fake_llm("**Start small**: put aside $50 a month.")
+    message = {"message": "How do I build an emergency fund?"}
+
+    events = await post("/coach/message/stream", json=message)
+
+    names = [event for event, _ in events]
+    assert names[0] == "step" and names[-2:] == ["step", "result"]
+    assert [data["status"] for event, data in events if event == "step"] == [
+        "in_progress",
+        "complete",
+    ]
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == events[-1][1]["response"]
+
+    # A cached reply arrives in one piece
+    events = await post("/coach/message/stream", json=message)
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert tokens == [events[-1][1]["response"]]
+
+
+@pytest.mark.asyncio
+async def test_statement_analysis_streams_steps_and_fields(fake_llm):
+    """Test that local figures come first, then the LLM's fields as written"""
+    reply = {
+        "recommendations": ["Cook at home"],
+        "traits": {"saver": 70, "investor": 40, "planner": 60, "knowledgeable": 50},
+        "xpEarned": 400,
+    }
+    fake_llm("```json\n" + json.dumps(reply, indent=2) + "\n```")
+    pdf = build_pdf([STATEMENT])
+
+    events = await post(
+        "/statement-analysis/analyze/stream",
+        files=[("files", ("may.pdf", pdf, "application/pdf"))],
+    )
+
+    steps = [(data["id"], data["status"]) for event, data in events if event == "step"]
+    assert steps == [
+        ("extracting", "in_progress"),
+        ("extracting", "complete"),
+        ("parsing", "in_progress"),
+        ("parsing", "complete"),
+        ("analyzing", "in_progress"),
+        ("analyzing", "complete"),
+    ]
+    fields = {data["name"]: data["value"] for event, data in events if event == "field"}
+    assert list(fields) == [
+        "totalIncome",
+        "totalExpenses",
+        "savingsRate",
+        "topCategories",
+        "recommendations",
+        "traits",
+        "xpEarned",
+    ]
+    event, result = events[-1]
+    assert event == "result"
+    assert {name: result[name] for name in fields} == fields
+    assert (result["totalExpenses"], result["numStatements"]) == (1254.2, 1)
+
+
+@pytest.mark.asyncio
+async def test_stream_starts_at_once_and_stops_when_client_disconnects(
+    monkeypatch, fake_llm
+):
+    """Test that the response starts before the reply and is cancellable"""
+    monkeypatch.setattr(settings, "LLM_DISCONNECT_POLL_SECONDS", 0.01)
+    completions = fake_llm("x" * 400, delay=0.05)
+    disconnected = asyncio.Event()
+
+    async def is_disconnected():
+        return disconnected.is_set()
+
+    response = stream_events(
+        SimpleNamespace(is_disconnected=is_disconnected),
+        lambda progress: coach.answer_message("How do I save?", False, progress),
+    )
+    body = response.body_iterator
+
+    began = time.perf_counter()
+    assert (await body.__anext__()).startswith(":")
+    assert time.perf_counter() - began < 0.05
+    first = parse_events(await body.__anext__())
+    assert first == [
+        (
+            "step",
+            {
+                "id": "generate_response",
+                "status": "in_progress",
+                "message": "Writing your answer...",
+            },
+        )
+    ]
+    assert parse_events(await body.__anext__())[0][0] == "token"
+
+    disconnected.set()
+    remaining = [chunk async for chunk in body]
+    await asyncio.sleep(0)
+
+    events = [event for chunk in remaining for event, _ in parse_events(chunk)]
+    assert set(events) <= {"token"}
+    assert completions.streams[0].closed
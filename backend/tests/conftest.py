@@ -0,0 +1,51 @@
+import os
+
+# Use an in-memory database unless one is configured explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Keep the statement text cache in memory
+os.environ.setdefault("PDF_TEXT_CACHE_DIR", "")
+# Keep LLM responses in memory too
+os.environ.setdefault("LLM_CACHE_DIR", "")
+
+import pytest
+from app.db.database import Base
+from app.db.init_db import init_db
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from tests.stubs.llm import FakeCompletions, install_fake_llm
+
+test_engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+
+
+@pytest.fixture
+def db_session():
+    """Database session backed by a fresh in-memory SQLite schema"""
+    init_db(bind=test_engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=test_engine)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Route the app's LLM calls to a stand-in client for the test
+
+    Call it with FakeCompletions' arguments; it returns the FakeCompletions.
+    """
+
+    def install(*replies, **options):
+        completions = FakeCompletions(*replies, **options)
+        install_fake_llm(monkeypatch, completions)
+        return completions
+
+    return install
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from app.core.config import settings
+from app.models.analysis_job import AnalysisJob
+from app.services.analysis_jobs import (
+    ANALYZE,
+    COMPLETED,
+    FAILED,
+    RUNNING,
+    AnalysisJobQueue,
+)
+from tests.conftest import TestingSessionLocal
+
+
+class SlowRunner:
+    """Stand-in for the analysis, taking a moment and reporting one step"""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, kind, files, model, use_cache, progress):
+        self.calls.append([filename for filename, _ in files])
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            progress("step", {"id": "analyzing", "status": "in_progress"})
+            await asyncio.sleep(0.05)
+        finally:
+            self.in_flight -= 1
+        return {"totalExpenses": float(len(files[0][1]))}
+
+
+@pytest.mark.asyncio
+async def test_identical_submissions_collapse_into_one_job(monkeypatch, db_session):
+    """Test dedupe by content while queued, and reuse once completed"""
+    runner = SlowRunner()
+    jobs = AnalysisJobQueue(session_factory=TestingSessionLocal, runner=runner)
+    may = [("may.pdf", b"%PDF may")]
+
+    first, existing = jobs.submit(db_session, ANALYZE, may, "gpt-4o")
+    assert not existing
+    # The same contents under another name are the same submission
+    again, existing = jobs.submit(
+        db_session, ANALYZE, [("copy.pdf", b"%PDF may")], "gpt-4o"
+    )
+    assert existing and again.id == first.id
+    other, existing = jobs.submit(db_session, ANALYZE, may, "gpt-4")
+    assert not existing and other.id != first.id
+
+    await jobs.start()
+    await jobs.drain()
+    await jobs.stop()
+
+    assert runner.calls == [["may.pdf"], ["may.pdf"]]
+    db_session.expire_all()
+    done = jobs.get(db_session, first.id)
+    assert (done.status, done.result) == (COMPLETED, {"totalExpenses": 8.0})
+
+    reused, existing = jobs.submit(db_session, ANALYZE, may, "gpt-4o")
+    assert existing and reused.id == first.id
+    fresh, existing = jobs.submit(db_session, ANALYZE, may, "gpt-4o", use_cache=False)
+    assert not existing and fresh.id != first.id
+    assert jobs.get_status()["jobs_deduplicated"] == 2
+
+    # Its upload was only in memory, so once its queue has stopped beating a
+    # restarted process fails the queued job
+    monkeypatch.setattr(settings, "ANALYSIS_JOB_STALE_SECONDS", 0)
+    restarted = AnalysisJobQueue(session_factory=TestingSessionLocal)
+    await restarted.start()
+    await restarted.stop()
+    db_session.expire_all()
+    assert jobs.get(db_session, fresh.id).status == FAILED
+
+
+@pytest.mark.asyncio
+async def test_workers_cap_concurrency_and_followers_see_progress(db_session):
+    """Test a bounded queue, capped workers, and events while following"""
+    runner = SlowRunner()
+    jobs = AnalysisJobQueue(
+        session_factory=TestingSessionLocal,
+        runner=runner,
+        concurrency=2,
+        queue_size=4,
+    )
+    submitted = [
+        jobs.submit(db_session, ANALYZE, [(f"{n}.pdf", b"%PDF" * n)], "gpt-4o")[0]
+        for n in range(1, 5)
+    ]
+    with pytest.raises(asyncio.QueueFull):
+        jobs.submit(db_session, ANALYZE, [("5.pdf", b"%PDF" * 5)], "gpt-4o")
+    assert db_session.query(AnalysisJob).count() == 4
+
+    events = []
+    await jobs.start()
+    finished = await jobs.follow(
+        submitted[-1].id, lambda event, data: events.append((event, data))
+    )
+    await jobs.drain()
+    await jobs.stop()
+
+    assert runner.peak == 2
+    assert [data["status"] for event, data in events if event == "status"] == [
+        "queued",
+        "running",
+        "completed",
+    ]
+    assert ("step", {"id": "analyzing", "status": "in_progress"}) in events
+    assert (finished["status"], finished["result"]) == (
+        COMPLETED,
+        {"totalExpenses": 16.0},
+    )
+
+
+@pytest.mark.asyncio
+async def test_only_jobs_of_a_stopped_process_are_failed(monkeypatch, db_session):
+    """Test that live queues keep each other's jobs, and fail a dead one's"""
+    monkeypatch.setattr(settings, "ANALYSIS_JOB_HEARTBEAT_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "ANALYSIS_JOB_STALE_SECONDS", 0.1)
+    release = asyncio.Event()
+
+    async def blocked(kind, files, model, use_cache, progress):
+        await release.wait()
+        return {}
+
+    first = AnalysisJobQueue(session_factory=TestingSessionLocal, runner=blocked)
+    second = AnalysisJobQueue(session_factory=TestingSessionLocal, runner=blocked)
+    assert first.owner != second.owner
+    await first.start()
+    job, _ = first.submit(db_session, ANALYZE, [("may.pdf", b"%PDF")], "gpt-4o")
+
+    # Both processes are alive, however long the job runs
+    await second.start()
+    await asyncio.sleep(0.3)
+    db_session.expire_all()
+    assert first.get(db_session, job.id).status == RUNNING
+
+    # The first process goes away with the job unfinished
+    await first.stop()
+    await asyncio.sleep(0.3)
+    db_session.expire_all()
+    assert first.get(db_session, job.id).status == FAILED
+    await second.stop()
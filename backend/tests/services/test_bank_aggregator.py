@@ -0,0 +1,236 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from app.models.bank_connection import BankConnection
+from app.services.bank_aggregator import (
+    BankAggregator,
+    account_identifier,
+    dedupe_across_providers,
+)
+from app.services.resilience import RateLimiter
+from app.services.tink import TinkService
+from app.services.truelayer import TrueLayerService
+
+
+def connection(connection_id, provider):
+    return BankConnection(
+        id=connection_id,
+        user_id=1,
+        provider=provider,
+        access_token=f"{provider}_token",
+        refresh_token=f"{provider}_refresh",
+        expires_at=datetime.now() + timedelta(hours=1),
+        is_active=True,
+    )
+
+
+def truelayer_handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/data/v1/accounts":
+        account = {
+            "account_id": "tl_acc",
+            "account_number": {"sort_code": "20-20-15", "number": "55555555"},
+        }
+        return httpx.Response(200, json={"results": [account]})
+    return httpx.Response(
+        200,
+        json={
+            "results": [
+                {
+                    "transaction_id": "tl_1",
+                    "timestamp": "2024-03-05T10:15:00+00:00",
+                    "description": "NETFLIX.COM 1234",
+                    "amount": -9.99,
+                    "currency": "GBP",
+                },
+                {
+                    "transaction_id": "tl_2",
+                    "timestamp": "2024-03-04T08:00:00+00:00",
+                    "description": "COSTA COFFEE",
+                    "amount": -3.20,
+                    "currency": "GBP",
+                },
+            ]
+        },
+    )
+
+
+async def slow_tink_handler(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(0.3)
+    if request.url.path == "/data/v2/accounts":
+        # The same bank account as TrueLayer's
+        identifiers = {"sortCode": {"code": "202015", "accountNumber": "55555555"}}
+        account = {"id": "tink_acc", "identifiers": identifiers}
+        return httpx.Response(200, json={"accounts": [account]})
+    amount = {"value": {"unscaledValue": "-999", "scale": "2"}, "currencyCode": "GBP"}
+    return httpx.Response(
+        200,
+        json={
+            "transactions": [
+                # The same Netflix payment, seen through Tink
+                {
+                    "id": "tink_1",
+                    "amount": amount,
+                    "dates": {"booked": "2024-03-05"},
+                    "descriptions": {"display": "Netflix"},
+                },
+                {
+                    "id": "tink_2",
+                    "amount": {**amount, "value": {"unscaledValue": "-4500"}},
+                    "dates": {"booked": "2024-03-03"},
+                    "descriptions": {"display": "Tesco Stores"},
+                },
+            ]
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_providers_are_fetched_concurrently_and_merged():
+    """Test that both providers are queried at once and duplicates are dropped"""
+    truelayer = TrueLayerService(transport=httpx.MockTransport(truelayer_handler))
+    tink = TinkService(transport=httpx.MockTransport(slow_tink_handler))
+    aggregator = BankAggregator({"truelayer": truelayer, "tink": tink})
+    connections = [connection(1, "truelayer"), connection(2, "tink")]
+
+    started = time.perf_counter()
+    transactions = await aggregator.get_transactions(connections)
+    elapsed = time.perf_counter() - started
+
+    # Tink's accounts and transactions calls take 0.6s back to back
+    assert elapsed < 0.9
+    assert [t["transaction_id"] for t in transactions] == ["tl_1", "tl_2", "tink_2"]
+    assert transactions[0]["aggregator"] == "truelayer"
+    assert transactions[2]["account_id"] == "tink_acc"
+
+    accounts = await aggregator.get_accounts(connections)
+    assert [(a["account_id"], a["aggregator"]) for a in accounts] == [
+        ("tl_acc", "truelayer"),
+        ("tink_acc", "tink"),
+    ]
+    await aggregator.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_does_not_hold_up_the_other():
+    """Test that each provider has its own pool and rate limiter"""
+    truelayer = TrueLayerService(transport=httpx.MockTransport(truelayer_handler))
+    tink = TinkService(transport=httpx.MockTransport(slow_tink_handler))
+    tink._rate_limiter = RateLimiter(rate=1, burst=1)
+
+    # Saturate Tink's rate limit while TrueLayer keeps serving
+    tink_calls = asyncio.gather(*(tink.get_accounts("token") for _ in range(3)))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    for _ in range(5):
+        await truelayer.get_accounts("token")
+    assert time.perf_counter() - started < 0.2
+
+    await tink_calls
+    assert tink.get_pool_stats()["rate_limited_waits"] == 2
+    assert truelayer.get_pool_stats()["rate_limited_waits"] == 0
+    await truelayer.aclose()
+    await tink.aclose()
+
+
+@pytest.mark.asyncio
+async def test_failed_provider_only_drops_its_own_data():
+    """Test that a failing connection does not fail the merged result"""
+
+    def failing_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(401, json={"errorMessage": "token expired"})
+
+    truelayer = TrueLayerService(transport=httpx.MockTransport(truelayer_handler))
+    tink = TinkService(transport=httpx.MockTransport(failing_handler))
+    aggregator = BankAggregator({"truelayer": truelayer, "tink": tink})
+
+    accounts = await aggregator.get_accounts(
+        [connection(1, "truelayer"), connection(2, "tink")]
+    )
+
+    assert [a["account_id"] for a in accounts] == ["tl_acc"]
+    await aggregator.aclose()
+
+
+def test_same_provider_repeats_are_kept():
+    """Test that identical payments within one provider are not collapsed"""
+    coffee = {
+        "timestamp": "2024-03-04T08:00:00+00:00",
+        "description": "COSTA COFFEE",
+        "amount": -3.20,
+        "currency": "GBP",
+    }
+
+    merged = dedupe_across_providers(
+        [
+            ("truelayer", "", dict(coffee)),
+            ("truelayer", "", dict(coffee)),
+            ("tink", "", dict(coffee, description="Costa Coffee")),
+            ("tink", "", dict(coffee, description="Costa Coffee")),
+            ("tink", "", dict(coffee, description="Costa Coffee")),
+        ]
+    )
+
+    # Tink saw a third coffee that TrueLayer did not return
+    assert len(merged) == 3
+
+
+def test_same_payment_from_two_accounts_is_kept():
+    """Test that only transactions of the same bank account are matched"""
+    truelayer = {
+        "account_number": {
+            "iban": "GB33BUKB20201555555555",
+            "sort_code": "20-20-15",
+            "number": "55555555",
+        }
+    }
+    tink_same = {"account_number": {"code": "202015", "accountNumber": "55555555"}}
+    tink_other = {"account_number": {"iban": {"iban": "GB94BARC10201530093459"}}}
+    assert account_identifier(truelayer, "truelayer") == account_identifier(
+        tink_same, "tink"
+    )
+    assert account_identifier(tink_other, "tink") != account_identifier(
+        truelayer, "truelayer"
+    )
+
+    rent = {
+        "timestamp": "2024-03-01T09:00:00+00:00",
+        "description": "RENT",
+        "amount": -1200.0,
+        "currency": "GBP",
+    }
+    merged = dedupe_across_providers(
+        [
+            ("truelayer", account_identifier(truelayer, "truelayer"), dict(rent)),
+            ("tink", account_identifier(tink_same, "tink"), dict(rent)),
+            ("tink", account_identifier(tink_other, "tink"), dict(rent)),
+        ]
+    )
+
+    # The same rent paid from a second account is a payment of its own
+    assert len(merged) == 2
+
+
+def test_accounts_without_numbers_are_never_matched_across_providers():
+    """Test that two unrelated cards keep the same purchase each"""
+    truelayer_card = {"account_id": "card-1", "account_number": None}
+    tink_card = {"account_id": "card-1"}
+    assert account_identifier(truelayer_card, "truelayer") == "truelayer:card-1"
+    assert account_identifier(tink_card, "tink") == "tink:card-1"
+
+    coffee = {
+        "timestamp": "2024-03-01T09:00:00+00:00",
+        "description": "COSTA COFFEE",
+        "amount": -4.5,
+        "currency": "GBP",
+    }
+    merged = dedupe_across_providers(
+        [
+            ("truelayer", account_identifier(truelayer_card, "truelayer"), coffee),
+            ("tink", account_identifier(tink_card, "tink"), dict(coffee)),
+        ]
+    )
+
+    assert len(merged) == 2
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from app.models.bank_connection import BankConnection
+from app.services.bank_tokens import BankConnectionExpiredError, BankTokenManager
+from app.services.truelayer import TrueLayerAPIError
+from tests.conftest import TestingSessionLocal
+
+
+class FakeProvider:
+    """Stand-in provider with a slow token endpoint"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.refresh_calls = 0
+
+    async def refresh_access_token(self, refresh_token):
+        self.refresh_calls += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise TrueLayerAPIError(
+                "Failed to refresh token: invalid_grant", status_code=400
+            )
+        return {
+            "access_token": f"new_access_token_{self.refresh_calls}",
+            "refresh_token": "new_refresh_token",
+            "expires_at": datetime.now() + timedelta(hours=1),
+        }
+
+
+def add_connection(db_session, expires_in):
+    connection = BankConnection(
+        id=1,
+        user_id=1,
+        provider="truelayer",
+        access_token="old_access_token",
+        refresh_token="old_refresh_token",
+        expires_at=datetime.now() + expires_in,
+        is_active=True,
+    )
+    db_session.add(connection)
+    db_session.commit()
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_are_coalesced(db_session):
+    """Test that simultaneous requests after expiry share one refresh"""
+    connection = add_connection(db_session, timedelta(seconds=-10))
+    provider = FakeProvider()
+    manager = BankTokenManager(provider=provider, session_factory=TestingSessionLocal)
+
+    tokens = await asyncio.gather(
+        *[manager.get_access_token(connection) for _ in range(10)]
+    )
+
+    assert provider.refresh_calls == 1
+    assert set(tokens) == {"new_access_token_1"}
+    # Later calls are served from the cache
+    assert await manager.get_access_token(connection) == "new_access_token_1"
+    assert provider.refresh_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_token_near_expiry_is_refreshed_in_background(db_session):
+    """Test that tokens inside the refresh window are served while refreshing"""
+    connection = add_connection(db_session, timedelta(minutes=2))
+    provider = FakeProvider()
+    manager = BankTokenManager(provider=provider, session_factory=TestingSessionLocal)
+
+    assert await manager.get_access_token(connection) == "old_access_token"
+    await asyncio.sleep(0.1)
+
+    assert provider.refresh_calls == 1
+    assert await manager.get_access_token(connection) == "new_access_token_1"
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_deactivates_connection(db_session):
+    """Test that a failed refresh marks the connection inactive"""
+    connection = add_connection(db_session, timedelta(seconds=-10))
+    manager = BankTokenManager(
+        provider=FakeProvider(fail=True), session_factory=TestingSessionLocal
+    )
+
+    with pytest.raises(BankConnectionExpiredError):
+        await manager.get_access_token(connection)
+
+    db_session.refresh(connection)
+    assert connection.is_active is False
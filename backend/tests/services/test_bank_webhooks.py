@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from app.models.account_sync_state import AccountSyncState
+from app.models.bank_connection import BankConnection
+from app.models.transaction import Transaction
+from app.services.bank_tokens import BankTokenManager
+from app.services.bank_webhooks import (
+    BankWebhookService,
+    WebhookSignatureError,
+    verify_webhook_signature,
+)
+from app.services.transaction_sync import TransactionSyncService
+from app.services.truelayer import TrueLayerService
+from tests.conftest import TestingSessionLocal
+from tests.stubs.webhooks import build_webhook
+
+SECRET = "test-webhook-secret"
+
+
+def slow_stand_in():
+    """TrueLayer stand-in whose transactions call takes a moment"""
+    calls = {"transactions": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["transactions"] += 1
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200,
+            json={
+                "results": [
+                    {
+                        "transaction_id": f"tx_{calls['transactions']}",
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "description": "Coffee Shop",
+                        "amount": -3.50,
+                        "currency": "GBP",
+                    }
+                ]
+            },
+        )
+
+    return httpx.MockTransport(handler), calls
+
+
+@pytest.fixture
+def known_account(db_session):
+    db_session.add(
+        BankConnection(
+            id=1,
+            user_id=1,
+            provider="truelayer",
+            access_token="token_1",
+            refresh_token="refresh_1",
+            expires_at=datetime.now() + timedelta(hours=1),
+            is_active=True,
+        )
+    )
+    db_session.add(
+        AccountSyncState(
+            bank_connection_id=1,
+            account_id="acc_123",
+            last_transaction_at=datetime.utcnow() - timedelta(days=1),
+            last_synced_at=datetime.utcnow() - timedelta(hours=1),
+        )
+    )
+    db_session.commit()
+
+
+def make_service(transport):
+    provider = TrueLayerService(transport=transport, max_retries=0)
+    return BankWebhookService(
+        sync_service=TransactionSyncService(provider=provider),
+        token_manager=BankTokenManager(
+            provider=provider, session_factory=TestingSessionLocal
+        ),
+        session_factory=TestingSessionLocal,
+        concurrency=2,
+    )
+
+
+def deliver(service, db_session, event_type="transactions_available", **kwargs):
+    body, _ = build_webhook("truelayer", event_type, "acc_123", SECRET, **kwargs)
+    return service.handle(db_session, "truelayer", json.loads(body), body)
+
+
+def test_signature_verification():
+    """Test that tampered, unsigned and stale notifications are rejected"""
+    body, headers = build_webhook("truelayer", "transactions_available", "a", SECRET)
+    signature = headers["X-Webhook-Signature"]
+
+    verify_webhook_signature(SECRET, body, signature)
+    with pytest.raises(WebhookSignatureError):
+        verify_webhook_signature(SECRET, body + b" ", signature)
+    with pytest.raises(WebhookSignatureError):
+        verify_webhook_signature("other-secret", body, signature)
+    with pytest.raises(WebhookSignatureError):
+        verify_webhook_signature(SECRET, body, None)
+    with pytest.raises(WebhookSignatureError):
+        verify_webhook_signature(
+            SECRET, body, signature, tolerance=300, now=time.time() + 600
+        )
+
+
+@pytest.mark.asyncio
+async def test_notification_burst_becomes_one_targeted_sync(db_session, known_account):
+    """Test that a burst for one account is coalesced into a single fetch"""
+    transport, calls = slow_stand_in()
+    service = make_service(transport)
+
+    results = [deliver(service, db_session) for _ in range(20)]
+    # The provider redelivers one of them
+    results.append(deliver(service, db_session, event_id="evt_1"))
+    results.append(deliver(service, db_session, event_id="evt_1"))
+
+    # Ingestion only happens once the workers run
+    assert calls["transactions"] == 0
+    await service.start()
+    await service.drain()
+
+    # A notification arriving mid-sync triggers exactly one follow-up
+    deliver(service, db_session)
+    await asyncio.sleep(0.01)
+    deliver(service, db_session)
+    deliver(service, db_session)
+    await service.drain()
+    await service.stop()
+
+    assert results[0] == "queued"
+    assert set(results[1:-1]) == {"coalesced"}
+    assert results[-1] == "duplicate"
+    assert calls["transactions"] == 3
+    status = service.get_status()
+    assert status["syncs_completed"] == 3
+    assert status["duplicate_events"] == 1
+    assert db_session.query(Transaction).count() == 3
+
+
+@pytest.mark.asyncio
+async def test_revocation_and_unknown_accounts(db_session, known_account):
+    """Test that consent revocation deactivates the connection"""
+    transport, calls = slow_stand_in()
+    service = make_service(transport)
+
+    body, _ = build_webhook(
+        "truelayer", "transactions_available", "acc_unknown", SECRET
+    )
+    assert service.handle(db_session, "truelayer", json.loads(body), body) == "ignored"
+    assert deliver(service, db_session, event_type="consent_revoked") == "revoked"
+
+    connection = db_session.query(BankConnection).first()
+    assert connection.is_active is False
+    # Later notifications for the revoked connection are ignored
+    assert deliver(service, db_session) == "ignored"
+    assert calls["transactions"] == 0
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from app.services import pdf_analysis
+from app.services.llm_cache import LLMResponseCache, completion_key
+from tests.stubs.llm import FakeCompletions
+
+MESSAGES = [{"role": "user", "content": "Analyze this statement"}]
+
+
+def test_completion_key_covers_model_messages_and_params():
+    """Test that only requests differing in model, messages or params differ"""
+    key = completion_key("gpt-4o", MESSAGES, temperature=0.2, max_tokens=2000)
+
+    assert key == completion_key("gpt-4o", MESSAGES, max_tokens=2000, temperature=0.2)
+    assert key != completion_key("gpt-4", MESSAGES, temperature=0.2, max_tokens=2000)
+    assert key != completion_key("gpt-4o", MESSAGES, temperature=0.7, max_tokens=2000)
+    other = [{"role": "user", "content": "Analyze that statement"}]
+    assert key != completion_key("gpt-4o", other, temperature=0.2, max_tokens=2000)
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    """Test TTL expiry and that the memory tier keeps its most recent entries"""
+    now = [1000.0]
+    monkeypatch.setattr("app.services.llm_cache.time.time", lambda: now[0])
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60, directory="")
+    cache.put("a", "first")
+    cache.put("b", "second", ttl_seconds=10)
+    assert cache.get("a") == "first"
+    cache.put("c", "third")
+
+    assert cache.get("b") is None
+    now[0] += 30
+    assert cache.get("a") == "first"
+    now[0] += 31
+    assert cache.get("a") is None
+    stats = cache.get_stats()
+    assert (stats["memory_evictions"], stats["expired"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_complete_reuses_persisted_responses(tmp_path):
+    """Test that a restarted app answers a repeat from disk unless opted out"""
+    completions = FakeCompletions('{"totalIncome": 1}', '{"totalIncome": 2}')
+    cache = LLMResponseCache(directory=str(tmp_path))
+    first = await cache.complete(
+        completions.create, "gpt-4o", MESSAGES, parse=json.loads, temperature=0.2
+    )
+
+    restarted = LLMResponseCache(directory=str(tmp_path))
+    again = await restarted.complete(
+        completions.create, "gpt-4o", MESSAGES, parse=json.loads, temperature=0.2
+    )
+    assert first == again == {"totalIncome": 1}
+    assert len(completions.calls) == 1
+    assert restarted.get_stats()["disk_hits"] == 1
+
+    fresh = await restarted.complete(
+        completions.create,
+        "gpt-4o",
+        MESSAGES,
+        parse=json.loads,
+        use_cache=False,
+        temperature=0.2,
+    )
+    assert fresh == {"totalIncome": 2}
+    assert len(completions.calls) == 2
+    # The fresh response replaced the cached one
+    assert await LLMResponseCache(directory=str(tmp_path)).complete(
+        completions.create, "gpt-4o", MESSAGES, parse=json.loads, temperature=0.2
+    ) == {"totalIncome": 2}
+
+
+@pytest.mark.asyncio
+async def test_repeat_statement_analysis_skips_the_llm(fake_llm):
+    """Test that identical statements are analyzed once, and bad replies retried"""
+    completions = fake_llm("Sorry, I can't help with that.", '{"xpEarned": 300}')
+
+    failed = await pdf_analysis.analyze_statement_with_llm("statement text")
+    assert failed["xpEarned"] == 100
+    results = [
+        await pdf_analysis.analyze_statement_with_llm("statement text") for _ in range(3)
+    ]
+
+    assert all(result == {"xpEarned": 300} for result in results)
+    # The unparseable reply wasn't cached, the good one was
+    assert len(completions.calls) == 2
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import (
+    LLMGateway,
+    LLMGatewayError,
+    LLMUnavailableError,
+    ModelLimits,
+)
+from tests.stubs.llm import FakeCompletions, fake_client
+
+MESSAGES = [{"role": "user", "content": "Suggest a budget"}]
+
+
+class APIError(Exception):
+    """Stand-in for an openai status error"""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def scripted(*failures, delay=0.0):
+    """Completions failing as scripted, then answering with usage reported"""
+    return FakeCompletions(failures=failures, delay=delay, usage=(80, 5))
+
+
+def gateway_for(**completions):
+    clients = {
+        provider: fake_client(provider_completions)
+        for provider, provider_completions in completions.items()
+    }
+    return LLMGateway(
+        clients=clients,
+        cache=LLMResponseCache(directory="", enabled=False),
+        max_retries=2,
+        backoff_base=0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried_and_recorded():
+    """Test that 429 and 5xx are retried, and usage and errors are recorded"""
+    openai = scripted(APIError(429, retry_after="0"), APIError(503))
+    deepseek = scripted()
+    gateway = gateway_for(openai=openai, deepseek=deepseek)
+
+    assert await gateway.complete("gpt-4o", MESSAGES, max_tokens=50) == "ok"
+    assert await gateway.complete("deepseek-chat", MESSAGES) == "ok"
+
+    assert len(openai.calls) == 3
+    assert [call["model"] for call in deepseek.calls] == ["deepseek-chat"]
+    stats = gateway.get_stats()["models"]["gpt-4o"]
+    assert (stats["requests"], stats["completed"], stats["retries"]) == (1, 1, 2)
+    assert stats["error_types"] == {"APIError": 2}
+    assert (stats["prompt_tokens"], stats["completion_tokens"]) == (80, 5)
+
+
+@pytest.mark.asyncio
+async def test_rejected_requests_fail_and_outages_open_the_circuit(monkeypatch):
+    """Test that 4xx isn't retried, and repeated 5xx stop reaching the provider"""
+    monkeypatch.setattr(
+        "app.services.llm_gateway.settings.LLM_BREAKER_FAILURE_THRESHOLD", 3
+    )
+    openai = scripted(APIError(400), *[APIError(500)] * 6)
+    gateway = gateway_for(openai=openai)
+
+    with pytest.raises(LLMGatewayError):
+        await gateway.complete("gpt-4o", MESSAGES)
+    assert len(openai.calls) == 1
+
+    with pytest.raises(LLMUnavailableError):
+        await gateway.complete("gpt-4o", MESSAGES)
+    with pytest.raises(LLMUnavailableError, match="circuit open"):
+        await gateway.complete("gpt-4o", MESSAGES)
+    assert len(openai.calls) == 4
+    assert gateway.get_stats()["providers"]["openai"]["state"] == "open"
+
+    with pytest.raises(LLMUnavailableError, match="No API key"):
+        await LLMGateway(providers={}).complete("gpt-4o", MESSAGES)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_or_rate_limited_trial_releases_the_circuit(monkeypatch):
+    """Test that a half-open trial without an outcome lets the next call try"""
+    monkeypatch.setattr(
+        "app.services.llm_gateway.settings.LLM_BREAKER_FAILURE_THRESHOLD", 1
+    )
+    monkeypatch.setattr(
+        "app.services.llm_gateway.settings.LLM_BREAKER_RESET_SECONDS", 0.05
+    )
+    openai = scripted(APIError(500), APIError(429))
+    gateway = gateway_for(openai=openai)
+    with pytest.raises(LLMUnavailableError):
+        await gateway.complete("gpt-4o", MESSAGES)
+    await asyncio.sleep(0.06)
+
+    # The trial is rate limited, so its retry may go out as the next trial
+    assert await gateway.complete("gpt-4o", MESSAGES, use_cache=False) == "ok"
+
+    openai.failures = [APIError(500)]
+    with pytest.raises(LLMUnavailableError):
+        await gateway.complete("gpt-4o", MESSAGES, use_cache=False)
+    await asyncio.sleep(0.06)
+    openai.delay = 10
+    trial = asyncio.create_task(gateway.complete("gpt-4o", MESSAGES, use_cache=False))
+    while not openai.in_flight:
+        await asyncio.sleep(0)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    openai.delay = 0
+    assert await gateway.complete("gpt-4o", MESSAGES, use_cache=False) == "ok"
+    assert gateway.get_stats()["providers"]["openai"]["state"] == "closed"
+
+
+@pytest.mark.asyncio
+async def test_per_model_limits_queue_requests():
+    """Test that completions in flight and tokens per minute stay within limits"""
+    openai = scripted(delay=0.05)
+    gateway = gateway_for(openai=openai)
+    gateway.model_limits = {
+        "gpt-4o": ModelLimits(max_concurrency=2, tokens_per_minute=60_000)
+    }
+
+    await asyncio.gather(*(gateway.complete("gpt-4o", MESSAGES) for _ in range(6)))
+    # The six used 510 tokens, so one as big as the whole budget has to wait
+    await gateway.complete("gpt-4o", MESSAGES, max_tokens=60_000)
+
+    assert openai.peak == 2
+    stats = gateway.get_stats()["models"]["gpt-4o"]
+    assert stats["completed"] == 7
+    assert stats["queued_seconds"] > 0
+    assert stats["budget_waits"] == 1
@@ -0,0 +1,38 @@
+import os
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+import pytest
+from app.core.config import settings
+from app.services.pdf_analysis import PDFTooLargeError, extract_text_from_pdf
+from fastapi import UploadFile
+from tests.stubs.statements import build_statement
+
+
+def make_upload(content: bytes, filename: str = "statement.pdf") -> UploadFile:
+    spooled = SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(content)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename=filename, size=len(content))
+
+
+def test_extract_text_reads_the_upload_stream_in_place():
+    """Test that text is read straight from the spooled upload, not a temp file"""
+    upload = make_upload(build_statement(pages=2, rows_per_page=3))
+
+    text = extract_text_from_pdf(upload)
+
+    assert "Page 1 of 2" in text and "SHOP 1-2 -3.50" in text
+    assert text.index("Page 1 of 2") < text.index("Page 2 of 2")
+    assert not os.path.exists("/tmp/statement.pdf")
+    # The upload is left readable from the start
+    assert upload.file.tell() == 0
+
+
+def test_extract_text_rejects_oversized_files(monkeypatch):
+    """Test that files over the size limit are refused before they are parsed"""
+    content = build_statement(pages=3)
+    monkeypatch.setattr(settings, "STATEMENT_UPLOAD_MAX_BYTES", len(content) - 1)
+
+    with pytest.raises(PDFTooLargeError):
+        extract_text_from_pdf(BytesIO(content))
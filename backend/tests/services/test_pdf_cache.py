@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from app.services.pdf_cache import StatementTextCache, content_digest
+from app.services.pdf_extraction import PDFExtractionEngine, PDFTooManyPagesError
+from tests.stubs.statements import build_statement
+
+
+def test_memory_tier_evicts_least_recently_used():
+    """Test that the memory tier stays under its size limit, oldest out first"""
+    cache = StatementTextCache(memory_bytes=25, directory="")
+    cache.put("a", "x" * 10, 1)
+    cache.put("b", "y" * 10, 1)
+    assert cache.get("a")["text"] == "x" * 10
+    cache.put("c", "z" * 10, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.get_stats()
+    assert stats["memory_bytes"] == 20
+    assert stats["memory_evictions"] == 1
+    assert (stats["memory_hits"], stats["misses"]) == (3, 1)
+
+
+def test_disk_tier_is_shared_and_pruned(tmp_path):
+    """Test that another worker's cache finds entries on disk, within the limit"""
+    writer = StatementTextCache(directory=str(tmp_path), disk_bytes=10_000)
+    reader = StatementTextCache(directory=str(tmp_path), disk_bytes=10_000)
+    writer.put("ab" * 32, "statement text", 3)
+
+    assert reader.get("ab" * 32) == {"text": "statement text", "pages": 3}
+    assert reader.get_stats()["disk_hits"] == 1
+    # Now in the reader's memory tier
+    assert reader.get("ab" * 32) is not None
+    assert reader.get_stats()["memory_hits"] == 1
+
+    for i in range(20):
+        writer.put(f"{i:064x}", "t" * 1000, 1)
+    writer.prune_disk()
+    sizes = [
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(tmp_path)
+        for name in files
+    ]
+    assert sum(sizes) <= 10_000
+    assert writer.get_stats()["disk_evictions"] > 0
+
+
+def test_disk_tier_needs_a_private_directory(tmp_path):
+    """Test that a directory others can write to is not used"""
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+
+    assert not StatementTextCache(directory=str(shared)).disk.enabled
+    cache = StatementTextCache(directory=str(tmp_path / "private"))
+    assert cache.disk.enabled
+    assert os.stat(tmp_path / "private").st_mode & 0o777 == 0o700
+
+
+@pytest.mark.asyncio
+async def test_reuploaded_statement_skips_extraction():
+    """Test that the same PDF bytes are only extracted once"""
+    cache = StatementTextCache(directory="")
+    engine = PDFExtractionEngine(max_workers=1, max_pages=3, cache=cache)
+    content = build_statement(pages=2, rows_per_page=2)
+    try:
+        first = await engine.extract(content, "may.pdf")
+        second = await engine.extract(content, "may (1).pdf")
+        cache.put(content_digest(b"long"), "text", 4)
+        with pytest.raises(PDFTooManyPagesError):
+            await engine.extract(b"long", "long.pdf")
+    finally:
+        await engine.aclose()
+
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["text"] == first["text"] and second["pages"] == 2
+    assert engine.get_stats()["pages_extracted"] == 2
@@ -0,0 +1,40 @@
+import pytest
+from app.services.pdf_extraction import PDFExtractionEngine, PDFTooManyPagesError
+from tests.stubs.statements import build_statement
+
+
+@pytest.mark.asyncio
+async def test_pages_are_extracted_across_the_pool_in_order():
+    """Test that page ranges of several documents are joined back in order"""
+    engine = PDFExtractionEngine(max_workers=2, pages_per_task=2, cache=None)
+    try:
+        results = await engine.extract_many(
+            [
+                ("a.pdf", build_statement(pages=5, rows_per_page=2)),
+                ("broken.pdf", b"not a pdf"),
+                ("b.pdf", build_statement(pages=3, rows_per_page=2)),
+            ]
+        )
+    finally:
+        await engine.aclose()
+
+    first, broken, second = results
+    positions = [first["text"].index(f"Page {n} of 5") for n in range(1, 6)]
+    assert positions == sorted(positions)
+    assert first["pages"] == 5 and len(first["page_seconds"]) == 5
+    assert isinstance(broken, ValueError)
+    assert second["pages"] == 3 and "SHOP 2-1" in second["text"]
+    assert engine.get_stats()["pages_extracted"] == 8
+
+
+@pytest.mark.asyncio
+async def test_documents_over_the_page_limit_are_refused():
+    """Test that the page cap is checked before any page is extracted"""
+    engine = PDFExtractionEngine(max_workers=1, max_pages=3, cache=None)
+    try:
+        with pytest.raises(PDFTooManyPagesError):
+            await engine.extract(build_statement(pages=4), "long.pdf")
+    finally:
+        await engine.aclose()
+
+    assert engine.get_stats()["pages_extracted"] == 0
@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta
+
+import pytest
+from app.models.bank_connection import BankConnection
+from app.models.recurring_series import RecurringSeries
+from app.models.transaction import Transaction
+from app.services.reconciliation import ReconciliationPass, transaction_reconciler
+from app.services.transaction_sync import TransactionSyncService
+
+
+class FakeProvider:
+    """Stand-in provider serving a fixed list of transactions"""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+
+    async def get_transactions(self, access_token, account_id, from_date=None, to_date=None):
+        return list(self.transactions)
+
+
+def make_transaction(transaction_id, day, amount, description="COSTA COFFEE", **extra):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": day.isoformat(),
+        "description": description,
+        "amount": amount,
+        "currency": "GBP",
+        **extra,
+    }
+
+
+@pytest.fixture
+def bank_connection(db_session):
+    connection = BankConnection(
+        id=1,
+        user_id=1,
+        provider="tink",
+        access_token="mock_access_token",
+        refresh_token="mock_refresh_token",
+        expires_at=datetime.now() + timedelta(hours=1),
+        is_active=True,
+    )
+    db_session.add(connection)
+    db_session.commit()
+    return connection
+
+
+def test_reconcile_transactions_drops_settled_pending_and_repeats():
+    """Test that only superseded pending transactions and repeats are dropped"""
+    day = datetime(2024, 5, 10)
+    transactions = [
+        # Restaurant bill authorised without the tip, settled two days later
+        make_transaction("p1", day, -40.0, "DISHOOM", status="pending"),
+        make_transaction("b1", day + timedelta(days=2), -46.0, "DISHOOM"),
+        # Two genuine coffees on the same day
+        make_transaction("b2", day, -3.5),
+        make_transaction("b3", day, -3.5),
+        # Still pending
+        make_transaction("p2", day, -12.0, "PRET A MANGER", status="pending"),
+        # Returned again under a new id, with the bank's reference unchanged
+        make_transaction("b4", day, -9.99, "NETFLIX", meta={"provider_transaction_id": "r1"}),
+        make_transaction("b5", day, -9.99, "NETFLIX", meta={"provider_transaction_id": "r1"}),
+        # Far bigger than the pending amount, so a different payment
+        make_transaction("p3", day, -5.0, "TESCO", status="pending"),
+        make_transaction("b6", day, -80.0, "TESCO"),
+    ]
+
+    kept = transaction_reconciler.reconcile_transactions(transactions)
+
+    assert [t["transaction_id"] for t in kept] == [
+        "b1",
+        "b2",
+        "b3",
+        "p2",
+        "b4",
+        "p3",
+        "b6",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sync_marks_settled_pending_as_duplicate(db_session, bank_connection):
+    """Test that a later sync supersedes a pending payment without double counting"""
+    now = datetime.utcnow().replace(microsecond=0)
+    provider = FakeProvider(
+        [make_transaction("p1", now - timedelta(days=3), -20.0, status="pending")]
+    )
+    service = TransactionSyncService(provider=provider)
+    await service.sync_account(db_session, bank_connection, "acc_123")
+
+    # The provider drops the pending item and reports it settled under a new id,
+    # alongside a new pending coffee the settled one must not absorb
+    provider.transactions = [
+        make_transaction("b1", now - timedelta(days=1), -21.0),
+        make_transaction("p2", now, -20.5, status="pending"),
+    ]
+    await service.sync_account(db_session, bank_connection, "acc_123")
+
+    pending = db_session.query(Transaction).filter_by(transaction_id="p1").one()
+    assert pending.duplicate_of == "b1"
+    visible = service.query_transactions(db_session, 1, "acc_123")
+    assert sorted(t.transaction_id for t in visible) == ["b1", "p2"]
+    assert sum(t.amount for t in visible) == -41.5
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_count_settled_payments_once(db_session, bank_connection):
+    """Test that pending echoes of a monthly charge don't become extra occurrences"""
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=95)
+    transactions = []
+    for month in range(3):
+        charged = start + timedelta(days=30 * month)
+        transactions.append(
+            make_transaction(f"p{month}", charged, -9.99, "NETFLIX.COM", status="pending")
+        )
+        transactions.append(
+            make_transaction(f"b{month}", charged + timedelta(days=1), -9.99, "NETFLIX.COM")
+        )
+    service = TransactionSyncService(provider=FakeProvider(transactions))
+
+    await service.sync_account(db_session, bank_connection, "acc_123")
+
+    series = db_session.query(RecurringSeries).all()
+    assert len(series) == 1
+    assert len(series[0].occurrences) == 3
+    assert series[0].frequency == "monthly"
+
+
+@pytest.mark.asyncio
+async def test_bulk_reconcile_matches_incremental(db_session, bank_connection):
+    """Test that re-reconciling a whole history in one pass finds the same pairs"""
+    start = datetime(2023, 1, 1)
+    transactions = []
+    for i in range(2000):
+        day = start + timedelta(days=i // 10)
+        merchant = f"SHOP {chr(65 + i % 26)}{chr(65 + i // 26 % 26)}"
+        amount = -float(5 + i % 37)
+        if i % 4 == 0:
+            transactions.append(
+                make_transaction(f"p{i}", day, amount * 0.9, merchant, status="pending")
+            )
+            day += timedelta(days=2)
+        transactions.append(make_transaction(f"b{i}", day, amount, merchant))
+    service = TransactionSyncService(provider=FakeProvider([]))
+    for offset in range(0, len(transactions), 250):
+        service.store_transactions(
+            db_session, bank_connection, "acc_123", transactions[offset : offset + 250]
+        )
+        db_session.flush()
+    db_session.commit()
+    incremental = {
+        t.transaction_id: t.duplicate_of
+        for t in db_session.query(Transaction).filter(Transaction.duplicate_of.isnot(None))
+    }
+    assert incremental == {f"p{i}": f"b{i}" for i in range(0, 2000, 4)}
+
+    result = await service.reconcile_account(db_session, bank_connection, "acc_123")
+
+    assert result["transactions"] == len(transactions)
+    assert result["duplicates"] == 500
+    bulk = {
+        t.transaction_id: t.duplicate_of
+        for t in db_session.query(Transaction).filter(Transaction.duplicate_of.isnot(None))
+    }
+    assert bulk == incremental
+
+
+@pytest.mark.asyncio
+async def test_bulk_reconcile_only_holds_a_window(
+    monkeypatch, db_session, bank_connection
+):
+    """Test that provider references are evicted along with the indexes"""
+    start = datetime(2023, 1, 1)
+    transactions = [
+        make_transaction(
+            f"b{i}",
+            start + timedelta(days=i),
+            -4.5,
+            meta={"provider_transaction_id": f"ref{i}"},
+        )
+        for i in range(500)
+    ]
+    service = TransactionSyncService(provider=FakeProvider([]))
+    service.store_transactions(db_session, bank_connection, "acc_123", transactions)
+    db_session.commit()
+
+    held = []
+    evict_before = ReconciliationPass.evict_before
+
+    def record(run, day):
+        evict_before(run, day)
+        held.append(len(run._references))
+
+    monkeypatch.setattr(ReconciliationPass, "evict_before", record)
+    result = await service.reconcile_account(db_session, bank_connection, "acc_123")
+
+    assert result["transactions"] == 500
+    assert len(held) == 500
+    assert max(held) <= 2 * ReconciliationPass().window_days + 1
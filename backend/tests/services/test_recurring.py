@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from app.services.recurring import RecurringPaymentEngine, normalize_merchant
+
+START = datetime(2024, 1, 3)
+
+
+def payment(description, amount, day):
+    return {
+        "description": description,
+        "amount": amount,
+        "timestamp": (START + timedelta(days=day)).isoformat() + "+00:00",
+    }
+
+
+def test_normalize_merchant_strips_descriptor_noise():
+    """Test that different descriptors for one merchant share a key"""
+    assert normalize_merchant("NETFLIX.COM 1234") == "netflix"
+    assert normalize_merchant("PAYPAL *NETFLIX") == "netflix"
+    assert normalize_merchant("DD SPOTIFY P0A1B2C3") == "spotify"
+    assert normalize_merchant("anything", merchant_name="Netflix") == "netflix"
+
+
+def test_detect_groups_fuzzy_descriptors_and_price_changes():
+    """Test grouping by merchant with a price rise inside the amount tolerance"""
+    transactions = [
+        payment(f"NETFLIX.COM {1000 + i}", -9.99 if i < 3 else -10.99, 30 * i)
+        for i in range(6)
+    ]
+    transactions.append(payment("SALARY", 2500.0, 10))
+
+    series = RecurringPaymentEngine().detect(transactions)
+
+    assert len(series) == 1
+    netflix = series[0]
+    assert netflix["merchant"] == "netflix"
+    assert netflix["frequency"] == "monthly"
+    assert netflix["amount"] == 10.99
+    assert len(netflix["occurrences"]) == 6
+    assert netflix["price_changes"] == [
+        {
+            "date": transactions[3]["timestamp"],
+            "old_amount": 9.99,
+            "new_amount": 10.99,
+        }
+    ]
+
+
+def test_detect_is_robust_to_a_missed_payment():
+    """Test that a skipped month does not change the detected cadence"""
+    days = [0, 31, 59, 90, 151, 181, 212]  # May payment missing
+    series = RecurringPaymentEngine().detect(
+        [payment("GYM GROUP", -24.99, day) for day in days]
+    )
+
+    assert series[0]["frequency"] == "monthly"
+    assert series[0]["interval_days"] == 31.0
+    assert series[0]["confidence"] == 1.0
+
+
+def test_detect_splits_distinct_amounts_and_drops_everyday_spending():
+    """Test that different plans split into bands and daily purchases are ignored"""
+    transactions = [payment("APPLE.COM/BILL", -0.99, 30 * i) for i in range(4)]
+    transactions += [payment("APPLE.COM/BILL", -6.99, 30 * i + 5) for i in range(4)]
+    transactions += [payment("COSTA COFFEE", -3.2, i) for i in range(60)]
+
+    series = RecurringPaymentEngine().detect(transactions)
+
+    assert [(s["merchant"], s["amount"]) for s in series] == [
+        ("apple bill", 0.99),
+        ("apple bill", 6.99),
+    ]
+
+
+def test_detect_batch_keeps_users_apart():
+    """Test that one batch call returns the same series as per-user calls"""
+    engine = RecurringPaymentEngine()
+    histories = {
+        1: [payment("SPOTIFY", -9.99, 30 * i) for i in range(4)],
+        2: [payment("SPOTIFY", -9.99, 7 * i) for i in range(4)],
+        3: [],
+    }
+
+    results = engine.detect_batch(histories)
+
+    assert results[1] == engine.detect(histories[1])
+    assert results[2] == engine.detect(histories[2])
+    assert results[1][0]["frequency"] == "monthly"
+    assert results[2][0]["frequency"] == "weekly"
+    assert results[3] == []
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+import pytest
+from app.models.bank_connection import BankConnection
+from app.models.recurring_series import RecurringSeries
+from app.models.transaction import Transaction
+from app.services.recurring_series import RecurringSeriesService
+from app.services.transaction_sync import TransactionSyncService
+
+
+class FakeProvider:
+    """Stand-in provider that serves transactions after the from_date"""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+
+    async def get_transactions(self, access_token, account_id, from_date=None, to_date=None):
+        return [
+            t for t in self.transactions if t["timestamp"][:10] >= (from_date or "")
+        ]
+
+
+class CountingService(RecurringSeriesService):
+    """Records which merchants each update recomputed"""
+
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+
+    def update_merchants(self, db, user_id, account_id, merchants):
+        merchants = sorted(merchants)
+        self.updates.append(merchants)
+        return super().update_merchants(db, user_id, account_id, merchants)
+
+
+def payment(transaction_id, description, amount, days_ago):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": (datetime.utcnow() - timedelta(days=days_ago)).isoformat(),
+        "description": description,
+        "amount": amount,
+        "currency": "GBP",
+    }
+
+
+@pytest.fixture
+def bank_connection(db_session):
+    connection = BankConnection(
+        id=1,
+        user_id=1,
+        provider="truelayer",
+        access_token="mock_access_token",
+        refresh_token="mock_refresh_token",
+        expires_at=datetime.now() + timedelta(hours=1),
+        is_active=True,
+    )
+    db_session.add(connection)
+    db_session.commit()
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_sync_updates_only_touched_merchants(db_session, bank_connection):
+    """Test that series are created on sync and later syncs recompute incrementally"""
+    provider = FakeProvider(
+        [
+            payment("n1", "NETFLIX.COM 111", -9.99, 70),
+            payment("n2", "NETFLIX.COM 222", -9.99, 40),
+            payment("g1", "GYM GROUP", -24.99, 50),
+            payment("g2", "GYM GROUP", -24.99, 20),
+            payment("s1", "SALARY", 2500.0, 20),
+        ]
+    )
+    recurring = CountingService()
+    service = TransactionSyncService(provider=provider, recurring_service=recurring)
+
+    await service.sync_account(db_session, bank_connection, "acc_123")
+    assert recurring.updates == [["gym group", "netflix"]]
+    assert db_session.query(RecurringSeries).count() == 2
+
+    # A new Netflix charge at a higher price arrives
+    provider.transactions.append(payment("n3", "NETFLIX.COM 333", -10.99, 10))
+    await service.sync_account(db_session, bank_connection, "acc_123")
+
+    # The gym payment in the overlap window is fetched again, but only
+    # merchants with newly inserted payments are recomputed
+    assert recurring.updates[1] == ["netflix"]
+    netflix = recurring.get_series(db_session, 1, "acc_123")[1]
+    assert netflix.merchant == "netflix"
+    assert netflix.amount == 10.99
+    assert len(netflix.occurrences) == 3
+    assert netflix.price_changes[0]["new_amount"] == 10.99
+    assert netflix.next_expected_at == netflix.last_charge_at + timedelta(
+        days=netflix.interval_days
+    )
+
+    flagged = {
+        t.transaction_id
+        for t in db_session.query(Transaction).filter(Transaction.is_subscription)
+    }
+    assert flagged == {"n1", "n2", "n3", "g1", "g2"}
+
+
+def test_get_upcoming_orders_by_next_charge(db_session):
+    """Test the upcoming charges window"""
+    now = datetime(2024, 6, 1)
+    for merchant, next_expected in [
+        ("netflix", now + timedelta(days=12)),
+        ("spotify", now + timedelta(days=3)),
+        ("insurance", now + timedelta(days=60)),
+        ("gym", now - timedelta(days=2)),
+    ]:
+        db_session.add(
+            RecurringSeries(
+                user_id=1,
+                account_id="acc_123",
+                merchant=merchant,
+                description=merchant,
+                amount=10.0,
+                last_charge_at=next_expected - timedelta(days=30),
+                next_expected_at=next_expected,
+            )
+        )
+    db_session.commit()
+
+    upcoming = RecurringSeriesService().get_upcoming(db_session, 1, 30, now=now)
+
+    assert [s.merchant for s in upcoming] == ["spotify", "netflix"]
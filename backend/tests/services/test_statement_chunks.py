@@ -0,0 +1,122 @@
+import json
+import re
+
+import pytest
+from app.core.config import settings
+from app.services import pdf_analysis
+from app.services.statement_parser import StatementParser
+from app.services.statement_chunks import (
+    merge_statement_analyses,
+    split_statement_text,
+)
+
+ROW = re.compile(r"SHOP (\d+-\d+) -(\d+\.\d+)")
+
+
+def statement_text(pages, rows_per_page):
+    """Text as extracted from tests.stubs.statements.build_statement"""
+    return "".join(
+        f"Page {page + 1} of {pages}\n"
+        + "\n".join(
+            f"0{1 + row % 9}/05/2024 CARD PAYMENT SHOP {page}-{row} -{row + 1}.50"
+            for row in range(rows_per_page)
+        )
+        + "\n\n"
+        for page in range(pages)
+    )
+
+
+def sum_rows(messages):
+    """Reply adding up the rows of the prompt, as if analyzing them"""
+    spent = sum(float(amount) for _, amount in ROW.findall(messages[-1]["content"]))
+    return json.dumps(
+        {
+            "totalIncome": 0.0,
+            "totalExpenses": spent,
+            "topCategories": [{"category": "Shopping", "amount": spent}],
+            "recommendations": ["Shop less"],
+            "traits": {"saver": 40},
+            "xpEarned": 200,
+        }
+    )
+
+
+def test_chunks_keep_every_row_within_the_budget():
+    """Test that chunks split on pages, then rows, and lose no text"""
+    small = statement_text(pages=3, rows_per_page=4)
+    big = statement_text(pages=1, rows_per_page=30)
+
+    packed = split_statement_text(small, 500, len)
+    cut = split_statement_text(big, 500, len)
+
+    assert all(len(chunk) <= 500 for chunk in packed + cut)
+    # Small pages are packed whole, the big page is cut between rows
+    assert "".join(packed) == small.rstrip("\n")
+    assert len(packed) == 2
+    assert all(chunk.startswith("Page") for chunk in packed)
+    assert "".join(cut) == big.rstrip("\n")
+    assert all(chunk.endswith(".50\n") for chunk in cut[:-1])
+    # The statement over the budget is split into parts of about equal size
+    sizes = [len(chunk) for chunk in cut]
+    assert max(sizes) - min(sizes) < 60
+
+
+def test_merge_adds_up_totals_and_categories():
+    """Test that partial analyses are summed, not averaged"""
+    merged = merge_statement_analyses(
+        [
+            {
+                "totalIncome": 1000,
+                "totalExpenses": 300,
+                "topCategories": [{"category": "Food", "amount": 200}],
+                "recommendations": ["Cook at home"],
+                "traits": {"saver": 80},
+                "xpEarned": 400,
+            },
+            {
+                "totalIncome": "$1,000.00",
+                "totalExpenses": 500,
+                "topCategories": [
+                    {"category": "food", "amount": 150},
+                    {"category": "Rent", "amount": 300},
+                ],
+                "recommendations": ["Cook at home", "Review rent"],
+                "traits": {"saver": 40},
+                "xpEarned": 100,
+            },
+        ],
+        weights=[1, 3],
+    )
+
+    assert (merged["totalIncome"], merged["totalExpenses"]) == (2000.0, 800.0)
+    assert merged["savingsRate"] == 60.0
+    assert merged["topCategories"] == [
+        {"category": "Food", "amount": 350.0},
+        {"category": "Rent", "amount": 300.0},
+    ]
+    assert merged["recommendations"] == ["Cook at home", "Review rent"]
+    assert (merged["traits"], merged["xpEarned"]) == ({"saver": 50}, 175)
+
+
+@pytest.mark.asyncio
+async def test_long_statements_are_analyzed_in_concurrent_parts(
+    monkeypatch, fake_llm
+):
+    """Test that a statement over the budget is analyzed whole, part by part"""
+    completions = fake_llm(sum_rows, delay=0.05)
+    monkeypatch.setattr(settings, "STATEMENT_CHUNK_TOKENS", 500)
+    # A layout the local parser doesn't know is sent as text
+    monkeypatch.setattr(pdf_analysis, "statement_parser", StatementParser(patterns=[]))
+    text = statement_text(pages=6, rows_per_page=8)
+
+    result = await pdf_analysis.analyze_statement_with_llm(text)
+
+    expected = [f"{page}-{row}" for page in range(6) for row in range(8)]
+    rows = [row for prompt in completions.prompts for row, _ in ROW.findall(prompt)]
+    assert sorted(rows) == sorted(expected)
+    assert completions.peak > 1
+    assert result["totalExpenses"] == 6 * sum(row + 1.5 for row in range(8))
+    assert result["topCategories"] == [
+        {"category": "Shopping", "amount": result["totalExpenses"]}
+    ]
+    assert (result["traits"], result["xpEarned"]) == ({"saver": 40}, 200)
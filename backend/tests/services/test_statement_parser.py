@@ -0,0 +1,114 @@
+import json
+from io import BytesIO
+
+import pytest
+from app.services import pdf_analysis
+from app.services.statement_parser import (
+    StatementParser,
+    StatementPattern,
+    summarize_transactions,
+)
+from fastapi import UploadFile
+from tests.stubs.statements import build_pdf
+
+STATEMENT = """ACME BANK  Statement 01/05/2024 - 31/05/2024
+Date Description Amount Balance
+01/05/2024 Opening balance 1,000.00
+02/05/2024 ACME CORP SALARY 3,000.00 4,000.00
+03/05/2024 RENT MAY 1,200.00 2,800.00
+05/05/2024 TESCO STORES 1234 54.20 2,745.80
+09/05/2024 NETFLIX.COM 15.99 CR 2,761.79
+12/05/2024 SHELL FUEL (40.00) 2,721.79
+"""
+
+
+def test_parse_reads_directions_from_markers_and_balances():
+    """Test signs from brackets, CR, and running balance changes"""
+    parsed = StatementParser().parse(STATEMENT)
+
+    amounts = [t["amount"] for t in parsed["transactions"]]
+    assert amounts == [3000.0, -1200.0, -54.2, 15.99, -40.0]
+    assert [t["category"] for t in parsed["transactions"]] == [
+        "Income",
+        "Housing",
+        "Food",
+        "Income",
+        "Transportation",
+    ]
+    summary = summarize_transactions(parsed["transactions"])
+    assert (summary["totalIncome"], summary["totalExpenses"]) == (3015.99, 1294.2)
+    assert summary["topCategories"][0] == {"category": "Housing", "amount": 1200.0}
+    assert (summary["periodStart"], summary["periodEnd"]) == (
+        "2024-05-02",
+        "2024-05-12",
+    )
+
+
+def test_registered_bank_patterns_read_their_layout():
+    """Test that an unknown layout is refused until its pattern is registered"""
+    text = "\n".join(
+        f"COFFEE SHOP {day} | 2024-05-{day:02d} | -{day},50 EUR" for day in range(1, 9)
+    )
+    parser = StatementParser()
+    assert parser.parse(text) is None
+
+    parser.register(
+        StatementPattern(
+            name="example-bank",
+            line=r"^(?P<description>.+?) \| (?P<date>\S+) \| (?P<amount>\S+) EUR$",
+            detect=r" EUR$",
+            decimal_comma=True,
+        )
+    )
+    parsed = parser.parse(text)
+
+    assert parsed["pattern"] == "example-bank"
+    assert parsed["transactions"][0]["amount"] == -1.5
+    assert parser.get_stats()["parsed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_parsed_statements_send_the_llm_a_summary(fake_llm):
+    """Test that figures are computed locally and the prompt stays small"""
+    recorded = fake_llm(
+        json.dumps(
+            {
+                "totalIncome": 1.0,
+                "recommendations": ["Cook at home"],
+                "traits": {"saver": 70},
+                "xpEarned": 400,
+            }
+        )
+    )
+    rows = [
+        f"{1 + day % 28:02d}/05/2024 CORNER SHOP {row} {day}.{row:02d}"
+        for day in range(28)
+        for row in range(20)
+    ]
+    text = STATEMENT + "\n".join(rows)
+
+    result = await pdf_analysis.analyze_statement_with_llm(text)
+
+    assert result["totalIncome"] == 3015.99
+    expected = 1294.2 + sum(day + row / 100 for day in range(28) for row in range(20))
+    assert result["totalExpenses"] == round(expected, 2)
+    assert (result["recommendations"], result["xpEarned"]) == (["Cook at home"], 400)
+    assert len(recorded.prompts) == 1
+    assert len(recorded.prompts[0]) * 10 < len(text)
+
+
+@pytest.mark.asyncio
+async def test_monthly_prediction_projects_spending_locally(fake_llm):
+    """Test that the month's projection comes from the parsed transactions"""
+    fake_llm(json.dumps({"savingsOpportunityScore": 40, "overallAdvice": "Spend less"}))
+    pdf = build_pdf([STATEMENT.splitlines()])
+    upload = UploadFile(file=BytesIO(pdf), filename="may.pdf", size=len(pdf))
+
+    result = await pdf_analysis.analyze_monthly_prediction(upload)
+
+    # 1294.20 spent over 11 days, projected over the 31 days of May
+    assert result["projectedSpending"] == round(1294.2 * 31 / 11, 2)
+    assert result["projectedEndBalance"] == round(
+        2721.79 - (1294.2 * 31 / 11 - 1294.2), 2
+    )
+    assert (result["overallAdvice"], result["xpEarned"]) == ("Spend less", 300)
@@ -0,0 +1,180 @@
+import json
+import re
+from datetime import date
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from app.services import pdf_analysis
+from app.services.statement_periods import (
+    DAYS_PER_MONTH,
+    months_covered,
+    statement_period,
+)
+from tests.stubs.statements import build_pdf
+
+AMOUNT = re.compile(r" ([+-])(\d+\.\d\d)$", re.MULTILINE)
+
+
+def total_amounts(messages):
+    """Reply adding up the +/- amounts of the prompt"""
+    amounts = AMOUNT.findall(messages[-1]["content"])
+    return json.dumps(
+        {
+            "totalIncome": sum(float(a) for sign, a in amounts if sign == "+"),
+            "totalExpenses": sum(float(a) for sign, a in amounts if sign == "-"),
+            "topCategories": [{"category": "Rent", "amount": 1000.0}],
+            "recommendations": [],
+            "traits": {"saver": 60},
+            "xpEarned": 300,
+        }
+    )
+
+
+def statement(period, *rows):
+    header = [
+        "Sort code 20-12-45 Account 12345678",
+        "Customer since 14 June 2011",
+        f"Statement period {period}",
+    ]
+    return BytesIO(build_pdf([[*header, *rows]]))
+
+
+def test_statement_period_reads_the_stated_period():
+    """Test periods from numeric, ISO and named dates, day or month first"""
+    assert statement_period("Period 01/05/2024 - 31/05/2024\n12/05/2024 RENT") == (
+        date(2024, 5, 1),
+        date(2024, 5, 31),
+    )
+    # Either way round is a valid date, the shorter period wins
+    assert statement_period("Statement 04/01/2024 to 06/01/2024") == (
+        date(2024, 1, 4),
+        date(2024, 1, 6),
+    )
+    assert statement_period("From June 3, 2024 to 2024-07-02\n15 Jun 2024") == (
+        date(2024, 6, 3),
+        date(2024, 7, 2),
+    )
+    assert statement_period("Reference 12/99 balance 1.234.56") is None
+
+
+def test_other_dates_in_a_statement_are_ignored():
+    """Test that a sort code or an account opening date isn't the period"""
+    header = [
+        "Sort code 20-12-45 Account 12345678",
+        "Customer since 14 June 2011",
+    ]
+    assert statement_period("\n".join(header + ["03/05/2024 RENT"])) is None
+    assert statement_period(
+        "\n".join(header + ["Statement period 01/05/2024 - 31/05/2024"])
+    ) == (date(2024, 5, 1), date(2024, 5, 31))
+    # Statement dates can't be years ahead
+    assert statement_period("Statement from 20-12-45 to 01/05/2024") is None
+
+
+def test_months_covered_counts_overlapping_periods_once():
+    """Test that statements of two accounts for one month cover one month"""
+    may = (date(2024, 5, 1), date(2024, 5, 31))
+    june = (date(2024, 6, 1), date(2024, 6, 30))
+    mid_june = (date(2024, 6, 10), date(2024, 7, 9))
+
+    assert months_covered([may, june, june]) == 61 / DAYS_PER_MONTH
+    assert months_covered([june, mid_june]) == 39 / DAYS_PER_MONTH
+    assert months_covered([may, None]) == 31 / DAYS_PER_MONTH + 1
+
+
+@pytest.mark.asyncio
+async def test_statements_are_analyzed_once_and_averaged_by_period(fake_llm):
+    """Test per-statement caching, and monthly averages over covered months"""
+    completions = fake_llm(total_amounts)
+
+    def uploads():
+        return [
+            statement(
+                "01/05/2024 - 31/05/2024",
+                "02/05/2024 SALARY +3000.00",
+                "03/05/2024 RENT -1000.00",
+            ),
+            statement(
+                "01/06/2024 - 30/06/2024",
+                "02/06/2024 SALARY +3000.00",
+                "03/06/2024 RENT -1000.00",
+            ),
+        ]
+
+    await pdf_analysis.process_pdf_statements(uploads())
+    assert len(completions.calls) == 2
+
+    # A savings account statement for June, next to the same two statements
+    savings = statement("01/06/2024 - 30/06/2024", "20/06/2024 TRANSFER -500.00")
+    result = await pdf_analysis.process_pdf_statements(uploads() + [savings])
+
+    assert len(completions.calls) == 3
+    months = 61 / DAYS_PER_MONTH
+    assert result["numStatements"] == 3
+    assert result["monthsCovered"] == round(months, 2)
+    assert result["totalIncomeAllStatements"] == 6000.0
+    assert result["totalExpensesAllStatements"] == 2500.0
+    assert result["totalIncome"] == round(6000 / months, 2)
+    assert result["totalExpenses"] == round(2500 / months, 2)
+    assert result["topCategories"] == [
+        {"category": "Rent", "amount": round(3000 / months, 2)}
+    ]
+    assert [s["periodStart"] for s in result["statements"]] == [
+        "2024-05-01",
+        "2024-06-01",
+        "2024-06-01",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_parsed_statements_take_their_period_from_transactions(fake_llm):
+    """Test that header dates don't stretch the period of parsed statements"""
+    fake_llm(total_amounts)
+    header = ["Sort code 20-12-45 Account 12345678", "Customer since 14 June 2011"]
+    uploads = [
+        BytesIO(build_pdf([[*header, *rows]]))
+        for rows in (
+            [
+                "02/05/2024 SALARY +3000.00",
+                "03/05/2024 RENT -1000.00",
+                "30/05/2024 TESCO STORES -100.00",
+            ],
+            [
+                "01/06/2024 SALARY +3000.00",
+                "03/06/2024 RENT -1000.00",
+                "29/06/2024 TESCO STORES -100.00",
+            ],
+        )
+    ]
+
+    result = await pdf_analysis.process_pdf_statements(uploads)
+
+    months = 58 / DAYS_PER_MONTH
+    assert result["monthsCovered"] == round(months, 2)
+    assert result["totalExpenses"] == round(2200 / months, 2)
+    assert [(s["periodStart"], s["periodEnd"]) for s in result["statements"]] == [
+        ("2024-05-02", "2024-05-30"),
+        ("2024-06-01", "2024-06-29"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_uploads_that_fail_are_listed_and_left_out_of_the_totals(fake_llm):
+    """Test that numStatements counts only the statements that were analyzed"""
+    fake_llm(total_amounts)
+    uploads = [
+        statement(
+            "01/05/2024 - 31/05/2024",
+            "02/05/2024 SALARY +3000.00",
+            "03/05/2024 RENT -1000.00",
+        ),
+        SimpleNamespace(filename="scan.pdf", file=BytesIO(b"not a pdf")),
+    ]
+
+    result = await pdf_analysis.process_pdf_statements(uploads)
+
+    assert result["numStatements"] == 1
+    assert result["skippedFiles"] == ["scan.pdf"]
+    assert result["totalIncome"] == 3000.0
+    assert result["totalExpenses"] == 1000.0
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from app.models.bank_connection import BankConnection
+from app.models.transaction import Transaction
+from app.services.bank_tokens import BankTokenManager
+from app.services.sync_scheduler import BankSyncScheduler
+from app.services.transaction_sync import TransactionSyncService
+from app.services.truelayer import TrueLayerService
+from tests.conftest import TestingSessionLocal
+
+
+def truelayer_stand_in(fail_data_api=False):
+    """Local stand-in for the TrueLayer auth and data APIs"""
+    calls = {"token": 0, "data": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/connect/token":
+            calls["token"] += 1
+            return httpx.Response(
+                200,
+                json={
+                    "access_token": "refreshed_access_token",
+                    "refresh_token": "refreshed_refresh_token",
+                    "expires_in": 3600,
+                },
+            )
+        calls["data"] += 1
+        if fail_data_api:
+            return httpx.Response(503, json={"error": "provider_unavailable"})
+        if request.url.path == "/data/v1/accounts":
+            return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+        token = request.headers["Authorization"].split()[-1]
+        return httpx.Response(
+            200,
+            json={
+                "results": [
+                    {
+                        "transaction_id": f"tx_{token}",
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "description": "Coffee Shop",
+                        "amount": -3.50,
+                        "currency": "GBP",
+                    }
+                ]
+            },
+        )
+
+    return httpx.MockTransport(handler), calls
+
+
+def make_scheduler(transport):
+    provider = TrueLayerService(transport=transport, max_retries=0)
+    return BankSyncScheduler(
+        provider=provider,
+        sync_service=TransactionSyncService(provider=provider),
+        token_manager=BankTokenManager(
+            provider=provider, session_factory=TestingSessionLocal
+        ),
+        session_factory=TestingSessionLocal,
+        tick=3600,
+        max_concurrency=2,
+        jitter=0,
+    )
+
+
+def add_connection(db_session, connection_id, user_id, expires_in=timedelta(hours=1)):
+    db_session.add(
+        BankConnection(
+            id=connection_id,
+            user_id=user_id,
+            provider="truelayer",
+            access_token=f"token_{connection_id}",
+            refresh_token=f"refresh_{connection_id}",
+            expires_at=datetime.now() + expires_in,
+            is_active=True,
+        )
+    )
+    db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_presyncs_active_connections(db_session):
+    """Test that due connections are synced by the background workers"""
+    add_connection(db_session, 1, user_id=1)
+    add_connection(db_session, 2, user_id=2)
+    transport, _ = truelayer_stand_in()
+    scheduler = make_scheduler(transport)
+
+    await scheduler.start()
+    await scheduler.tick()
+    await scheduler.drain()
+    status = scheduler.get_status()
+    await scheduler.stop()
+
+    assert db_session.query(Transaction).count() == 2
+    assert status["syncs_completed"] == 2
+    assert status["queue_depth"] == 0
+    assert status["connections_never_synced"] == 0
+    assert status["max_sync_lag_seconds"] is not None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_backs_off_failing_connections(db_session):
+    """Test that a failing connection is not retried on the next pass"""
+    add_connection(db_session, 1, user_id=1)
+    transport, calls = truelayer_stand_in(fail_data_api=True)
+    scheduler = make_scheduler(transport)
+
+    await scheduler.start()
+    await scheduler.tick()
+    await scheduler.drain()
+    calls_after_failure = calls["data"]
+    await scheduler.tick()
+    await scheduler.drain()
+    status = scheduler.get_status()
+    await scheduler.stop()
+
+    assert status["syncs_failed"] == 1
+    assert status["connections_backing_off"] == 1
+    assert calls["data"] == calls_after_failure
+
+
+@pytest.mark.asyncio
+async def test_scheduler_refreshes_tokens_ahead_of_expiry(db_session):
+    """Test that tokens inside the refresh window are refreshed off the request path"""
+    add_connection(db_session, 1, user_id=1, expires_in=timedelta(minutes=2))
+    transport, calls = truelayer_stand_in()
+    scheduler = make_scheduler(transport)
+
+    await scheduler.start()
+    await scheduler.tick()
+    await scheduler.drain()
+    await scheduler.stop()
+
+    assert calls["token"] == 1
+    connection = db_session.query(BankConnection).first()
+    db_session.refresh(connection)
+    assert connection.access_token == "refreshed_access_token"
+
+
+@pytest.mark.asyncio
+async def test_user_at_their_limit_does_not_hold_up_a_worker(db_session):
+    """Test that another user's sync runs while a user's second one waits"""
+    add_connection(db_session, 1, user_id=1)
+    add_connection(db_session, 2, user_id=1)
+    add_connection(db_session, 3, user_id=2)
+    synced = []
+
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/data/v1/accounts":
+            return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+        await asyncio.sleep(0.05)
+        synced.append(request.headers["Authorization"].split()[-1])
+        return httpx.Response(200, json={"results": []})
+
+    scheduler = make_scheduler(httpx.MockTransport(slow_handler))
+    await scheduler.start()
+    await scheduler.tick()
+    await scheduler.drain()
+    status = scheduler.get_status()
+    await scheduler.stop()
+
+    # Both workers stay busy: user 2 goes before user 1's second connection
+    assert set(synced[:2]) == {"token_1", "token_3"}
+    assert synced[2] == "token_2"
+    assert (status["syncs_completed"], status["deferred"]) == (3, 0)
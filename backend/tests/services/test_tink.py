@@ -0,0 +1,115 @@
+import httpx
+import pytest
+from app.services.tink import TinkAPIError, TinkService
+
+
+def tink_transaction(transaction_id, booked, unscaled, description):
+    return {
+        "id": transaction_id,
+        "accountId": "tink_acc_1",
+        "amount": {
+            "value": {"unscaledValue": str(unscaled), "scale": "2"},
+            "currencyCode": "GBP",
+        },
+        "dates": {"booked": booked},
+        "descriptions": {"original": description.upper(), "display": description},
+        "status": "BOOKED",
+        "types": {"type": "DEFAULT"},
+    }
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/api/v1/oauth/token":
+        return httpx.Response(
+            200,
+            json={
+                "access_token": "tink_access",
+                "refresh_token": "tink_refresh",
+                "expires_in": 7200,
+            },
+        )
+    if request.url.path == "/data/v2/accounts":
+        return httpx.Response(
+            200,
+            json={
+                "accounts": [
+                    {
+                        "id": "tink_acc_1",
+                        "name": "Everyday",
+                        "type": "CHECKING",
+                        "balances": {
+                            "booked": {
+                                "amount": {
+                                    "value": {"unscaledValue": "10000", "scale": "2"},
+                                    "currencyCode": "GBP",
+                                }
+                            }
+                        },
+                    }
+                ],
+                "nextPageToken": "",
+            },
+        )
+    if request.url.path == "/data/v2/transactions":
+        assert request.url.params["accountIdIn"] == "tink_acc_1"
+        assert request.url.params["bookedDateGte"] == "2024-01-01"
+        if request.url.params.get("pageToken") == "page2":
+            return httpx.Response(
+                200,
+                json={
+                    "transactions": [
+                        tink_transaction("t2", "2024-01-02", 250000, "Salary")
+                    ],
+                    "nextPageToken": "",
+                },
+            )
+        return httpx.Response(
+            200,
+            json={
+                "transactions": [
+                    tink_transaction("t1", "2024-01-05", -999, "Netflix")
+                ],
+                "nextPageToken": "page2",
+            },
+        )
+    return httpx.Response(401, json={"errorMessage": "unauthorized"})
+
+
+@pytest.mark.asyncio
+async def test_data_is_normalized_to_the_common_shape():
+    """Test that Tink accounts and paged transactions use the common shape"""
+    service = TinkService(
+        transport=httpx.MockTransport(handler), api_url="http://tink-stub"
+    )
+
+    token = await service.exchange_code_for_token("code")
+    accounts = await service.get_accounts(token["access_token"])
+    transactions = await service.get_transactions(
+        token["access_token"], "tink_acc_1", "2024-01-01"
+    )
+
+    assert token["access_token"] == "tink_access"
+    assert accounts[0]["account_id"] == "tink_acc_1"
+    assert accounts[0]["currency"] == "GBP"
+    assert [t["transaction_id"] for t in transactions] == ["t1", "t2"]
+    assert transactions[0]["amount"] == -9.99
+    assert transactions[0]["description"] == "Netflix"
+    assert transactions[0]["timestamp"] == "2024-01-05T00:00:00+00:00"
+    assert transactions[0]["transaction_type"] == "DEBIT"
+    assert transactions[1]["amount"] == 2500.0
+    assert await service.get_direct_debits(token["access_token"], "tink_acc_1") == []
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_error_responses_raise_tink_errors():
+    """Test that non-200 responses raise TinkAPIError with the status code"""
+    service = TinkService(
+        transport=httpx.MockTransport(handler), api_url="http://tink-stub"
+    )
+
+    with pytest.raises(TinkAPIError) as error:
+        await service._get_pages("/data/v2/unknown", "unknown", "items", "token")
+
+    assert error.value.status_code == 401
+    await service.aclose()
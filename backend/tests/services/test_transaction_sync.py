@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from app.core.config import settings
+from app.db.init_db import init_db
+from app.models.bank_connection import BankConnection
+from app.models.transaction import Transaction
+from app.services.transaction_sync import TransactionSyncService
+from sqlalchemy import create_engine, inspect, text, tuple_
+
+
+class FakeProvider:
+    """Stand-in provider that records the from_date of each call"""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.calls = []
+
+    async def get_transactions(self, access_token, account_id, from_date=None, to_date=None):
+        self.calls.append(from_date)
+        return [
+            t for t in self.transactions if t["timestamp"][:10] >= (from_date or "")
+        ]
+
+
+def make_transaction(transaction_id, days_ago, amount=-10.0):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": (datetime.utcnow() - timedelta(days=days_ago)).isoformat(),
+        "description": f"Payment {transaction_id}",
+        "amount": amount,
+        "currency": "GBP",
+    }
+
+
+@pytest.fixture
+def bank_connection(db_session):
+    connection = BankConnection(
+        id=1,
+        user_id=1,
+        provider="truelayer",
+        access_token="mock_access_token",
+        refresh_token="mock_refresh_token",
+        expires_at=datetime.now() + timedelta(hours=1),
+        is_active=True,
+    )
+    db_session.add(connection)
+    db_session.commit()
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_uses_high_water_mark(db_session, bank_connection):
+    """Test that later syncs only fetch from the high-water mark minus the overlap"""
+    provider = FakeProvider([make_transaction("tx_1", 20), make_transaction("tx_2", 10)])
+    service = TransactionSyncService(provider=provider)
+
+    inserted = await service.sync_account(db_session, bank_connection, "acc_123")
+    assert inserted == 2
+
+    # A late-posting item and a new item arrive; tx_2 is fetched again
+    provider.transactions.append(make_transaction("tx_3", 9))
+    provider.transactions.append(make_transaction("tx_4", 1))
+    inserted = await service.sync_account(db_session, bank_connection, "acc_123")
+
+    expected_from = (
+        datetime.utcnow()
+        - timedelta(days=10 + settings.TRANSACTION_SYNC_OVERLAP_DAYS)
+    ).strftime("%Y-%m-%d")
+    assert provider.calls[1] == expected_from
+    assert inserted == 2
+    assert db_session.query(Transaction).count() == 4
+
+
+@pytest.mark.asyncio
+async def test_ensure_synced_skips_fresh_accounts(db_session, bank_connection):
+    """Test that reads within the staleness window are served locally"""
+    provider = FakeProvider([make_transaction("tx_1", 5)])
+    service = TransactionSyncService(provider=provider)
+
+    await service.ensure_synced(db_session, bank_connection, "acc_123")
+    await service.ensure_synced(db_session, bank_connection, "acc_123")
+
+    assert len(provider.calls) == 1
+    stored = service.query_transactions(db_session, 1, "acc_123")
+    assert [t.transaction_id for t in stored] == ["tx_1"]
+    assert stored[0].is_expense is True
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_sync(db_session, bank_connection):
+    """Test that concurrent first reads of an account sync it only once"""
+
+    class SlowProvider(FakeProvider):
+        async def get_transactions(self, *args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await super().get_transactions(*args, **kwargs)
+
+    provider = SlowProvider([make_transaction("tx_1", 5)])
+    service = TransactionSyncService(provider=provider)
+
+    await asyncio.gather(
+        *(
+            service.ensure_synced(db_session, bank_connection, "acc_123")
+            for _ in range(5)
+        )
+    )
+
+    assert len(provider.calls) == 1
+    assert db_session.query(Transaction).count() == 1
+    # Locks of accounts no longer syncing are not kept around
+    assert len(service._locks) == 0
+
+
+def test_keyset_pages_cover_history_in_order(db_session, bank_connection):
+    """Test that cursor pages walk the whole history without gaps or repeats"""
+    service = TransactionSyncService(provider=FakeProvider([]))
+    # Several transactions share each timestamp, so ties need the id
+    base = datetime(2024, 6, 1)
+    transactions = [
+        {
+            "transaction_id": f"tx_{i:03d}",
+            "timestamp": (base - timedelta(hours=i // 3)).isoformat(),
+            "description": "NETFLIX.COM" if i % 10 == 0 else "COSTA COFFEE",
+            "amount": 25.0 if i % 7 == 0 else -float(i % 50 + 1),
+            "currency": "GBP",
+            "transaction_category": "BILL_PAYMENT" if i % 10 == 0 else "PURCHASE",
+        }
+        for i in range(250)
+    ]
+    service.store_transactions(db_session, bank_connection, "acc_123", transactions)
+    db_session.commit()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = service.page_transactions(
+            db_session, 1, "acc_123", limit=40, cursor=cursor
+        )
+        seen.extend((t.transaction_date, t.transaction_id) for t in page)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 7
+    assert len(seen) == 250 == len(set(seen))
+    assert seen == sorted(seen, reverse=True)
+
+    netflix, _ = service.page_transactions(
+        db_session, 1, "acc_123", merchant="Netflix", categories=["BILL_PAYMENT"]
+    )
+    assert len(netflix) == 25
+    debits, _ = service.page_transactions(
+        db_session,
+        1,
+        "acc_123",
+        direction="debit",
+        min_amount=10,
+        max_amount=20,
+        limit=500,
+    )
+    assert debits and all(-20 <= t.amount <= -10 for t in debits)
+    credits, _ = service.page_transactions(
+        db_session, 1, "acc_123", direction="credit", limit=500
+    )
+    assert len(credits) == len([t for t in transactions if t["amount"] > 0])
+
+
+def test_page_query_seeks_on_the_composite_index(db_session, bank_connection):
+    """Test that a deep page is an index seek rather than a sort"""
+    service = TransactionSyncService(provider=FakeProvider([]))
+    query = service._filtered_query(db_session, 1, "acc_123").filter(
+        tuple_(Transaction.transaction_date, Transaction.transaction_id)
+        < tuple_(datetime(2024, 1, 1), "tx_100")
+    )
+    statement = query.limit(41).statement.compile(
+        db_session.get_bind(), compile_kwargs={"literal_binds": True}
+    )
+
+    plan = " ".join(
+        row[-1]
+        for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {statement}"))
+    )
+
+    assert "ix_transactions_account_date_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_superseded_indexes_are_dropped():
+    """Test that init_db drops the indexes the composite ones replaced"""
+    engine = create_engine("sqlite://")
+    init_db(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE INDEX ix_transactions_account_date "
+                "ON transactions (account_id, transaction_date)"
+            )
+        )
+
+    init_db(bind=engine)
+
+    names = {index["name"] for index in inspect(engine).get_indexes("transactions")}
+    assert "ix_transactions_account_date" not in names
+    assert "ix_transactions_account_date_id" in names
@@ -0,0 +1,325 @@
+import asyncio
+import sys
+import time
+
+import httpx
+import pytest
+from app.core.config import settings
+from app.services.truelayer import (
+    TrueLayerAPIError,
+    TrueLayerService,
+    TrueLayerUnavailableError,
+)
+from tests.stubs.truelayer import TrueLayerStubConfig, create_truelayer_stub
+
+
+def mock_handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/data/v1/accounts":
+        return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+    return httpx.Response(404, json={"error": "not_found"})
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_between_calls():
+    """Test that every call goes through the same pooled client"""
+    service = TrueLayerService(transport=httpx.MockTransport(mock_handler))
+    await service.startup()
+    client = service._get_client()
+
+    accounts = await service.get_accounts("mock_access_token")
+    await service.get_accounts("mock_access_token")
+
+    assert accounts == [{"account_id": "acc_123"}]
+    assert service._get_client() is client
+    assert service.get_pool_stats()["requests_sent"] == 2
+    assert service.get_pool_stats()["client_open"] is True
+
+    await service.aclose()
+    assert service.get_pool_stats()["client_open"] is False
+
+
+def test_pool_stats_report_the_protocol_in_use(monkeypatch):
+    """Test that http2 is reported off when h2 is missing, whatever the setting"""
+    # An import of a module mapped to None raises ImportError
+    monkeypatch.setitem(sys.modules, "h2", None)
+    service = TrueLayerService(transport=httpx.MockTransport(mock_handler))
+    assert service.limits.http2 is True
+    assert service.get_pool_stats()["http2"] is None
+
+    service._get_client()
+
+    assert service.get_pool_stats()["http2"] is False
+
+
+@pytest.mark.asyncio
+async def test_client_is_recreated_after_close():
+    """Test that the pool reopens lazily if used after shutdown"""
+    service = TrueLayerService(transport=httpx.MockTransport(mock_handler))
+    await service.aclose()
+
+    accounts = await service.get_accounts("mock_access_token")
+
+    assert len(accounts) == 1
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_accounts_overview_runs_concurrently():
+    """Test that per-account calls overlap and failures stay isolated"""
+    account_ids = ["acc_1", "acc_2", "acc_3", "acc_4"]
+
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/data/v1/accounts":
+            return httpx.Response(
+                200, json={"results": [{"account_id": a} for a in account_ids]}
+            )
+        await asyncio.sleep(0.1)
+        if request.url.path == "/data/v1/accounts/acc_2/standing_orders":
+            return httpx.Response(500, json={"error": "internal_error"})
+        return httpx.Response(200, json={"results": [{"id": request.url.path}]})
+
+    service = TrueLayerService(
+        transport=httpx.MockTransport(slow_handler), max_retries=0
+    )
+
+    start = time.perf_counter()
+    overview = await service.get_accounts_overview("mock_access_token")
+    elapsed = time.perf_counter() - start
+
+    # 12 calls of 100ms each would take 1.2s if run serially
+    assert elapsed < 0.6
+    assert [entry["account"]["account_id"] for entry in overview] == account_ids
+    assert "standing_orders" in overview[1]["errors"]
+    assert overview[1]["standing_orders"] == []
+    assert len(overview[1]["transactions"]) == 1
+    assert overview[0]["errors"] == {}
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_get_requests_are_retried_with_retry_after():
+    """Test that 429 and 5xx responses are retried until one succeeds"""
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}, json={"error": "rate_limited"}),
+        httpx.Response(503, json={"error": "unavailable"}),
+        httpx.Response(200, json={"results": [{"account_id": "acc_123"}]}),
+    ]
+
+    def flaky_handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    service = TrueLayerService(
+        transport=httpx.MockTransport(flaky_handler), backoff_base=0.01
+    )
+
+    accounts = await service.get_accounts("mock_access_token")
+
+    assert accounts == [{"account_id": "acc_123"}]
+    stats = service.get_resilience_stats()["accounts"]
+    assert stats["retries"] == 2
+    assert stats["state"] == "closed"
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_token_requests_are_not_retried():
+    """Test that non-idempotent token requests are sent only once"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503, json={"error": "unavailable"})
+
+    service = TrueLayerService(transport=httpx.MockTransport(handler), backoff_base=0.01)
+
+    with pytest.raises(TrueLayerAPIError):
+        await service.refresh_access_token("mock_refresh_token")
+
+    assert len(calls) == 1
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_and_serves_cached_data():
+    """Test that an unhealthy provider trips the breaker and cached data is served"""
+    healthy = {"value": True}
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if healthy["value"]:
+            return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+        return httpx.Response(500, json={"error": "internal_error"})
+
+    service = TrueLayerService(
+        transport=httpx.MockTransport(handler), max_retries=1, backoff_base=0.01
+    )
+
+    # Warm the cache, then make the provider fail until the breaker opens;
+    # each request counts once, however many times it was retried
+    await service.get_accounts("mock_access_token")
+    healthy["value"] = False
+    for _ in range(4):
+        assert await service.get_accounts("mock_access_token") == [
+            {"account_id": "acc_123"}
+        ]
+    assert service.get_resilience_stats()["accounts"]["state"] == "closed"
+    await service.get_accounts("mock_access_token")
+    assert service.get_resilience_stats()["accounts"]["state"] == "open"
+
+    # While open, no request reaches the provider
+    calls_before = len(calls)
+    assert await service.get_accounts("mock_access_token") == [
+        {"account_id": "acc_123"}
+    ]
+    assert len(calls) == calls_before
+
+    # Without cached data the call fails fast
+    with pytest.raises(TrueLayerUnavailableError):
+        await service.get_accounts("other_access_token")
+    assert service.get_resilience_stats()["accounts"]["stale_responses_served"] >= 1
+    await service.aclose()
+
+
+async def open_breaker(monkeypatch, handler, status):
+    """A service whose accounts breaker has opened and is ready for a trial"""
+    monkeypatch.setattr(settings, "TRUELAYER_BREAKER_RESET_SECONDS", 0.05)
+    service = TrueLayerService(transport=httpx.MockTransport(handler), max_retries=0)
+    status["code"] = 500
+    for _ in range(settings.TRUELAYER_BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(TrueLayerAPIError):
+            await service.get_accounts("mock_access_token")
+    assert service.get_resilience_stats()["accounts"]["state"] == "open"
+    await asyncio.sleep(0.06)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_trial_releases_the_breaker(monkeypatch):
+    """Test that a 429 on the half-open trial lets the next call try again"""
+    status = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if status["code"] != 200:
+            return httpx.Response(status["code"], json={"error": "failed"})
+        return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+
+    service = await open_breaker(monkeypatch, handler, status)
+
+    status["code"] = 429
+    with pytest.raises(TrueLayerAPIError):
+        await service.get_accounts("mock_access_token")
+    assert service.get_resilience_stats()["accounts"]["state"] == "half_open"
+
+    status["code"] = 200
+    assert await service.get_accounts("mock_access_token") == [
+        {"account_id": "acc_123"}
+    ]
+    assert service.get_resilience_stats()["accounts"]["state"] == "closed"
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_releases_the_breaker(monkeypatch):
+    """Test that cancelling the half-open trial lets the next call try again"""
+    status = {}
+    stalled = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if status["code"] == "stall":
+            stalled.set()
+            await asyncio.sleep(10)
+        if status["code"] != 200:
+            return httpx.Response(status["code"], json={"error": "failed"})
+        return httpx.Response(200, json={"results": [{"account_id": "acc_123"}]})
+
+    service = await open_breaker(monkeypatch, handler, status)
+
+    status["code"] = "stall"
+    trial = asyncio.create_task(service.get_accounts("mock_access_token"))
+    await stalled.wait()
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    status["code"] = 200
+    assert await service.get_accounts("mock_access_token") == [
+        {"account_id": "acc_123"}
+    ]
+    assert service.get_resilience_stats()["accounts"]["state"] == "closed"
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_next_links_off_the_data_api_are_not_followed():
+    """Test that the access token is not sent to another scheme or host"""
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.host == "api.truelayer.test":
+            return httpx.Response(200, json={"results": [], "next": next_url})
+        return httpx.Response(200, json={"results": []})
+
+    service = TrueLayerService(
+        transport=httpx.MockTransport(handler), api_url="https://api.truelayer.test"
+    )
+    for next_url in [
+        "https://attacker.test/data/v1/accounts?cursor=2",
+        "http://api.truelayer.test/data/v1/accounts?cursor=2",
+    ]:
+        with pytest.raises(TrueLayerAPIError):
+            await service.get_accounts("mock_access_token")
+
+    assert requested == ["https://api.truelayer.test/data/v1/accounts"] * 2
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_paginated_results_are_followed_against_stand_in():
+    """Test that every page is fetched from the local TrueLayer stand-in"""
+    stub = create_truelayer_stub(
+        TrueLayerStubConfig(page_size=50, transactions_per_account=120)
+    )
+    service = TrueLayerService(
+        transport=httpx.ASGITransport(app=stub),
+        auth_url="http://truelayer-stub",
+        api_url="http://truelayer-stub",
+    )
+
+    token = await service.exchange_code_for_token("user1")
+    accounts = await service.get_accounts(token["access_token"])
+    transactions = await service.get_transactions(
+        token["access_token"], accounts[0]["account_id"]
+    )
+
+    assert accounts[0]["account_id"] == "user1-acc0"
+    assert len(transactions) == 120
+    assert len({t["transaction_id"] for t in transactions}) == 120
+    assert stub.state.stats["transactions:200"] == 3
+    await service.aclose()
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_are_retried_against_stand_in():
+    """Test that the stand-in's injected 503s and 429s are absorbed by retries"""
+    stub = create_truelayer_stub(
+        TrueLayerStubConfig(error_rate=0.3, rate_limit_rate=0.2, seed=3)
+    )
+    service = TrueLayerService(
+        transport=httpx.ASGITransport(app=stub),
+        max_retries=8,
+        backoff_base=0.001,
+        api_url="http://truelayer-stub",
+    )
+
+    for _ in range(10):
+        accounts = await service.get_accounts("user1.access1")
+        assert len(accounts) == 1
+
+    stats = service.get_resilience_stats()["accounts"]
+    assert stats["retries"] == stub.state.stats["accounts:503"] + stub.state.stats[
+        "accounts:429"
+    ]
+    assert stats["retries"] > 0
+    await service.aclose()
@@ -0,0 +1,134 @@
+"""
+Stand-in for the OpenAI-compatible LLM clients.
+
+FakeCompletions takes the place of client.chat.completions and answers with
+canned replies, or with replies computed from the prompt, either in one
+piece or streamed a few characters at a time. install_fake_llm routes the
+app's LLM gateway to it, so the endpoints and services that call an LLM can
+be exercised without network access or API keys.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.api.api_v1.endpoints import coach, savings_planner
+from app.services import pdf_analysis
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import LLMGateway
+
+# A reply's text, or a function computing it from the request's messages
+Reply = Union[str, Callable[[List[Dict[str, Any]]], str]]
+
+# Modules holding a reference to the app's LLM gateway
+GATEWAY_USERS = (coach, savings_planner, pdf_analysis)
+
+
+class PieceStream:
+    """Stand-in for a streamed completion, sent a few characters at a time"""
+
+    def __init__(self, text: str, delay: float):
+        self.pieces = [text[i : i + 5] for i in range(0, len(text), 5)]
+        self.delay = delay
+        self.closed = False
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            await asyncio.sleep(self.delay)
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    """
+    Stand-in for client.chat.completions
+
+    The nth request gets the nth reply, and the last reply once they run
+    out. Scripted failures are raised first, one per request. A request
+    takes delay seconds to answer, or, when streamed, delay seconds per
+    piece.
+    """
+
+    def __init__(
+        self,
+        *replies: Reply,
+        delay: float = 0.0,
+        failures: Tuple[Exception, ...] = (),
+        usage: Optional[Tuple[int, int]] = None,
+    ):
+        self.replies = list(replies) or ["ok"]
+        self.delay = delay
+        self.failures = list(failures)
+        # Prompt and completion tokens reported with each answer
+        self.usage = usage
+        self.calls: List[Dict[str, Any]] = []
+        self.streams: List[PieceStream] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    def _reply(self, messages: List[Dict[str, Any]]) -> str:
+        reply = self.replies[min(len(self.calls), len(self.replies)) - 1]
+        return reply(messages) if callable(reply) else reply
+
+    async def create(self, stream: bool = False, **request):
+        self.calls.append(request)
+        text = self._reply(request["messages"])
+        if stream:
+            self.streams.append(PieceStream(text, self.delay))
+            return self.streams[-1]
+
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.failures:
+            raise self.failures.pop(0)
+        message = SimpleNamespace(content=text)
+        response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        if self.usage is not None:
+            prompt_tokens, completion_tokens = self.usage
+            response.usage = SimpleNamespace(
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+            )
+        return response
+
+    @property
+    def prompts(self) -> List[str]:
+        """Last message of each request"""
+        return [call["messages"][-1]["content"] for call in self.calls]
+
+
+def fake_client(completions: FakeCompletions) -> SimpleNamespace:
+    """Stand-in for an AsyncOpenAI client answering through completions"""
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def install_fake_llm(monkeypatch, completions: FakeCompletions) -> LLMGateway:
+    """
+    Route the app's LLM calls to completions for the rest of a test
+
+    Args:
+        monkeypatch: The test's monkeypatch fixture
+        completions: Stand-in answering every model
+
+    Returns:
+        The gateway now used by the app, with an in-memory response cache
+    """
+    gateway = LLMGateway(
+        clients={"openai": fake_client(completions)},
+        cache=LLMResponseCache(directory=""),
+    )
+    for module in GATEWAY_USERS:
+        monkeypatch.setattr(module, "llm_gateway", gateway)
+    monkeypatch.setattr(pdf_analysis, "USE_MOCK_RESPONSES", False)
+    # tiktoken downloads its encodings on first use, keep the tests offline
+    for module in (coach, pdf_analysis):
+        monkeypatch.setattr(
+            module, "num_tokens_from_string", lambda text, model: len(text)
+        )
+    return gateway
@@ -0,0 +1,96 @@
+"""
+Synthetic PDF bank statements.
+
+Builds small, valid PDFs with one text line per statement row, so statement
+ingestion can be exercised without real statements or a PDF library:
+
+    python -m tests.stubs.statements --pages 3 statement.pdf
+"""
+
+import argparse
+from typing import List, Optional, Sequence
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: Sequence[Sequence[str]]) -> bytes:
+    """
+    Build a PDF with the given lines of text on each page
+
+    Args:
+        pages: Lines of text for each page
+
+    Returns:
+        The PDF file contents
+    """
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects.append(
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode()
+    )
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, lines in zip(page_ids, pages):
+        objects.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {page_id + 1} 0 R >>"
+            ).encode()
+        )
+        text = "".join(
+            f"({_escape(line)}) Tj 0 -14 Td " for line in lines
+        )
+        content = f"BT /F1 10 Tf 50 760 Td {text}ET".encode()
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(content)
+            + content
+            + b"\nendstream"
+        )
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += (
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objects) + 1, xref)
+    )
+    return bytes(pdf)
+
+
+def build_statement(pages: int = 1, rows_per_page: int = 20) -> bytes:
+    """Build a statement PDF with numbered transaction rows on every page"""
+    return build_pdf(
+        [
+            [f"Page {page + 1} of {pages}"]
+            + [
+                f"0{1 + row % 9}/05/2024 CARD PAYMENT SHOP {page}-{row} -{row + 1}.50"
+                for row in range(rows_per_page)
+            ]
+            for page in range(pages)
+        ]
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic statement PDF")
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=20)
+    args = parser.parse_args(argv)
+    with open(args.output, "wb") as f:
+        f.write(build_statement(args.pages, args.rows))
+
+
+if __name__ == "__main__":
+    main()
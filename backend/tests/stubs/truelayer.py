@@ -0,0 +1,250 @@
+"""
+Local stand-in for the TrueLayer auth and data APIs.
+
+Serves deterministic synthetic accounts and transactions with configurable
+latency, injected errors, rate limiting and pagination, so the banking
+endpoints can be exercised without network access. Use it in process with
+httpx.ASGITransport, or run it as a server and point TRUELAYER_AUTH_URL and
+TRUELAYER_API_URL at it:
+
+    uvicorn tests.stubs.truelayer:app --port 9000
+"""
+
+import asyncio
+import hashlib
+import itertools
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+SUBSCRIPTIONS = [
+    ("NETFLIX.COM", 10.99, 30),
+    ("SPOTIFY", 9.99, 30),
+    ("PURE GYM", 24.99, 30),
+    ("AMAZON PRIME", 8.99, 30),
+    ("HOME INSURANCE", 31.50, 30),
+]
+MERCHANTS = ["TESCO", "SAINSBURYS", "PRET A MANGER", "UBER", "COSTA", "AMAZON"]
+
+
+class TrueLayerStubConfig(BaseModel):
+    """Behaviour of the stand-in server"""
+
+    # Added to every response, in milliseconds
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    # Share of data API calls answered with 503 or with 429 and Retry-After
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 0.0
+    # Results per page, None to return every result in one page
+    page_size: Optional[int] = None
+    accounts_per_user: int = 1
+    transactions_per_account: int = 200
+    history_days: int = 180
+    token_expires_in: int = 3600
+    seed: int = 0
+
+
+def _owner(access_token: str) -> str:
+    """Accounts belong to the token owner, which survives token refreshes"""
+    return access_token.split(".")[0]
+
+
+def create_truelayer_stub(config: Optional[TrueLayerStubConfig] = None) -> FastAPI:
+    """
+    Create a stand-in TrueLayer server
+
+    Args:
+        config: Latency, error and dataset settings
+
+    Returns:
+        ASGI app serving /connect/token and the /data/v1 endpoints used by
+        TrueLayerService. app.state.stats counts requests per endpoint and
+        status code.
+    """
+    config = config or TrueLayerStubConfig()
+    stub = FastAPI(title="TrueLayer stand-in")
+    stub.state.config = config
+    stub.state.stats = Counter()
+    rng = random.Random(config.seed)
+    token_counter = itertools.count(1)
+    datasets: Dict[str, List[Dict[str, Any]]] = {}
+
+    def transactions_for(account_id: str) -> List[Dict[str, Any]]:
+        if account_id not in datasets:
+            account_rng = random.Random(f"{config.seed}:{account_id}")
+            now = datetime.utcnow().replace(microsecond=0)
+            transactions = []
+            for description, amount, interval in SUBSCRIPTIONS:
+                day = account_rng.randint(0, interval - 1)
+                while day < config.history_days:
+                    timestamp = now - timedelta(days=day)
+                    transactions.append((timestamp, description, -amount))
+                    day += interval
+            while len(transactions) < config.transactions_per_account:
+                transactions.append(
+                    (
+                        now
+                        - timedelta(
+                            seconds=account_rng.randint(0, config.history_days * 86400)
+                        ),
+                        account_rng.choice(MERCHANTS),
+                        -round(account_rng.uniform(2, 80), 2),
+                    )
+                )
+            transactions = transactions[: config.transactions_per_account]
+            transactions.sort(reverse=True)
+            datasets[account_id] = [
+                {
+                    "transaction_id": hashlib.sha1(
+                        f"{account_id}:{i}".encode()
+                    ).hexdigest()[:16],
+                    "timestamp": timestamp.isoformat() + "+00:00",
+                    "description": description,
+                    "amount": amount,
+                    "currency": "GBP",
+                    "transaction_type": "DEBIT",
+                    "transaction_category": "PURCHASE",
+                    "merchant_name": None,
+                }
+                for i, (timestamp, description, amount) in enumerate(transactions)
+            ]
+        return datasets[account_id]
+
+    @stub.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        endpoint = request.url.path.rstrip("/").split("/")[-1]
+        delay = config.latency_ms + rng.uniform(0, config.latency_jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if request.url.path.startswith("/data/"):
+            roll = rng.random()
+            if roll < config.error_rate:
+                stub.state.stats[f"{endpoint}:503"] += 1
+                return JSONResponse({"error": "stub_unavailable"}, status_code=503)
+            if roll < config.error_rate + config.rate_limit_rate:
+                stub.state.stats[f"{endpoint}:429"] += 1
+                return JSONResponse(
+                    {"error": "rate_limited"},
+                    status_code=429,
+                    headers={"Retry-After": str(config.retry_after_seconds)},
+                )
+
+        response = await call_next(request)
+        stub.state.stats[f"{endpoint}:{response.status_code}"] += 1
+        return response
+
+    def authorize(authorization: Optional[str]) -> str:
+        if not authorization or not authorization.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="invalid_token")
+        return _owner(authorization[len("Bearer ") :])
+
+    def page(request: Request, results: List[Dict[str, Any]], cursor: int):
+        body: Dict[str, Any] = {"results": results, "status": "Succeeded"}
+        if config.page_size is not None:
+            end = cursor + config.page_size
+            body["results"] = results[cursor:end]
+            if end < len(results):
+                body["next"] = str(request.url.include_query_params(cursor=end))
+        return body
+
+    @stub.post("/connect/token")
+    async def token(
+        grant_type: str = Form(...),
+        code: Optional[str] = Form(None),
+        refresh_token: Optional[str] = Form(None),
+    ):
+        if grant_type == "authorization_code" and code:
+            owner = code
+        elif grant_type == "refresh_token" and refresh_token:
+            owner = _owner(refresh_token)
+        else:
+            raise HTTPException(status_code=400, detail="invalid_grant")
+        issued = next(token_counter)
+        return {
+            "access_token": f"{owner}.access{issued}",
+            "refresh_token": f"{owner}.refresh{issued}",
+            "expires_in": config.token_expires_in,
+            "token_type": "Bearer",
+        }
+
+    @stub.get("/data/v1/accounts")
+    async def accounts(
+        request: Request, cursor: int = 0, authorization: Optional[str] = Header(None)
+    ):
+        owner = authorize(authorization)
+        results = [
+            {
+                "account_id": f"{owner}-acc{i}",
+                "account_type": "TRANSACTION",
+                "display_name": f"Current Account {i + 1}",
+                "currency": "GBP",
+                "account_number": {"number": f"{10000000 + i}"},
+                "provider": {"display_name": "Stub Bank"},
+            }
+            for i in range(config.accounts_per_user)
+        ]
+        return page(request, results, cursor)
+
+    @stub.get("/data/v1/accounts/{account_id}/transactions")
+    async def transactions(
+        request: Request,
+        account_id: str,
+        cursor: int = 0,
+        authorization: Optional[str] = Header(None),
+    ):
+        authorize(authorization)
+        from_date = request.query_params.get("from")
+        to_date = request.query_params.get("to")
+        results = [
+            t
+            for t in transactions_for(account_id)
+            if (from_date is None or t["timestamp"][:10] >= from_date)
+            and (to_date is None or t["timestamp"][:10] <= to_date)
+        ]
+        return page(request, results, cursor)
+
+    @stub.get("/data/v1/accounts/{account_id}/standing_orders")
+    async def standing_orders(
+        request: Request,
+        account_id: str,
+        cursor: int = 0,
+        authorization: Optional[str] = Header(None),
+    ):
+        authorize(authorization)
+        return page(request, [], cursor)
+
+    @stub.get("/data/v1/accounts/{account_id}/direct_debits")
+    async def direct_debits(
+        request: Request,
+        account_id: str,
+        cursor: int = 0,
+        authorization: Optional[str] = Header(None),
+    ):
+        authorize(authorization)
+        results = [
+            {
+                "direct_debit_id": f"{account_id}-dd{i}",
+                "name": description,
+                "previous_payment_amount": amount,
+                "currency": "GBP",
+            }
+            for i, (description, amount, _) in enumerate(SUBSCRIPTIONS)
+        ]
+        return page(request, results, cursor)
+
+    @stub.get("/_stub/stats")
+    async def stats():
+        return dict(stub.state.stats)
+
+    return stub
+
+
+app = create_truelayer_stub()
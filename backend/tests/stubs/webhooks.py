@@ -0,0 +1,89 @@
+"""
+Local sender for signed bank provider webhook notifications.
+
+Builds notifications signed the same way the receiver verifies them, for
+use in tests or against a running server:
+
+    python -m tests.stubs.webhooks --secret dev-secret --account acc_123 \
+        --count 20 http://localhost:8000/api/v1/banking/webhooks/truelayer
+"""
+
+import argparse
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import httpx
+from app.services.bank_webhooks import BankWebhookService, sign_webhook
+
+
+def build_webhook(
+    provider: str,
+    event_type: str,
+    account_id: str,
+    secret: str,
+    event_id: Optional[str] = None,
+    timestamp: Optional[int] = None,
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Build a signed notification
+
+    Args:
+        provider: Provider to impersonate, which picks the payload format
+        event_type: Event type, e.g. transactions_available
+        account_id: Account the notification is about
+        secret: Shared webhook secret
+        event_id: Optional event id, random by default
+        timestamp: Optional signing time, now by default
+
+    Returns:
+        Request body and headers
+    """
+    event_id = event_id or str(uuid.uuid4())
+    if provider == "tink":
+        payload = {
+            "id": event_id,
+            "event": event_type,
+            "content": {"account": {"id": account_id}},
+        }
+    else:
+        payload = {"event_id": event_id, "type": event_type, "account_id": account_id}
+
+    body = json.dumps(payload).encode()
+    signature = sign_webhook(secret, body, timestamp or int(time.time()))
+    return body, {
+        "Content-Type": "application/json",
+        BankWebhookService.signature_header(provider): signature,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send signed bank webhooks")
+    parser.add_argument("url", help="receiver URL, ending in the provider name")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--account", required=True)
+    parser.add_argument("--event", default="transactions_available")
+    parser.add_argument("--count", type=int, default=1, help="burst size")
+    args = parser.parse_args()
+
+    provider = args.url.rstrip("/").rsplit("/", 1)[-1]
+    results = Counter()
+    with httpx.Client() as client:
+        for _ in range(args.count):
+            body, headers = build_webhook(
+                provider, args.event, args.account, args.secret
+            )
+            response = client.post(args.url, content=body, headers=headers)
+            status = (
+                response.json().get("status")
+                if response.status_code == 202
+                else response.status_code
+            )
+            results[status] += 1
+    print(dict(results))
+
+
+if __name__ == "__main__":
+    main()